@@ -1,22 +1,68 @@
+import time
+
+# Startup timing starts here, so the startup log includes import time
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import hmac
+import math
 import os
+import signal
 import threading
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
+from slack_sdk import WebClient
 from openai import OpenAI
 from dotenv import load_dotenv
+from ledger_bot import metrics
+from ledger_bot.answer_store import SQLiteAnswerStore
+from ledger_bot.cache import ResponseCache, cache_key
+from ledger_bot.cassette import Cassette, RecordingLLMClient, RecordingSlackClient, ReplayLLMClient
+from ledger_bot.conversation import ConversationStore, clean_turn
+from ledger_bot.dedup import EventDeduper, SQLiteEventDeduper
+from ledger_bot.dispatch import Dispatcher
+from ledger_bot.drain import Drainer
+from ledger_bot.health import SocketModeHealth, make_health_server
+from ledger_bot.kb_tiers import compile_tiers, settings as tier_settings
+from ledger_bot.knowledge import KnowledgeBase, KnowledgeReloader, artifact_path, estimate_tokens, read_artifact
+from ledger_bot.quotas import Admission, QuotaManager, parse_channel_weights
+from ledger_bot.resilience import CircuitBreaker, PeekedStream, ResilientLLM, RetryBudget, close_stream
+from ledger_bot.routing import QuestionRouter, Route, Tier, parse_channel_tiers, parse_tiers
+from ledger_bot.singleflight import SingleFlight
+from ledger_bot.slack_outbound import ScheduledSlackClient, SlackScheduler
+from ledger_bot.startup import Lazy, Startup, is_built, resolve
+from ledger_bot.streaming import ThrottledMessageUpdater
 
 load_dotenv()
 
+# Startup pipeline: Slack, LLM and worker pool are built on first use (by
+# start() in production), each as a timed phase. Importing this module needs
+# no tokens and makes no network calls.
+startup = Startup(started=IMPORT_STARTED)
+startup.record("imports", time.perf_counter() - IMPORT_STARTED)
+REQUIRED_ENV = ("SLACK_BOT_TOKEN", "SLACK_APP_TOKEN", "LITELLM_DEVELOPER_KEY")
+
 # Health check server
 health_app = Flask(__name__)
 health_status = {"ready": False, "slack_connected": False, "llm_connected": False}
 
+# Readiness: startup has finished, Socket Mode has said hello and is still
+# connected, and LLM calls haven't been failing for READINESS_LLM_WINDOW
+# seconds without a success, with a failure in the last READINESS_LLM_WINDOW
+# seconds (0 leaves the LLM out of readiness)
+READINESS_LLM_WINDOW = float(os.environ.get("READINESS_LLM_WINDOW", "120"))
+SOCKET_CONNECT_TIMEOUT = float(os.environ.get("SOCKET_CONNECT_TIMEOUT", "30"))
+socket_health = SocketModeHealth()
+
+def knowledge_base_path():
+    """Path of the knowledge base file (KNOWLEDGE_BASE_PATH overrides the bundled copy)"""
+    return os.environ.get("KNOWLEDGE_BASE_PATH") or os.path.join(os.path.dirname(__file__), "knowledge_base.txt")
+
 def load_knowledge_base():
     """Load the knowledge base content from file"""
-    knowledge_base_path = os.path.join(os.path.dirname(__file__), "knowledge_base.txt")
     try:
-        with open(knowledge_base_path, "r") as f:
+        with open(knowledge_base_path(), "r") as f:
             return f.read()
     except FileNotFoundError:
         # Fallback if file doesn't exist
@@ -24,18 +70,176 @@ def load_knowledge_base():
 
 Answer questions clearly and concisely. If you're not sure, say so."""
 
-# Initialize Slack app (no signing secret needed for Socket Mode)
-slack_app = App(token=os.environ["SLACK_BOT_TOKEN"])
+# SLACK_API_URL points the Web API client elsewhere, e.g. at load_test.py's fake Slack.
+SLACK_API_URL = os.environ.get("SLACK_API_URL", WebClient.BASE_URL)
+
+# LiteLLM staging endpoint
+LITELLM_BASE_URL = os.environ.get("LITELLM_BASE_URL", "https://llm.ws2.staging.w10e.com/api/v2")
+
+# Cassettes: CASSETTE_MODE=record writes every LLM call (with timing), Slack
+# chat.* call durations and incoming events to CASSETTE_PATH; CASSETTE_MODE=replay
+# answers from that file instead of LiteLLM, e.g. under load_test.py --cassette
+CASSETTE_MODE = os.environ.get("CASSETTE_MODE", "").lower()
+CASSETTE_PATH = os.environ.get("CASSETTE_PATH", "cassette.jsonl")
+CASSETTE_TIME_SCALE = float(os.environ.get("CASSETTE_TIME_SCALE", "1.0"))
+cassette = None
+if CASSETTE_MODE and os.environ.get("BOT_RUNTIME", "sync").lower() == "async":
+    # The async runtime's LLM and Slack clients aren't wrapped: replay would
+    # quietly call LiteLLM and record would capture nothing
+    raise ValueError("CASSETTE_MODE only works with BOT_RUNTIME=sync")
+if CASSETTE_MODE == "record":
+    cassette = Cassette.record(CASSETTE_PATH)
+    print(f"📼 Recording LLM calls and Slack events to {CASSETTE_PATH}")
+elif CASSETTE_MODE and CASSETTE_MODE != "replay":
+    raise ValueError(f"Unknown CASSETTE_MODE {CASSETTE_MODE!r}, expected record or replay")
+
+def create_llm_client():
+    """OpenAI client for LiteLLM (recording under CASSETTE_MODE=record), or the cassette replayer"""
+    if CASSETTE_MODE == "replay":
+        print(f"📼 Replaying LLM calls from {CASSETTE_PATH} at {CASSETTE_TIME_SCALE:g}x recorded timing")
+        return ReplayLLMClient(Cassette.load(CASSETTE_PATH), time_scale=CASSETTE_TIME_SCALE)
+    client = OpenAI(
+        api_key=os.environ["LITELLM_DEVELOPER_KEY"],
+        base_url=LITELLM_BASE_URL,
+        default_headers={"X-LiteLLM-Dev-Key": os.environ["LITELLM_DEVELOPER_KEY"]},
+        # Retries are llm_caller's job; the SDK's own would multiply its attempts
+        max_retries=0
+    )
+    if cassette is not None:
+        client = RecordingLLMClient(client, cassette)
+    return client
+
+llm_client = Lazy(create_llm_client, "llm_client", startup)
+
+# Retrieval: send the core sections plus the most relevant sections for each
+# question instead of the whole knowledge base
+RETRIEVAL_ENABLED = os.environ.get("RETRIEVAL_ENABLED", "true").lower() == "true"
+RETRIEVAL_TOP_K = int(os.environ.get("RETRIEVAL_TOP_K", "6"))
+RETRIEVAL_TOKEN_BUDGET = int(os.environ.get("RETRIEVAL_TOKEN_BUDGET", "3000"))
+RETRIEVAL_CORE_SECTIONS = [
+    title.strip()
+    for title in os.environ.get("RETRIEVAL_CORE_SECTIONS", "YOUR ROLE,HOW TO ANSWER QUESTIONS").split(",")
+    if title.strip()
+]
+
+# Compiled knowledge artifact (parsed sections, token counts and retrieval
+# index) written by update_knowledge_base.py. Used only while it matches the
+# knowledge base text; otherwise the text is parsed as before.
+KNOWLEDGE_ARTIFACT_PATH = os.environ.get("KNOWLEDGE_ARTIFACT_PATH") or artifact_path(knowledge_base_path())
+
+# Tiers: whitespace is compressed and snippets repeating a core section are
+# replaced by pointers; sections listed in KB_ARCHIVE_SECTIONS, and then the
+# most code-heavy detail sections until the prompt fits KB_TOKEN_CEILING
+# (0 = no ceiling), are archived - kept in the artifact but never sent
+KB_TOKEN_CEILING = int(os.environ.get("KB_TOKEN_CEILING", "0"))
+KB_ARCHIVE_SECTIONS = [
+    title.strip() for title in os.environ.get("KB_ARCHIVE_SECTIONS", "").split(",") if title.strip()
+]
+KB_COMPRESS = os.environ.get("KB_COMPRESS", "true").lower() == "true"
+KB_TIERING = tier_settings(RETRIEVAL_CORE_SECTIONS, KB_ARCHIVE_SECTIONS, KB_TOKEN_CEILING, KB_COMPRESS)
+
+def build_knowledge(text):
+    """Load knowledge base text from a matching compiled artifact, or compress, tier and index it"""
+    kb = KnowledgeBase(text, core_titles=RETRIEVAL_CORE_SECTIONS, artifact=read_artifact(KNOWLEDGE_ARTIFACT_PATH))
+    if kb.compiled and kb.tiering == KB_TIERING:
+        return kb
+    return compile_tiers(text, RETRIEVAL_CORE_SECTIONS, KB_ARCHIVE_SECTIONS, KB_TOKEN_CEILING, KB_COMPRESS).kb
+
+with startup.phase("knowledge"):
+    KNOWLEDGE_BASE = load_knowledge_base()
+    knowledge = build_knowledge(KNOWLEDGE_BASE)
+
+# Prompt caching: send the whole knowledge base as a byte-stable system block
+# marked with cache_control so Claude (via LiteLLM) serves it from its prompt
+# cache. The cached prefix replaces retrieval - per-question section selection
+# would change the prefix and never hit.
+PROMPT_CACHE_ENABLED = os.environ.get("PROMPT_CACHE_ENABLED", "false").lower() == "true"
+
+# Response cache: repeat questions are answered from memory. Keys include the
+# knowledge base hash and model, so a KB or model change never serves stale answers.
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "256"))
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "3600"))
+
+# Persistent answer store: set ANSWER_STORE_PATH to a file on a mounted volume
+# so cached answers survive restarts and rolling deploys
+ANSWER_STORE_PATH = os.environ.get("ANSWER_STORE_PATH", "")
+ANSWER_STORE_MAX_MB = float(os.environ.get("ANSWER_STORE_MAX_MB", "20"))
+ANSWER_STORE_TTL = float(os.environ.get("ANSWER_STORE_TTL", str(7 * 24 * 3600)))
+
+def open_answer_store():
+    """Open the on-disk answer store, or None if not configured or unusable"""
+    if not (RESPONSE_CACHE_ENABLED and ANSWER_STORE_PATH):
+        return None
+    try:
+        return SQLiteAnswerStore(
+            ANSWER_STORE_PATH,
+            max_bytes=int(ANSWER_STORE_MAX_MB * 1024 * 1024),
+            ttl=ANSWER_STORE_TTL
+        )
+    except Exception as e:
+        print(f"Error opening answer store at {ANSWER_STORE_PATH}: {e}")
+        return None
+
+response_cache = ResponseCache(
+    max_entries=RESPONSE_CACHE_SIZE,
+    ttl=RESPONSE_CACHE_TTL,
+    store=open_answer_store()
+)
+
+# Coalescing: identical questions asked while one is already waiting on the LLM
+# share that answer instead of making their own call
+SINGLEFLIGHT_ENABLED = os.environ.get("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+SINGLEFLIGHT_WAIT_SECONDS = float(os.environ.get("SINGLEFLIGHT_WAIT_SECONDS", "60"))
+singleflight = SingleFlight(wait_timeout=SINGLEFLIGHT_WAIT_SECONDS)
+
+if response_cache.store is not None:
+    # Answers from an older knowledge base are of no use after a deploy
+    response_cache.invalidate_kb(knowledge.hash)
+    print(f"💾 Answer store {ANSWER_STORE_PATH}: {len(response_cache.store)} warm answer(s), "
+          f"dropped {response_cache.invalidations} stale")
 
-# Initialize LiteLLM client with staging endpoint
-llm_client = OpenAI(
-    api_key=os.environ["LITELLM_DEVELOPER_KEY"],
-    base_url="https://llm.ws2.staging.w10e.com/api/v2",
-    default_headers={"X-LiteLLM-Dev-Key": os.environ["LITELLM_DEVELOPER_KEY"]}
+# Conversation memory: earlier turns of a thread are sent with follow-up
+# questions. Older turns are folded into a summary past the token budget and
+# idle threads are evicted once the store is over its limits.
+CONVERSATION_MEMORY_ENABLED = os.environ.get("CONVERSATION_MEMORY_ENABLED", "true").lower() == "true"
+CONVERSATION_TOKEN_BUDGET = int(os.environ.get("CONVERSATION_TOKEN_BUDGET", "1500"))
+CONVERSATION_KEEP_TURNS = int(os.environ.get("CONVERSATION_KEEP_TURNS", "4"))
+CONVERSATION_SUMMARY_TOKENS = int(os.environ.get("CONVERSATION_SUMMARY_TOKENS", "400"))
+CONVERSATION_MAX_THREADS = int(os.environ.get("CONVERSATION_MAX_THREADS", "1000"))
+CONVERSATION_MAX_MB = float(os.environ.get("CONVERSATION_MAX_MB", "16"))
+CONVERSATION_IDLE_TTL = float(os.environ.get("CONVERSATION_IDLE_TTL", str(24 * 3600)))
+conversations = ConversationStore(
+    token_budget=CONVERSATION_TOKEN_BUDGET,
+    keep_turns=CONVERSATION_KEEP_TURNS,
+    summary_tokens=CONVERSATION_SUMMARY_TOKENS,
+    max_threads=CONVERSATION_MAX_THREADS,
+    max_bytes=int(CONVERSATION_MAX_MB * 1024 * 1024),
+    idle_ttl=CONVERSATION_IDLE_TTL
 )
 
-# Load knowledge base
-KNOWLEDGE_BASE = load_knowledge_base()
+# Hot reload: knowledge_base.txt is re-read in the background when it changes
+# (or on POST /admin/reload-knowledge) and swapped in without a restart
+KB_WATCH_INTERVAL = float(os.environ.get("KB_WATCH_INTERVAL", "10"))
+KB_RELOAD_TOKEN = os.environ.get("KB_RELOAD_TOKEN", "")
+
+def install_knowledge(new, old=None):
+    """Swap in a rebuilt knowledge base. In-flight requests keep the version they started with."""
+    global knowledge, KNOWLEDGE_BASE
+    knowledge = new
+    KNOWLEDGE_BASE = new.text
+    response_cache.invalidate_kb(new.hash)
+    router.update_headings([section.title for section in new.sections])
+    metrics.KNOWLEDGE_RELOADS.inc()
+    print(f"📚 Knowledge base reloaded: {new.hash} ({len(new.sections)} sections, ~{new.prompt_tokens}/{new.total_tokens} tokens sent)")
+
+knowledge_reloader = KnowledgeReloader(
+    knowledge_base_path(),
+    knowledge,
+    build=build_knowledge,
+    on_swap=install_knowledge,
+    interval=KB_WATCH_INTERVAL
+)
 
 # Get model name from environment or use default
 # Wealthsimple LiteLLM uses AWS Bedrock model names
@@ -47,164 +251,846 @@ def health():
     """Liveness probe - is the app alive?"""
     return jsonify({"status": "healthy"}), 200
 
+def update_health_status():
+    """Refresh health_status from Socket Mode events and recent LLM outcomes"""
+    slack_connected = socket_health.connected()
+    llm_connected = llm_caller.healthy(READINESS_LLM_WINDOW)
+    health_status.update(
+        slack_connected=slack_connected,
+        llm_connected=llm_connected,
+        draining=drainer.draining,
+        ready=startup.ready_after is not None and slack_connected and llm_connected and not drainer.draining
+    )
+    return health_status["ready"]
+
 @health_app.route('/ready', methods=['GET'])
 def ready():
     """Readiness probe - is the app ready to serve?"""
-    if health_status["ready"] and health_status["slack_connected"]:
-        return jsonify(health_status), 200
+    update_health_status()
+    body = dict(
+        health_status,
+        socket_mode=socket_health.stats(),
+        drain=drainer.stats(),
+        events=event_deduper.stats(),
+        startup=startup.stats(),
+        dispatch=dispatcher.stats() if is_built(dispatcher) else None,
+        cache=response_cache.stats(),
+        singleflight=singleflight.stats(),
+        conversations=conversations.stats(),
+        routing=dict(router.stats(), enabled=ROUTING_ENABLED),
+        llm=llm_caller.stats(),
+        slack_outbound=slack_scheduler.stats(),
+        quotas=dict(quotas.stats(), enabled=QUOTAS_ENABLED),
+        knowledge=knowledge_reloader.stats()
+    )
+    if health_status["ready"]:
+        return jsonify(body), 200
     else:
-        return jsonify(health_status), 503
+        return jsonify(body), 503
+
+@health_app.route('/quotas', methods=['GET'])
+def quota_usage():
+    """Per-user and per-channel token and request totals (kept out of Prometheus labels)"""
+    return jsonify(dict(quotas.usage(), enabled=QUOTAS_ENABLED)), 200
+
+@health_app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    body, content_type = metrics.exposition()
+    return Response(body, mimetype=content_type)
+
+@health_app.route('/admin/reload-knowledge', methods=['POST'])
+def reload_knowledge():
+    """Re-read the knowledge base now instead of waiting for the watcher"""
+    # Served on 0.0.0.0 next to the probes: off unless a token is configured
+    if not KB_RELOAD_TOKEN:
+        return jsonify({"error": "not found"}), 404
+    if not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), KB_RELOAD_TOKEN):
+        return jsonify({"error": "forbidden"}), 403
+    try:
+        new = knowledge_reloader.reload(force=True)
+    except Exception as e:
+        return jsonify({"reloaded": False, "error": str(e)}), 500
+    body = dict(knowledge_reloader.stats(), reloaded=new is not None)
+    if new is not None:
+        body["build_ms"] = round(knowledge_reloader.last_build_seconds * 1000, 1)
+    return jsonify(body), 200
 
 def run_health_server():
-    """Run the health check server on a separate thread"""
+    """Serve the health app on waitress (Flask's dev server is for development only)"""
     port = int(os.environ.get("HEALTH_PORT", "8080"))
-    health_app.run(host="0.0.0.0", port=port, debug=False, use_reloader=False)
+    make_health_server(health_app, port=port).run()
 
-# Handle mentions
-@slack_app.event("app_mention")
-def handle_mention(event, say, client):
-    user_question = event["text"]
-    channel = event["channel"]
-    ts = event["ts"]
+# Slack limit is 40,000 chars, but be conservative
+# With max_tokens=2000, response should be ~8000 chars max
+# Use 10,000 to be extra safe
+MAX_MESSAGE_LENGTH = 10000
+MAX_TOKENS = 2000
+THINKING_MESSAGE = ":hourglass_flowing_sand: Thinking..."
+
+# Model routing: a local classifier sends lookups ("which channel do I ask in?")
+# to the fast tier and debugging/explanation questions to the strong tier.
+# MODEL_TIERS is "name=model:max_tokens,..." from fastest to strongest.
+ROUTING_ENABLED = os.environ.get("ROUTING_ENABLED", "false").lower() == "true"
+MODEL_TIERS = os.environ.get(
+    "MODEL_TIERS", f"fast=bedrock-claude-4.5-haiku:800,strong={MODEL_NAME}:{MAX_TOKENS}"
+)
+ROUTING_THRESHOLD = float(os.environ.get("ROUTING_THRESHOLD", "1.0"))
+# Per-channel tier overrides, e.g. "C0123ABC:strong,C0456DEF:fast"
+ROUTING_CHANNEL_TIERS = os.environ.get("ROUTING_CHANNEL_TIERS", "")
+DEFAULT_ROUTE = Route(Tier("default", MODEL_NAME, MAX_TOKENS), "default")
+router = QuestionRouter(
+    parse_tiers(MODEL_TIERS),
+    threshold=ROUTING_THRESHOLD,
+    channel_tiers=parse_channel_tiers(ROUTING_CHANNEL_TIERS),
+    headings=[section.title for section in knowledge.sections]
+)
+
+# Streaming: push partial answers into the placeholder while the LLM is still writing.
+# Edits are coalesced so we stay well inside Slack's chat.update rate tier.
+STREAM_RESPONSES = os.environ.get("STREAM_RESPONSES", "true").lower() == "true"
+STREAM_UPDATE_INTERVAL = float(os.environ.get("STREAM_UPDATE_INTERVAL", "1.5"))
+STREAM_MIN_CHARS = int(os.environ.get("STREAM_MIN_CHARS", "150"))
 
+# Worker pool: LLM work runs off Bolt's listener threads behind a bounded queue.
+# When the queue is full we tell the user to retry instead of piling up work.
+WORKER_POOL_SIZE = int(os.environ.get("WORKER_POOL_SIZE", "4"))
+DISPATCH_QUEUE_SIZE = int(os.environ.get("DISPATCH_QUEUE_SIZE", "50"))
+MAX_CONCURRENT_PER_USER = int(os.environ.get("MAX_CONCURRENT_PER_USER", "2"))
+MAX_CONCURRENT_PER_CHANNEL = int(os.environ.get("MAX_CONCURRENT_PER_CHANNEL", "4"))
+BUSY_MESSAGE = ":no_entry: I'm handling a lot of questions right now. Please retry in a minute."
+
+# Fair-share quotas: token buckets on requests and estimated LLM tokens per
+# user and per channel, so one chatty channel can't spend the whole LiteLLM
+# key. CHANNEL_PRIORITIES ("C0123:4,C0456:2") gives channels such as the
+# incident channel a bigger share of a saturated worker pool and bigger quotas.
+QUOTAS_ENABLED = os.environ.get("QUOTAS_ENABLED", "true").lower() == "true"
+USER_REQUESTS_PER_MINUTE = float(os.environ.get("USER_REQUESTS_PER_MINUTE", "10"))
+USER_TOKENS_PER_HOUR = float(os.environ.get("USER_TOKENS_PER_HOUR", "150000"))
+CHANNEL_REQUESTS_PER_MINUTE = float(os.environ.get("CHANNEL_REQUESTS_PER_MINUTE", "30"))
+CHANNEL_TOKENS_PER_HOUR = float(os.environ.get("CHANNEL_TOKENS_PER_HOUR", "600000"))
+CHANNEL_PRIORITIES = parse_channel_weights(os.environ.get("CHANNEL_PRIORITIES", ""))
+THROTTLED_MESSAGE = ":hourglass: {who} asked a lot of questions recently. Please try again in {wait}."
+
+quotas = QuotaManager(
+    user_requests_per_minute=USER_REQUESTS_PER_MINUTE,
+    user_tokens_per_hour=USER_TOKENS_PER_HOUR,
+    channel_requests_per_minute=CHANNEL_REQUESTS_PER_MINUTE,
+    channel_tokens_per_hour=CHANNEL_TOKENS_PER_HOUR,
+    channel_weights=CHANNEL_PRIORITIES
+)
+
+def create_dispatcher():
+    """Worker pool for the threaded runtime (the async runtime never builds it)"""
+    return Dispatcher(
+        workers=WORKER_POOL_SIZE,
+        queue_size=DISPATCH_QUEUE_SIZE,
+        per_user_limit=MAX_CONCURRENT_PER_USER,
+        per_channel_limit=MAX_CONCURRENT_PER_CHANNEL
+    )
+
+dispatcher = Lazy(create_dispatcher, "dispatcher", startup)
+
+# Graceful drain: on SIGTERM the pod closes its Socket Mode connection (Slack
+# then delivers to the pod replacing it), gives in-flight answers until
+# DRAIN_TIMEOUT to finish and replaces any left with RESTART_MESSAGE. Keep
+# DRAIN_TIMEOUT below the pod's terminationGracePeriodSeconds.
+DRAIN_TIMEOUT = float(os.environ.get("DRAIN_TIMEOUT", "45"))
+RESTART_MESSAGE = (":arrows_counterclockwise: I'm restarting for a deploy and couldn't finish this answer. "
+                   "Please ask again in a minute.")
+drainer = Drainer(timeout=DRAIN_TIMEOUT)
+
+# Event dedup: a redelivered Slack event (same event_id) is answered once.
+# EVENT_DEDUP_PATH on the mounted volume shares claims with the other pod
+# during a rollout; without it claims are only remembered in this process.
+EVENT_DEDUP_PATH = os.environ.get("EVENT_DEDUP_PATH", "")
+EVENT_DEDUP_TTL = float(os.environ.get("EVENT_DEDUP_TTL", "3600"))
+
+def open_event_deduper():
+    """Shared on-disk deduper if configured and usable, else an in-memory one"""
+    if EVENT_DEDUP_PATH:
+        try:
+            return SQLiteEventDeduper(EVENT_DEDUP_PATH, ttl=EVENT_DEDUP_TTL)
+        except Exception as e:
+            print(f"Error opening event dedup store at {EVENT_DEDUP_PATH}: {e}")
+    return EventDeduper(ttl=EVENT_DEDUP_TTL)
+
+event_deduper = open_event_deduper()
+
+def claim_event(body, source):
+    """False if this Slack event was already claimed, here or by another pod"""
+    event_id = (body or {}).get("event_id")
+    try:
+        claimed = event_deduper.claim(event_id)
+    except Exception as e:
+        # Answering twice beats not answering
+        metrics.record_error("dedup", e)
+        print(f"Error claiming event {event_id}: {e}")
+        return True
+    if not claimed:
+        metrics.DUPLICATE_EVENTS.inc()
+        print(f"♻️  Skipping redelivered {source} event {event_id}")
+    return claimed
+
+# LLM resilience: per-attempt timeouts, jittered retries within a budget,
+# optional hedging, and a circuit breaker per model that fails over to
+# LLM_FALLBACK_MODEL when errors or latency breach the SLO
+LLM_ATTEMPT_TIMEOUT = float(os.environ.get("LLM_ATTEMPT_TIMEOUT", "90"))
+LLM_MAX_ATTEMPTS = int(os.environ.get("LLM_MAX_ATTEMPTS", "3"))
+LLM_RETRY_BUDGET_RATIO = float(os.environ.get("LLM_RETRY_BUDGET_RATIO", "0.2"))
+LLM_HEDGE_ENABLED = os.environ.get("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_MIN_DELAY = float(os.environ.get("LLM_HEDGE_MIN_DELAY", "2"))
+LLM_FALLBACK_MODEL = os.environ.get("LLM_FALLBACK_MODEL", "")
+LLM_BREAKER_ERROR_RATE = float(os.environ.get("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_LATENCY_SLO = float(os.environ.get("LLM_BREAKER_LATENCY_SLO", "30"))
+LLM_BREAKER_COOLDOWN = float(os.environ.get("LLM_BREAKER_COOLDOWN", "30"))
+
+def make_breaker(model, on_change=None):
+    """Circuit breaker for one model"""
+    return CircuitBreaker(
+        model,
+        error_rate=LLM_BREAKER_ERROR_RATE,
+        latency_slo=LLM_BREAKER_LATENCY_SLO,
+        cooldown=LLM_BREAKER_COOLDOWN,
+        on_change=on_change
+    )
+
+llm_caller = ResilientLLM(
+    attempt_timeout=LLM_ATTEMPT_TIMEOUT,
+    max_attempts=LLM_MAX_ATTEMPTS,
+    budget=RetryBudget(ratio=LLM_RETRY_BUDGET_RATIO),
+    hedge=LLM_HEDGE_ENABLED,
+    hedge_min_delay=LLM_HEDGE_MIN_DELAY,
+    hedge_workers=2 * WORKER_POOL_SIZE,
+    fallback_model=LLM_FALLBACK_MODEL,
+    breaker_factory=make_breaker
+)
+
+# Slack outbound: chat.postMessage/chat.update go through one queue with
+# per-method and per-channel rate limits that honours Retry-After, merges
+# superseded edits to the same message and sends streaming edits last
+SLACK_OUTBOUND_ENABLED = os.environ.get("SLACK_OUTBOUND_ENABLED", "true").lower() == "true"
+SLACK_POST_PER_MINUTE = float(os.environ.get("SLACK_POST_PER_MINUTE", "300"))
+SLACK_UPDATE_PER_MINUTE = float(os.environ.get("SLACK_UPDATE_PER_MINUTE", "50"))
+SLACK_CHANNEL_PER_SECOND = float(os.environ.get("SLACK_CHANNEL_PER_SECOND", "1"))
+SLACK_CHANNEL_BURST = float(os.environ.get("SLACK_CHANNEL_BURST", "4"))
+slack_scheduler = SlackScheduler(
+    method_limits={"chat_postMessage": SLACK_POST_PER_MINUTE, "chat_update": SLACK_UPDATE_PER_MINUTE},
+    channel_rate=SLACK_CHANNEL_PER_SECOND,
+    channel_burst=SLACK_CHANNEL_BURST
+)
+
+def outbound_client(client):
+    """Slack client for answering: timed, and rate limited through the outbound queue"""
+    if cassette is not None:
+        client = RecordingSlackClient(client, cassette)
+    client = metrics.TimedSlackClient(client)
+    if SLACK_OUTBOUND_ENABLED:
+        client = ScheduledSlackClient(client, slack_scheduler)
+    return client
+
+metrics.SLACK_OUTBOUND_QUEUE.set_function(slack_scheduler.queue_depth)
+metrics.QUEUE_DEPTH.set_function(lambda: dispatcher.stats()["queue_depth"] if is_built(dispatcher) else 0)
+metrics.ACTIVE_WORKERS.set_function(lambda: dispatcher.stats()["active"] if is_built(dispatcher) else 0)
+
+# Async runtime: BOT_RUNTIME=async answers on one event loop with a pooled
+# AsyncOpenAI client instead of a worker thread per question
+BOT_RUNTIME = os.environ.get("BOT_RUNTIME", "sync").lower()
+ASYNC_MAX_CONCURRENCY = int(os.environ.get("ASYNC_MAX_CONCURRENCY", "200"))
+ASYNC_MAX_PENDING = int(os.environ.get("ASYNC_MAX_PENDING", "500"))
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "200"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("LLM_MAX_KEEPALIVE_CONNECTIONS", "50"))
+
+def truncate_response(response_text):
+    """Keep responses within MAX_MESSAGE_LENGTH"""
+    if len(response_text) > MAX_MESSAGE_LENGTH:
+        metrics.TRUNCATIONS.inc()
+        response_text = response_text[:MAX_MESSAGE_LENGTH] + "\n\n...\n\n_(Response truncated due to length. Please ask a more specific question.)_"
+    return response_text
+
+def format_error_message(error):
+    """User-facing message for a failed answer"""
+    error_message = f"❌ Sorry, I encountered an error: `{str(error)[:500]}`\n\n"
+    error_message += "This is usually temporary. Please try again in a moment, or reach out to #bor-write-eng if the issue persists."
+    return error_message
+
+def build_system_prompt(user_question, kb=None):
+    """Knowledge base content to send for a question"""
+    kb = kb or knowledge
+    if PROMPT_CACHE_ENABLED or not RETRIEVAL_ENABLED:
+        return kb.prompt_text
+    retrieval = kb.retrieve(
+        user_question,
+        top_k=RETRIEVAL_TOP_K,
+        token_budget=RETRIEVAL_TOKEN_BUDGET
+    )
+    print(retrieval.describe())
+    return retrieval.prompt
+
+def build_messages(user_question, kb=None, history=None):
+    """Chat messages sent to the LLM for a question, after any earlier turns of its thread"""
+    system_prompt = build_system_prompt(user_question, kb)
+    if PROMPT_CACHE_ENABLED:
+        # Nothing request-specific may go into this block, or the cache never hits
+        system_content = [
+            {"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}
+        ]
+    else:
+        system_content = system_prompt
+    return [
+        {"role": "system", "content": system_content},
+        *(history or []),
+        # Cleaned like the stored turns, so this question reads the same once it's history
+        {"role": "user", "content": clean_turn(user_question) or user_question}
+    ]
+
+def route_question(user_question, channel=None):
+    """Model tier to answer a question with"""
+    if not ROUTING_ENABLED:
+        return DEFAULT_ROUTE
+    return router.route(user_question, channel)
+
+def complete(messages, tier=None):
+    """Call LiteLLM and return the full response text"""
+    tier = tier or DEFAULT_ROUTE.tier
+    started = time.perf_counter()
+
+    def attempt(model, timeout):
+        return llm_client.chat.completions.create(
+            model=model,
+            max_tokens=tier.max_tokens,
+            messages=messages,
+            timeout=timeout
+        )
+
+    response, model = llm_caller.call(attempt, tier.model)
+    metrics.LLM_LATENCY.labels(model=model, mode="blocking", tier=tier.name).observe(time.perf_counter() - started)
+    metrics.record_usage(model, getattr(response, "usage", None))
+    return response.choices[0].message.content
+
+def stream_completion(messages, updater, tier=None):
+    """Call LiteLLM in streaming mode, feeding deltas into the placeholder updater"""
+    tier = tier or DEFAULT_ROUTE.tier
+    started = time.perf_counter()
+
+    def attempt(model, timeout):
+        # Read the first chunk inside the attempt so a stalled stream is retried
+        return PeekedStream(llm_client.chat.completions.create(
+            model=model,
+            max_tokens=tier.max_tokens,
+            messages=messages,
+            stream=True,
+            # Final chunk carries token usage
+            stream_options={"include_usage": True},
+            timeout=timeout
+        ))
+
+    stream, model = llm_caller.call(attempt, tier.model, discard=close_stream)
+    parts = []
+    usage = None
+    first_token = None
+    for chunk in stream:
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            if first_token is None:
+                first_token = time.perf_counter() - started
+            parts.append(delta)
+            updater.append(delta)
+    metrics.LLM_LATENCY.labels(model=model, mode="stream", tier=tier.name).observe(time.perf_counter() - started)
+    metrics.record_usage(model, usage)
+    if first_token is not None:
+        # Observed at the end: only the final usage chunk says whether the prompt cache hit
+        metrics.record_first_token(model, first_token, usage)
+    return "".join(parts)
+
+def question_key(user_question, kb=None, channel=None):
+    """Identity of a question for caching and coalescing"""
+    model = route_question(user_question, channel).tier.model
+    return cache_key(user_question, (kb or knowledge).hash, model)
+
+def response_cache_key(user_question, kb=None, channel=None):
+    """Cache key for a question, or None when caching is off"""
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    return question_key(user_question, kb, channel)
+
+def coalesce_key(user_question, kb=None, channel=None):
+    """Singleflight key for a question, or None when coalescing is off"""
+    if not SINGLEFLIGHT_ENABLED:
+        return None
+    return question_key(user_question, kb, channel)
+
+def conversation_history(channel, thread_ts):
+    """Earlier turns of the thread a question was asked in"""
+    # Top-level DMs have no thread: each one is a separate conversation
+    if not CONVERSATION_MEMORY_ENABLED or thread_ts is None:
+        return []
+    return conversations.history(channel, thread_ts)
+
+def remember_turn(channel, thread_ts, user_question, response_text):
+    """Record an answered question in its thread's history"""
+    if CONVERSATION_MEMORY_ENABLED and thread_ts is not None:
+        conversations.append(channel, thread_ts, user_question, response_text)
+
+def estimate_question_tokens(user_question, kb=None, history=None, channel=None):
+    """(prompt, answer) token estimates for a question, without building its prompt"""
+    kb = kb or knowledge
+    if PROMPT_CACHE_ENABLED or not RETRIEVAL_ENABLED:
+        prompt = kb.prompt_tokens
+    else:
+        prompt = min(RETRIEVAL_TOKEN_BUDGET, kb.prompt_tokens)
+    prompt += estimate_tokens(user_question) + sum(estimate_tokens(str(m["content"])) for m in history or [])
+    return prompt, route_question(user_question, channel).tier.max_tokens
+
+def admit_question(user, channel, user_question, history=None):
+    """Charge a question against its user's and channel's quotas"""
+    prompt_tokens, answer_tokens = estimate_question_tokens(user_question, history=history, channel=channel)
+    if not QUOTAS_ENABLED:
+        return Admission(user, channel, prompt_tokens + answer_tokens)
+    admission = quotas.admit(user, channel, prompt_tokens + answer_tokens)
+    if not admission.allowed:
+        print(f"🚦 Throttled {user} in {channel}: {admission.scope} quota, retry in {admission.retry_after:.0f}s")
+    return admission
+
+def settle_question(admission, user_question, response_text, history=None):
+    """Correct an admitted question's charge to the tokens its answer used"""
+    if not QUOTAS_ENABLED:
+        return
+    if admission.shared:
+        # Coalesced onto another question's answer: no model call to pay for
+        quotas.settle(admission, 0)
+        return
+    prompt_tokens, _ = estimate_question_tokens(user_question, history=history, channel=admission.channel)
+    quotas.settle(admission, prompt_tokens + estimate_tokens(response_text or ""))
+
+def throttled_message(admission):
+    """User-facing reply for a question refused by a quota"""
+    seconds = max(admission.retry_after, 1)
+    wait = f"{math.ceil(seconds)} seconds" if seconds < 90 else f"{math.ceil(seconds / 60)} minutes"
+    who = "You've" if admission.scope == "user" else "This channel has"
+    return THROTTLED_MESSAGE.format(who=who, wait=wait)
+
+def reply_from_cache(client, channel, user_question, thread_ts=None, source="message"):
+    """Post a cached answer directly. Returns True if the question was answered."""
+    if conversation_history(channel, thread_ts):
+        # Follow-ups depend on the thread; a cached standalone answer won't fit
+        return False
+    key = response_cache_key(user_question, channel=channel)
+    if key is None:
+        return False
+    cached = response_cache.get(key)
+    if cached is None:
+        metrics.CACHE_LOOKUPS.labels(result="miss").inc()
+        return False
+    metrics.CACHE_LOOKUPS.labels(result="hit").inc()
+    try:
+        client.chat_postMessage(channel=channel, thread_ts=thread_ts, text=cached)
+    except Exception as e:
+        metrics.record_error("slack_post", e)
+        print(f"Error posting cached answer ({source}): {e}")
+        return False
+    remember_turn(channel, thread_ts, user_question, cached)
+    print(f"💾 Answered {source} from cache")
+    return True
+
+def generate_answer(user_question, updater, kb=None, history=None, channel=None):
+    """Ask the LLM, streaming into the placeholder if enabled"""
+    route = route_question(user_question, channel)
+    if ROUTING_ENABLED:
+        metrics.record_route(route)
+        print(f"🧭 Routed to {route.describe()}")
+    messages = build_messages(user_question, kb, history)
+    if STREAM_RESPONSES:
+        response_text = stream_completion(messages, updater, route.tier)
+    else:
+        response_text = complete(messages, route.tier)
+    return truncate_response(response_text)
+
+def coalesced_answer(user_question, updater, source="message", kb=None, history=None, channel=None,
+                     admission=None):
+    """
+    Share the answer of an identical in-flight question, or generate one.
+    A shared answer marks `admission` so its quota charge is given back.
+    """
+    if history:
+        # The same words mean something different in another thread
+        return generate_answer(user_question, updater, kb, history, channel)
+    key = coalesce_key(user_question, kb, channel)
+    if key is None:
+        return generate_answer(user_question, updater, kb, channel=channel)
+
+    call, leader = singleflight.begin(key)
+    if not leader:
+        response_text = singleflight.wait(call)
+        if response_text is not None:
+            if admission is not None:
+                admission.shared = True
+            metrics.COALESCED.inc()
+            print(f"🔗 Coalesced {source} onto an in-flight answer")
+            return response_text
+        # Leader failed or took too long; ask on our own
+        return generate_answer(user_question, updater, kb, channel=channel)
+
+    try:
+        response_text = generate_answer(user_question, updater, kb, channel=channel)
+    except Exception as e:
+        singleflight.finish(key, call, error=e)
+        raise
+    singleflight.finish(key, call, result=response_text)
+    return response_text
+
+def answer_question(client, channel, user_question, thread_ts=None, source="message", received_at=None,
+                    reply=None, admission=None):
+    """
+    Post a placeholder, ask the LLM and replace it with the answer. Returns
+    the answer, or None on failure. `reply` is the question's drainer entry
+    and `admission` its quota charge.
+    """
+    started = time.monotonic()
+    received_at = received_at or started
+    # Pin the knowledge base version for this request so a reload mid-answer
+    # doesn't mix versions between the prompt and the cache key
+    kb = knowledge
+    history = conversation_history(channel, thread_ts)
     try:
         # Send immediate acknowledgment
         thinking_msg = client.chat_postMessage(
             channel=channel,
-            thread_ts=ts,
-            text=":hourglass_flowing_sand: Thinking..."
+            thread_ts=thread_ts,
+            text=THINKING_MESSAGE
         )
     except Exception as e:
-        print(f"Error posting thinking message (mention): {e}")
+        metrics.record_error("slack_post", e)
+        print(f"Error posting thinking message ({source}): {e}")
         # Can't post to channel, silently fail
         return
+    if reply is not None:
+        reply.ts = thinking_msg["ts"]
 
-    try:
-        # Call LiteLLM
-        response = llm_client.chat.completions.create(
-            model=MODEL_NAME,
-            max_tokens=2000,
-            messages=[
-                {"role": "system", "content": KNOWLEDGE_BASE},
-                {"role": "user", "content": user_question}
-            ]
-        )
-
-        # Get response content and truncate if too long
-        response_text = response.choices[0].message.content
+    updater = ThrottledMessageUpdater(
+        client,
+        channel,
+        thinking_msg["ts"],
+        min_interval=STREAM_UPDATE_INTERVAL,
+        min_chars=STREAM_MIN_CHARS,
+        max_length=MAX_MESSAGE_LENGTH
+    )
 
-        # Slack limit is 40,000 chars, but be conservative
-        # With max_tokens=2000, response should be ~8000 chars max
-        # Use 10,000 to be extra safe
-        MAX_MESSAGE_LENGTH = 10000
-        if len(response_text) > MAX_MESSAGE_LENGTH:
-            response_text = response_text[:MAX_MESSAGE_LENGTH] + "\n\n...\n\n_(Response truncated due to length. Please ask a more specific question.)_"
+    try:
+        response_text = coalesced_answer(user_question, updater, source, kb, history, channel, admission)
 
         # Update with actual response
-        client.chat_update(
-            channel=channel,
-            ts=thinking_msg["ts"],
-            text=response_text
-        )
+        updater.finish(response_text)
+        remember_turn(channel, thread_ts, user_question, response_text)
+        key = response_cache_key(user_question, kb, channel) if not history else None
+        if key is not None:
+            response_cache.put(key, response_text, kb_hash=kb.hash)
+        metrics.ANSWER_LATENCY.labels(source=source, outcome="answered").observe(time.monotonic() - received_at)
+        if updater.first_update_at is not None:
+            print(f"⏱️  First text after {updater.first_update_at - started:.2f}s, "
+                  f"{updater.updates_sent} update(s) ({source})")
+        return response_text
     except Exception as e:
         # Handle errors gracefully
-        error_message = f"❌ Sorry, I encountered an error: `{str(e)[:500]}`\n\n"
-        error_message += "This is usually temporary. Please try again in a moment, or reach out to #bor-write-eng if the issue persists."
-
+        metrics.record_error("answer", e)
+        metrics.ANSWER_LATENCY.labels(source=source, outcome="error").observe(time.monotonic() - received_at)
         try:
             client.chat_update(
                 channel=channel,
                 ts=thinking_msg["ts"],
-                text=error_message
+                text=format_error_message(e)
             )
         except Exception as update_error:
+            metrics.record_error("slack_update", update_error)
             print(f"Error updating error message: {update_error}")
 
-        print(f"Error handling mention: {e}")
+        print(f"Error handling {source}: {e}")
 
-# Handle direct messages
-@slack_app.event("message")
-def handle_message(event, say, client):
-    # Ignore bot's own messages
-    if event.get("bot_id"):
+def dispatch_question(client, event, thread_ts=None, source="message"):
+    """Queue a question for the worker pool, or tell the user we're busy"""
+    received_at = time.monotonic()
+    client = outbound_client(client)
+    channel = event["channel"]
+    if reply_from_cache(client, channel, event["text"], thread_ts=thread_ts, source=source):
+        metrics.ANSWER_LATENCY.labels(source=source, outcome="cached").observe(time.monotonic() - received_at)
         return
 
-    user_question = event["text"]
-    channel = event["channel"]
+    if drainer.draining:
+        # Shutting down: this pod may be gone before an answer is ready
+        try:
+            client.chat_postMessage(channel=channel, thread_ts=thread_ts, text=RESTART_MESSAGE)
+        except Exception as e:
+            metrics.record_error("slack_post", e)
+            print(f"Error posting restart message ({source}): {e}")
+        return
 
+    user = event.get("user")
+    history = conversation_history(channel, thread_ts)
+    admission = admit_question(user, channel, event["text"], history)
+    if not admission.allowed:
+        metrics.ANSWER_LATENCY.labels(source=source, outcome="throttled").observe(time.monotonic() - received_at)
+        try:
+            client.chat_postMessage(channel=channel, thread_ts=thread_ts, text=throttled_message(admission))
+        except Exception as e:
+            metrics.record_error("slack_post", e)
+            print(f"Error posting throttled message ({source}): {e}")
+        return
+
+    reply = drainer.track(client, channel, thread_ts, source)
+
+    def answer():
+        try:
+            response_text = answer_question(client, channel, event["text"], thread_ts=thread_ts, source=source,
+                                            received_at=received_at, reply=reply, admission=admission)
+        finally:
+            drainer.done(reply)
+        settle_question(admission, event["text"], response_text, history)
+
+    accepted = dispatcher.submit(
+        answer,
+        user=user,
+        channel=channel,
+        weight=quotas.weight(channel),
+        cost=admission.tokens
+    )
+    if accepted:
+        return
+    drainer.done(reply)
+    if QUOTAS_ENABLED:
+        # Never ran: give its token charge back
+        quotas.settle(admission, 0)
+
+    metrics.SHED.inc()
+    print(f"⚠️  Queue full, shedding {source} from {event.get('user')} in {channel}")
     try:
-        # Send immediate acknowledgment
-        thinking_msg = client.chat_postMessage(
-            channel=channel,
-            text=":hourglass_flowing_sand: Thinking..."
-        )
+        client.chat_postMessage(channel=channel, thread_ts=thread_ts, text=BUSY_MESSAGE)
     except Exception as e:
-        print(f"Error posting thinking message (DM): {e}")
-        # Can't post to channel, silently fail
+        metrics.record_error("slack_post", e)
+        print(f"Error posting busy message ({source}): {e}")
+
+# Handle mentions
+def handle_mention(event, say, client, body=None):
+    if not claim_event(body, "mention"):
         return
+    if cassette is not None:
+        cassette.add_event(event)
+    # Follow-ups inside a thread carry the root's thread_ts; answer there
+    dispatch_question(client, event, thread_ts=event.get("thread_ts") or event["ts"], source="mention")
 
-    try:
-        # Call LiteLLM
-        response = llm_client.chat.completions.create(
-            model=MODEL_NAME,
-            max_tokens=2000,
-            messages=[
-                {"role": "system", "content": KNOWLEDGE_BASE},
-                {"role": "user", "content": user_question}
-            ]
-        )
+# Handle direct messages
+# Message subtypes that are still a person asking something. Edits
+# (message_changed, including the bot's own streamed ones), deletions and
+# joins carry no top-level text and aren't questions.
+USER_MESSAGE_SUBTYPES = (None, "file_share", "thread_broadcast")
+
+def is_user_message(event):
+    """True for a message event a person typed, False for bots' messages and edits"""
+    return (not event.get("bot_id") and event.get("subtype") in USER_MESSAGE_SUBTYPES
+            and "text" in event)
+
+def handle_message(event, say, client, body=None):
+    if not is_user_message(event):
+        return
+    if not claim_event(body, "DM"):
+        return
+    if cassette is not None:
+        cassette.add_event(event)
 
-        # Get response content and truncate if too long
-        response_text = response.choices[0].message.content
+    dispatch_question(client, event, thread_ts=event.get("thread_ts"), source="DM")
 
-        # Slack limit is 40,000 chars, but be conservative
-        # With max_tokens=2000, response should be ~8000 chars max
-        # Use 10,000 to be extra safe
-        MAX_MESSAGE_LENGTH = 10000
-        if len(response_text) > MAX_MESSAGE_LENGTH:
-            response_text = response_text[:MAX_MESSAGE_LENGTH] + "\n\n...\n\n_(Response truncated due to length. Please ask a more specific question.)_"
+def create_slack_app():
+    """Bolt app with the event handlers registered (no signing secret needed for Socket Mode)"""
+    # App checks the bot token with auth.test as it's built
+    slack_app = App(client=WebClient(token=os.environ["SLACK_BOT_TOKEN"], base_url=SLACK_API_URL))
+    slack_app.event("app_mention")(handle_mention)
+    slack_app.event("message")(handle_message)
+    return slack_app
 
-        # Update with actual response
-        client.chat_update(
-            channel=channel,
-            ts=thinking_msg["ts"],
-            text=response_text
+slack_app = Lazy(create_slack_app, "slack_app", startup)
+
+def create_async_app():
+    """Build the asyncio Slack app with handlers backed by a pooled AsyncOpenAI client"""
+    from slack_bolt.async_app import AsyncApp
+    from slack_sdk.web.async_client import AsyncWebClient
+    from ledger_bot.async_runtime import AsyncAnswerer, create_async_llm_client
+
+    async_app = AsyncApp(client=AsyncWebClient(token=os.environ["SLACK_BOT_TOKEN"], base_url=SLACK_API_URL))
+    answerer = AsyncAnswerer(
+        create_async_llm_client(
+            os.environ["LITELLM_DEVELOPER_KEY"],
+            LITELLM_BASE_URL,
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS
+        ),
+        MODEL_NAME,
+        build_messages,
+        truncate_response,
+        format_error_message,
+        max_tokens=MAX_TOKENS,
+        stream=STREAM_RESPONSES,
+        update_interval=STREAM_UPDATE_INTERVAL,
+        min_chars=STREAM_MIN_CHARS,
+        max_length=MAX_MESSAGE_LENGTH,
+        max_concurrency=ASYNC_MAX_CONCURRENCY,
+        max_pending=ASYNC_MAX_PENDING,
+        thinking_message=THINKING_MESSAGE,
+        busy_message=BUSY_MESSAGE,
+        cache=response_cache,
+        cache_key=response_cache_key,
+        knowledge=lambda: knowledge,
+        coalesce_key=coalesce_key,
+        coalesce_wait=SINGLEFLIGHT_WAIT_SECONDS,
+        history=conversation_history,
+        remember=remember_turn,
+        route=route_question if ROUTING_ENABLED else None,
+        resilience=llm_caller,
+        slack_scheduler=slack_scheduler if SLACK_OUTBOUND_ENABLED else None,
+        admit=admit_question,
+        settle=settle_question,
+        throttled_message=throttled_message,
+        drainer=drainer,
+        restart_message=RESTART_MESSAGE
+    )
+
+    @async_app.event("app_mention")
+    async def handle_mention_async(event, client, body):
+        if not claim_event(body, "mention"):
+            return
+        await answerer.answer(client, event["channel"], event["text"],
+                              thread_ts=event.get("thread_ts") or event["ts"], source="mention",
+                              user=event.get("user"))
+
+    @async_app.event("message")
+    async def handle_message_async(event, client, body):
+        if not is_user_message(event):
+            return
+        if not claim_event(body, "DM"):
+            return
+        await answerer.answer(client, event["channel"], event["text"],
+                              thread_ts=event.get("thread_ts"), source="DM", user=event.get("user"))
+
+    return async_app
+
+async def run_async():
+    """Run Socket Mode on asyncio"""
+    from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+
+    with startup.phase("async_app"):
+        async_app = create_async_app()
+    handler = AsyncSocketModeHandler(async_app, os.environ["SLACK_APP_TOKEN"])
+    socket_health.attach_async(handler.client)
+    with startup.phase("socket_mode"):
+        await handler.connect_async()
+        connected = await asyncio.get_running_loop().run_in_executor(
+            None, socket_health.wait_connected, SOCKET_CONNECT_TIMEOUT
         )
+    if not connected:
+        print(f"⚠️  No Socket Mode hello after {SOCKET_CONNECT_TIMEOUT:g}s; not ready until one arrives")
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    startup.ready()
+    print("⚡️ Ledger Bot is running in Socket Mode (asyncio)!")
+    await stop.wait()
+
+    drainer.begin()
+    update_health_status()
+    try:
+        await handler.close_async()
     except Exception as e:
-        # Handle errors gracefully
-        error_message = f"❌ Sorry, I encountered an error: `{str(e)[:500]}`\n\n"
-        error_message += "This is usually temporary. Please try again in a moment, or reach out to #bor-write-eng if the issue persists."
+        print(f"Error closing Socket Mode connection: {e}")
+    if not await loop.run_in_executor(None, drainer.wait_idle):
+        # Notices bypass the outbound queue; stop it so a queued edit can't overwrite one
+        slack_scheduler.stop()
+        await drainer.abandon_async(RESTART_MESSAGE)
+    print("👋 Drained, exiting")
 
-        try:
-            client.chat_update(
-                channel=channel,
-                ts=thinking_msg["ts"],
-                text=error_message
-            )
-        except Exception as update_error:
-            print(f"Error updating error message: {update_error}")
+def drain(handler):
+    """
+    Shut down without losing questions: close the Socket Mode connection so
+    new events go to the other pod, let queued and in-flight answers finish
+    until DRAIN_TIMEOUT, then post RESTART_MESSAGE for the rest.
+    """
+    drainer.begin()
+    update_health_status()
+    try:
+        handler.close()
+    except Exception as e:
+        print(f"Error closing Socket Mode connection: {e}")
+    if is_built(dispatcher):
+        dispatcher.shutdown(wait=False)
+    if not drainer.wait_idle():
+        if is_built(dispatcher):
+            # Queued questions are covered by the notice; don't start them now
+            dispatcher.cancel_pending()
+        # Notices bypass the outbound queue; stop it so a queued edit can't overwrite one
+        slack_scheduler.stop()
+        drainer.abandon(RESTART_MESSAGE)
+    slack_scheduler.stop()
+    print("👋 Drained, exiting")
 
-        print(f"Error handling message: {e}")
+def check_environment():
+    """Fail fast, before any network calls, if a required variable is missing"""
+    missing = [name for name in REQUIRED_ENV if not os.environ.get(name)]
+    if missing:
+        raise SystemExit(f"❌ Missing required environment variables: {', '.join(missing)}")
+
+def start():
+    """
+    Startup pipeline: check config, start the knowledge watcher and health
+    server, build the Slack app (token check), LLM client and worker pool,
+    then connect Socket Mode and report ready. Blocks until SIGTERM/SIGINT,
+    then drains (see drain) and returns.
+    """
+    with startup.phase("config"):
+        check_environment()
+
+    # Watch knowledge_base.txt for changes
+    knowledge_reloader.start()
+    archived = sum(1 for section in knowledge.sections if section.tier == "archive")
+    print(f"📚 Knowledge base {knowledge.hash}: {len(knowledge.sections)} sections ({archived} archived), "
+          f"~{knowledge.prompt_tokens} tokens sent, "
+          f"{'compiled artifact' if knowledge.compiled else 'compiled at startup'}")
 
-if __name__ == "__main__":
     # Start health check server in background thread
-    health_thread = threading.Thread(target=run_health_server, daemon=True)
-    health_thread.start()
+    with startup.phase("health_server"):
+        health_thread = threading.Thread(target=run_health_server, daemon=True)
+        health_thread.start()
     print(f"🏥 Health check server running on port {os.environ.get('HEALTH_PORT', '8080')}")
 
     # Note: Skip startup LLM test - will verify on first real request
     # This allows bot to start even if model name needs adjustment
     print(f"📋 Using model: {MODEL_NAME}")
+    if ROUTING_ENABLED:
+        print(f"🧭 Routing between tiers: {', '.join(f'{t.name}={t.model}' for t in router.tiers.values())}")
     print("⏭️  Skipping startup LLM test - will verify on first message")
 
-    # Print environment variables for debugging
-    print(f"SLACK_APP_TOKEN: {os.environ.get('SLACK_APP_TOKEN', 'NOT SET')}")
-    print(f"SLACK_BOT_TOKEN: {os.environ.get('SLACK_BOT_TOKEN', 'NOT SET')}")
-    print(f"LITELLM_DEVELOPER_KEY: {os.environ.get('LITELLM_DEVELOPER_KEY', 'NOT SET')}")
+    if BOT_RUNTIME == "async":
+        asyncio.run(run_async())
+        return
 
-    # Start Socket Mode
-    handler = SocketModeHandler(slack_app, os.environ["SLACK_APP_TOKEN"])
-    health_status["slack_connected"] = True
-    health_status["ready"] = True
+    resolve(slack_app)
+    resolve(llm_client)
+    resolve(dispatcher)
+    handler = SocketModeHandler(resolve(slack_app), os.environ["SLACK_APP_TOKEN"])
+    socket_health.attach(handler.client)
+    with startup.phase("socket_mode"):
+        handler.connect()
+        connected = socket_health.wait_connected(SOCKET_CONNECT_TIMEOUT)
+    if not connected:
+        print(f"⚠️  No Socket Mode hello after {SOCKET_CONNECT_TIMEOUT:g}s; not ready until one arrives")
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: stop.set())
+    startup.ready()
     print("⚡️ Ledger Bot is running in Socket Mode!")
-    handler.start()
+    stop.wait()
+    drain(handler)
+
+if __name__ == "__main__":
+    start()
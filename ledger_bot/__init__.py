@@ -0,0 +1 @@
+"""Ledger Bot internals shared by the Slack entry point"""
@@ -0,0 +1,139 @@
+"""SQLite-backed answer store so cached answers survive pod restarts"""
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    key TEXT PRIMARY KEY,
+    answer TEXT NOT NULL,
+    kb_hash TEXT,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used);
+"""
+
+
+class SQLiteAnswerStore:
+    """
+    Single-file answer store on a mounted volume.
+
+    Uses WAL journaling so writes are appends to the log rather than page
+    rewrites. Once the stored answers exceed `max_bytes`, `compact` drops
+    expired entries and then the least recently used ones down to
+    `compact_ratio` of the limit, releases the freed pages and checkpoints
+    the WAL. Times are wall clock so TTLs carry across restarts.
+    """
+
+    def __init__(self, path, max_bytes=20 * 1024 * 1024, ttl=7 * 24 * 3600.0,
+                 compact_every=100, compact_ratio=0.8, clock=time.time):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.compact_every = compact_every
+        self.compact_ratio = compact_ratio
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._writes_since_compact = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # Must be set before the first table is created to take effect
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def get(self, key):
+        """Stored answer for key, or None if missing or expired"""
+        now = self.clock()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer, expires_at FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            answer, expires_at = row
+            if now >= expires_at:
+                self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, key))
+            return answer
+
+    def put(self, key, answer, kb_hash=None, ttl=None):
+        """Store an answer, compacting every `compact_every` writes"""
+        now = self.clock()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers "
+                "(key, answer, kb_hash, created_at, expires_at, last_used, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, answer, kb_hash, now, expires_at, now, len(answer.encode("utf-8")))
+            )
+            self._writes_since_compact += 1
+            due = self._writes_since_compact >= self.compact_every
+        if due:
+            self.compact()
+
+    def invalidate_kb(self, current_kb_hash):
+        """Delete answers produced against any other knowledge base version"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM answers WHERE kb_hash IS NOT ?", (current_kb_hash,)
+            )
+            return cursor.rowcount
+
+    def size_bytes(self):
+        """Total size of stored answers"""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM answers").fetchone()[0]
+
+    def compact(self):
+        """Drop expired and least recently used answers until under the size limit"""
+        with self._lock:
+            self._writes_since_compact = 0
+            removed = self._conn.execute(
+                "DELETE FROM answers WHERE expires_at <= ?", (self.clock(),)
+            ).rowcount
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM answers").fetchone()[0]
+            if total > self.max_bytes:
+                target = int(self.max_bytes * self.compact_ratio)
+                excess = total - target
+                freed = 0
+                doomed = []
+                for key, size in self._conn.execute(
+                    "SELECT key, size FROM answers ORDER BY last_used ASC"
+                ):
+                    if freed >= excess:
+                        break
+                    doomed.append((key,))
+                    freed += size
+                self._conn.executemany("DELETE FROM answers WHERE key = ?", doomed)
+                removed += len(doomed)
+            if removed:
+                # Return freed pages to the filesystem and truncate the WAL
+                self._conn.execute("PRAGMA incremental_vacuum")
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            return removed
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+    def stats(self):
+        """Entry count and size for health/metrics endpoints"""
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM answers"
+            ).fetchone()
+        return {"entries": count, "bytes": total, "max_bytes": self.max_bytes}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
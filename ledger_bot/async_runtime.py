@@ -0,0 +1,362 @@
+"""Asyncio runtime: answers questions on one event loop instead of a thread per request"""
+import asyncio
+import time
+
+from ledger_bot import metrics
+from ledger_bot.resilience import AsyncPeekedStream, ResilientLLM, close_stream
+from ledger_bot.routing import Route, Tier
+from ledger_bot.slack_outbound import AsyncScheduledSlackClient, ScheduledSlackClient
+from ledger_bot.streaming import ThrottledMessageUpdater
+
+
+def create_async_llm_client(api_key, base_url, max_connections=200, max_keepalive_connections=50,
+                            keepalive_expiry=30.0, timeout=120.0):
+    """
+    AsyncOpenAI client with a shared keep-alive connection pool to LiteLLM.
+
+    All in-flight questions share one pool, so concurrent calls reuse warm
+    TLS connections to the gateway instead of opening one per request.
+    """
+    import httpx
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        ),
+        timeout=httpx.Timeout(timeout, connect=10.0)
+    )
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        default_headers={"X-LiteLLM-Dev-Key": api_key},
+        http_client=http_client,
+        # AsyncAnswerer.resilience retries; SDK retries would multiply attempts
+        max_retries=0
+    )
+
+
+class AsyncThrottledMessageUpdater(ThrottledMessageUpdater):
+    """ThrottledMessageUpdater for Bolt's AsyncWebClient"""
+
+    async def append(self, delta):
+        if not delta:
+            return
+        self.text += delta
+        if self._should_push():
+            await self._push(self._partial_text())
+
+    async def finish(self, final_text):
+        self.text = final_text
+        await self.client.chat_update(channel=self.channel, ts=self.ts, text=final_text)
+        self._mark_pushed()
+
+    async def _push(self, text):
+        try:
+            if isinstance(self.client, ScheduledSlackClient):
+                if not self._submit(text):
+                    self._mark_pushed(sent=False)
+                    return
+            else:
+                await self.client.chat_update(channel=self.channel, ts=self.ts, text=text)
+        except Exception as e:
+            # A failed intermediate edit shouldn't abort the answer
+            self._push_failed(e)
+            return
+        self._mark_pushed()
+
+
+class AsyncAnswerer:
+    """
+    Async counterpart of app.answer_question.
+
+    Concurrency is bounded by a semaphore rather than a thread pool; once
+    `max_pending` questions are waiting or running, new ones get the busy
+    message instead of queueing without bound. Quotas are checked and
+    settled as in the threaded runtime, but the semaphore is first come,
+    first served: there is no weighted fair queuing between channels.
+    """
+
+    def __init__(self, llm_client, model, build_messages, truncate, format_error,
+                 max_tokens=2000, stream=True, update_interval=1.5, min_chars=150,
+                 max_length=None, max_concurrency=200, max_pending=500,
+                 thinking_message=":hourglass_flowing_sand: Thinking...",
+                 busy_message="I'm busy right now. Please retry in a minute.",
+                 cache=None, cache_key=None, knowledge=None, coalesce_key=None,
+                 coalesce_wait=60.0, history=None, remember=None, route=None, resilience=None,
+                 slack_scheduler=None, admit=None, settle=None, throttled_message=None,
+                 drainer=None, restart_message=None):
+        self.llm_client = llm_client
+        self.model = model
+        self.build_messages = build_messages
+        self.truncate = truncate
+        self.format_error = format_error
+        self.max_tokens = max_tokens
+        self.stream = stream
+        self.update_interval = update_interval
+        self.min_chars = min_chars
+        self.max_length = max_length
+        self.max_pending = max_pending
+        self.thinking_message = thinking_message
+        self.busy_message = busy_message
+        self.cache = cache
+        self.cache_key = cache_key
+        # knowledge() -> the current KnowledgeBase; read once per question and
+        # passed to cache_key, coalesce_key and build_messages as `kb`, so a
+        # reload mid-answer can't mix versions
+        self.knowledge = knowledge
+        self.coalesce_key = coalesce_key
+        self.coalesce_wait = coalesce_wait
+        # Conversation memory: history(channel, thread_ts) -> earlier turns,
+        # remember(channel, thread_ts, question, answer) records a new one
+        self.history = history
+        self.remember = remember
+        # Model routing: route(question, channel) -> Route; None always uses `model`
+        self.route = route
+        self.default_route = Route(Tier("default", model, max_tokens), "default")
+        # Timeouts, retries, hedging and circuit breaking; shared with the sync path in app.py
+        self.resilience = resilience or ResilientLLM(max_attempts=1)
+        # Rate-limited outbound queue for chat_postMessage/chat_update
+        self.slack_scheduler = slack_scheduler
+        # Fair-share quotas: admit(user, channel, question, history) -> Admission,
+        # settle(admission, question, answer, history) once answered, and
+        # throttled_message(admission) -> reply for a refused question
+        self.admit = admit
+        self.settle = settle
+        self.throttled_message = throttled_message
+        # Graceful drain: questions are tracked until answered; while draining
+        # new ones get restart_message instead
+        self.drainer = drainer
+        self.restart_message = restart_message
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._inflight = {}
+        self.pending = 0
+        self.saved_calls = 0
+
+    async def answer(self, client, channel, user_question, thread_ts=None, source="message", user=None):
+        """Answer a question, shedding load once too many are in flight"""
+        received_at = time.monotonic()
+        client = metrics.AsyncTimedSlackClient(client)
+        if self.slack_scheduler is not None:
+            client = AsyncScheduledSlackClient(client, self.slack_scheduler)
+        kb = self.knowledge() if self.knowledge else None
+        history = self.history(channel, thread_ts) if self.history else []
+        # Follow-ups depend on their thread, so they bypass the cache
+        key = self.cache_key(user_question, kb=kb, channel=channel) if self.cache is not None and not history else None
+        cached = self.cache.get(key) if key is not None else None
+        if key is not None:
+            metrics.CACHE_LOOKUPS.labels(result="hit" if cached is not None else "miss").inc()
+        if cached is not None:
+            try:
+                await client.chat_postMessage(channel=channel, thread_ts=thread_ts, text=cached)
+                self._remember(channel, thread_ts, user_question, cached)
+                metrics.ANSWER_LATENCY.labels(source=source, outcome="cached").observe(time.monotonic() - received_at)
+                print(f"💾 Answered {source} from cache")
+                return
+            except Exception as e:
+                metrics.record_error("slack_post", e)
+                print(f"Error posting cached answer ({source}): {e}")
+
+        if self.pending >= self.max_pending:
+            metrics.SHED.inc()
+            print(f"⚠️  Too many questions in flight, shedding {source} in {channel}")
+            try:
+                await client.chat_postMessage(channel=channel, thread_ts=thread_ts, text=self.busy_message)
+            except Exception as e:
+                metrics.record_error("slack_post", e)
+                print(f"Error posting busy message ({source}): {e}")
+            return
+
+        if self.drainer is not None and self.drainer.draining:
+            try:
+                await client.chat_postMessage(channel=channel, thread_ts=thread_ts, text=self.restart_message)
+            except Exception as e:
+                metrics.record_error("slack_post", e)
+                print(f"Error posting restart message ({source}): {e}")
+            return
+
+        admission = self.admit(user, channel, user_question, history) if self.admit else None
+        if admission is not None and not admission.allowed:
+            metrics.ANSWER_LATENCY.labels(source=source, outcome="throttled").observe(time.monotonic() - received_at)
+            try:
+                await client.chat_postMessage(channel=channel, thread_ts=thread_ts,
+                                              text=self.throttled_message(admission))
+            except Exception as e:
+                metrics.record_error("slack_post", e)
+                print(f"Error posting throttled message ({source}): {e}")
+            return
+
+        reply = self.drainer.track(client, channel, thread_ts, source) if self.drainer is not None else None
+        self.pending += 1
+        try:
+            async with self._semaphore:
+                response_text = await self._answer(client, channel, user_question, thread_ts, source, key,
+                                                   received_at, history, reply, kb, admission)
+        finally:
+            self.pending -= 1
+            if reply is not None:
+                self.drainer.done(reply)
+        if admission is not None and self.settle:
+            self.settle(admission, user_question, response_text, history)
+
+    def _remember(self, channel, thread_ts, user_question, response_text):
+        if self.remember:
+            self.remember(channel, thread_ts, user_question, response_text)
+
+    async def _answer(self, client, channel, user_question, thread_ts, source, cache_key=None,
+                      received_at=None, history=None, reply=None, kb=None, admission=None):
+        started = time.monotonic()
+        received_at = received_at or started
+        try:
+            thinking_msg = await client.chat_postMessage(
+                channel=channel,
+                thread_ts=thread_ts,
+                text=self.thinking_message
+            )
+        except Exception as e:
+            metrics.record_error("slack_post", e)
+            print(f"Error posting thinking message ({source}): {e}")
+            return
+        if reply is not None:
+            reply.ts = thinking_msg["ts"]
+
+        updater = AsyncThrottledMessageUpdater(
+            client,
+            channel,
+            thinking_msg["ts"],
+            min_interval=self.update_interval,
+            min_chars=self.min_chars,
+            max_length=self.max_length
+        )
+
+        try:
+            response_text = await self._coalesced_answer(user_question, updater, source, history, channel, kb,
+                                                         admission)
+            await updater.finish(response_text)
+            self._remember(channel, thread_ts, user_question, response_text)
+            if cache_key is not None:
+                self.cache.put(cache_key, response_text, kb_hash=kb.hash if kb is not None else None)
+            metrics.ANSWER_LATENCY.labels(source=source, outcome="answered").observe(time.monotonic() - received_at)
+            if updater.first_update_at is not None:
+                print(f"⏱️  First text after {updater.first_update_at - started:.2f}s, "
+                      f"{updater.updates_sent} update(s) ({source})")
+            return response_text
+        except Exception as e:
+            metrics.record_error("answer", e)
+            metrics.ANSWER_LATENCY.labels(source=source, outcome="error").observe(time.monotonic() - received_at)
+            try:
+                await client.chat_update(
+                    channel=channel,
+                    ts=thinking_msg["ts"],
+                    text=self.format_error(e)
+                )
+            except Exception as update_error:
+                metrics.record_error("slack_update", update_error)
+                print(f"Error updating error message: {update_error}")
+
+            print(f"Error handling {source}: {e}")
+
+    async def _generate(self, user_question, updater, history=None, channel=None, kb=None):
+        route = self.route(user_question, channel) if self.route else self.default_route
+        if self.route:
+            metrics.record_route(route)
+            print(f"🧭 Routed to {route.describe()}")
+        if history:
+            messages = self.build_messages(user_question, kb=kb, history=history)
+        else:
+            messages = self.build_messages(user_question, kb=kb)
+        if self.stream:
+            response_text = await self._stream_completion(messages, updater, route.tier)
+        else:
+            response_text = await self._complete(messages, route.tier)
+        return self.truncate(response_text)
+
+    async def _coalesced_answer(self, user_question, updater, source, history=None, channel=None, kb=None,
+                                admission=None):
+        """Await an identical in-flight question's answer, or generate one; a shared one marks `admission`"""
+        if history:
+            return await self._generate(user_question, updater, history, channel, kb)
+        key = self.coalesce_key(user_question, kb=kb, channel=channel) if self.coalesce_key else None
+        if key is None:
+            return await self._generate(user_question, updater, channel=channel, kb=kb)
+
+        leader = self._inflight.get(key)
+        if leader is not None:
+            try:
+                # shield: a follower giving up must not cancel the leader's call
+                response_text = await asyncio.wait_for(asyncio.shield(leader), self.coalesce_wait)
+                self.saved_calls += 1
+                if admission is not None:
+                    admission.shared = True
+                metrics.COALESCED.inc()
+                print(f"🔗 Coalesced {source} onto an in-flight answer")
+                return response_text
+            except Exception:
+                return await self._generate(user_question, updater, channel=channel, kb=kb)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            response_text = await self._generate(user_question, updater, channel=channel, kb=kb)
+            future.set_result(response_text)
+            return response_text
+        except BaseException as e:
+            future.set_exception(e if isinstance(e, Exception) else RuntimeError("cancelled"))
+            # Followers handle the failure; don't warn about an unread exception
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _complete(self, messages, tier):
+        started = time.perf_counter()
+
+        async def attempt(model, timeout):
+            return await self.llm_client.chat.completions.create(
+                model=model,
+                max_tokens=tier.max_tokens,
+                messages=messages,
+                timeout=timeout
+            )
+
+        response, model = await self.resilience.acall(attempt, tier.model)
+        metrics.LLM_LATENCY.labels(model=model, mode="blocking", tier=tier.name).observe(time.perf_counter() - started)
+        metrics.record_usage(model, getattr(response, "usage", None))
+        return response.choices[0].message.content
+
+    async def _stream_completion(self, messages, updater, tier):
+        started = time.perf_counter()
+
+        async def attempt(model, timeout):
+            return await AsyncPeekedStream.open(await self.llm_client.chat.completions.create(
+                model=model,
+                max_tokens=tier.max_tokens,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+                timeout=timeout
+            ))
+
+        stream, model = await self.resilience.acall(attempt, tier.model, discard=close_stream)
+        parts = []
+        usage = None
+        first_token = None
+        async for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                parts.append(delta)
+                await updater.append(delta)
+        metrics.LLM_LATENCY.labels(model=model, mode="stream", tier=tier.name).observe(time.perf_counter() - started)
+        metrics.record_usage(model, usage)
+        if first_token is not None:
+            metrics.record_first_token(model, first_token, usage)
+        return "".join(parts)
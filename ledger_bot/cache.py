@@ -0,0 +1,137 @@
+"""In-memory answer cache keyed on the normalized question"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+MENTION_RE = re.compile(r"<@[A-Z0-9]+(?:\|[^>]*)?>")
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(text):
+    """Strip bot mentions, fold case and whitespace, drop trailing punctuation"""
+    text = MENTION_RE.sub(" ", text or "")
+    text = WHITESPACE_RE.sub(" ", text).strip().casefold()
+    return text.rstrip("?!. ")
+
+
+def cache_key(question, kb_hash, model):
+    """Cache key for a question against a knowledge base version and model"""
+    raw = "\x1f".join((normalize_question(question), kb_hash, model))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU of answers with a per-entry TTL.
+
+    Entries remember the knowledge base hash they were answered against;
+    `invalidate_kb` drops everything from older versions when the KB changes.
+
+    An optional `store` (e.g. SQLiteAnswerStore) acts as a second tier:
+    writes go to both, and memory misses are read through from the store.
+    """
+
+    def __init__(self, max_entries=256, ttl=3600.0, clock=time.monotonic, store=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.store_hits = 0
+
+    def get(self, key):
+        """Cached answer for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, _ = entry
+                if self.clock() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+
+        value = self._get_from_store(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.store_hits += 1
+        # Promote into memory; the store already enforces its own TTL
+        self._put_memory(key, value, None, self.ttl)
+        return value
+
+    def _get_from_store(self, key):
+        if self.store is None:
+            return None
+        try:
+            return self.store.get(key)
+        except Exception as e:
+            print(f"Error reading answer store: {e}")
+            return None
+
+    def put(self, key, value, kb_hash=None, ttl=None):
+        """Store an answer, evicting the least recently used entries if full"""
+        self._put_memory(key, value, kb_hash, self.ttl if ttl is None else ttl)
+        if self.store is not None:
+            try:
+                self.store.put(key, value, kb_hash=kb_hash)
+            except Exception as e:
+                print(f"Error writing answer store: {e}")
+
+    def _put_memory(self, key, value, kb_hash, ttl):
+        if self.max_entries <= 0:
+            return
+        expires_at = self.clock() + ttl
+        with self._lock:
+            self._entries[key] = (value, expires_at, kb_hash)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_kb(self, current_kb_hash):
+        """Drop entries answered against any other knowledge base version"""
+        with self._lock:
+            stale = [k for k, (_, _, h) in self._entries.items() if h != current_kb_hash]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        if self.store is not None:
+            self.invalidations += self.store.invalidate_kb(current_kb_hash)
+        return len(stale)
+
+    def clear(self):
+        """Empty the in-memory tier"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Hit/miss counters for health/metrics endpoints"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "store_hits": self.store_hits,
+                "store": self.store.stats() if self.store is not None else None,
+            }
@@ -0,0 +1,395 @@
+"""Record LLM calls, Slack API timings and Slack events to a cassette, and replay them"""
+import hashlib
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from ledger_bot.resilience import RETRYABLE_ERRORS
+
+CASSETTE_VERSION = 1
+
+# Event fields worth keeping; the rest of Slack's payload is noise for replay
+EVENT_FIELDS = ("type", "subtype", "channel", "channel_type", "user", "bot_id", "text", "ts", "thread_ts")
+
+
+def request_key(model, messages):
+    """Stable hash of a chat request's model and messages"""
+    payload = json.dumps({"model": model, "messages": messages}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def last_question(messages):
+    """Text of the last user message"""
+    for message in reversed(messages or []):
+        if message.get("role") != "user":
+            continue
+        content = message.get("content")
+        if isinstance(content, list):
+            return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        return content or ""
+    return ""
+
+
+def usage_dict(usage):
+    if usage is None:
+        return None
+    if hasattr(usage, "model_dump"):
+        return usage.model_dump(exclude_none=True)
+    return dict(usage)
+
+
+class Cassette:
+    """
+    A JSON-lines recording. The first line is a header; every other line is
+    an entry with a `kind` ("llm", "slack" or "event") and `at`, seconds
+    since recording started.
+
+    A recording cassette appends and flushes each entry as it happens, so a
+    crashed or killed bot still leaves a usable file.
+    """
+
+    def __init__(self, entries=(), path=None, clock=time.monotonic):
+        self.entries = list(entries)
+        self.path = path
+        self.clock = clock
+        self.started = clock()
+        self._file = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def record(cls, path, clock=time.monotonic):
+        """Start a new recording at path (overwriting it)"""
+        cassette = cls(path=path, clock=clock)
+        cassette._file = open(path, "w", encoding="utf-8")
+        cassette._write({"kind": "header", "version": CASSETTE_VERSION,
+                         "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds")})
+        return cassette
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        if lines and lines[0].get("kind") == "header":
+            version = lines[0].get("version")
+            if version != CASSETTE_VERSION:
+                raise ValueError(f"Unsupported cassette version {version} in {path}")
+            lines = lines[1:]
+        return cls(lines, path=path)
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+    def add(self, kind, **fields):
+        entry = {"kind": kind, "at": round(self.clock() - self.started, 3), **fields}
+        with self._lock:
+            self.entries.append(entry)
+            if self._file is not None:
+                self._write(entry)
+        return entry
+
+    def add_event(self, event):
+        """Record an incoming Slack event payload"""
+        self.add("event", event={name: event[name] for name in EVENT_FIELDS if event.get(name) is not None})
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def of_kind(self, kind):
+        with self._lock:
+            return [entry for entry in self.entries if entry["kind"] == kind]
+
+    def events(self):
+        return self.of_kind("event")
+
+    def llm_calls(self):
+        return self.of_kind("llm")
+
+    def slack_latency(self, time_scale=1.0):
+        """Recorded Slack chat.* call durations as a latency distribution (None if there are none)"""
+        durations = [entry["duration"] for entry in self.of_kind("slack") if "duration" in entry]
+        return ReplayedLatency(durations, time_scale) if durations else None
+
+
+class ReplayedLatency:
+    """Latency 'distribution' that cycles through recorded durations"""
+
+    def __init__(self, durations, time_scale=1.0):
+        self._durations = itertools.cycle(durations)
+        self.time_scale = time_scale
+        self._lock = threading.Lock()
+
+    def sample(self):
+        with self._lock:
+            return next(self._durations) * self.time_scale
+
+
+class RecordingLLMClient:
+    """
+    Wraps an OpenAI client and records every chat.completions.create call:
+    the request's hash, question and token limit, and the response with
+    timing - time to first token and the offset of every streamed chunk.
+    """
+
+    def __init__(self, client, cassette, clock=time.monotonic):
+        self._client = client
+        self.cassette = cassette
+        self.clock = clock
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def create(self, **kwargs):
+        model = kwargs.get("model")
+        messages = kwargs.get("messages") or []
+        request = {
+            "model": model,
+            "key": request_key(model, messages),
+            "question": last_question(messages),
+            "max_tokens": kwargs.get("max_tokens"),
+            "stream": bool(kwargs.get("stream")),
+        }
+        started = self.clock()
+        try:
+            response = self._client.chat.completions.create(**kwargs)
+        except Exception as e:
+            self._record_error(request, started, e)
+            raise
+        if not request["stream"]:
+            self.cassette.add("llm", **request, duration=round(self.clock() - started, 3),
+                              content=response.choices[0].message.content,
+                              usage=usage_dict(getattr(response, "usage", None)))
+            return response
+        return RecordingStream(response, self, request, started)
+
+    def _record_error(self, request, started, error, chunks=None):
+        self.cassette.add("llm", **request, duration=round(self.clock() - started, 3), chunks=chunks or [],
+                          error={"type": type(error).__name__, "message": str(error)[:500],
+                                 "retryable": isinstance(error, RETRYABLE_ERRORS)})
+
+
+class RecordingStream:
+    """Passes a streamed completion through, recording chunk timings once it ends"""
+
+    def __init__(self, stream, recorder, request, started):
+        self.stream = stream
+        self._recorder = recorder
+        self._request = request
+        self._started = started
+        self._chunks = []
+        self._usage = None
+        self._done = False
+
+    def __iter__(self):
+        clock = self._recorder.clock
+        try:
+            for chunk in self.stream:
+                if getattr(chunk, "usage", None):
+                    self._usage = usage_dict(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    self._chunks.append([round(clock() - self._started, 3), chunk.choices[0].delta.content])
+                yield chunk
+        except Exception as e:
+            self._done = True
+            self._recorder._record_error(self._request, self._started, e, self._chunks)
+            raise
+        self._finish()
+
+    def _finish(self):
+        if self._done:
+            return
+        self._done = True
+        first_token = self._chunks[0][0] if self._chunks else None
+        self._recorder.cassette.add("llm", **self._request,
+                                    duration=round(self._recorder.clock() - self._started, 3),
+                                    first_token=first_token, chunks=self._chunks, usage=self._usage)
+
+    def close(self):
+        # A hedge loser closed before it finished isn't an answer; don't record it
+        self._done = True
+        close = getattr(self.stream, "close", None)
+        if close:
+            close()
+
+
+class RecordingSlackClient:
+    """Wraps a Slack WebClient and records how long each chat.* call took"""
+
+    def __init__(self, client, cassette, clock=time.monotonic):
+        self._client = client
+        self.cassette = cassette
+        self.clock = clock
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not name.startswith("chat_") or not callable(attr):
+            return attr
+
+        def recorded(*args, **kwargs):
+            started = self.clock()
+            ok = False
+            try:
+                result = attr(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                self.cassette.add("slack", method=name, duration=round(self.clock() - started, 3), ok=ok)
+        return recorded
+
+
+def replayed_usage(usage):
+    """Recorded usage with the fields the OpenAI types require filled in"""
+    if not usage:
+        return None
+    usage = dict(usage)
+    usage.setdefault("prompt_tokens", 0)
+    usage.setdefault("completion_tokens", 0)
+    usage.setdefault("total_tokens", usage["prompt_tokens"] + usage["completion_tokens"])
+    return usage
+
+
+class ReplayedLLMError(Exception):
+    """A recorded LLM failure that wasn't worth retrying"""
+
+
+class ReplayLLMClient:
+    """
+    Serves chat.completions.create from a cassette instead of LiteLLM.
+
+    A request is answered by an unused recording of the same request hash,
+    else of the same question, else the next unused recording in order;
+    once all are used they are reused from the start. Recorded timing is
+    reproduced multiplied by `time_scale` (0 answers instantly), and waits
+    longer than the call's `timeout` raise TimeoutError like the real client.
+    """
+
+    def __init__(self, cassette, time_scale=1.0, sleep=time.sleep):
+        self.time_scale = time_scale
+        self.sleep = sleep
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self._recordings = cassette.llm_calls()
+        if not self._recordings:
+            raise ValueError(f"Cassette {cassette.path} has no LLM calls to replay")
+        self._by_key = {}
+        self._by_question = {}
+        for index, entry in enumerate(self._recordings):
+            self._by_key.setdefault(entry.get("key"), deque()).append(index)
+            self._by_question.setdefault(entry.get("question"), deque()).append(index)
+        self._order = deque(range(len(self._recordings)))
+        self._used = set()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.matches = {"key": 0, "question": 0, "order": 0, "reused": 0}
+
+    def _take(self, queue):
+        while queue and queue[0] in self._used:
+            queue.popleft()
+        if not queue:
+            return None
+        index = queue.popleft()
+        self._used.add(index)
+        return index
+
+    def _pick(self, model, messages):
+        with self._lock:
+            for match, queue in (("key", self._by_key.get(request_key(model, messages))),
+                                 ("question", self._by_question.get(last_question(messages))),
+                                 ("order", self._order)):
+                index = self._take(queue) if queue is not None else None
+                if index is not None:
+                    self.matches[match] += 1
+                    return self._recordings[index]
+            # Everything has been served once: start over
+            self._used.clear()
+            self._order.extend(range(len(self._recordings)))
+            self.matches["reused"] += 1
+            return self._recordings[self._take(self._order)]
+
+    def _wait(self, seconds, timeout):
+        seconds = max(seconds, 0.0) * self.time_scale
+        if timeout is not None and seconds > timeout:
+            self.sleep(timeout)
+            raise TimeoutError(f"Replayed LLM call exceeded {timeout:g}s timeout")
+        if seconds:
+            self.sleep(seconds)
+
+    def create(self, **kwargs):
+        model = kwargs.get("model")
+        recording = self._pick(model, kwargs.get("messages") or [])
+        timeout = kwargs.get("timeout")
+        if not isinstance(timeout, (int, float)):
+            timeout = None
+        if kwargs.get("stream"):
+            return self._stream(recording, model, timeout)
+        self._wait(recording.get("duration", 0.0), timeout)
+        self._raise_recorded_error(recording)
+        return self._completion(recording, model)
+
+    def _raise_recorded_error(self, recording):
+        error = recording.get("error")
+        if not error:
+            return
+        message = f"Replayed {error['type']}: {error['message']}"
+        # Transient failures come back as timeouts so they are retried like the original
+        raise TimeoutError(message) if error.get("retryable") else ReplayedLLMError(message)
+
+    def _chunks(self, recording):
+        """[(offset, text)] whether the recording was streamed or not"""
+        if "chunks" in recording:
+            return recording["chunks"]
+        content = recording.get("content") or ""
+        return [[recording.get("duration", 0.0), content]] if content else []
+
+    def _completion(self, recording, model):
+        from openai.types.chat import ChatCompletion
+
+        return ChatCompletion.model_validate({
+            "id": f"chatcmpl-replay-{next(self._ids)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant",
+                            "content": "".join(text for _, text in self._chunks(recording))},
+                "finish_reason": "stop",
+            }],
+            "usage": replayed_usage(recording.get("usage")),
+        })
+
+    def _stream(self, recording, model, timeout):
+        from openai.types.chat import ChatCompletionChunk
+
+        chunk_id = f"chatcmpl-replay-{next(self._ids)}"
+        created = int(time.time())
+
+        def chunk(choices, usage=None):
+            return ChatCompletionChunk.model_validate({
+                "id": chunk_id, "object": "chat.completion.chunk", "created": created,
+                "model": model, "choices": choices, "usage": usage,
+            })
+
+        def chunks():
+            elapsed = 0.0
+            for offset, text in self._chunks(recording):
+                self._wait(offset - elapsed, timeout)
+                elapsed = offset
+                yield chunk([{"index": 0, "delta": {"content": text}, "finish_reason": None}])
+            self._wait(recording.get("duration", elapsed) - elapsed, timeout)
+            self._raise_recorded_error(recording)
+            yield chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if recording.get("usage"):
+                yield chunk([], replayed_usage(recording["usage"]))
+        return chunks()
+
+    def stats(self):
+        with self._lock:
+            return {"recordings": len(self._recordings), "matches": dict(self.matches)}
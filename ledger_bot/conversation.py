@@ -0,0 +1,189 @@
+"""Per-thread conversation memory so follow-up questions keep their context"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from ledger_bot.cache import MENTION_RE
+from ledger_bot.knowledge import estimate_tokens
+
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+SUMMARY_LINE_CHARS = 240
+
+
+def clean_turn(text):
+    """Turn text without bot mentions or surrounding whitespace"""
+    return MENTION_RE.sub("", text or "").strip()
+
+
+def summary_line(role, text, max_chars=SUMMARY_LINE_CHARS):
+    """One summary line for a turn: the first sentence, capped at max_chars"""
+    text = " ".join(text.split())
+    first = SENTENCE_END_RE.split(text, maxsplit=1)[0]
+    if len(first) > max_chars:
+        first = first[:max_chars - 3].rstrip() + "..."
+    label = "User asked" if role == "user" else "You answered"
+    return f"- {label}: {first}"
+
+
+def summarize(summary, turns, max_tokens):
+    """
+    Fold turns into a rolling extractive summary.
+
+    Keeps the first sentence of each turn and drops the oldest lines once
+    the summary is over max_tokens. Runs locally, so compaction never costs
+    an extra LLM call on the answer path.
+    """
+    lines = summary.splitlines() if summary else []
+    lines.extend(summary_line(turn.role, turn.text) for turn in turns)
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class Turn:
+    """A single message in a thread"""
+
+    def __init__(self, role, text):
+        self.role = role
+        self.text = text
+        self.tokens = estimate_tokens(text)
+        self.size = len(text.encode("utf-8"))
+
+
+class Conversation:
+    """Recent turns of a thread plus a summary of the older ones"""
+
+    def __init__(self, now):
+        self.turns = []
+        self.summary = ""
+        self.last_used = now
+        self.compactions = 0
+
+    @property
+    def tokens(self):
+        return estimate_tokens(self.summary) + sum(t.tokens for t in self.turns)
+
+    @property
+    def size(self):
+        return len(self.summary.encode("utf-8")) + sum(t.size for t in self.turns)
+
+
+class ConversationStore:
+    """
+    In-memory conversation history keyed by (channel, thread_ts).
+
+    Turns are appended as they happen rather than re-fetched from Slack.
+    Once a thread's history is over `token_budget`, all but the newest
+    `keep_turns` turns are folded into a rolling summary of at most
+    `summary_tokens`. Threads idle for `idle_ttl` are dropped, and the least
+    recently used threads are evicted once there are more than `max_threads`
+    or their history exceeds `max_bytes`.
+    """
+
+    def __init__(self, token_budget=1500, keep_turns=4, summary_tokens=400, max_threads=1000,
+                 max_bytes=16 * 1024 * 1024, idle_ttl=24 * 3600.0, summarize=summarize,
+                 clock=time.monotonic):
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.summary_tokens = summary_tokens
+        self.max_threads = max_threads
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.summarize = summarize
+        self.clock = clock
+        self._threads = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.compactions = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def history(self, channel, thread_ts):
+        """Earlier turns of a thread as chat messages (empty for a new thread)"""
+        with self._lock:
+            conversation = self._live(channel, thread_ts)
+            if conversation is None:
+                return []
+            messages = []
+            if conversation.summary:
+                messages.append({
+                    "role": "system",
+                    "content": "Summary of earlier messages in this thread:\n" + conversation.summary
+                })
+            messages.extend({"role": t.role, "content": t.text} for t in conversation.turns)
+            return messages
+
+    def append(self, channel, thread_ts, question, answer):
+        """Record a question and its answer, compacting and evicting as needed"""
+        question, answer = clean_turn(question), answer or ""
+        if not question:
+            return
+        key = (channel, thread_ts)
+        now = self.clock()
+        with self._lock:
+            conversation = self._live(channel, thread_ts)
+            if conversation is None:
+                conversation = Conversation(now)
+                self._threads[key] = conversation
+            self._bytes -= conversation.size
+            conversation.turns.append(Turn("user", question))
+            conversation.turns.append(Turn("assistant", answer))
+            conversation.last_used = now
+            self._threads.move_to_end(key)
+            if conversation.tokens > self.token_budget:
+                self._compact(conversation)
+            self._bytes += conversation.size
+            self._evict()
+
+    def _live(self, channel, thread_ts):
+        """Conversation for a thread, dropping it if idle too long. Caller holds the lock."""
+        key = (channel, thread_ts)
+        conversation = self._threads.get(key)
+        if conversation is None:
+            return None
+        if self.clock() - conversation.last_used >= self.idle_ttl:
+            self._drop(key)
+            self.expirations += 1
+            return None
+        return conversation
+
+    def _compact(self, conversation):
+        keep = max(self.keep_turns, 0)
+        cut = len(conversation.turns) - keep
+        if cut <= 0:
+            return
+        old, conversation.turns = conversation.turns[:cut], conversation.turns[cut:]
+        conversation.summary = self.summarize(conversation.summary, old, self.summary_tokens)
+        conversation.compactions += 1
+        self.compactions += 1
+
+    def _drop(self, key):
+        conversation = self._threads.pop(key)
+        self._bytes -= conversation.size
+
+    def _evict(self):
+        while self._threads and (len(self._threads) > self.max_threads or self._bytes > self.max_bytes):
+            self._drop(next(iter(self._threads)))
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._threads.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._threads)
+
+    def stats(self):
+        """Thread counts and memory use for health/metrics endpoints"""
+        with self._lock:
+            return {
+                "threads": len(self._threads),
+                "max_threads": self.max_threads,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "compactions": self.compactions,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,122 @@
+"""Claim Slack events by event_id so a redelivered event is answered once"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    event_id TEXT PRIMARY KEY,
+    owner TEXT,
+    claimed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_claimed_at ON events (claimed_at);
+"""
+
+
+class EventDeduper:
+    """
+    Event IDs claimed in the last `ttl` seconds, in memory.
+
+    Slack redelivers an event it thinks wasn't handled (a slow ack, a
+    connection dropped mid-delivery) with the same event_id; only the first
+    claim wins. Events without an ID are always claimed.
+    """
+
+    def __init__(self, ttl=3600.0, max_entries=10000, clock=time.time):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._claimed = OrderedDict()
+        self._lock = threading.Lock()
+        self.claims = 0
+        self.duplicates = 0
+
+    def claim(self, event_id):
+        """True if this is the first time event_id is seen (within the TTL)"""
+        if not event_id:
+            return True
+        now = self.clock()
+        with self._lock:
+            while self._claimed:
+                oldest, claimed_at = next(iter(self._claimed.items()))
+                if now - claimed_at < self.ttl and len(self._claimed) < self.max_entries:
+                    break
+                del self._claimed[oldest]
+            if event_id in self._claimed:
+                self.duplicates += 1
+                return False
+            self._claimed[event_id] = now
+            self.claims += 1
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {"tracked": len(self._claimed), "claims": self.claims, "duplicates": self.duplicates}
+
+
+class SQLiteEventDeduper:
+    """
+    EventDeduper shared by every pod that mounts the same file.
+
+    During a rolling deploy the old and new pod both hold a Socket Mode
+    connection, and an event redelivered to the other one must not be
+    answered twice. INSERT OR IGNORE makes the claim atomic across
+    processes; SQLite's file locks cover the brief overlap, as for the
+    answer store. Claims older than `ttl` are purged every `purge_every`
+    claims.
+    """
+
+    def __init__(self, path, ttl=3600.0, purge_every=500, owner=None, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self.owner = owner or os.environ.get("HOSTNAME")
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._claims_since_purge = 0
+        self.claims = 0
+        self.duplicates = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def claim(self, event_id):
+        """True if no pod has claimed event_id within the TTL"""
+        if not event_id:
+            return True
+        now = self.clock()
+        with self._lock:
+            claimed = self._conn.execute(
+                "INSERT OR IGNORE INTO events (event_id, owner, claimed_at) VALUES (?, ?, ?)",
+                (event_id, self.owner, now)
+            ).rowcount == 1
+            if not claimed:
+                # An expired claim that hasn't been purged yet doesn't count
+                claimed = self._conn.execute(
+                    "UPDATE events SET owner = ?, claimed_at = ? WHERE event_id = ? AND claimed_at <= ?",
+                    (self.owner, now, event_id, now - self.ttl)
+                ).rowcount == 1
+            if not claimed:
+                self.duplicates += 1
+                return False
+            self.claims += 1
+            self._claims_since_purge += 1
+            if self._claims_since_purge >= self.purge_every:
+                self._claims_since_purge = 0
+                self._conn.execute("DELETE FROM events WHERE claimed_at <= ?", (now - self.ttl,))
+            return True
+
+    def stats(self):
+        with self._lock:
+            tracked = self._conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+        return {"tracked": tracked, "claims": self.claims, "duplicates": self.duplicates, "path": self.path}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,176 @@
+"""Bounded worker pool that runs LLM work off Bolt's listener threads"""
+import threading
+from collections import deque, defaultdict
+
+
+class Job:
+    """A unit of work tagged with the user and channel it belongs to"""
+
+    def __init__(self, fn, user=None, channel=None, weight=1.0, cost=1.0):
+        self.fn = fn
+        self.user = user
+        self.channel = channel
+        self.weight = weight
+        self.cost = cost
+        # Weighted fair queuing tags, set by the dispatcher on submit
+        self.start = 0.0
+        self.finish = 0.0
+
+
+class Dispatcher:
+    """
+    Admission queue plus a fixed pool of worker threads.
+
+    `submit` never blocks: it returns False when the queue is full so the
+    caller can shed load. Workers skip jobs whose user or channel is at its
+    concurrency cap, so one busy user or channel can't occupy the whole pool.
+
+    Among the rest, jobs are picked by weighted fair queuing over channels
+    (start-time fair queuing): each job's finish tag is its channel's
+    previous tag plus cost / weight, and the lowest tag runs first. While the
+    pool is saturated a channel gets a share of it proportional to its
+    weight however many questions it queues; idle channels don't bank
+    credit. With equal weights and costs this is round robin by channel.
+    """
+
+    def __init__(self, workers=4, queue_size=50, per_user_limit=2, per_channel_limit=4,
+                 name="ledger-bot-worker"):
+        self.queue_size = queue_size
+        self.per_user_limit = per_user_limit
+        self.per_channel_limit = per_channel_limit
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._active_by_user = defaultdict(int)
+        self._active_by_channel = defaultdict(int)
+        self._active = 0
+        self._virtual_time = 0.0
+        self._last_finish = {}
+        self._stopping = False
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, fn, user=None, channel=None, weight=1.0, cost=1.0):
+        """
+        Queue fn() for a worker. Returns False if the queue is full.
+
+        `weight` is the channel's share of the pool relative to others and
+        `cost` the job's expected size (e.g. estimated tokens).
+        """
+        with self._cond:
+            if self._stopping or len(self._queue) >= self.queue_size:
+                self.rejected += 1
+                return False
+            job = Job(fn, user, channel, weight, cost)
+            job.start = max(self._virtual_time, self._last_finish.get(channel, 0.0))
+            job.finish = job.start + cost / max(weight, 1e-9)
+            self._last_finish[channel] = job.finish
+            self._queue.append(job)
+            self.submitted += 1
+            self._cond.notify()
+        return True
+
+    def stats(self):
+        """Queue depth and counters for health/metrics endpoints"""
+        with self._cond:
+            return {
+                "queue_depth": len(self._queue),
+                "queue_size": self.queue_size,
+                "active": self._active,
+                "workers": len(self._threads),
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+    def shutdown(self, wait=True, timeout=None):
+        """Stop accepting work and let workers exit once the queue drains"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join(timeout)
+
+    def cancel_pending(self):
+        """Drop queued jobs that haven't started; returns how many"""
+        with self._cond:
+            dropped = len(self._queue)
+            self._queue.clear()
+            self._cond.notify_all()
+        return dropped
+
+    def _eligible(self, job):
+        # .get: indexing the defaultdicts would add an entry for every queued job
+        if job.user and self._active_by_user.get(job.user, 0) >= self.per_user_limit:
+            return False
+        if job.channel and self._active_by_channel.get(job.channel, 0) >= self.per_channel_limit:
+            return False
+        return True
+
+    def _next_job(self):
+        """Pop the eligible job with the lowest finish tag (caller holds the lock)"""
+        best = None
+        for job in self._queue:
+            if self._eligible(job) and (best is None or job.finish < best.finish):
+                best = job
+        if best is None:
+            return None
+        self._queue.remove(best)
+        self._virtual_time = max(self._virtual_time, best.start)
+        # Channels whose last tag is behind virtual time have nothing to catch up on
+        if len(self._last_finish) > 2 * max(len(self._queue), 16):
+            self._last_finish = {
+                channel: finish for channel, finish in self._last_finish.items() if finish > self._virtual_time
+            }
+        return best
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    if self._stopping and not self._queue:
+                        return
+                    self._cond.wait()
+                    job = self._next_job()
+                self._active += 1
+                if job.user:
+                    self._active_by_user[job.user] += 1
+                if job.channel:
+                    self._active_by_channel[job.channel] += 1
+
+            try:
+                job.fn()
+                ok = True
+            except Exception as e:
+                print(f"Error in dispatched job: {e}")
+                ok = False
+
+            with self._cond:
+                self._active -= 1
+                if job.user:
+                    self._release(self._active_by_user, job.user)
+                if job.channel:
+                    self._release(self._active_by_channel, job.channel)
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                # A finished job may unblock capped jobs for any worker
+                self._cond.notify_all()
+
+    @staticmethod
+    def _release(counts, key):
+        counts[key] -= 1
+        if counts[key] <= 0:
+            del counts[key]
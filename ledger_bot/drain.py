@@ -0,0 +1,161 @@
+"""Graceful drain on SIGTERM: finish in-flight answers, then replace what's left with a notice"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ledger_bot import metrics
+from ledger_bot.slack_outbound import unscheduled
+
+# Restart notices sent at once. They skip the outbound queue: paced at
+# chat.update's 50/min, a few dozen would outlast the grace period that's
+# left after the drain deadline.
+NOTICE_CONCURRENCY = 16
+
+
+class PendingReply:
+    """A question being answered: where it was asked, and its placeholder once posted"""
+
+    def __init__(self, client, channel, thread_ts=None, source="message"):
+        self.client = client
+        self.channel = channel
+        self.thread_ts = thread_ts
+        self.source = source
+        # Set by the answering code once the "Thinking..." placeholder is posted
+        self.ts = None
+
+    def notice(self, text):
+        """(method, kwargs) that puts `text` where the answer would have gone"""
+        if self.ts:
+            return "chat_update", {"channel": self.channel, "ts": self.ts, "text": text}
+        return "chat_postMessage", {"channel": self.channel, "thread_ts": self.thread_ts, "text": text}
+
+
+class Drainer:
+    """
+    Questions accepted but not yet answered, and the drain that ends them.
+
+    With replicas: 1 and maxSurge: 1 the old pod gets SIGTERM while the new
+    one is already connected. `begin` starts the drain: the caller closes its
+    Socket Mode connection (Slack then delivers to the new pod) and stops
+    taking work, `wait_idle` gives in-flight answers until the deadline to
+    finish, and `abandon` rewrites whatever is still pending, placeholder or
+    not yet started, with a notice to ask again. Notices go straight to
+    Slack, concurrently, rather than through the rate-limited outbound queue.
+    """
+
+    def __init__(self, timeout=45.0, clock=time.monotonic):
+        self.timeout = timeout
+        self.clock = clock
+        self.draining = False
+        self.deadline = None
+        self.finished = 0
+        self.abandoned = 0
+        self._pending = set()
+        self._cond = threading.Condition()
+
+    def track(self, client, channel, thread_ts=None, source="message"):
+        """Register an accepted question; pass the result to `done` once it's answered"""
+        reply = PendingReply(client, channel, thread_ts, source)
+        with self._cond:
+            self._pending.add(reply)
+        return reply
+
+    def done(self, reply):
+        with self._cond:
+            if reply in self._pending:
+                self._pending.discard(reply)
+                if self.draining:
+                    self.finished += 1
+                self._cond.notify_all()
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    def begin(self):
+        """Start draining; returns the number of questions still being answered"""
+        with self._cond:
+            if not self.draining:
+                self.draining = True
+                self.deadline = self.clock() + self.timeout
+            pending = len(self._pending)
+        print(f"🛑 Draining: {pending} question(s) in flight, {self.timeout:g}s to finish")
+        return pending
+
+    def remaining(self):
+        """Seconds left before the drain deadline (None when not draining)"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - self.clock())
+
+    def wait_idle(self):
+        """Block until nothing is pending or the deadline passes; True if everything finished"""
+        with self._cond:
+            while self._pending:
+                remaining = self.remaining()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def _take_pending(self):
+        with self._cond:
+            replies = list(self._pending)
+            self._pending.clear()
+            self.abandoned += len(replies)
+            self._cond.notify_all()
+        return replies
+
+    def _abandoned(self, reply, error=None):
+        stage = "placeholder" if reply.ts else "queued"
+        metrics.DRAIN_ABANDONED.labels(stage=stage).inc()
+        if error is not None:
+            metrics.record_error("slack_update" if reply.ts else "slack_post", error)
+            print(f"Error posting restart notice ({reply.source}): {error}")
+
+    def _send_notice(self, reply, text):
+        method, kwargs = reply.notice(text)
+        try:
+            getattr(unscheduled(reply.client), method)(**kwargs)
+            self._abandoned(reply)
+        except Exception as e:
+            self._abandoned(reply, e)
+
+    async def _send_notice_async(self, reply, text, semaphore):
+        method, kwargs = reply.notice(text)
+        async with semaphore:
+            try:
+                await getattr(unscheduled(reply.client), method)(**kwargs)
+                self._abandoned(reply)
+            except Exception as e:
+                self._abandoned(reply, e)
+
+    def abandon(self, text):
+        """Replace every pending answer with `text`, NOTICE_CONCURRENCY at a time; returns how many there were"""
+        replies = self._take_pending()
+        if replies:
+            with ThreadPoolExecutor(max_workers=min(NOTICE_CONCURRENCY, len(replies)),
+                                    thread_name_prefix="drain-notice") as pool:
+                list(pool.map(lambda reply: self._send_notice(reply, text), replies))
+            print(f"🛑 Drain deadline passed, posted a restart notice for {len(replies)} question(s)")
+        return len(replies)
+
+    async def abandon_async(self, text):
+        """abandon for replies tracked with an async Slack client"""
+        replies = self._take_pending()
+        if replies:
+            semaphore = asyncio.Semaphore(NOTICE_CONCURRENCY)
+            await asyncio.gather(*(self._send_notice_async(reply, text, semaphore) for reply in replies))
+            print(f"🛑 Drain deadline passed, posted a restart notice for {len(replies)} question(s)")
+        return len(replies)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "draining": self.draining,
+                "pending": len(self._pending),
+                "finished_while_draining": self.finished,
+                "abandoned": self.abandoned,
+                "seconds_left": None if self.deadline is None else round(self.remaining(), 1),
+            }
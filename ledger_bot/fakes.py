@@ -0,0 +1,377 @@
+"""Offline stand-ins for LiteLLM and the Slack Web API, for load tests"""
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+from ledger_bot.knowledge import estimate_tokens
+
+# Filler the fake model answers with, one word per token
+ANSWER_WORDS = (
+    "The GL Publisher posts each journal to the ledger once both sides balance, "
+    "and reversals are published as new entries that reference the original."
+).split()
+
+
+class Distribution:
+    """
+    A latency (or size) distribution parsed from "kind:args":
+
+        fixed:0.5           always 0.5
+        uniform:0.2,1.5     uniform between 0.2 and 1.5
+        normal:1.0,0.3      mean 1.0, standard deviation 0.3 (clamped at 0)
+        lognormal:0.8,0.5   median 0.8, sigma 0.5 - long-tailed, like real LLM latency
+        exp:0.4             exponential with mean 0.4
+    """
+
+    KINDS = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exp": 1}
+
+    def __init__(self, spec, rng=None):
+        kind, _, args = spec.strip().partition(":")
+        try:
+            values = [float(value) for value in args.split(",") if value.strip()]
+        except ValueError:
+            values = None
+        if kind not in self.KINDS or values is None or len(values) != self.KINDS[kind]:
+            raise ValueError(f"Invalid distribution {spec!r}, expected one of: "
+                             f"{', '.join(f'{k}:...' for k in self.KINDS)}")
+        self.spec = spec.strip()
+        self.kind = kind
+        self.values = values
+        self.rng = rng or random.Random()
+
+    def sample(self):
+        a = self.values[0]
+        if self.kind == "fixed":
+            value = a
+        elif self.kind == "uniform":
+            value = self.rng.uniform(a, self.values[1])
+        elif self.kind == "normal":
+            value = self.rng.gauss(a, self.values[1])
+        elif self.kind == "lognormal":
+            value = a * self.rng.lognormvariate(0.0, self.values[1])
+        else:
+            value = self.rng.expovariate(1.0 / a) if a > 0 else 0.0
+        return max(value, 0.0)
+
+    def __repr__(self):
+        return f"Distribution({self.spec!r})"
+
+
+def distribution(spec, rng=None):
+    """A Distribution from a spec string or a number (fixed); anything with sample() is used as is"""
+    if hasattr(spec, "sample"):
+        return spec
+    if isinstance(spec, (int, float)):
+        return Distribution(f"fixed:{spec}", rng)
+    return Distribution(spec, rng)
+
+
+class FakeServer:
+    """A threaded HTTP server on localhost; subclasses implement handle(handler, path, body)"""
+
+    def __init__(self, host="127.0.0.1", port=0):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                fake.handle(self, self.path, self.rfile.read(length) if length else b"")
+
+            def do_GET(self):
+                fake.handle(self, self.path, b"")
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def address(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name=type(self).__name__,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def handle(self, handler, path, body):
+        raise NotImplementedError
+
+    @staticmethod
+    def send_json(handler, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+
+class FakeLiteLLM(FakeServer):
+    """
+    OpenAI-compatible /chat/completions endpoint.
+
+    Each request waits `first_token` seconds, then produces `answer_tokens`
+    tokens at `tokens_per_second` (0 sends them all at once), streamed as
+    server-sent events when the request asks for `stream`. A fraction of
+    requests fail: `error_rate` with a 500, `rate_limit_rate` with a 429, and
+    `stall_rate` hang for `stall_seconds` before answering.
+    """
+
+    def __init__(self, first_token="lognormal:0.8,0.5", tokens_per_second=60.0,
+                 answer_tokens="uniform:150,400", error_rate=0.0, rate_limit_rate=0.0,
+                 stall_rate=0.0, stall_seconds=120.0, seed=None, sleep=time.sleep, **kwargs):
+        super().__init__(**kwargs)
+        self.rng = random.Random(seed)
+        self.first_token = distribution(first_token, self.rng)
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = distribution(answer_tokens, self.rng)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.sleep = sleep
+        self._ids = itertools.count(1)
+        self.requests = 0
+        self.failures = 0
+        self.active = 0
+        self.max_active = 0
+        self.models = {}
+
+    @property
+    def base_url(self):
+        return self.address + "/v1"
+
+    def _draw(self):
+        """(fault, first token delay, answer tokens) for a new request"""
+        with self._lock:
+            roll = self.rng.random()
+            if roll < self.error_rate:
+                fault = "error"
+            elif roll < self.error_rate + self.rate_limit_rate:
+                fault = "rate_limit"
+            elif roll < self.error_rate + self.rate_limit_rate + self.stall_rate:
+                fault = "stall"
+            else:
+                fault = None
+            return fault, self.first_token.sample(), max(int(self.answer_tokens.sample()), 1)
+
+    def handle(self, handler, path, body):
+        if not path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(handler, 404, {"error": {"message": f"No route for {path}"}})
+            return
+        request = json.loads(body or b"{}")
+        model = request.get("model", "fake")
+        fault, delay, tokens = self._draw()
+        with self._lock:
+            self.requests += 1
+            self.models[model] = self.models.get(model, 0) + 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            if fault == "error":
+                self._fail(handler, 500, "Injected upstream failure", "internal_server_error")
+                return
+            if fault == "rate_limit":
+                self._fail(handler, 429, "Injected rate limit", "rate_limit_error", {"Retry-After": "1"})
+                return
+            if fault == "stall":
+                delay = self.stall_seconds
+            max_tokens = request.get("max_tokens")
+            if max_tokens:
+                tokens = min(tokens, int(max_tokens))
+            usage = {
+                "prompt_tokens": sum(estimate_tokens(str(m.get("content", ""))) for m in request.get("messages", [])),
+                "completion_tokens": tokens,
+            }
+            usage["total_tokens"] = usage["prompt_tokens"] + tokens
+            self.sleep(delay)
+            if request.get("stream"):
+                self._stream(handler, model, tokens, usage, request.get("stream_options") or {})
+            else:
+                self.sleep(tokens / self.tokens_per_second if self.tokens_per_second else 0)
+                self.send_json(handler, 200, {
+                    "id": f"chatcmpl-fake-{next(self._ids)}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(self._words(tokens))},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": usage,
+                })
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (timeout or hedge loser)
+            pass
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def _fail(self, handler, status, message, error_type, headers=None):
+        with self._lock:
+            self.failures += 1
+        self.send_json(handler, status, {"error": {"message": message, "type": error_type}}, headers)
+
+    def _words(self, tokens):
+        for i in range(tokens):
+            yield ANSWER_WORDS[i % len(ANSWER_WORDS)] + " "
+
+    def _stream(self, handler, model, tokens, usage, stream_options):
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Cache-Control", "no-cache")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        chunk_id = f"chatcmpl-fake-{next(self._ids)}"
+        created = int(time.time())
+
+        def event(choices, extra=None):
+            chunk = {"id": chunk_id, "object": "chat.completion.chunk", "created": created,
+                     "model": model, "choices": choices}
+            chunk.update(extra or {})
+            handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            handler.wfile.flush()
+
+        interval = 1.0 / self.tokens_per_second if self.tokens_per_second else 0
+        for i, word in enumerate(self._words(tokens)):
+            if i and interval:
+                self.sleep(interval)
+            delta = {"content": word}
+            if i == 0:
+                delta["role"] = "assistant"
+            event([{"index": 0, "delta": delta, "finish_reason": None}])
+        event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if stream_options.get("include_usage"):
+            event([], {"usage": usage})
+        handler.wfile.write(b"data: [DONE]\n\n")
+        handler.wfile.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "failures": self.failures,
+                "max_concurrent": self.max_active,
+                "models": dict(self.models),
+            }
+
+
+class SlackCall:
+    """A Web API call received by FakeSlack"""
+
+    def __init__(self, method, payload, at, ts=None):
+        self.method = method
+        self.payload = payload
+        self.at = at
+        self.ts = ts
+
+    @property
+    def text(self):
+        return self.payload.get("text") or ""
+
+    def __repr__(self):
+        return f"SlackCall({self.method!r}, {self.payload!r})"
+
+
+class FakeSlack(FakeServer):
+    """
+    Slack Web API that records every call.
+
+    chat.postMessage returns a fresh message ts; chat.update, auth.test and
+    anything else succeed. Calls take `latency` seconds, and `rate_limit_rate`
+    of chat.* calls get a 429 with a Retry-After of `retry_after` seconds.
+    `listeners` are called with each recorded SlackCall as it arrives.
+    """
+
+    def __init__(self, latency="fixed:0", rate_limit_rate=0.0, retry_after=1, seed=None,
+                 sleep=time.sleep, **kwargs):
+        super().__init__(**kwargs)
+        self.rng = random.Random(seed)
+        self.latency = distribution(latency, self.rng)
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.sleep = sleep
+        self.calls = []
+        self.listeners = []
+        self.rate_limited = 0
+        self._ts = itertools.count(1)
+
+    @property
+    def base_url(self):
+        return self.address + "/api/"
+
+    def handle(self, handler, path, body):
+        method = path.split("?", 1)[0].rstrip("/").rsplit("/", 1)[-1]
+        payload = self._payload(handler, body)
+        with self._lock:
+            delay = self.latency.sample()
+            limited = method.startswith("chat.") and self.rng.random() < self.rate_limit_rate
+        self.sleep(delay)
+        if limited:
+            with self._lock:
+                self.rate_limited += 1
+            self.send_json(handler, 429, {"ok": False, "error": "ratelimited"},
+                           {"Retry-After": str(self.retry_after)})
+            return
+
+        call = SlackCall(method, payload, time.monotonic())
+        if method == "auth.test":
+            response = {"ok": True, "url": "https://fake.slack.com/", "team": "Fake", "team_id": "T0FAKE",
+                        "user": "ledger-bot", "user_id": "U0FAKEBOT", "bot_id": "B0FAKEBOT"}
+        elif method == "chat.postMessage":
+            call.ts = f"{int(time.time())}.{next(self._ts):06d}"
+            response = {"ok": True, "channel": payload.get("channel"), "ts": call.ts,
+                        "message": {"text": call.text, "ts": call.ts}}
+        elif method == "chat.update":
+            call.ts = payload.get("ts")
+            response = {"ok": True, "channel": payload.get("channel"), "ts": call.ts, "text": call.text}
+        else:
+            response = {"ok": True}
+        with self._lock:
+            self.calls.append(call)
+            listeners = list(self.listeners)
+        for listener in listeners:
+            listener(call)
+        self.send_json(handler, 200, response)
+
+    @staticmethod
+    def _payload(handler, body):
+        if not body:
+            return {}
+        if "json" in (handler.headers.get("Content-Type") or ""):
+            return json.loads(body)
+        return dict(parse_qsl(body.decode("utf-8")))
+
+    def calls_to(self, method):
+        with self._lock:
+            return [call for call in self.calls if call.method == method]
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for call in self.calls:
+                counts[call.method] = counts.get(call.method, 0) + 1
+            return {"calls": counts, "rate_limited": self.rate_limited}
@@ -0,0 +1,153 @@
+"""Socket Mode connection health and the health/metrics server"""
+import json
+import threading
+import time
+from waitress import create_server
+from waitress.wasyncore import close_all
+
+from ledger_bot import metrics
+
+# Probes and scrapes are tiny; a few workers keep one slow /metrics render
+# from holding up a liveness probe
+HEALTH_SERVER_THREADS = 4
+
+
+class SocketModeHealth:
+    """
+    Socket Mode connection state, driven by the client's own events.
+
+    Slack sends `hello` once a connection is ready to deliver events and
+    `disconnect` shortly before it drops one (the client then reconnects
+    and gets a new `hello`). Closes and errors are counted. When the client
+    can report it synchronously, its own is_connected() must agree too, so
+    a socket that died without a close frame isn't reported as connected.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.is_connected = None
+        self.connects = 0
+        self.disconnects = 0
+        self.closes = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_disconnect_reason = None
+        self.connected_at = None
+        self.disconnected_at = None
+        self._connected = threading.Event()
+
+    def attach(self, client):
+        """Listen to a slack_sdk builtin SocketModeClient"""
+        client.on_message_listeners.append(self.on_message)
+        client.on_close_listeners.append(self.on_close)
+        client.on_error_listeners.append(self.on_error)
+        self.is_connected = client.is_connected
+
+    def attach_async(self, client):
+        """Listen to a slack_sdk aiohttp SocketModeClient (its listeners get aiohttp WSMessages)"""
+        async def on_message(message):
+            self.on_message(message.data)
+
+        async def on_close(message):
+            self.on_close(getattr(message, "data", None), getattr(message, "extra", None))
+
+        async def on_error(message):
+            self.on_error(getattr(message, "data", message))
+
+        client.on_message_listeners.append(on_message)
+        client.on_close_listeners.append(on_close)
+        client.on_error_listeners.append(on_error)
+
+    def on_message(self, raw_message):
+        if not isinstance(raw_message, str) or not raw_message.startswith("{"):
+            return
+        try:
+            message = json.loads(raw_message)
+        except ValueError:
+            return
+        message_type = message.get("type")
+        if message_type == "hello":
+            self.connects += 1
+            self.connected_at = self.clock()
+            self._connected.set()
+            metrics.SOCKET_MODE_CONNECTED.set(1)
+            if self.connects > 1:
+                print(f"🔌 Socket Mode reconnected (connection {self.connects})")
+        elif message_type == "disconnect":
+            self.last_disconnect_reason = message.get("reason")
+            self._mark_disconnected()
+            print(f"🔌 Socket Mode disconnect requested ({self.last_disconnect_reason}), reconnecting")
+
+    def on_close(self, code=None, reason=None):
+        self.closes += 1
+        # The builtin client reconnects before calling close listeners
+        if self.is_connected is None or not self.is_connected():
+            self._mark_disconnected()
+            print(f"🔌 Socket Mode connection closed ({code} {reason or ''})".rstrip())
+
+    def on_error(self, error):
+        self.errors += 1
+        self.last_error = str(error)
+
+    def _mark_disconnected(self):
+        if self._connected.is_set():
+            self.disconnects += 1
+            metrics.SOCKET_MODE_DISCONNECTS.inc()
+        self._connected.clear()
+        self.disconnected_at = self.clock()
+        metrics.SOCKET_MODE_CONNECTED.set(0)
+
+    def connected(self):
+        """True while a connection has said hello and hasn't gone away since"""
+        if not self._connected.is_set():
+            return False
+        return self.is_connected is None or bool(self.is_connected())
+
+    def wait_connected(self, timeout):
+        """Block until the first hello (or timeout); returns connected()"""
+        self._connected.wait(timeout)
+        return self.connected()
+
+    def stats(self):
+        now = self.clock()
+        return {
+            "connected": self.connected(),
+            "connects": self.connects,
+            "disconnects": self.disconnects,
+            "closes": self.closes,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "last_disconnect_reason": self.last_disconnect_reason,
+            "connected_for": round(now - self.connected_at, 1) if self.connected() else None,
+        }
+
+
+class HealthServer:
+    """
+    Waitress server for the health/metrics app.
+
+    Waitress is a production WSGI server (Flask's development server is
+    not): its own event loop accepts connections and a small worker pool
+    runs requests, without access logging. It still runs in the bot's
+    process, so call run() on a daemon thread and stop() to end it.
+    """
+
+    def __init__(self, wsgi_app, host="0.0.0.0", port=8080):
+        self._map = {}
+        self._server = create_server(wsgi_app, map=self._map, host=host, port=port,
+                                     threads=HEALTH_SERVER_THREADS, ident="ledger-bot-health")
+        self.port = self._server.effective_port
+
+    def run(self):
+        self._server.run()
+
+    def stop(self):
+        # Closed on the loop's own thread: closing the sockets from here
+        # would pull them out from under its select()
+        self._server.trigger.pull_trigger(lambda: close_all(self._map))
+        self._server.task_dispatcher.shutdown()
+
+
+def make_health_server(wsgi_app, host="0.0.0.0", port=8080):
+    """HealthServer for `wsgi_app`, bound but not yet serving"""
+    return HealthServer(wsgi_app, host, port)
@@ -0,0 +1,282 @@
+"""Incremental, idempotent compiler for knowledge_base.txt"""
+import json
+import os
+import re
+
+from ledger_bot.knowledge import estimate_tokens, is_fence, text_hash
+
+# Bumped whenever the manifest layout or section rendering changes
+MANIFEST_VERSION = 1
+# Imported documents' own headings start at this level, under their `##` title
+SOURCE_HEADING_LEVEL = 3
+
+ANY_HEADING_RE = re.compile(r"^(#{1,6})(\s+.*)$")
+TOP_HEADING_RE = re.compile(r"^##\s+(.+?)\s*$")
+
+
+class Source:
+    """
+    A document imported as one top-level (`##`) knowledge base section.
+
+    `key` identifies it in the manifest (default: its path); a path relative
+    to the repo it came from keeps the manifest valid on another machine.
+    """
+
+    def __init__(self, path, title, key=None):
+        self.path = str(path)
+        self.title = title
+        self.key = str(key) if key is not None else self.path
+
+    def __repr__(self):
+        return f"Source({self.path!r}, {self.title!r})"
+
+
+class Block:
+    """A top-level section of the knowledge base: its `##` heading and everything up to the next one"""
+
+    def __init__(self, title, text):
+        self.title = title
+        self.text = text.strip() + "\n"
+
+    @property
+    def body_hash(self):
+        """Hash of the body with whitespace collapsed, so reflowed copies still match; None if empty"""
+        body = " ".join(self.text.split("\n", 1)[1].split()) if "\n" in self.text else ""
+        return text_hash(body) if body else None
+
+    @property
+    def tokens(self):
+        return estimate_tokens(self.text)
+
+
+class SectionReport:
+    """What happened to one section in a compile"""
+
+    def __init__(self, title, status, tokens, source=None):
+        self.title = title
+        # curated, unchanged, updated, added, kept (source unreadable), removed or duplicate
+        self.status = status
+        self.tokens = tokens
+        self.source = source
+
+
+class CompileResult:
+    """Compiled knowledge base text, the manifest to save with it and a per-section report"""
+
+    def __init__(self, text, previous_text, manifest, sections):
+        self.text = text
+        self.previous_text = previous_text
+        self.manifest = manifest
+        self.sections = sections
+        self.tokens = estimate_tokens(text)
+        self.previous_tokens = estimate_tokens(previous_text)
+
+    @property
+    def changed(self):
+        return self.text != self.previous_text
+
+    def report(self):
+        """Per-section token report, one line per section, then the totals"""
+        lines = [f"{'status':<10} {'tokens':>7}  section"]
+        for section in self.sections:
+            line = f"{section.status:<10} {section.tokens:>7}  {section.title}"
+            if section.status == "kept" and section.source:
+                # Unreadable this run: titles can repeat, the source path can't
+                line += f"  (unreadable: {section.source})"
+            lines.append(line)
+        delta = self.tokens - self.previous_tokens
+        lines.append(f"{'total':<10} {self.tokens:>7}  ({delta:+d} tokens, "
+                     f"{'rewritten' if self.changed else 'no changes'})")
+        return "\n".join(lines)
+
+
+def manifest_path(kb_path):
+    """Default location of the compile manifest for a knowledge base file"""
+    return os.path.splitext(str(kb_path))[0] + ".manifest.json"
+
+
+def read_manifest(path):
+    """A compile manifest, or an empty one if there isn't a readable one of this version"""
+    try:
+        with open(path, "r") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {"version": MANIFEST_VERSION, "sources": {}}
+    except (OSError, ValueError) as e:
+        print(f"Ignoring knowledge base manifest {path}: {e}")
+        return {"version": MANIFEST_VERSION, "sources": {}}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "sources": {}}
+    return manifest
+
+
+def write_atomic(path, text):
+    """Replace path with text, so readers (and the bot's watcher) never see a partial file"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def read_source(path):
+    """A source document's text, or None if it can't be read"""
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except OSError as e:
+        print(f"Error reading {path}: {e}")
+        return None
+
+
+def split_blocks(text):
+    """(preamble, blocks) split on `##` headings outside code fences"""
+    preamble = []
+    blocks = []
+    current = None
+    in_fence = False
+    for line in text.splitlines():
+        if is_fence(line):
+            in_fence = not in_fence
+        match = None if in_fence else TOP_HEADING_RE.match(line)
+        if match:
+            current = (match.group(1), [line])
+            blocks.append(current)
+        elif current is None:
+            preamble.append(line)
+        else:
+            current[1].append(line)
+    return "\n".join(preamble).strip(), [Block(title, "\n".join(lines)) for title, lines in blocks]
+
+
+def shift_headings(text, top_level=SOURCE_HEADING_LEVEL):
+    """
+    Move a document's headings down so its highest one is at `top_level`.
+
+    A README's own `#`/`##` headings would otherwise end the section it was
+    imported as, and the next compile couldn't tell where it stops.
+    """
+    lines = text.splitlines()
+    levels = []
+    in_fence = False
+    for line in lines:
+        if is_fence(line):
+            in_fence = not in_fence
+        match = None if in_fence else ANY_HEADING_RE.match(line)
+        if match:
+            levels.append(len(match.group(1)))
+    if not levels or min(levels) >= top_level:
+        return text
+    shift = top_level - min(levels)
+
+    shifted = []
+    in_fence = False
+    for line in lines:
+        if is_fence(line):
+            in_fence = not in_fence
+        match = None if in_fence else ANY_HEADING_RE.match(line)
+        if match:
+            line = "#" * min(6, len(match.group(1)) + shift) + match.group(2)
+        shifted.append(line)
+    return "\n".join(shifted)
+
+
+def render_section(title, content):
+    """A source document as a knowledge base section"""
+    return Block(title, f"## {title}\n\n{shift_headings(content.strip())}")
+
+
+def compile_knowledge_base(kb_text, sources, manifest, read=read_source):
+    """
+    Rebuild the knowledge base from its curated text and `sources`.
+
+    Sections from earlier compiles (recorded in the manifest) and sections
+    titled like a source are replaced, never appended to, so stale copies
+    from old append-only runs are dropped too. A source whose content hash
+    matches the manifest keeps its existing section; one that can't be read
+    keeps it as well. Sections whose body duplicates an earlier one are
+    dropped. The same inputs always give the same text.
+    """
+    preamble, blocks = split_blocks(kb_text)
+    previous = manifest.get("sources", {})
+    generated_titles = {entry["title"] for entry in previous.values()} | {s.title for s in sources}
+    listed = {s.key for s in sources}
+
+    kept = []
+    existing = {}
+    stale = []
+    for block in blocks:
+        if block.title not in generated_titles:
+            kept.append((block, SectionReport(block.title, "curated", block.tokens)))
+        elif block.title in existing:
+            # A second copy from an append-only run
+            stale.append(SectionReport(block.title, "duplicate", block.tokens))
+        else:
+            existing[block.title] = block
+
+    entries = {}
+    for source in sources:
+        entry = previous.get(source.key)
+        old = existing.get(source.title)
+        content = read(source.path)
+        if content is None:
+            if old is None:
+                continue
+            block, status, content_hash = old, "kept", entry["hash"] if entry else None
+        else:
+            content_hash = text_hash(content)
+            if old is not None and entry and entry["hash"] == content_hash and entry["title"] == source.title:
+                block, status = old, "unchanged"
+            else:
+                block = render_section(source.title, content)
+                status = "updated" if old is not None else "added"
+        kept.append((block, SectionReport(source.title, status, block.tokens, source.key)))
+        entries[source.key] = {"title": source.title, "hash": content_hash, "tokens": block.tokens}
+
+    seen = set()
+    output = []
+    reports = []
+    for block, report in kept:
+        if block.body_hash is not None and block.body_hash in seen:
+            report.status = "duplicate"
+            if report.source in entries:
+                entries[report.source]["duplicate"] = True
+        else:
+            seen.add(block.body_hash)
+            output.append(block)
+        reports.append(report)
+    reports.extend(stale)
+    for key, entry in sorted(previous.items()):
+        if key not in listed and entry["title"] in existing:
+            reports.append(SectionReport(entry["title"], "removed", existing[entry["title"]].tokens, key))
+
+    parts = ([preamble] if preamble else []) + [block.text.strip() for block in output]
+    text = "\n\n".join(parts) + "\n"
+    new_manifest = {"version": MANIFEST_VERSION, "kb_hash": text_hash(text), "sources": entries}
+    return CompileResult(text, kb_text, new_manifest, reports)
+
+
+def update_knowledge_base(kb_path, sources, manifest_file=None, read=read_source, dry_run=False):
+    """
+    Compile sources into the knowledge base file, printing the section
+    report. The file and its manifest are only rewritten (atomically) if
+    their content changed, so an unchanged run doesn't trigger a reload.
+    """
+    try:
+        with open(kb_path, "r") as f:
+            kb_text = f.read()
+    except FileNotFoundError:
+        kb_text = ""
+    manifest_file = manifest_path(kb_path) if manifest_file is None else manifest_file
+    manifest = read_manifest(manifest_file)
+
+    result = compile_knowledge_base(kb_text, sources, manifest, read=read)
+    print(result.report())
+    if dry_run:
+        return result
+
+    if result.changed:
+        write_atomic(kb_path, result.text)
+        print(f"✅ Wrote {kb_path}")
+    if result.manifest != manifest:
+        write_atomic(manifest_file, json.dumps(result.manifest, indent=2, sort_keys=True) + "\n")
+    return result
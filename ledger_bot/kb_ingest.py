@@ -0,0 +1,234 @@
+"""Discover, read and normalize oracle-gl-publisher docs for the knowledge base, in parallel"""
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ledger_bot.kb_compiler import Source
+from ledger_bot.knowledge import estimate_tokens
+
+# Paths are relative to the checkout, with `/` separators. `*` stays within
+# one directory, `**/` spans any number of them.
+DEFAULT_INCLUDE = (
+    "*/README.md",
+    "*/docs/**/*.md",
+    "docs/adr/*.md",
+)
+DEFAULT_EXCLUDE = (
+    "**/CHANGELOG.md",
+    "docs/adr/*template*.md",
+    "docs/adr/README.md",
+)
+# Never walked into: VCS metadata, dependencies and build output
+SKIP_DIRS = frozenset({
+    ".git", ".gradle", ".idea", ".venv", "venv", "node_modules", "build", "target", "dist", "out",
+    "__pycache__",
+})
+DEFAULT_MAX_DOC_TOKENS = 2500
+TRUNCATED_NOTE = "_(truncated)_"
+
+FRONT_MATTER_RE = re.compile(r"\A---\n.*?\n---\n", re.DOTALL)
+HTML_COMMENT_RE = re.compile(r"<!--.*?-->", re.DOTALL)
+# A line of nothing but images, e.g. CI and coverage badges
+BADGE_LINE_RE = re.compile(r"^\s*(\[?!\[[^\]]*\]\([^)]*\)(\]\([^)]*\))?\s*)+$")
+BLANK_RUN_RE = re.compile(r"\n{3,}")
+
+# Section order in the knowledge base: module READMEs, other module docs, ADRs, the rest
+KIND_ORDER = {"module": 0, "module-doc": 1, "adr": 2, "doc": 3}
+
+
+def glob_to_regex(pattern):
+    """Compile a path glob where `*`/`?` don't cross `/` and `**/` matches any directories"""
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return re.compile("".join(parts) + r"\Z")
+
+
+class PathRules:
+    """Include/exclude globs; a path is ingested if any include matches and no exclude does"""
+
+    def __init__(self, include=DEFAULT_INCLUDE, exclude=DEFAULT_EXCLUDE):
+        self.include = [glob_to_regex(p) for p in include]
+        self.exclude = [glob_to_regex(p) for p in exclude]
+
+    def matches(self, relative_path):
+        return (any(p.match(relative_path) for p in self.include)
+                and not any(p.match(relative_path) for p in self.exclude))
+
+
+class Document:
+    """A normalized source document and the section title it's imported under"""
+
+    def __init__(self, key, path, title, kind, text, raw_tokens, truncated=False):
+        self.key = key
+        self.path = path
+        self.title = title
+        self.kind = kind
+        self.text = text
+        self.raw_tokens = raw_tokens
+        self.tokens = estimate_tokens(text)
+        self.truncated = truncated
+
+    def source(self):
+        return Source(self.path, self.title, key=self.key)
+
+    def __repr__(self):
+        return f"Document({self.key!r}, {self.title!r}, tokens={self.tokens})"
+
+
+class IngestResult:
+    """Documents read in one refresh, in knowledge base order, and how long each step took"""
+
+    def __init__(self, root, documents, scanned, failed, discover_seconds, read_seconds, failed_titles=None):
+        self.root = root
+        self.documents = documents
+        self.scanned = scanned
+        self.failed = failed
+        # Section titles of the unreadable paths, disambiguated like the documents'
+        self.failed_titles = failed_titles or {}
+        self.discover_seconds = discover_seconds
+        self.read_seconds = read_seconds
+
+    @property
+    def seconds(self):
+        return self.discover_seconds + self.read_seconds
+
+    def sources(self):
+        """Sources to compile; unreadable ones are included so they keep their previous section"""
+        sources = [document.source() for document in self.documents]
+        for key in self.failed:
+            title = self.failed_titles.get(key) or classify(key)[1]
+            sources.append(Source(os.path.join(self.root, key), title, key=key))
+        return sources
+
+    def reader(self):
+        """read(path) for compile_knowledge_base, serving the normalized text"""
+        texts = {document.path: document.text for document in self.documents}
+        return texts.get
+
+    def describe(self):
+        truncated = sum(1 for document in self.documents if document.truncated)
+        unreadable = f" ({', '.join(self.failed)})" if self.failed else ""
+        return (f"{len(self.documents)} document(s) from {self.scanned} file(s) scanned, "
+                f"{truncated} truncated, {len(self.failed)} unreadable{unreadable} in {self.seconds:.2f}s "
+                f"(discover {self.discover_seconds:.2f}s, read {self.read_seconds:.2f}s)")
+
+
+def classify(relative_path):
+    """(kind, section title) for a document at relative_path"""
+    parts = relative_path.split("/")
+    stem = os.path.splitext(parts[-1])[0]
+    if parts[:2] == ["docs", "adr"]:
+        return "adr", f"ADR: {stem}"
+    if len(parts) == 2 and parts[1] == "README.md":
+        return "module", f"{parts[0].upper()} Module Details"
+    if len(parts) > 2 and parts[1] == "docs":
+        return "module-doc", f"{parts[0].upper()} Module: {stem}"
+    return "doc", f"Doc: {os.path.splitext(relative_path)[0]}"
+
+
+def discover(root, rules, skip_dirs=SKIP_DIRS):
+    """(relative paths matching rules, number of files looked at), sorted"""
+    found = []
+    scanned = 0
+    for directory, dirnames, filenames in os.walk(root):
+        # Pruning in place keeps os.walk out of dependency and build trees
+        dirnames[:] = [d for d in dirnames if d not in skip_dirs and not d.startswith(".")]
+        relative_dir = os.path.relpath(directory, root).replace(os.sep, "/")
+        for filename in filenames:
+            if not filename.endswith(".md"):
+                continue
+            scanned += 1
+            relative = filename if relative_dir == "." else f"{relative_dir}/{filename}"
+            if rules.matches(relative):
+                found.append(relative)
+    return sorted(found), scanned
+
+
+def normalize(text):
+    """Strip what costs prompt tokens without informing answers: front matter, comments, badges, extra blank lines"""
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = FRONT_MATTER_RE.sub("", text)
+    text = HTML_COMMENT_RE.sub("", text)
+    lines = [line.rstrip() for line in text.split("\n") if not BADGE_LINE_RE.match(line)]
+    return BLANK_RUN_RE.sub("\n\n", "\n".join(lines)).strip() + "\n"
+
+
+def cap_tokens(text, max_tokens):
+    """(text, truncated) with text cut at a paragraph break to fit max_tokens"""
+    if not max_tokens or estimate_tokens(text) <= max_tokens:
+        return text, False
+    limit = max(0, max_tokens * 4 - len(TRUNCATED_NOTE) - 2)
+    cut = text.rfind("\n\n", 0, limit)
+    head = text[:cut if cut > 0 else limit].rstrip()
+    if head.count("```") % 2:
+        # Don't leave a code block open for the rest of the knowledge base
+        head += "\n```"
+    return f"{head}\n\n{TRUNCATED_NOTE}\n", True
+
+
+def read_document(root, relative_path, max_tokens):
+    path = os.path.join(root, relative_path)
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        raw = f.read()
+    text, truncated = cap_tokens(normalize(raw), max_tokens)
+    kind, title = classify(relative_path)
+    return Document(relative_path, path, title, kind, text, estimate_tokens(raw), truncated)
+
+
+def ingest(root, rules=None, max_doc_tokens=DEFAULT_MAX_DOC_TOKENS, workers=8, skip_dirs=SKIP_DIRS):
+    """
+    Find every document under root matching the rules, then read and
+    normalize them on a thread pool. Documents are returned in knowledge
+    base order (module READMEs, module docs, ADRs, others; by path within
+    each), whatever order the reads finish in.
+    """
+    rules = rules or PathRules()
+    root = str(root)
+    started = time.perf_counter()
+    paths, scanned = discover(root, rules, skip_dirs)
+    discovered = time.perf_counter()
+
+    documents = []
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="kb-ingest") as pool:
+        futures = [(path, pool.submit(read_document, root, path, max_doc_tokens)) for path in paths]
+        for path, future in futures:
+            try:
+                documents.append(future.result())
+            except OSError as e:
+                print(f"Error reading {path}: {e}")
+                failed.append(path)
+    finished = time.perf_counter()
+
+    documents.sort(key=lambda document: (KIND_ORDER[document.kind], document.key))
+    # Unreadable paths count too: they keep their section under the title they'd have had
+    failed_titles = {path: classify(path)[1] for path in failed}
+    titles = {}
+    for title in [document.title for document in documents] + list(failed_titles.values()):
+        titles[title] = titles.get(title, 0) + 1
+    for document in documents:
+        if titles[document.title] > 1:
+            # e.g. api/docs/v1/setup.md and api/docs/v2/setup.md
+            document.title = f"{document.title} ({document.key})"
+    for path, title in failed_titles.items():
+        if titles[title] > 1:
+            failed_titles[path] = f"{title} ({path})"
+    return IngestResult(root, documents, scanned, failed, discovered - started, finished - discovered,
+                        failed_titles)
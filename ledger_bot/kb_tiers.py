@@ -0,0 +1,280 @@
+"""Lossless compression and token-budgeted tiers for the compiled knowledge base"""
+import re
+
+from ledger_bot.knowledge import (
+    ARCHIVE, CORE, DEFAULT_CORE_SECTIONS, DETAIL, KnowledgeBase, Section, estimate_tokens, is_fence,
+    parse_sections, render_sections
+)
+
+SPACE_RUN_RE = re.compile(r"(?<=\S) {2,}")
+# Snippets shorter than this are cheaper to repeat than to point at
+MIN_DEDUP_CHARS = 120
+
+
+def settings(core_titles=DEFAULT_CORE_SECTIONS, archive_titles=(), token_ceiling=0, compress=True):
+    """The tiering settings stored in the artifact; a build with different ones is recompiled"""
+    return {
+        "core": [title.upper() for title in core_titles],
+        "archive": [title.upper() for title in archive_titles],
+        "ceiling": int(token_ceiling),
+        "compress": bool(compress),
+    }
+
+
+def shorten_code(lines):
+    """
+    Code block lines dedented and with blank lines dropped. Indentation is
+    halved only when every indent is a multiple of 4, so 2-space nesting
+    (YAML, GraphQL) keeps its levels.
+    """
+    lines = [line.rstrip().replace("\t", "    ") for line in lines]
+    lines = [line for line in lines if line]
+    if not lines:
+        return lines
+    common = min(len(line) - len(line.lstrip(" ")) for line in lines)
+    lines = [line[common:] for line in lines]
+    indents = [len(line) - len(line.lstrip(" ")) for line in lines]
+    if any(indent % 4 for indent in indents):
+        return lines
+    return [" " * (indent // 2) + line.lstrip(" ") for line, indent in zip(lines, indents)]
+
+
+def compress_markdown(text):
+    """
+    Remove whitespace the model doesn't need: trailing spaces, runs of
+    spaces inside lines, repeated blank lines, and indentation and blank
+    lines inside code blocks (see shorten_code). Leading indentation of
+    prose (nested lists) is kept; fences lose theirs.
+    """
+    output = []
+    code = None
+    for line in text.splitlines():
+        if is_fence(line):
+            if code is None:
+                output.append("```" + line.strip().lstrip("`").strip())
+                code = []
+            else:
+                output.extend(shorten_code(code))
+                output.append("```")
+                code = None
+            continue
+        if code is not None:
+            code.append(line)
+            continue
+        line = SPACE_RUN_RE.sub(" ", line.rstrip())
+        if line or (output and output[-1]):
+            output.append(line)
+    if code is not None:
+        output.extend(shorten_code(code))
+    return "\n".join(output).strip() + "\n"
+
+
+def split_snippets(text):
+    """Paragraphs and code blocks of text, in order, with the blank lines between them dropped"""
+    snippets = []
+    current = []
+    in_fence = False
+    for line in text.splitlines():
+        if is_fence(line):
+            if not in_fence and current:
+                snippets.append("\n".join(current))
+                current = []
+            current.append(line)
+            in_fence = not in_fence
+            if not in_fence:
+                snippets.append("\n".join(current))
+                current = []
+        elif in_fence or line.strip():
+            current.append(line)
+        elif current:
+            snippets.append("\n".join(current))
+            current = []
+    if current:
+        snippets.append("\n".join(current))
+    return snippets
+
+
+def snippet_key(snippet):
+    return " ".join(snippet.split())
+
+
+def dedupe_snippets(sections):
+    """
+    Replace paragraphs and code blocks that also appear in a core section
+    with a pointer to it. Core sections are in every prompt, so a pointer
+    never leads to a section retrieval left out. Returns the new texts and
+    how many snippets were replaced in each.
+    """
+    seen = {}
+    for section in sections:
+        if section.tier != CORE:
+            continue
+        # The first snippet is the section's own heading
+        for snippet in split_snippets(section.text)[1:]:
+            key = snippet_key(snippet)
+            if len(key) >= MIN_DEDUP_CHARS:
+                seen.setdefault(key, section.title)
+
+    texts = []
+    counts = []
+    for section in sections:
+        snippets = split_snippets(section.text)
+        replaced = 0
+        kept = snippets[:1]
+        for snippet in snippets[1:]:
+            key = snippet_key(snippet)
+            if key in seen and seen[key] != section.title:
+                kind = "code" if is_fence(snippet.splitlines()[0]) else "text"
+                kept.append(f"_(same {kind} as in {seen[key]})_")
+                replaced += 1
+            else:
+                kept.append(snippet)
+        texts.append("\n\n".join(kept) + "\n" if replaced else section.text)
+        counts.append(replaced)
+    return texts, counts
+
+
+def code_tokens(text):
+    """Tokens of text that are inside code blocks"""
+    total = 0
+    in_fence = False
+    for line in text.splitlines():
+        if is_fence(line):
+            in_fence = not in_fence
+        elif in_fence:
+            total += estimate_tokens(line + "\n")
+    return total
+
+
+def archived_by_title(section, archive_titles):
+    return section.title.upper() in archive_titles or (section.parent or "").upper() in archive_titles
+
+
+def demotion_order(sections):
+    """
+    Detail sections in the order they're archived to meet a token ceiling:
+    the most code first (examples are the easiest to do without), then
+    prose from the end of the knowledge base back, where imported docs are.
+    """
+    return sorted(sections, key=lambda s: (-code_tokens(s.text), -s.position))
+
+
+class TierReport:
+    """What the build did to one section"""
+
+    def __init__(self, section, raw_tokens, deduped, reason):
+        self.title = section.title
+        self.tier = section.tier
+        self.raw_tokens = raw_tokens
+        self.tokens = section.tokens
+        self.deduped = deduped
+        # core, configured (KB_ARCHIVE_SECTIONS), ceiling or "" for untouched detail
+        self.reason = reason
+
+
+class TierResult:
+    """A tiered knowledge base and the per-section report of how it was built"""
+
+    def __init__(self, kb, sections, token_ceiling):
+        self.kb = kb
+        self.sections = sections
+        self.token_ceiling = token_ceiling
+
+    @property
+    def over_ceiling(self):
+        return bool(self.token_ceiling) and self.kb.prompt_tokens > self.token_ceiling
+
+    def describe(self):
+        """One-line summary"""
+        archived = sum(1 for s in self.sections if s.tier == ARCHIVE)
+        ceiling = f"/{self.token_ceiling}" if self.token_ceiling else ""
+        return (f"{self.kb.prompt_tokens}{ceiling} prompt tokens from {self.kb.total_tokens} "
+                f"({len(self.sections) - archived} section(s) sent, {archived} archived)")
+
+    def report(self):
+        """Per-section tier and token report, then the totals"""
+        lines = [f"{'tier':<8} {'raw':>6} {'tokens':>6}  section"]
+        for s in self.sections:
+            notes = []
+            if s.reason and s.reason != CORE:
+                notes.append(f"archived: {s.reason}")
+            if s.deduped:
+                notes.append(f"{s.deduped} repeated snippet(s)")
+            suffix = f"  ({', '.join(notes)})" if notes else ""
+            lines.append(f"{s.tier:<8} {s.raw_tokens:>6} {s.tokens:>6}  {s.title}{suffix}")
+        lines.append(f"{'total':<8} {self.kb.total_tokens:>6} {self.kb.prompt_tokens:>6}  {self.describe()}")
+        if self.over_ceiling:
+            lines.append(f"⚠️  Core sections alone exceed the {self.token_ceiling} token ceiling")
+        return "\n".join(lines)
+
+
+def compile_tiers(text, core_titles=DEFAULT_CORE_SECTIONS, archive_titles=(), token_ceiling=0, compress=True):
+    """
+    Build a KnowledgeBase whose prompt fits `token_ceiling` (0 for none).
+
+    Sections are compressed and de-duplicated, then sorted into tiers: core
+    (`core_titles`, always sent), archive (`archive_titles` and their
+    subsections, never sent) and detail (everything else, retrievable).
+    While the preamble, core and detail sections are over the ceiling,
+    detail sections are archived in `demotion_order`; any that fit again
+    afterwards are restored. The same inputs always give the same
+    knowledge base.
+    """
+    options = settings(core_titles, archive_titles, token_ceiling, compress)
+    preamble, parsed = parse_sections(text)
+    if compress:
+        preamble = compress_markdown(preamble) if preamble else preamble
+        parsed_texts = [compress_markdown(s.text) for s in parsed]
+    else:
+        parsed_texts = [s.text for s in parsed]
+    compressed = [Section(s.title, s.level, body, s.position, s.parent) for s, body in zip(parsed, parsed_texts)]
+
+    core = set(options["core"])
+    reasons = {}
+    for section in compressed:
+        if section.title.upper() in core:
+            section.tier = CORE
+            reasons[section.position] = CORE
+        elif archived_by_title(section, options["archive"]):
+            section.tier = ARCHIVE
+            reasons[section.position] = "configured"
+
+    def build():
+        # Archived sections are never sent, so they keep their full text
+        sent = [s for s in compressed if s.tier != ARCHIVE]
+        texts, counts = dedupe_snippets(sent) if compress else ([s.text for s in sent], [0] * len(sent))
+        rewritten = {s.position: (body, count) for s, body, count in zip(sent, texts, counts)}
+        sections = [
+            Section(s.title, s.level, rewritten.get(s.position, (s.text, 0))[0], s.position, s.parent, tier=s.tier)
+            for s in compressed
+        ]
+        prompt = render_sections(preamble, [s for s in sections if s.tier != ARCHIVE])
+        return sections, rewritten, estimate_tokens(prompt)
+
+    sections, rewritten, tokens = build()
+    if token_ceiling:
+        candidates = demotion_order([s for s in compressed if s.tier == DETAIL])
+        demoted = []
+        while candidates and tokens > token_ceiling:
+            section = candidates.pop(0)
+            section.tier = ARCHIVE
+            demoted.append(section)
+            sections, rewritten, tokens = build()
+        # A big section archived late may have freed room for smaller ones archived before it
+        for section in demoted[-2::-1]:
+            section.tier = DETAIL
+            trial = build()
+            if trial[2] <= token_ceiling:
+                sections, rewritten, tokens = trial
+            else:
+                section.tier = ARCHIVE
+        for section in demoted:
+            if section.tier == ARCHIVE:
+                reasons[section.position] = "ceiling"
+
+    kb = KnowledgeBase.from_sections(text, preamble, sections, core_titles, tiering=options)
+    reports = [
+        TierReport(section, raw.tokens, rewritten.get(section.position, ("", 0))[1], reasons.get(section.position, ""))
+        for section, raw in zip(sections, parsed)
+    ]
+    return TierResult(kb, reports, token_ceiling)
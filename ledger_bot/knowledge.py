@@ -0,0 +1,424 @@
+"""Knowledge base sections and BM25 retrieval over knowledge_base.txt"""
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+# Sections always sent to the LLM regardless of the question
+DEFAULT_CORE_SECTIONS = ("YOUR ROLE", "HOW TO ANSWER QUESTIONS")
+# Bumped whenever the compiled artifact's layout, the parser or compression changes
+ARTIFACT_VERSION = 4
+
+# Section tiers: core is always sent, detail is retrievable, archive is never sent
+CORE = "core"
+DETAIL = "detail"
+ARCHIVE = "archive"
+
+HEADING_RE = re.compile(r"^(#{2,3})\s+(.+?)\s*$")
+WORD_RE = re.compile(r"[a-z0-9_]+")
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from how i if in into is it me my of on or
+our should so that the their them then there these this to was we what when where which
+who why will with you your about any
+""".split())
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token for English/markdown)"""
+    return (len(text) + 3) // 4
+
+
+def is_fence(line):
+    """
+    True for a ``` code fence line. Fences inside list items are indented,
+    so leading whitespace is allowed; everything that parses knowledge base
+    text uses this so they agree on what is code.
+    """
+    return line.lstrip().startswith("```")
+
+
+def text_hash(text):
+    """Short content hash identifying a knowledge base version"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def tokenize(text):
+    """Lowercased search terms with stopwords removed"""
+    return [w for w in WORD_RE.findall(text.lower()) if w not in STOPWORDS]
+
+
+class Section:
+    """A `##` or `###` section of the knowledge base"""
+
+    def __init__(self, title, level, text, position, parent=None, tokens=None, tier=DETAIL):
+        self.title = title
+        self.level = level
+        self.text = text
+        self.position = position
+        self.parent = parent
+        self.tokens = estimate_tokens(text) if tokens is None else tokens
+        self.tier = tier
+
+    def __repr__(self):
+        return f"Section({self.title!r}, level={self.level}, tokens={self.tokens}, tier={self.tier!r})"
+
+
+def parse_sections(text):
+    """
+    Split knowledge base text on its `##`/`###` headings.
+
+    Returns (preamble, sections). The preamble is everything before the
+    first heading. Headings inside ``` code fences are ignored and deeper
+    headings (`####`) stay inside their parent section.
+    """
+    preamble_lines = []
+    sections = []
+    current = None
+    parent_title = None
+    in_fence = False
+
+    def close():
+        if current is not None:
+            title, level, lines, parent = current
+            sections.append(Section(title, level, "\n".join(lines).strip() + "\n",
+                                    len(sections), parent))
+
+    for line in text.splitlines():
+        if is_fence(line):
+            in_fence = not in_fence
+        match = None if in_fence else HEADING_RE.match(line)
+        if match:
+            close()
+            level = len(match.group(1))
+            title = match.group(2)
+            if level == 2:
+                parent_title = title
+                current = (title, level, [line], None)
+            else:
+                current = (title, level, [line], parent_title)
+        elif current is None:
+            preamble_lines.append(line)
+        else:
+            current[2].append(line)
+    close()
+
+    preamble = "\n".join(preamble_lines).strip()
+    return (preamble + "\n" if preamble else ""), sections
+
+
+def render_sections(preamble, sections):
+    """Assemble sections in document order, keeping parent headings for context"""
+    parts = [preamble] if preamble else []
+    emitted_parents = set()
+    for section in sorted(set(sections), key=lambda s: s.position):
+        if section.level == 2:
+            emitted_parents.add(section.title)
+        elif section.parent and section.parent not in emitted_parents:
+            parts.append(f"## {section.parent}\n")
+            emitted_parents.add(section.parent)
+        parts.append(section.text)
+    return "\n".join(parts)
+
+
+class BM25Index:
+    """Okapi BM25 over knowledge base sections; titles count double"""
+
+    def __init__(self, sections, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_terms = []
+        doc_freq = Counter()
+        for section in sections:
+            terms = Counter(tokenize(section.text))
+            for term in tokenize(section.title):
+                terms[term] += 1
+            self.doc_terms.append(terms)
+            doc_freq.update(terms.keys())
+
+        self.doc_lengths = [sum(terms.values()) for terms in self.doc_terms]
+        count = len(self.doc_terms)
+        self.avg_length = (sum(self.doc_lengths) / count) if count else 0.0
+        self.idf = {
+            term: math.log(1 + (count - df + 0.5) / (df + 0.5))
+            for term, df in doc_freq.items()
+        }
+
+    def to_dict(self):
+        return {"k1": self.k1, "b": self.b, "doc_terms": self.doc_terms, "idf": self.idf}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild an index saved with to_dict without re-tokenizing"""
+        index = cls.__new__(cls)
+        index.k1 = data["k1"]
+        index.b = data["b"]
+        index.doc_terms = [Counter(terms) for terms in data["doc_terms"]]
+        index.idf = data["idf"]
+        index.doc_lengths = [sum(terms.values()) for terms in index.doc_terms]
+        count = len(index.doc_terms)
+        index.avg_length = (sum(index.doc_lengths) / count) if count else 0.0
+        return index
+
+    def scores(self, query):
+        """BM25 score of every section for the query"""
+        terms = tokenize(query)
+        results = [0.0] * len(self.doc_terms)
+        if not terms or not self.avg_length:
+            return results
+        for i, doc in enumerate(self.doc_terms):
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[i] / self.avg_length)
+            score = 0.0
+            for term in terms:
+                tf = doc.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            results[i] = score
+        return results
+
+
+class Retrieval:
+    """Outcome of selecting sections for a question"""
+
+    def __init__(self, prompt, sections, prompt_tokens, full_tokens, elapsed):
+        self.prompt = prompt
+        self.sections = sections
+        self.prompt_tokens = prompt_tokens
+        self.full_tokens = full_tokens
+        self.elapsed = elapsed
+
+    @property
+    def tokens_saved(self):
+        return max(self.full_tokens - self.prompt_tokens, 0)
+
+    def describe(self):
+        """One-line log summary"""
+        saved_pct = 100 * self.tokens_saved / self.full_tokens if self.full_tokens else 0
+        titles = ", ".join(s.title for s in self.sections) or "none"
+        return (f"🔎 Retrieved {len(self.sections)} section(s) in {self.elapsed * 1000:.1f}ms "
+                f"[{titles}] - {self.prompt_tokens}/{self.full_tokens} tokens ({saved_pct:.0f}% saved)")
+
+
+class KnowledgeBase:
+    """
+    Parsed knowledge base: text, sections and retrieval index.
+
+    Built once from the raw text and never mutated, so a new version can be
+    swapped in wholesale while in-flight requests keep using the old one.
+    A compiled `artifact` (see `to_artifact`) for the same text skips
+    parsing and indexing; one for other text or another version is ignored.
+
+    `tiering` records the settings a tiered build (see kb_tiers) used; when
+    set, `prompt_text` is the compressed core and detail sections rather
+    than the raw text, and archived sections are never retrieved.
+    """
+
+    def __init__(self, text, core_titles=DEFAULT_CORE_SECTIONS, artifact=None):
+        compiled = (artifact is not None and artifact.get("version") == ARTIFACT_VERSION
+                    and artifact.get("hash") == text_hash(text))
+        if compiled:
+            preamble = artifact["preamble"]
+            sections = [Section(**fields) for fields in artifact["sections"]]
+            index = BM25Index.from_dict(artifact["index"])
+            tiering = artifact.get("tiering")
+        else:
+            preamble, sections = parse_sections(text)
+            index = BM25Index(sections)
+            tiering = None
+        self._setup(text, preamble, sections, index, core_titles, tiering)
+        self.compiled = compiled
+
+    @classmethod
+    def from_sections(cls, text, preamble, sections, core_titles=DEFAULT_CORE_SECTIONS, tiering=None):
+        """A knowledge base for text whose parsed sections were rewritten, e.g. compressed"""
+        kb = cls.__new__(cls)
+        kb._setup(text, preamble, sections, BM25Index(sections), core_titles, tiering)
+        kb.compiled = False
+        return kb
+
+    def _setup(self, text, preamble, sections, index, core_titles, tiering):
+        self.text = text
+        self.hash = text_hash(text)
+        self.preamble = preamble
+        self.sections = sections
+        self.index = index
+        self.tiering = tiering
+        self.total_tokens = estimate_tokens(text)
+        core = {title.upper() for title in core_titles}
+        self.core_sections = [s for s in self.sections if s.title.upper() in core]
+        for section in self.core_sections:
+            section.tier = CORE
+        if tiering is None:
+            self.prompt_text = text
+        else:
+            self.prompt_text = self.render([s for s in self.sections if s.tier != ARCHIVE])
+        self.prompt_tokens = estimate_tokens(self.prompt_text)
+
+    def to_artifact(self):
+        """Parsed sections, token counts, tiers and index as JSON-serializable data"""
+        artifact = {
+            "version": ARTIFACT_VERSION,
+            "hash": self.hash,
+            "preamble": self.preamble,
+            "sections": [
+                {"title": s.title, "level": s.level, "text": s.text, "position": s.position,
+                 "parent": s.parent, "tokens": s.tokens, "tier": s.tier}
+                for s in self.sections
+            ],
+            "index": self.index.to_dict(),
+        }
+        if self.tiering is not None:
+            artifact["tiering"] = self.tiering
+        return artifact
+
+    def retrieve(self, question, top_k=6, token_budget=3000):
+        """
+        Build a system prompt with the preamble, core sections and the top-k
+        sections for the question that fit within `token_budget` tokens.
+        """
+        started = time.perf_counter()
+        chosen = list(self.core_sections)
+        used = estimate_tokens(self.preamble) + sum(s.tokens for s in chosen)
+
+        scores = self.index.scores(question)
+        ranked = sorted(
+            (i for i, score in enumerate(scores) if score > 0),
+            key=lambda i: (-scores[i], i)
+        )
+        picked = []
+        for i in ranked:
+            if len(picked) >= top_k:
+                break
+            section = self.sections[i]
+            if section.tier == ARCHIVE or section in chosen or used + section.tokens > token_budget:
+                continue
+            picked.append(section)
+            used += section.tokens
+
+        prompt = self.render(chosen + picked)
+        return Retrieval(prompt, picked, estimate_tokens(prompt), self.total_tokens,
+                         time.perf_counter() - started)
+
+    def render(self, sections):
+        """Assemble sections in document order, keeping parent headings for context"""
+        return render_sections(self.preamble, sections)
+
+
+def artifact_path(kb_path):
+    """Default location of the compiled artifact for a knowledge base file"""
+    return os.path.splitext(kb_path)[0] + ".compiled.json"
+
+
+def save_artifact(kb, path):
+    """Write kb's compiled artifact, replacing any previous one atomically"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(kb.to_artifact(), f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def read_artifact(path):
+    """A compiled artifact, or None if there isn't a readable one"""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Ignoring knowledge base artifact {path}: {e}")
+        return None
+
+
+class KnowledgeReloader:
+    """
+    Reloads the knowledge base file without a restart.
+
+    `reload` rebuilds the KnowledgeBase (sections, index, token counts) on
+    the calling thread - the watcher thread or an admin request, never the
+    Slack event path - and then swaps `current` in a single assignment.
+    Requests that already grabbed the old version finish on it.
+    """
+
+    def __init__(self, path, current, build=KnowledgeBase, on_swap=None, interval=10.0):
+        self.path = path
+        self.current = current
+        self.build = build
+        self.on_swap = on_swap
+        self.interval = interval
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_build_seconds = None
+        self._signature = self._stat()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def reload(self, force=False):
+        """
+        Rebuild and swap in the knowledge base if the file changed.
+
+        Returns the new KnowledgeBase, or None if nothing changed. Raises if
+        the file can't be read or parsed; the current version stays in place.
+        """
+        with self._lock:
+            signature = self._stat()
+            if not force and signature == self._signature:
+                return None
+            try:
+                with open(self.path, "r") as f:
+                    text = f.read()
+                self._signature = signature
+                if text_hash(text) == self.current.hash:
+                    return None
+                started = time.perf_counter()
+                new = self.build(text)
+                self.last_build_seconds = time.perf_counter() - started
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                raise
+
+            old, self.current = self.current, new
+            self.reloads += 1
+            self.last_error = None
+        if self.on_swap:
+            self.on_swap(new, old)
+        return new
+
+    def start(self):
+        """Poll the file every `interval` seconds on a daemon thread"""
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._watch, name="knowledge-reloader", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"Error reloading knowledge base from {self.path}: {e}")
+
+    def stats(self):
+        return {
+            "hash": self.current.hash,
+            "sections": len(self.current.sections),
+            "tokens": self.current.total_tokens,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,281 @@
+"""Prometheus metrics for the bot, served from the health server's /metrics"""
+import time
+
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+# Buckets sized for LLM answers: sub-second cache hits up to multi-minute answers
+ANSWER_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 21, 34, 55, 90, 180)
+FIRST_TOKEN_BUCKETS = (0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 8, 13, 21)
+SLACK_BUCKETS = (0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 2, 5, 10)
+QUEUE_WAIT_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+
+ANSWER_LATENCY = Histogram(
+    "ledger_bot_answer_latency_seconds",
+    "Time from receiving a Slack event to posting the final answer",
+    ["source", "outcome"],
+    buckets=ANSWER_BUCKETS,
+)
+LLM_LATENCY = Histogram(
+    "ledger_bot_llm_latency_seconds",
+    "Duration of LLM completion calls",
+    ["model", "mode", "tier"],
+    buckets=ANSWER_BUCKETS,
+)
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "ledger_bot_llm_time_to_first_token_seconds",
+    "Time from sending a streamed LLM request to its first content token",
+    ["model", "prompt_cache"],
+    buckets=FIRST_TOKEN_BUCKETS,
+)
+SLACK_API_LATENCY = Histogram(
+    "ledger_bot_slack_api_latency_seconds",
+    "Duration of Slack Web API calls",
+    ["method"],
+    buckets=SLACK_BUCKETS,
+)
+SLACK_QUEUE_WAIT = Histogram(
+    "ledger_bot_slack_queue_wait_seconds",
+    "Time Slack calls wait in the outbound queue for rate limit tokens",
+    ["method"],
+    buckets=QUEUE_WAIT_BUCKETS,
+)
+SLACK_RATE_LIMITED = Counter(
+    "ledger_bot_slack_rate_limited_total",
+    "Slack calls that got a 429 and were re-queued after Retry-After",
+    ["method"],
+)
+SLACK_MERGED_UPDATES = Counter(
+    "ledger_bot_slack_merged_updates_total",
+    "Queued chat.update calls superseded by a newer edit to the same message",
+)
+SLACK_DROPPED_UPDATES = Counter(
+    "ledger_bot_slack_dropped_updates_total",
+    "Partial (streaming) chat.update calls dropped because no spare rate limit was left",
+)
+LLM_TOKENS = Counter(
+    "ledger_bot_llm_tokens_total",
+    "Tokens reported in LLM usage payloads (prompt, completion, cache_read, cache_write)",
+    ["model", "type"],
+)
+ERRORS = Counter(
+    "ledger_bot_errors_total",
+    "Errors by stage and exception type",
+    ["stage", "type"],
+)
+TRUNCATIONS = Counter(
+    "ledger_bot_truncations_total",
+    "Answers truncated at MAX_MESSAGE_LENGTH",
+)
+CACHE_LOOKUPS = Counter(
+    "ledger_bot_cache_lookups_total",
+    "Response cache lookups by result",
+    ["result"],
+)
+COALESCED = Counter(
+    "ledger_bot_coalesced_questions_total",
+    "Questions answered from an identical in-flight LLM call",
+)
+SHED = Counter(
+    "ledger_bot_shed_questions_total",
+    "Questions rejected with a busy message because the queue was full",
+)
+LLM_RETRIES = Counter(
+    "ledger_bot_llm_retries_total",
+    "LLM attempts retried after a retryable error",
+    ["model", "error"],
+)
+LLM_HEDGES = Counter(
+    "ledger_bot_llm_hedges_total",
+    "Hedged LLM requests fired, and how many beat the original",
+    ["result"],
+)
+LLM_FALLBACKS = Counter(
+    "ledger_bot_llm_fallbacks_total",
+    "LLM calls sent to the fallback model because the model's circuit was open",
+    ["model"],
+)
+LLM_BREAKER_STATE = Gauge(
+    "ledger_bot_llm_breaker_state",
+    "LLM circuit breaker state per model (0 closed, 1 half-open, 2 open)",
+    ["model"],
+)
+ROUTING_DECISIONS = Counter(
+    "ledger_bot_routing_decisions_total",
+    "Model tier picked per LLM call, by tier and how it was picked",
+    ["tier", "source"],
+)
+ROUTING_SCORE = Histogram(
+    "ledger_bot_routing_score",
+    "Question complexity scores from the routing classifier",
+    buckets=(-4, -3, -2, -1, -0.5, 0, 0.5, 1, 1.5, 2, 3, 4, 6),
+)
+QUOTA_THROTTLED = Counter(
+    "ledger_bot_quota_throttled_total",
+    "Questions refused because a user or channel quota was exhausted",
+    ["scope"],
+)
+TENANT_REQUESTS = Counter(
+    "ledger_bot_tenant_requests_total",
+    "Quota checks by channel type (public, private, dm, none) and outcome (admitted, throttled)",
+    ["channel_type", "outcome"],
+)
+TENANT_TOKENS = Counter(
+    "ledger_bot_tenant_tokens_total",
+    "Estimated LLM tokens used by channel type (public, private, dm, none)",
+    ["channel_type"],
+)
+KNOWLEDGE_RELOADS = Counter(
+    "ledger_bot_knowledge_reloads_total",
+    "Knowledge base versions swapped in without a restart",
+)
+QUEUE_DEPTH = Gauge(
+    "ledger_bot_queue_depth",
+    "Questions waiting for a worker",
+)
+SLACK_OUTBOUND_QUEUE = Gauge(
+    "ledger_bot_slack_outbound_queue_depth",
+    "Slack calls waiting in the outbound queue",
+)
+ACTIVE_WORKERS = Gauge(
+    "ledger_bot_active_workers",
+    "Workers currently answering a question",
+)
+SOCKET_MODE_CONNECTED = Gauge(
+    "ledger_bot_socket_mode_connected",
+    "1 while the Socket Mode connection is up",
+)
+SOCKET_MODE_DISCONNECTS = Counter(
+    "ledger_bot_socket_mode_disconnects_total",
+    "Socket Mode connections lost or refreshed",
+)
+DUPLICATE_EVENTS = Counter(
+    "ledger_bot_duplicate_events_total",
+    "Slack events skipped because their event_id was already claimed",
+)
+DRAIN_ABANDONED = Counter(
+    "ledger_bot_drain_abandoned_total",
+    "Questions left unanswered at the drain deadline and given a restart notice",
+    ["stage"],
+)
+STARTUP_PHASE_SECONDS = Gauge(
+    "ledger_bot_startup_phase_seconds",
+    "Duration of each startup phase",
+    ["phase"],
+)
+STARTUP_SECONDS = Gauge(
+    "ledger_bot_startup_seconds",
+    "Time from process start until the bot was ready",
+)
+
+# Slack Web API methods whose latency is recorded by TimedSlackClient
+TIMED_SLACK_METHODS = ("chat_postMessage", "chat_update")
+
+
+def exposition():
+    """(body, content type) for the /metrics endpoint"""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def record_error(stage, error):
+    """Count an error by the stage it happened in and its exception type"""
+    ERRORS.labels(stage=stage, type=type(error).__name__).inc()
+
+
+def _token_count(obj, field):
+    value = getattr(obj, field, None) if obj is not None else None
+    return value if isinstance(value, int) else 0
+
+
+def prompt_cache_tokens(usage):
+    """
+    (cache_read, cache_write) tokens from a usage payload.
+
+    LiteLLM passes Anthropic's cache_read_input_tokens/cache_creation_input_tokens
+    through, and also reports reads as prompt_tokens_details.cached_tokens.
+    """
+    if usage is None:
+        return 0, 0
+    read = _token_count(usage, "cache_read_input_tokens")
+    if not read:
+        read = _token_count(getattr(usage, "prompt_tokens_details", None), "cached_tokens")
+    write = _token_count(usage, "cache_creation_input_tokens")
+    return read, write
+
+
+def prompt_cache_status(usage):
+    """'read', 'write', 'none' or 'unknown' (no usage) for labelling latency"""
+    if usage is None:
+        return "unknown"
+    read, write = prompt_cache_tokens(usage)
+    if read:
+        return "read"
+    if write:
+        return "write"
+    return "none"
+
+
+def record_usage(model, usage):
+    """Count prompt/completion/prompt-cache tokens from an OpenAI-style usage payload"""
+    if usage is None:
+        return
+    cache_read, cache_write = prompt_cache_tokens(usage)
+    counts = (
+        ("prompt", _token_count(usage, "prompt_tokens")),
+        ("completion", _token_count(usage, "completion_tokens")),
+        ("cache_read", cache_read),
+        ("cache_write", cache_write),
+    )
+    for token_type, count in counts:
+        if count > 0:
+            LLM_TOKENS.labels(model=model, type=token_type).inc(count)
+
+
+def record_route(route):
+    """Count a routing decision and, for classifier decisions, its score"""
+    ROUTING_DECISIONS.labels(tier=route.tier.name, source=route.source).inc()
+    if route.source == "classifier":
+        ROUTING_SCORE.observe(route.score)
+
+
+def record_first_token(model, seconds, usage):
+    """Observe time to first token, labelled by whether the prompt cache was hit"""
+    LLM_TIME_TO_FIRST_TOKEN.labels(model=model, prompt_cache=prompt_cache_status(usage)).observe(seconds)
+
+
+class TimedSlackClient:
+    """Wraps a Slack WebClient, recording latency of chat_postMessage/chat_update"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name not in TIMED_SLACK_METHODS:
+            return attr
+        histogram = SLACK_API_LATENCY.labels(method=name)
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return timed
+
+
+class AsyncTimedSlackClient(TimedSlackClient):
+    """TimedSlackClient for Bolt's AsyncWebClient"""
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name not in TIMED_SLACK_METHODS:
+            return attr
+        histogram = SLACK_API_LATENCY.labels(method=name)
+
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await attr(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return timed
@@ -0,0 +1,188 @@
+"""Per-user and per-channel fair-share quotas on LLM requests and tokens"""
+import threading
+import time
+from collections import OrderedDict
+
+from ledger_bot import metrics
+from ledger_bot.slack_outbound import TokenBucket
+
+
+def channel_type(channel):
+    """
+    Bounded metric label for a channel: Slack IDs start with C (public),
+    G (private or group DM) or D (DM). Per-channel and per-user numbers are
+    in QuotaManager.usage() instead, since DM IDs grow with the user base.
+    """
+    if not channel:
+        return "none"
+    return {"C": "public", "G": "private", "D": "dm"}.get(channel[0], "other")
+
+
+def parse_channel_weights(spec):
+    """{channel: weight} from "C0123:4,C0456:2" """
+    weights = {}
+    for entry in spec.split(","):
+        channel, _, weight = entry.strip().partition(":")
+        if not channel:
+            continue
+        try:
+            weights[channel] = float(weight)
+        except ValueError:
+            raise ValueError(f"Invalid channel priority {entry.strip()!r}, expected channel:weight")
+        if weights[channel] <= 0:
+            raise ValueError(f"Channel priority weight must be positive: {entry.strip()!r}")
+    return weights
+
+
+class Admission:
+    """
+    Result of a quota check; `scope` says which quota refused it. `shared` is
+    set when the answer came from an identical in-flight question, so it
+    never reached the model and costs nothing.
+    """
+
+    def __init__(self, user, channel, tokens, allowed=True, scope=None, retry_after=0.0):
+        self.user = user
+        self.channel = channel
+        self.tokens = tokens
+        self.allowed = allowed
+        self.scope = scope
+        self.retry_after = retry_after
+        self.shared = False
+
+
+class Tenant:
+    """A user's or channel's buckets and usage counters"""
+
+    def __init__(self, requests, tokens):
+        self.requests = requests
+        self.tokens = tokens
+        self.admitted = 0
+        self.throttled = 0
+        self.used_tokens = 0
+
+
+class QuotaManager:
+    """
+    Token-bucket quotas on LLM requests and estimated tokens, per user and
+    per channel.
+
+    A question is admitted only if the user's and the channel's request and
+    token buckets can all cover it. It is charged an estimate up front, and
+    `settle` gives back what the answer didn't use. Buckets refill
+    continuously and hold one window's allowance: a minute of requests, an
+    hour of tokens. A channel's weight multiplies its limits. A limit of 0
+    turns that quota off. The least recently seen tenants are forgotten
+    beyond `max_tenants`, and start again with full buckets.
+    """
+
+    def __init__(self, user_requests_per_minute=10, user_tokens_per_hour=100000,
+                 channel_requests_per_minute=30, channel_tokens_per_hour=400000,
+                 channel_weights=None, max_tenants=5000, clock=time.monotonic):
+        self.limits = {
+            "user": (user_requests_per_minute, user_tokens_per_hour),
+            "channel": (channel_requests_per_minute, channel_tokens_per_hour),
+        }
+        self.channel_weights = dict(channel_weights or {})
+        self.max_tenants = max_tenants
+        self.clock = clock
+        self._tenants = OrderedDict()
+        self._lock = threading.Lock()
+        self.throttled = {"user": 0, "channel": 0}
+
+    def weight(self, channel):
+        """Fair-share weight of a channel (1 unless configured)"""
+        return self.channel_weights.get(channel, 1.0)
+
+    def _tenant(self, scope, tenant_id, now):
+        key = (scope, tenant_id)
+        tenant = self._tenants.get(key)
+        if tenant is None:
+            per_minute, per_hour = self.limits[scope]
+            scale = self.weight(tenant_id) if scope == "channel" else 1.0
+            tenant = self._tenants[key] = Tenant(
+                TokenBucket(per_minute * scale / 60.0, per_minute * scale, now) if per_minute else None,
+                TokenBucket(per_hour * scale / 3600.0, per_hour * scale, now) if per_hour else None,
+            )
+            while len(self._tenants) > self.max_tenants:
+                self._tenants.popitem(last=False)
+        self._tenants.move_to_end(key)
+        return tenant
+
+    def admit(self, user, channel, tokens):
+        """Charge a question's estimated tokens, or refuse it if a quota is exhausted"""
+        now = self.clock()
+        with self._lock:
+            tenants = [(scope, self._tenant(scope, tenant_id, now))
+                       for scope, tenant_id in (("user", user), ("channel", channel)) if tenant_id]
+            for scope, tenant in tenants:
+                # A question larger than a whole window's allowance waits for a full bucket
+                waits = [bucket.delay(now, min(amount, bucket.burst))
+                         for bucket, amount in ((tenant.requests, 1), (tenant.tokens, tokens)) if bucket]
+                retry_after = max(waits, default=0.0)
+                if retry_after > 0:
+                    tenant.throttled += 1
+                    self.throttled[scope] += 1
+                    metrics.QUOTA_THROTTLED.labels(scope=scope).inc()
+                    metrics.TENANT_REQUESTS.labels(channel_type=channel_type(channel), outcome="throttled").inc()
+                    return Admission(user, channel, tokens, allowed=False, scope=scope, retry_after=retry_after)
+            for _, tenant in tenants:
+                if tenant.requests:
+                    tenant.requests.take(now)
+                if tenant.tokens:
+                    tenant.tokens.take(now, tokens)
+                tenant.admitted += 1
+        metrics.TENANT_REQUESTS.labels(channel_type=channel_type(channel), outcome="admitted").inc()
+        return Admission(user, channel, tokens)
+
+    def settle(self, admission, used_tokens):
+        """Record what an admitted question actually used, returning the unused estimate"""
+        if not admission.allowed:
+            return
+        now = self.clock()
+        unused = admission.tokens - used_tokens
+        with self._lock:
+            for scope, tenant_id in (("user", admission.user), ("channel", admission.channel)):
+                tenant = self._tenants.get((scope, tenant_id)) if tenant_id else None
+                if tenant is None:
+                    continue
+                tenant.used_tokens += used_tokens
+                if tenant.tokens and unused > 0:
+                    tenant.tokens.give_back(now, unused)
+                elif tenant.tokens and unused < 0:
+                    tenant.tokens.take(now, -unused)
+        metrics.TENANT_TOKENS.labels(channel_type=channel_type(admission.channel)).inc(used_tokens)
+
+    def clear(self):
+        with self._lock:
+            self._tenants.clear()
+
+    def _top(self, scope, count=None):
+        tenants = [(tenant_id, t) for (s, tenant_id), t in self._tenants.items() if s == scope]
+        tenants.sort(key=lambda item: item[1].used_tokens, reverse=True)
+        return [{"id": tenant_id, "tokens": t.used_tokens, "admitted": t.admitted, "throttled": t.throttled}
+                for tenant_id, t in tenants[:count]]
+
+    def usage(self):
+        """
+        Token and request totals of every user and channel still tracked,
+        heaviest first. Totals start again for a tenant forgotten beyond
+        `max_tenants`.
+        """
+        with self._lock:
+            return {"users": self._top("user"), "channels": self._top("channel")}
+
+    def stats(self, top=5):
+        """Limits, throttle counts and the heaviest users and channels for health endpoints"""
+        with self._lock:
+            return {
+                "user_limits": {"requests_per_minute": self.limits["user"][0],
+                                "tokens_per_hour": self.limits["user"][1]},
+                "channel_limits": {"requests_per_minute": self.limits["channel"][0],
+                                   "tokens_per_hour": self.limits["channel"][1]},
+                "priority_channels": len(self.channel_weights),
+                "tenants": len(self._tenants),
+                "throttled": dict(self.throttled),
+                "top_users": self._top("user", top),
+                "top_channels": self._top("channel", top),
+            }
@@ -0,0 +1,512 @@
+"""Retries, hedged requests and circuit breaking around LLM calls"""
+import asyncio
+import inspect
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import openai
+
+from ledger_bot import metrics
+
+# Errors worth another attempt: timeouts, dropped connections, 429s and 5xxs.
+# Anything else (bad request, auth) would fail the same way again.
+# asyncio.TimeoutError (raised by wait_for) only became TimeoutError in 3.11.
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+    TimeoutError,
+    asyncio.TimeoutError,
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+BREAKER_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a model whose circuit is open and has no fallback"""
+
+
+def is_retryable(error):
+    return isinstance(error, RETRYABLE_ERRORS)
+
+
+class RetryBudget:
+    """
+    Caps retries and hedges at `ratio` of the requests in the last `window`
+    seconds, plus `min_retries` so a quiet bot can still retry.
+
+    When LiteLLM is struggling every call fails at once; without a budget each
+    of them retries and the gateway sees several times its normal load.
+    """
+
+    def __init__(self, ratio=0.2, min_retries=3, window=10.0, clock=time.monotonic):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self.clock = clock
+        self._requests = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+        self.exhausted = 0
+
+    def _trim(self, now):
+        for events in (self._requests, self._retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def record_request(self):
+        with self._lock:
+            now = self.clock()
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_spend(self):
+        """Take one retry from the budget. Returns False if it's used up."""
+        with self._lock:
+            now = self.clock()
+            self._trim(now)
+            if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+                self.exhausted += 1
+                return False
+            self._retries.append(now)
+            return True
+
+    def stats(self):
+        with self._lock:
+            self._trim(self.clock())
+            return {
+                "requests": len(self._requests),
+                "retries": len(self._retries),
+                "ratio": self.ratio,
+                "exhausted": self.exhausted,
+            }
+
+
+class LatencyWindow:
+    """The most recent successful call latencies, for percentile estimates"""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class CircuitBreaker:
+    """
+    Opens when too many of the last `window` calls failed or breached the
+    latency SLO.
+
+    While open, calls are refused for `cooldown` seconds. Then a single probe
+    is let through (half-open): success closes the circuit, failure opens it
+    again.
+    """
+
+    def __init__(self, name, error_rate=0.5, latency_slo=30.0, slow_rate=0.5, window=20,
+                 min_calls=10, cooldown=30.0, on_change=None, clock=time.monotonic):
+        self.name = name
+        self.error_rate = error_rate
+        self.latency_slo = latency_slo
+        self.slow_rate = slow_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.on_change = on_change
+        self.clock = clock
+        self.state = CLOSED
+        self.trips = 0
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go to this model now"""
+        with self._lock:
+            if self.state == OPEN:
+                if self.clock() - self._opened_at < self.cooldown:
+                    return False
+                self._set_state(HALF_OPEN)
+                self._probing = False
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def record(self, ok, latency=None):
+        """Record the outcome of an allowed call"""
+        slow = latency is not None and latency > self.latency_slo
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+                if ok and not slow:
+                    self._outcomes.clear()
+                    self._set_state(CLOSED)
+                else:
+                    self._open()
+                return
+            self._outcomes.append((not ok, slow))
+            calls = len(self._outcomes)
+            if self.state == CLOSED and calls >= self.min_calls:
+                failures = sum(1 for failed, _ in self._outcomes if failed)
+                slows = sum(1 for _, was_slow in self._outcomes if was_slow)
+                if failures / calls >= self.error_rate or slows / calls >= self.slow_rate:
+                    self._open()
+
+    def _open(self):
+        self._opened_at = self.clock()
+        self._outcomes.clear()
+        self.trips += 1
+        self._set_state(OPEN)
+
+    def _set_state(self, state):
+        if state != self.state:
+            self.state = state
+            if self.on_change:
+                self.on_change(self.name, state)
+
+    def stats(self):
+        with self._lock:
+            calls = len(self._outcomes)
+            failures = sum(1 for failed, _ in self._outcomes if failed)
+            return {
+                "state": self.state,
+                "trips": self.trips,
+                "recent_calls": calls,
+                "error_rate": round(failures / calls, 3) if calls else 0.0,
+            }
+
+
+class PeekedStream:
+    """
+    A streamed completion whose first chunk was read during the attempt, so a
+    stream that opens but never produces anything counts as a failed attempt.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._iterator = iter(stream)
+        self._first = list(itertools.islice(self._iterator, 1))
+
+    def __iter__(self):
+        yield from self._first
+        yield from self._iterator
+
+    def close(self):
+        close = getattr(self.stream, "close", None)
+        if close:
+            close()
+
+
+class AsyncPeekedStream:
+    """PeekedStream for AsyncOpenAI streams; build with `await AsyncPeekedStream.open(stream)`"""
+
+    def __init__(self, stream, iterator, first):
+        self.stream = stream
+        self._iterator = iterator
+        self._first = first
+
+    @classmethod
+    async def open(cls, stream):
+        iterator = stream.__aiter__()
+        try:
+            first = [await iterator.__anext__()]
+        except StopAsyncIteration:
+            first = []
+        return cls(stream, iterator, first)
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for chunk in self._first:
+            yield chunk
+        async for chunk in self._iterator:
+            yield chunk
+
+    async def close(self):
+        close = getattr(self.stream, "close", None)
+        if close:
+            result = close()
+            if inspect.isawaitable(result):
+                await result
+
+
+def close_stream(result):
+    """`discard` callback for a losing hedged stream"""
+    close = getattr(result, "close", None)
+    return close() if close else None
+
+
+class ResilientLLM:
+    """
+    Runs LLM calls with per-attempt timeouts, jittered exponential backoff
+    within a shared RetryBudget, optional hedging and a circuit breaker per
+    model.
+
+    Callers pass `attempt(model, timeout)`, which makes one request and
+    returns its result. With hedging on, once a model has enough history a
+    second request is fired if the first hasn't finished by the
+    `hedge_quantile` latency; the first to succeed wins and `discard` is
+    called on the loser's result. When a model's circuit is open, calls go
+    to `fallback_model` instead.
+    """
+
+    def __init__(self, attempt_timeout=90.0, max_attempts=3, backoff_base=0.5, backoff_max=8.0,
+                 budget=None, hedge=False, hedge_quantile=0.95, hedge_min_delay=2.0,
+                 hedge_min_samples=20, hedge_workers=8, fallback_model=None,
+                 breaker_factory=CircuitBreaker, sleep=time.sleep, rng=random.random,
+                 clock=time.monotonic):
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.budget = budget or RetryBudget()
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.fallback_model = fallback_model or None
+        self.breaker_factory = breaker_factory
+        self.sleep = sleep
+        self.rng = rng
+        self.clock = clock
+        self.breakers = {}
+        self.latencies = {}
+        # Monotonic time of the last successful call, of the first failure
+        # since then (None while calls are succeeding) and of the latest one
+        self.last_success = None
+        self.failing_since = None
+        self.last_failure = None
+        self._lock = threading.Lock()
+        self._executor = (
+            ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix="llm-hedge") if hedge else None
+        )
+
+    def breaker(self, model):
+        with self._lock:
+            breaker = self.breakers.get(model)
+            if breaker is None:
+                breaker = self.breakers[model] = self.breaker_factory(model, on_change=self._breaker_changed)
+                metrics.LLM_BREAKER_STATE.labels(model=model).set(BREAKER_STATE_VALUES[CLOSED])
+            return breaker
+
+    def _breaker_changed(self, model, state):
+        metrics.LLM_BREAKER_STATE.labels(model=model).set(BREAKER_STATE_VALUES[state])
+        print(f"⚡ LLM circuit for {model} is now {state}")
+
+    def _latency_window(self, model):
+        with self._lock:
+            return self.latencies.setdefault(model, LatencyWindow())
+
+    def _pick_model(self, model):
+        """The model to call: the requested one, or the fallback while its circuit is open"""
+        if self.breaker(model).allow():
+            return model
+        fallback = self.fallback_model
+        if fallback and fallback != model and self.breaker(fallback).allow():
+            metrics.LLM_FALLBACKS.labels(model=model).inc()
+            print(f"↪️  Circuit open for {model}, falling back to {fallback}")
+            return fallback
+        raise CircuitOpenError(f"The model {model} is unavailable right now (circuit open)")
+
+    def backoff(self, retry):
+        """Full-jitter exponential backoff before retry number `retry` (0-based)"""
+        return self.rng() * min(self.backoff_max, self.backoff_base * (2 ** retry))
+
+    def hedge_delay(self, model):
+        """How long to wait before hedging, or None if hedging doesn't apply"""
+        if not self.hedge:
+            return None
+        window = self._latency_window(model)
+        if len(window) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, window.percentile(self.hedge_quantile))
+
+    def _should_retry(self, error, retry, model):
+        if retry >= self.max_attempts or not self.budget.try_spend():
+            return False
+        metrics.LLM_RETRIES.labels(model=model, error=type(error).__name__).inc()
+        return True
+
+    def call(self, attempt, model, discard=None):
+        """Run attempt(model, timeout) until one succeeds. Returns (result, model used)."""
+        self.budget.record_request()
+        retry = 0
+        while True:
+            used = self._pick_model(model)
+            breaker = self.breaker(used)
+            started = time.monotonic()
+            try:
+                result = self._hedged(attempt, used, discard)
+            except Exception as e:
+                if not is_retryable(e):
+                    # The model answered; the request itself was bad
+                    breaker.record(True)
+                    self._record_outcome(True)
+                    raise
+                breaker.record(False)
+                self._record_outcome(False)
+                retry += 1
+                if not self._should_retry(e, retry, used):
+                    raise
+                delay = self.backoff(retry - 1)
+                print(f"🔁 LLM call to {used} failed ({type(e).__name__}), retry {retry} in {delay:.1f}s")
+                self.sleep(delay)
+                continue
+            latency = time.monotonic() - started
+            breaker.record(True, latency)
+            self._record_outcome(True)
+            self._latency_window(used).add(latency)
+            return result, used
+
+    def _hedged(self, attempt, model, discard):
+        delay = self.hedge_delay(model)
+        if delay is None:
+            return attempt(model, self.attempt_timeout)
+        first = self._executor.submit(attempt, model, self.attempt_timeout)
+        done, _ = wait([first], timeout=delay)
+        if done or not self.budget.try_spend():
+            return first.result()
+        metrics.LLM_HEDGES.labels(result="fired").inc()
+        second = self._executor.submit(attempt, model, self.attempt_timeout)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winners = [f for f in done if f.exception() is None]
+            if not winners:
+                error = next(iter(done)).exception()
+                continue
+            winner = first if first in winners else winners[0]
+            if winner is second:
+                metrics.LLM_HEDGES.labels(result="won").inc()
+            for loser in [f for f in winners if f is not winner] + list(pending):
+                loser.add_done_callback(lambda f: self._discard(f, discard))
+            return winner.result()
+        raise error
+
+    @staticmethod
+    def _discard(future, discard):
+        if discard is None or future.exception() is not None:
+            return
+        try:
+            discard(future.result())
+        except Exception as e:
+            print(f"Error discarding hedged LLM response: {e}")
+
+    async def acall(self, attempt, model, discard=None):
+        """Async `call`: attempt(model, timeout) is a coroutine function"""
+        self.budget.record_request()
+        retry = 0
+        while True:
+            used = self._pick_model(model)
+            breaker = self.breaker(used)
+            started = time.monotonic()
+            try:
+                result = await self._ahedged(attempt, used, discard)
+            except Exception as e:
+                if not is_retryable(e):
+                    breaker.record(True)
+                    self._record_outcome(True)
+                    raise
+                breaker.record(False)
+                self._record_outcome(False)
+                retry += 1
+                if not self._should_retry(e, retry, used):
+                    raise
+                delay = self.backoff(retry - 1)
+                print(f"🔁 LLM call to {used} failed ({type(e).__name__}), retry {retry} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            latency = time.monotonic() - started
+            breaker.record(True, latency)
+            self._record_outcome(True)
+            self._latency_window(used).add(latency)
+            return result, used
+
+    async def _ahedged(self, attempt, model, discard):
+        delay = self.hedge_delay(model)
+        if delay is None:
+            return await asyncio.wait_for(attempt(model, self.attempt_timeout), self.attempt_timeout)
+        first = asyncio.ensure_future(asyncio.wait_for(attempt(model, self.attempt_timeout), self.attempt_timeout))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done or not self.budget.try_spend():
+            return await first
+        metrics.LLM_HEDGES.labels(result="fired").inc()
+        second = asyncio.ensure_future(asyncio.wait_for(attempt(model, self.attempt_timeout), self.attempt_timeout))
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winners = [t for t in done if not t.cancelled() and t.exception() is None]
+            if not winners:
+                error = next(iter(done)).exception()
+                continue
+            winner = first if first in winners else winners[0]
+            if winner is second:
+                metrics.LLM_HEDGES.labels(result="won").inc()
+            for task in pending:
+                task.cancel()
+            for loser in winners:
+                if loser is not winner and discard is not None:
+                    result = discard(loser.result())
+                    if inspect.isawaitable(result):
+                        await result
+            return winner.result()
+        raise error
+
+    def _record_outcome(self, ok):
+        now = self.clock()
+        if ok:
+            self.last_success = now
+            self.failing_since = None
+            return
+        if self.failing_since is None:
+            self.failing_since = now
+        self.last_failure = now
+
+    def healthy(self, window, now=None):
+        """
+        False once calls have failed for `window` seconds without a single
+        success, for as long as the latest failure is under `window` seconds
+        old. True before the first call, after any success, and once a
+        window passes with no failures: a pod taken out of rotation gets no
+        traffic, so it can't wait for a success to come back.
+        """
+        failing_since, last_failure = self.failing_since, self.last_failure
+        if not window or failing_since is None:
+            return True
+        now = self.clock() if now is None else now
+        return now - failing_since < window or now - last_failure >= window
+
+    def stats(self):
+        """Breaker states, retry budget and hedging settings for /ready"""
+        with self._lock:
+            breakers = dict(self.breakers)
+        return {
+            "breakers": {model: breaker.stats() for model, breaker in breakers.items()},
+            "fallback_model": self.fallback_model,
+            "retry_budget": self.budget.stats(),
+            "hedging": self.hedge,
+            "failing_for": None if self.failing_since is None else round(self.clock() - self.failing_since, 1),
+        }
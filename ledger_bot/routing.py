@@ -0,0 +1,162 @@
+"""Route questions between a fast and a strong model with a local classifier"""
+import re
+
+from ledger_bot.knowledge import tokenize
+
+WORD_RE = re.compile(r"[a-z0-9_]+")
+TRACE_RE = re.compile(r"```|Traceback|Exception\b|Error:|\bat [\w.$]+\(", re.IGNORECASE)
+
+# Questions about where to go or who to ask: a lookup, not reasoning
+SIMPLE_TERMS = frozenset("""
+who where which channel channels slack contact owner owns link url docs documentation team
+ask oncall on-call name stand
+""".split())
+# Debugging, comparing or explaining behaviour needs the stronger model
+COMPLEX_TERMS = frozenset("""
+why debug debugging error errors exception fails failing failed failure broken wrong
+mismatch mismatched unbalanced reversal reversals reconcile reconciliation investigate
+compare difference design implement migrate migration explain trace
+""".split())
+
+
+class Tier:
+    """A model and the max_tokens it answers with"""
+
+    def __init__(self, name, model, max_tokens):
+        self.name = name
+        self.model = model
+        self.max_tokens = max_tokens
+
+    def __repr__(self):
+        return f"Tier({self.name!r}, {self.model!r}, {self.max_tokens})"
+
+
+def parse_tiers(spec):
+    """
+    Tier table from "name=model:max_tokens,..." in order from fastest to
+    strongest, e.g. "fast=bedrock-claude-4.5-haiku:800,strong=bedrock-claude-4.5-sonnet:2000".
+    """
+    tiers = []
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+        name, _, rest = entry.partition("=")
+        model, _, max_tokens = rest.strip().rpartition(":")
+        if not name.strip() or not model or not max_tokens.strip().isdigit():
+            raise ValueError(f"Invalid model tier {entry.strip()!r}, expected name=model:max_tokens")
+        tiers.append(Tier(name.strip(), model, int(max_tokens)))
+    if not tiers:
+        raise ValueError("No model tiers configured")
+    return tiers
+
+
+def parse_channel_tiers(spec):
+    """{channel: tier name} from "C0123:strong,C0456:fast" """
+    overrides = {}
+    for entry in spec.split(","):
+        channel, _, tier = entry.strip().partition(":")
+        if channel and tier:
+            overrides[channel] = tier.strip()
+    return overrides
+
+
+class Route:
+    """A routing decision: the tier, how it was picked and the classifier score"""
+
+    def __init__(self, tier, source, score=0.0, reasons=()):
+        self.tier = tier
+        self.source = source
+        self.score = score
+        self.reasons = list(reasons)
+
+    def describe(self):
+        reasons = ", ".join(self.reasons) or "no signals"
+        return f"{self.tier.name} ({self.tier.model}) via {self.source}, score {self.score:g}: {reasons}"
+
+
+class QuestionRouter:
+    """
+    Picks a model tier per question.
+
+    A channel override wins. Otherwise the question is scored from cheap
+    features - length, code or stack traces, keyword lists and how many
+    knowledge base headings it touches - and sent to the strongest tier if
+    the score reaches `threshold`, else the fastest. Scoring is a handful of
+    set lookups, well under a millisecond.
+    """
+
+    def __init__(self, tiers, threshold=1.0, channel_tiers=None, headings=(),
+                 short_words=8, long_words=40):
+        self.tiers = {tier.name: tier for tier in tiers}
+        self.fast = tiers[0]
+        self.strong = tiers[-1]
+        self.threshold = threshold
+        self.channel_tiers = dict(channel_tiers or {})
+        unknown = set(self.channel_tiers.values()) - set(self.tiers)
+        if unknown:
+            raise ValueError(f"Channel overrides name unknown tier(s): {', '.join(sorted(unknown))}")
+        self.short_words = short_words
+        self.long_words = long_words
+        self._headings = []
+        self.update_headings(headings)
+
+    def update_headings(self, titles):
+        """Index knowledge base section titles (call again after a reload)"""
+        headings = [set(tokenize(title)) for title in titles]
+        self._headings = [terms for terms in headings if terms]
+
+    def classify(self, question):
+        """(score, reasons): higher scores need a stronger model"""
+        text = question or ""
+        words = WORD_RE.findall(text.lower())
+        score = 0.0
+        reasons = []
+
+        if len(words) >= self.long_words:
+            score += 2
+            reasons.append(f"long ({len(words)} words)")
+        elif len(words) <= self.short_words:
+            score -= 1
+            reasons.append(f"short ({len(words)} words)")
+
+        if TRACE_RE.search(text) or text.count("\n") >= 3:
+            score += 3
+            reasons.append("code or stack trace")
+
+        vocabulary = set(words)
+        complex_hits = sorted(vocabulary & COMPLEX_TERMS)
+        if complex_hits:
+            score += min(len(complex_hits), 3)
+            reasons.append("complex: " + " ".join(complex_hits))
+        simple_hits = sorted(vocabulary & SIMPLE_TERMS)
+        if simple_hits:
+            score -= min(len(simple_hits), 2)
+            reasons.append("simple: " + " ".join(simple_hits))
+
+        terms = set(tokenize(text))
+        matched = sum(1 for heading in self._headings if heading & terms)
+        if matched >= 4:
+            score += 1
+            reasons.append(f"spans {matched} sections")
+        elif matched:
+            score -= 0.5
+            reasons.append(f"matches {matched} section(s)")
+
+        return score, reasons
+
+    def route(self, question, channel=None):
+        """Route for a question asked in a channel"""
+        override = self.channel_tiers.get(channel)
+        if override is not None:
+            return Route(self.tiers[override], "channel")
+        score, reasons = self.classify(question)
+        tier = self.strong if score >= self.threshold else self.fast
+        return Route(tier, "classifier", score, reasons)
+
+    def stats(self):
+        """Tier table and thresholds for health endpoints"""
+        return {
+            "tiers": {name: tier.model for name, tier in self.tiers.items()},
+            "threshold": self.threshold,
+            "channel_overrides": len(self.channel_tiers),
+        }
@@ -0,0 +1,88 @@
+"""Coalesce identical in-flight questions into a single LLM call"""
+import threading
+
+
+class Call:
+    """An in-flight LLM call that later requesters can wait on"""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+    def wait(self, timeout=None):
+        """Block until the leader finishes. Returns False on timeout."""
+        return self._done.wait(timeout)
+
+
+class SingleFlight:
+    """
+    Tracks in-flight calls by key.
+
+    The first requester for a key becomes the leader and makes the call;
+    anyone asking for the same key before it finishes becomes a follower
+    and waits (up to `wait_timeout`) for the leader's result instead of
+    making their own call.
+    """
+
+    def __init__(self, wait_timeout=30.0):
+        self.wait_timeout = wait_timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.saved_calls = 0
+        self.timeouts = 0
+        self.leader_failures = 0
+
+    def begin(self, key):
+        """Return (call, is_leader) for key"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                return call, False
+            call = Call()
+            self._calls[key] = call
+            self.leaders += 1
+            return call, True
+
+    def finish(self, key, call, result=None, error=None):
+        """Publish the leader's result and release followers"""
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.result = result
+        call.error = error
+        call._done.set()
+
+    def wait(self, call, timeout=None):
+        """
+        Follower side: the leader's result, or None if the leader failed or
+        didn't finish in time (the follower should then make its own call).
+        """
+        finished = call.wait(self.wait_timeout if timeout is None else timeout)
+        with self._lock:
+            if not finished:
+                self.timeouts += 1
+                return None
+            if call.error is not None or call.result is None:
+                self.leader_failures += 1
+                return None
+            self.saved_calls += 1
+            return call.result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        """Coalescing counters for health/metrics endpoints"""
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "leaders": self.leaders,
+                "saved_calls": self.saved_calls,
+                "timeouts": self.timeouts,
+                "leader_failures": self.leader_failures,
+            }
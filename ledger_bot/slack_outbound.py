@@ -0,0 +1,378 @@
+"""Rate-limited outbound queue for Slack chat.postMessage/chat.update calls"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from ledger_bot import metrics
+
+# Slack Web API methods sent through the scheduler
+SCHEDULED_METHODS = ("chat_postMessage", "chat_update")
+
+# Requests per minute per workspace. chat.update is Tier 3 (50+/min);
+# chat.postMessage is limited mainly per channel (about 1/s).
+DEFAULT_METHOD_LIMITS = {"chat_postMessage": 300, "chat_update": 50}
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`"""
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now, amount=1):
+        """Seconds until `amount` tokens are available (0 if they are now)"""
+        self._refill(now)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, now, amount=1):
+        self._refill(now)
+        self.tokens -= amount
+
+    def give_back(self, now, amount):
+        """Return unused tokens, never above `burst`"""
+        self._refill(now)
+        self.tokens = min(self.burst, self.tokens + amount)
+
+
+def retry_after(error):
+    """Seconds to wait from a rate-limited (429) SlackApiError, or None for other errors"""
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) != 429:
+        return None
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def call_method(client, method, kwargs):
+    return getattr(client, method)(**kwargs)
+
+
+class OutboundRequest:
+    """A queued Slack call and the future(s) waiting on it"""
+
+    def __init__(self, client, method, kwargs, runner, enqueued_at, partial=False):
+        self.client = client
+        self.method = method
+        self.kwargs = kwargs
+        self.runner = runner
+        self.enqueued_at = enqueued_at
+        self.channel = kwargs.get("channel")
+        # Only edits to the same message can replace each other
+        self.merge_key = (self.channel, kwargs.get("ts")) if method == "chat_update" else None
+        self.futures = [Future()]
+        self.attempts = 0
+        # A streaming edit the final answer will replace anyway
+        self.partial = partial
+
+
+class SlackScheduler:
+    """
+    Sends chat.postMessage/chat.update calls from a single queue.
+
+    A request is sent once both its method's token bucket (requests per
+    minute, bursting up to 10 seconds' worth) and its channel's bucket have a
+    token; requests for other channels don't wait behind a busy one. A
+    chat.update for a message that already has an update queued replaces that
+    update's text, since only the latest matters. A 429 pauses the method for
+    its Retry-After and re-queues the request, up to `max_retries` times.
+
+    Partial (streaming) edits rank below everything else: they are only sent
+    while `partial_reserve` tokens would be left in both buckets for posts
+    and final edits, are dropped at submit when the buckets are already that
+    low, and `partial_interval` spreads what's spare across the messages
+    currently streaming.
+    """
+
+    def __init__(self, method_limits=None, channel_rate=1.0, channel_burst=4, senders=4,
+                 max_retries=3, max_channels=1000, partial_reserve=2, stream_window=10.0,
+                 clock=time.monotonic):
+        self.clock = clock
+        now = clock()
+        limits = dict(DEFAULT_METHOD_LIMITS, **(method_limits or {}))
+        self._method_buckets = {
+            method: TokenBucket(per_minute / 60.0, max(1.0, per_minute / 6.0), now)
+            for method, per_minute in limits.items()
+        }
+        self.channel_rate = channel_rate
+        self.channel_burst = channel_burst
+        self.max_retries = max_retries
+        self.max_channels = max_channels
+        self.partial_reserve = partial_reserve
+        self.stream_window = stream_window
+        self._channel_buckets = OrderedDict()
+        # Messages with a partial edit in the last `stream_window` seconds
+        self._streams = OrderedDict()
+        self._paused_until = {}
+        self._queue = deque()
+        self._pending_updates = {}
+        self._in_flight = set()
+        self._cond = threading.Condition()
+        self._senders = senders
+        self._executor = None
+        self._thread = None
+        self._stopped = False
+        self.sent = 0
+        self.merged = 0
+        self.dropped = 0
+        self.rate_limited = 0
+        self.failed = 0
+
+    def submit(self, client, method, kwargs, runner=call_method, partial=False):
+        """
+        Queue a call. Returns a Future for its Slack response, or None for a
+        partial edit dropped because the rate limits have nothing to spare.
+        """
+        with self._cond:
+            self._start()
+            now = self.clock()
+            request = OutboundRequest(client, method, kwargs, runner, now, partial=partial)
+            if request.merge_key:
+                self._track_stream(request, now)
+            pending = self._pending_updates.get(request.merge_key) if request.merge_key else None
+            if pending is not None:
+                # Superseded: the queued edit now sends this text instead
+                pending.kwargs = kwargs
+                pending.partial = pending.partial and partial
+                self.merged += 1
+                metrics.SLACK_MERGED_UPDATES.inc()
+                self._cond.notify()
+                return pending.futures[0]
+            if partial and self._delay(request, now) > 0:
+                self.dropped += 1
+                metrics.SLACK_DROPPED_UPDATES.inc()
+                return None
+            if request.merge_key:
+                self._pending_updates[request.merge_key] = request
+            self._queue.append(request)
+            self._cond.notify()
+            return request.futures[0]
+
+    def _track_stream(self, request, now):
+        self._streams.pop(request.merge_key, None)
+        if request.partial:
+            self._streams[request.merge_key] = now
+        while self._streams and next(iter(self._streams.values())) < now - self.stream_window:
+            self._streams.popitem(last=False)
+
+    def partial_interval(self, method="chat_update"):
+        """Seconds between partial edits per message so streams together stay within `method`'s rate"""
+        bucket = self._method_buckets.get(method)
+        with self._cond:
+            streams = len(self._streams)
+        if bucket is None or not streams:
+            return 0.0
+        return streams / bucket.rate
+
+    def _start(self):
+        if self._thread is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._senders, thread_name_prefix="slack-send")
+            self._thread = threading.Thread(target=self._run, name="slack-scheduler", daemon=True)
+            self._thread.start()
+
+    def _channel_bucket(self, channel, now):
+        bucket = self._channel_buckets.get(channel)
+        if bucket is None:
+            bucket = self._channel_buckets[channel] = TokenBucket(self.channel_rate, self.channel_burst, now)
+            while len(self._channel_buckets) > self.max_channels:
+                self._channel_buckets.popitem(last=False)
+        self._channel_buckets.move_to_end(channel)
+        return bucket
+
+    def _delay(self, request, now):
+        """Seconds until `request` may be sent; partial edits also wait for the reserve"""
+        bucket = self._method_buckets.get(request.method)
+        channel_bucket = self._channel_bucket(request.channel, now)
+        if request.partial:
+            return max(
+                self._paused_until.get(request.method, 0.0) - now,
+                bucket.delay(now, min(bucket.burst, 1 + self.partial_reserve)) if bucket else 0.0,
+                channel_bucket.delay(now, min(channel_bucket.burst, 1 + self.partial_reserve)),
+            )
+        return max(
+            self._paused_until.get(request.method, 0.0) - now,
+            bucket.delay(now) if bucket else 0.0,
+            channel_bucket.delay(now),
+        )
+
+    def _next_ready(self, now):
+        """
+        (request, None) for the oldest sendable request, preferring anything
+        over partial edits, else (None, seconds to wait)
+        """
+        soonest = None
+        partial = None
+        for request in self._queue:
+            if request.merge_key in self._in_flight:
+                continue
+            delay = self._delay(request, now)
+            if delay <= 0:
+                if not request.partial:
+                    return request, None
+                partial = partial or request
+                continue
+            soonest = delay if soonest is None else min(soonest, delay)
+        if partial is not None:
+            return partial, None
+        return None, soonest
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    now = self.clock()
+                    request, wait = self._next_ready(now)
+                    if request is not None:
+                        break
+                    self._cond.wait(wait)
+                self._queue.remove(request)
+                if request.merge_key:
+                    self._pending_updates.pop(request.merge_key, None)
+                    self._in_flight.add(request.merge_key)
+                if request.method in self._method_buckets:
+                    self._method_buckets[request.method].take(now)
+                self._channel_bucket(request.channel, now).take(now)
+            metrics.SLACK_QUEUE_WAIT.labels(method=request.method).observe(now - request.enqueued_at)
+            self._executor.submit(self._send, request)
+
+    def _send(self, request):
+        try:
+            result = request.runner(request.client, request.method, request.kwargs)
+        except Exception as e:
+            delay = retry_after(e)
+            if delay is not None and request.attempts < self.max_retries:
+                self._requeue(request, delay)
+                return
+            self._finish(request, error=e)
+            return
+        self._finish(request, result=result)
+
+    def _requeue(self, request, delay):
+        self.rate_limited += 1
+        metrics.SLACK_RATE_LIMITED.labels(method=request.method).inc()
+        print(f"⏳ Slack rate limited {request.method}, retrying in {delay:.1f}s")
+        with self._cond:
+            now = self.clock()
+            self._paused_until[request.method] = max(self._paused_until.get(request.method, 0.0), now + delay)
+            request.attempts += 1
+            if request.merge_key:
+                self._in_flight.discard(request.merge_key)
+                newer = self._pending_updates.get(request.merge_key)
+                if newer is not None:
+                    # A newer edit was queued meanwhile; it answers both
+                    newer.futures.extend(request.futures)
+                    self._cond.notify()
+                    return
+                self._pending_updates[request.merge_key] = request
+            self._queue.appendleft(request)
+            self._cond.notify()
+
+    def _finish(self, request, result=None, error=None):
+        with self._cond:
+            if request.merge_key:
+                self._in_flight.discard(request.merge_key)
+            if error is None:
+                self.sent += 1
+            else:
+                self.failed += 1
+            self._cond.notify()
+        for future in request.futures:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._queue)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def stats(self):
+        """Queue and rate limit counters for health/metrics endpoints"""
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "in_flight": len(self._in_flight),
+                "sent": self.sent,
+                "merged_updates": self.merged,
+                "dropped_updates": self.dropped,
+                "rate_limited": self.rate_limited,
+                "failed": self.failed,
+            }
+
+
+class ScheduledSlackClient:
+    """
+    Wraps a Slack WebClient so chat_postMessage/chat_update go through a
+    SlackScheduler. Calls still block until Slack responds; `submit` queues a
+    call without waiting, for edits that a later one may supersede.
+    """
+
+    def __init__(self, client, scheduler):
+        self._client = client
+        self._scheduler = scheduler
+
+    def submit(self, method, partial=False, **kwargs):
+        return self._scheduler.submit(self._client, method, kwargs, partial=partial)
+
+    def partial_interval(self):
+        return self._scheduler.partial_interval()
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name not in SCHEDULED_METHODS:
+            return attr
+
+        def scheduled(**kwargs):
+            return self.submit(name, **kwargs).result()
+        return scheduled
+
+
+class AsyncScheduledSlackClient(ScheduledSlackClient):
+    """ScheduledSlackClient for Bolt's AsyncWebClient; calls run on the caller's event loop"""
+
+    def __init__(self, client, scheduler, loop=None):
+        super().__init__(client, scheduler)
+        self._loop = loop or asyncio.get_running_loop()
+
+    def submit(self, method, partial=False, **kwargs):
+        return self._scheduler.submit(self._client, method, kwargs, runner=self._run_on_loop, partial=partial)
+
+    def _run_on_loop(self, client, method, kwargs):
+        return asyncio.run_coroutine_threadsafe(getattr(client, method)(**kwargs), self._loop).result()
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name not in SCHEDULED_METHODS:
+            return attr
+
+        async def scheduled(**kwargs):
+            return await asyncio.wrap_future(self.submit(name, **kwargs))
+        return scheduled
+
+
+def unscheduled(client):
+    """The client a ScheduledSlackClient wraps, for calls that must not wait in the queue"""
+    return client._client if isinstance(client, ScheduledSlackClient) else client
@@ -0,0 +1,100 @@
+"""Startup phases with timing, and lazily constructed clients"""
+import threading
+import time
+from contextlib import contextmanager
+
+from ledger_bot import metrics
+
+
+class Startup:
+    """
+    Named startup phases and how long each took.
+
+    Phases are exported as they finish and logged together once the bot is
+    ready, so a slow pod start shows which step (imports, knowledge base,
+    Slack auth, Socket Mode connect) it spent its time in. Phases that run
+    after that, such as a client first built by a request, are logged as
+    they happen.
+    """
+
+    def __init__(self, clock=time.perf_counter, started=None):
+        self.clock = clock
+        self.started = clock() if started is None else started
+        self.phases = []
+        self.ready_after = None
+
+    def record(self, name, seconds):
+        self.phases.append((name, seconds))
+        metrics.STARTUP_PHASE_SECONDS.labels(phase=name).set(seconds)
+        if self.ready_after is not None:
+            print(f"⏱️  Built {name} after startup in {seconds * 1000:.0f}ms")
+
+    @contextmanager
+    def phase(self, name):
+        """Time the body of a with-block as one phase"""
+        started = self.clock()
+        try:
+            yield
+        finally:
+            self.record(name, self.clock() - started)
+
+    def ready(self):
+        """Mark startup finished; returns seconds since `started`"""
+        self.ready_after = self.clock() - self.started
+        metrics.STARTUP_SECONDS.set(self.ready_after)
+        phases = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.phases)
+        print(f"🚀 Ready {self.ready_after * 1000:.0f}ms after start ({phases or 'no phases'})")
+        return self.ready_after
+
+    def stats(self):
+        return {
+            "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in self.phases},
+            "ready_ms": None if self.ready_after is None else round(self.ready_after * 1000, 1),
+        }
+
+
+class Lazy:
+    """
+    Stand-in for an object built on first use.
+
+    Attribute access builds the object with `factory()` (once, even if
+    several threads get there together) inside a startup phase, then
+    delegates to it. Importing app.py therefore needs no tokens and makes
+    no network calls; `start` builds everything in order before Slack
+    events arrive.
+    """
+
+    def __init__(self, factory, name, startup=None):
+        self._factory = factory
+        self._name = name
+        self._startup = startup
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def _resolve(self):
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    if self._startup is not None:
+                        with self._startup.phase(self._name):
+                            self._instance = self._factory()
+                    else:
+                        self._instance = self._factory()
+        return self._instance
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __repr__(self):
+        state = "built" if self._instance is not None else "not built"
+        return f"Lazy({self._name!r}, {state})"
+
+
+def resolve(obj):
+    """The real object behind a Lazy (building it if needed); other objects as is"""
+    return obj._resolve() if isinstance(obj, Lazy) else obj
+
+
+def is_built(obj):
+    """False for a Lazy that hasn't been built yet"""
+    return not isinstance(obj, Lazy) or obj._instance is not None
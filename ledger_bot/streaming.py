@@ -0,0 +1,125 @@
+"""Stream partial LLM output into a Slack message without tripping rate limits"""
+import time
+
+from ledger_bot.slack_outbound import ScheduledSlackClient, retry_after
+
+# Shown after the partial answer while tokens are still arriving
+TYPING_INDICATOR = " :writing_hand:"
+
+
+class ThrottledMessageUpdater:
+    """
+    Accumulates streamed text and pushes it to a Slack message via chat_update.
+
+    Edits are coalesced: a new chat_update is only sent once both
+    `min_interval` seconds have passed since the last edit and at least
+    `min_chars` new characters have arrived. The first visible text is
+    pushed as soon as `first_chars` characters are available so users see
+    something quickly. Through the outbound queue, edits are partial: the
+    interval stretches to the queue's `partial_interval` when several
+    messages stream at once, and an edit the queue drops waits for the next.
+    """
+
+    def __init__(self, client, channel, ts, min_interval=1.0, min_chars=200,
+                 first_chars=40, max_length=None, clock=time.monotonic):
+        self.client = client
+        self.channel = channel
+        self.ts = ts
+        self.min_interval = min_interval
+        self.min_chars = min_chars
+        self.first_chars = first_chars
+        self.max_length = max_length
+        self.clock = clock
+
+        self.text = ""
+        self.updates_sent = 0
+        self.first_update_at = None
+        self._pushed_length = 0
+        self._last_push = None
+        # No partial edits before this (set from a 429's Retry-After)
+        self._retry_at = None
+
+    def append(self, delta):
+        """Add streamed text and push an edit if the budget allows"""
+        if not delta:
+            return
+        self.text += delta
+        if self._should_push():
+            self._push(self._partial_text())
+
+    def finish(self, final_text):
+        """Replace the message with the final answer"""
+        self.text = final_text
+        self.client.chat_update(channel=self.channel, ts=self.ts, text=final_text)
+        self._mark_pushed()
+
+    def _should_push(self):
+        if self._retry_at is not None and self.clock() < self._retry_at:
+            return False
+        pending = len(self.text) - self._pushed_length
+        if self._last_push is None:
+            return pending >= self.first_chars
+        if self.max_length and self._pushed_length >= self.max_length:
+            # Already showing as much as the message can hold
+            return False
+        return (pending >= self.min_chars
+                and self.clock() - self._last_push >= self._interval())
+
+    def _interval(self):
+        if isinstance(self.client, ScheduledSlackClient):
+            return max(self.min_interval, self.client.partial_interval())
+        return self.min_interval
+
+    def _partial_text(self):
+        text = self.text
+        if self.max_length and len(text) > self.max_length:
+            text = text[:self.max_length]
+        return text + TYPING_INDICATOR
+
+    def _push(self, text):
+        try:
+            if isinstance(self.client, ScheduledSlackClient):
+                if not self._submit(text):
+                    self._mark_pushed(sent=False)
+                    return
+            else:
+                self.client.chat_update(channel=self.channel, ts=self.ts, text=text)
+        except Exception as e:
+            # A failed intermediate edit shouldn't abort the answer
+            self._push_failed(e)
+            return
+        self._mark_pushed()
+
+    def _push_failed(self, error):
+        """Wait out the interval, or a 429's Retry-After, instead of retrying on the next delta"""
+        print(f"Error updating streamed message: {error}")
+        self._mark_pushed(sent=False)
+        delay = retry_after(error)
+        if delay is not None:
+            self._retry_at = self.clock() + delay
+
+    def _submit(self, text):
+        # Queued without waiting: if Slack is rate limiting us, the next
+        # edit (or the final answer) replaces this one before it's sent.
+        # False if the queue had no spare capacity and dropped it.
+        future = self.client.submit("chat_update", partial=True, channel=self.channel, ts=self.ts, text=text)
+        if future is None:
+            return False
+        future.add_done_callback(log_failed_update)
+        return True
+
+    def _mark_pushed(self, sent=True):
+        now = self.clock()
+        self._last_push = now
+        if not sent:
+            # Try again after the interval rather than on the next delta
+            return
+        if self.first_update_at is None:
+            self.first_update_at = now
+        self._pushed_length = len(self.text)
+        self.updates_sent += 1
+
+
+def log_failed_update(future):
+    if future.exception() is not None:
+        print(f"Error updating streamed message: {future.exception()}")
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Offline load test for Ledger Bot.
+
+Starts a fake LiteLLM and a fake Slack Web API on localhost, points the bot
+at them and injects app_mention/message events into its handlers at a target
+rate. Reports throughput, answer latency percentiles, Slack calls per answer
+and the process's memory high-water mark. No network access or real tokens
+are needed; bot settings (WORKER_POOL_SIZE, STREAM_*, SLACK_* ...) are read
+from the environment as usual.
+
+    python load_test.py --rate 5 --duration 60
+    python load_test.py --cassette cassette.jsonl --time-scale 0.5
+    WORKER_POOL_SIZE=16 python load_test.py --rate 20 --llm-first-token lognormal:1.5,0.6 --json
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import math
+import os
+import random
+import re
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ledger_bot.cassette import Cassette
+from ledger_bot.fakes import FakeLiteLLM, FakeSlack
+from ledger_bot.streaming import TYPING_INDICATOR
+
+QUESTIONS = [
+    "How do I publish a journal entry to the GL?",
+    "Why is my journal entry unbalanced?",
+    "Who owns the GL Publisher?",
+    "How are reversals published?",
+    "What does the accounting period close do to late entries?",
+    "Which Slack channel should I ask about ledger incidents in?",
+    "How do I reconcile the subledger with Oracle?",
+    "What happens when a publish request fails validation?",
+    "How do I add a new account to the chart of accounts mapping?",
+    "Why was my entry posted to the suspense account?",
+    "How do I replay a failed batch?",
+    "What is the difference between the posting date and the effective date?",
+]
+
+BOT_USER_ID = "U0FAKEBOT"
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a list of numbers (None if empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(p / 100.0 * len(ordered)), 1)
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def peak_rss_mb():
+    """Process memory high-water mark in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+class InjectedEvent:
+    """An event sent to a handler and what the fake Slack saw in reply"""
+
+    def __init__(self, kind, event, key):
+        self.kind = kind
+        self.event = event
+        self.key = key
+        self.sent_at = None
+        self.done_at = None
+        self.outcome = None
+        self.slack_calls = 0
+
+    @property
+    def latency(self):
+        return self.done_at - self.sent_at
+
+
+def template_re(template):
+    """Regex matching any str.format of template"""
+    return re.compile(".*?".join(re.escape(part) for part in re.split(r"\{[^}]*\}", template)), re.DOTALL)
+
+
+class ReplyTracker:
+    """
+    Matches fake Slack calls to the events they answer.
+
+    A thread is identified by (channel, thread_ts); events in the same thread
+    are matched in the order they were sent. A placeholder post links the
+    message ts to its event; the first post that isn't the placeholder, or
+    the first edit of the placeholder without the typing indicator,
+    completes it. Busy and quota (`throttled_message`, a format template)
+    replies are counted as shed and throttled rather than cached answers.
+    """
+
+    def __init__(self, thinking_message, busy_message, throttled_message=None):
+        self.thinking_message = thinking_message
+        self.busy_message = busy_message
+        self.throttled_re = template_re(throttled_message) if throttled_message else None
+        self._by_thread = {}
+        self._by_message = {}
+        self._lock = threading.Condition()
+        self.outstanding = 0
+
+    def expect(self, injected):
+        with self._lock:
+            self._by_thread.setdefault(injected.key, []).append(injected)
+            self.outstanding += 1
+
+    def on_call(self, call):
+        channel = call.payload.get("channel")
+        with self._lock:
+            if call.method == "chat.postMessage":
+                waiting = self._by_thread.get((channel, call.payload.get("thread_ts")))
+                if not waiting:
+                    return
+                injected = waiting.pop(0)
+                injected.slack_calls += 1
+                if call.text == self.thinking_message:
+                    self._by_message[(channel, call.ts)] = injected
+                    return
+                self._finish(injected, self._reply_outcome(call.text), call.at)
+            elif call.method == "chat.update":
+                injected = self._by_message.get((channel, call.ts))
+                if injected is None or injected.outcome is not None:
+                    return
+                injected.slack_calls += 1
+                if call.text.endswith(TYPING_INDICATOR):
+                    return
+                self._finish(injected, "error" if call.text.startswith("❌") else "answered", call.at)
+
+    def _reply_outcome(self, text):
+        if text == self.busy_message:
+            return "shed"
+        if self.throttled_re is not None and self.throttled_re.fullmatch(text or ""):
+            return "throttled"
+        return "cached"
+
+    def _finish(self, injected, outcome, at):
+        injected.outcome = outcome
+        injected.done_at = at
+        self.outstanding -= 1
+        self._lock.notify_all()
+
+    def wait(self, timeout):
+        """Wait for outstanding answers; True if none are left"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while self.outstanding:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+            return True
+
+
+def make_events(count, questions, dm_fraction=0.3, repeat_fraction=0.2, channels=10, users=50, seed=None):
+    """InjectedEvents for `count` questions, mixing channel mentions and DMs"""
+    rng = random.Random(seed)
+    base = int(time.time())
+    events = []
+    for i in range(count):
+        question = rng.choice(questions)
+        if rng.random() >= repeat_fraction:
+            # Unique wording: a miss for the response cache and coalescing
+            question = f"{question} (ticket {i})"
+        ts = f"{base}.{i:06d}"
+        user = f"U{rng.randrange(users):08d}"
+        if rng.random() < dm_fraction:
+            # One DM channel per event so replies can be told apart
+            channel = f"D{i:08d}"
+            event = {"type": "message", "channel_type": "im", "channel": channel, "user": user,
+                     "text": question, "ts": ts}
+            events.append(InjectedEvent("message", event, (channel, None)))
+        else:
+            channel = f"C{rng.randrange(channels):08d}"
+            event = {"type": "app_mention", "channel": channel, "user": user,
+                     "text": f"<@{BOT_USER_ID}> {question}", "ts": ts}
+            events.append(InjectedEvent("app_mention", event, (channel, ts)))
+    return events
+
+
+def cassette_events(cassette, arrival_scale=1.0):
+    """(InjectedEvents, offsets) for the events recorded in a cassette"""
+    recorded = cassette.events()
+    first = recorded[0]["at"] if recorded else 0.0
+    events, offsets = [], []
+    for entry in recorded:
+        event = entry["event"]
+        if event.get("type") == "app_mention":
+            key = (event["channel"], event.get("thread_ts") or event["ts"])
+            events.append(InjectedEvent("app_mention", event, key))
+        else:
+            events.append(InjectedEvent("message", event, (event["channel"], event.get("thread_ts"))))
+        offsets.append((entry["at"] - first) * arrival_scale)
+    return events, offsets
+
+
+def arrival_offsets(count, rate, poisson=True, seed=None):
+    """Seconds after start at which to send each of `count` events"""
+    rng = random.Random(seed)
+    offsets = []
+    at = 0.0
+    for _ in range(count):
+        offsets.append(at)
+        at += rng.expovariate(rate) if poisson else 1.0 / rate
+    return offsets
+
+
+def run_load(bot, client, slack, events, offsets, drain=60.0, listener_threads=10, llm=None):
+    """
+    Send events to bot.handle_mention/handle_message at their offsets and
+    wait up to `drain` seconds after the last one for answers. Handlers run
+    on a pool of `listener_threads`, like Bolt's listener executor.
+
+    Returns the report dict.
+    """
+    tracker = ReplyTracker(bot.THINKING_MESSAGE, bot.BUSY_MESSAGE, bot.THROTTLED_MESSAGE)
+    slack.listeners.append(tracker.on_call)
+    handlers = {"app_mention": bot.handle_mention, "message": bot.handle_message}
+    rss_before = peak_rss_mb()
+    calls_before = len(slack.calls)
+    listeners = ThreadPoolExecutor(max_workers=listener_threads, thread_name_prefix="load-listener")
+
+    def deliver(injected):
+        try:
+            handlers[injected.kind](event=injected.event, say=None, client=client)
+        except Exception as e:
+            print(f"Error in {injected.kind} handler: {e}")
+
+    started = time.monotonic()
+    try:
+        for injected, offset in zip(events, offsets):
+            delay = started + offset - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            tracker.expect(injected)
+            injected.sent_at = time.monotonic()
+            listeners.submit(deliver, injected)
+        sent_for = time.monotonic() - started
+        drained = tracker.wait(drain)
+    finally:
+        listeners.shutdown(wait=False)
+        slack.listeners.remove(tracker.on_call)
+    elapsed = time.monotonic() - started
+
+    return build_report(bot, events, slack, llm, elapsed, sent_for, drained, rss_before,
+                        len(slack.calls) - calls_before)
+
+
+def build_report(bot, events, slack, llm, elapsed, sent_for, drained, rss_before, slack_calls):
+    finished = [e for e in events if e.outcome is not None]
+    outcomes = {}
+    for injected in finished:
+        outcomes[injected.outcome] = outcomes.get(injected.outcome, 0) + 1
+    # Shed, throttled and failed questions got a reply but not an answer
+    replied = [e for e in finished if e.outcome in ("answered", "cached")]
+    latencies = [e.latency for e in replied]
+    latency = {
+        name: percentile(latencies, p)
+        for name, p in (("p50", 50), ("p95", 95), ("p99", 99))
+    }
+    latency["max"] = max(latencies) if latencies else None
+    report = {
+        "events": len(events),
+        "offered_rate": len(events) / sent_for if sent_for else None,
+        "elapsed_seconds": elapsed,
+        "throughput_per_second": len(replied) / elapsed if elapsed else None,
+        "outcomes": outcomes,
+        "unanswered": len(events) - len(finished),
+        "drained": drained,
+        "latency_seconds": latency,
+        "slack_calls": slack_calls,
+        "slack_calls_per_answer": slack_calls / len(finished) if finished else None,
+        "slack_rate_limited": slack.rate_limited,
+        "memory_mb": {"peak_before": rss_before, "peak": peak_rss_mb()},
+        "bot": {
+            "dispatch": bot.dispatcher.stats(),
+            "cache": bot.response_cache.stats(),
+            "llm": bot.llm_caller.stats(),
+            "slack_outbound": bot.slack_scheduler.stats(),
+        },
+    }
+    if llm is not None:
+        report["fake_llm"] = llm.stats()
+    return report
+
+
+def format_seconds(value):
+    return "-" if value is None else f"{value:.2f}s"
+
+
+def format_report(report):
+    latency = report["latency_seconds"]
+    outcomes = ", ".join(f"{name} {count}" for name, count in sorted(report["outcomes"].items())) or "none"
+    lines = [
+        "📊 Load test report",
+        f"   Events:          {report['events']} at {report['offered_rate'] or 0:.2f}/s offered",
+        f"   Outcomes:        {outcomes}, unanswered {report['unanswered']}",
+        f"   Throughput:      {report['throughput_per_second'] or 0:.2f} answers/s over {report['elapsed_seconds']:.1f}s",
+        f"   Latency:         p50 {format_seconds(latency['p50'])}, p95 {format_seconds(latency['p95'])}, "
+        f"p99 {format_seconds(latency['p99'])}, max {format_seconds(latency['max'])}",
+        f"   Slack calls:     {report['slack_calls']} "
+        f"({report['slack_calls_per_answer'] or 0:.1f} per answer, {report['slack_rate_limited']} rate limited)",
+        f"   Memory peak:     {report['memory_mb']['peak']:.0f} MB "
+        f"(was {report['memory_mb']['peak_before']:.0f} MB before load)",
+    ]
+    if "replay" in report:
+        matches = report["replay"]["matches"]
+        lines.append(f"   Replayed LLM:    {report['replay']['recordings']} recordings, matched by request "
+                     f"{matches['key']}, question {matches['question']}, order {matches['order']}, "
+                     f"reused {matches['reused']}x")
+    if "fake_llm" in report:
+        llm = report["fake_llm"]
+        lines.append(f"   LLM requests:    {llm['requests']} ({llm['failures']} injected failures, "
+                     f"{llm['max_concurrent']} max concurrent)")
+    if not report["drained"]:
+        lines.append("⚠️  Some questions were still unanswered when the drain timeout expired")
+    return "\n".join(lines)
+
+
+def load_bot(slack, llm=None, cassette_path=None, time_scale=1.0):
+    """Import app.py configured to talk to the fake servers, or to replay a cassette's LLM calls"""
+    os.environ.setdefault("SLACK_BOT_TOKEN", "xoxb-load-test")
+    os.environ.setdefault("SLACK_APP_TOKEN", "xapp-load-test")
+    os.environ.setdefault("LITELLM_DEVELOPER_KEY", "sk-load-test")
+    os.environ["SLACK_API_URL"] = slack.base_url
+    if llm is not None:
+        os.environ["LITELLM_BASE_URL"] = llm.base_url
+    if cassette_path:
+        os.environ["CASSETTE_MODE"] = "replay"
+        os.environ["CASSETTE_PATH"] = cassette_path
+        os.environ["CASSETTE_TIME_SCALE"] = str(time_scale)
+    elif os.environ.get("CASSETTE_MODE", "").lower() == "replay":
+        # Only a cassette replay should bypass the fake LiteLLM
+        del os.environ["CASSETTE_MODE"]
+    import app
+    return app
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test against fake LiteLLM and Slack servers")
+    parser.add_argument("--rate", type=float, default=2.0, help="Questions per second to inject")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to inject for")
+    parser.add_argument("--drain", type=float, default=120.0, help="Seconds to wait for answers afterwards")
+    parser.add_argument("--arrivals", choices=("poisson", "uniform"), default="poisson")
+    parser.add_argument("--dm-fraction", type=float, default=0.3, help="Share of events that are DMs")
+    parser.add_argument("--repeat-fraction", type=float, default=0.2,
+                        help="Share of questions asked verbatim (cacheable); the rest are made unique")
+    parser.add_argument("--channels", type=int, default=10, help="Channels mentions are spread across")
+    parser.add_argument("--users", type=int, default=50, help="Distinct users asking")
+    parser.add_argument("--questions", help="File with one question per line (default: built-in list)")
+    parser.add_argument("--listener-threads", type=int, default=10, help="Bolt listener threads")
+    parser.add_argument("--llm-first-token", default="lognormal:0.8,0.5",
+                        help="Time to first token distribution, e.g. fixed:1, uniform:0.5,2, lognormal:0.8,0.5")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=60.0)
+    parser.add_argument("--llm-answer-tokens", default="uniform:150,400", help="Answer length distribution")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Share of LLM calls failing with 500")
+    parser.add_argument("--llm-rate-limit-rate", type=float, default=0.0, help="Share of LLM calls given a 429")
+    parser.add_argument("--llm-stall-rate", type=float, default=0.0, help="Share of LLM calls that hang")
+    parser.add_argument("--llm-stall-seconds", type=float, default=120.0)
+    parser.add_argument("--slack-latency", default="lognormal:0.08,0.4", help="Slack API latency distribution")
+    parser.add_argument("--slack-rate-limit-rate", type=float, default=0.0,
+                        help="Share of chat.* calls given a 429")
+    parser.add_argument("--cassette", help="Replay the events and LLM calls recorded in this cassette "
+                                           "(CASSETTE_MODE=record) instead of generating load")
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="Multiplier for recorded LLM and Slack timings when replaying (0 = instant)")
+    parser.add_argument("--arrival-scale", type=float, default=1.0,
+                        help="Multiplier for recorded gaps between events when replaying (0.5 = twice the rate)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    questions = QUESTIONS
+    if args.questions:
+        with open(args.questions) as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    seeds = itertools.count(args.seed) if args.seed is not None else itertools.repeat(None)
+    cassette = Cassette.load(args.cassette) if args.cassette else None
+    llm = None
+    slack_latency = args.slack_latency
+    if cassette is not None:
+        slack_latency = cassette.slack_latency(args.time_scale) or slack_latency
+    else:
+        llm = FakeLiteLLM(
+            first_token=args.llm_first_token,
+            tokens_per_second=args.llm_tokens_per_second,
+            answer_tokens=args.llm_answer_tokens,
+            error_rate=args.llm_error_rate,
+            rate_limit_rate=args.llm_rate_limit_rate,
+            stall_rate=args.llm_stall_rate,
+            stall_seconds=args.llm_stall_seconds,
+            seed=next(seeds)
+        )
+    slack = FakeSlack(latency=slack_latency, rate_limit_rate=args.slack_rate_limit_rate, seed=next(seeds))
+    with contextlib.ExitStack() as servers:
+        if llm is not None:
+            servers.enter_context(llm)
+        servers.enter_context(slack)
+        bot = load_bot(slack, llm=llm, cassette_path=args.cassette, time_scale=args.time_scale)
+        if cassette is not None:
+            events, offsets = cassette_events(cassette, args.arrival_scale)
+            print(f"📼 Replaying {len(events)} events from {args.cassette} "
+                  f"(timing x{args.time_scale:g}, arrivals x{args.arrival_scale:g})")
+        else:
+            count = max(int(args.rate * args.duration), 1)
+            events = make_events(count, questions, dm_fraction=args.dm_fraction,
+                                 repeat_fraction=args.repeat_fraction, channels=args.channels,
+                                 users=args.users, seed=next(seeds))
+            offsets = arrival_offsets(count, args.rate, poisson=args.arrivals == "poisson", seed=next(seeds))
+            print(f"🚀 Sending {count} questions at {args.rate:g}/s for {args.duration:g}s "
+                  f"(LLM {llm.base_url}, Slack {slack.base_url})")
+        report = run_load(bot, bot.slack_app.client, slack, events, offsets, drain=args.drain,
+                          listener_threads=args.listener_threads, llm=llm)
+        if cassette is not None:
+            report["replay"] = bot.llm_client.stats()
+        bot.slack_scheduler.stop()
+
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 0 if report["drained"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
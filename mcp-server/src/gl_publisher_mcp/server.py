@@ -8,7 +8,7 @@ from gl_publisher_mcp.tools.adr_search import search_adrs
 from gl_publisher_mcp.tools.file_reader import read_file, FileReadError
 from gl_publisher_mcp.tools.impact_builder_finder import find_impact_builders
 from gl_publisher_mcp.tools.schema_info import get_schema_info
-from gl_publisher_mcp.tools.code_search import search_code
+from gl_publisher_mcp.tools.code_search import describe_search, search_code
 
 
 class GLPublisherMCPServer:
@@ -229,7 +229,8 @@ class GLPublisherMCPServer:
             elif name == "search_code":
                 pattern = arguments.get("pattern")
                 file_pattern = arguments.get("file_pattern")
-                results = search_code(pattern, self.gl_publisher_path, file_pattern)
+                stats = {}
+                results = search_code(pattern, self.gl_publisher_path, file_pattern, stats=stats)
 
                 if not results:
                     return [
@@ -242,6 +243,7 @@ class GLPublisherMCPServer:
                 for result in results:
                     output += f"**{result['file']}:{result['line']}**\n"
                     output += f"```\n{result['context']}\n```\n\n"
+                output += f"_{describe_search(stats)}_\n"
 
                 return [types.TextContent(type="text", text=output)]
 
@@ -0,0 +1,304 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from gl_publisher_mcp.tools.code_scan import file_pattern_matcher, is_binary, walk_files, walk_order_key
+
+# Bumped whenever the schema or the way files are indexed changes
+INDEX_VERSION = 2
+
+# Larger files aren't tokenized; they are read for every search instead
+MAX_INDEXED_BYTES = 1_000_000
+# Re-read files applied to the index at a time
+APPLY_BATCH = 256
+
+INDEXED = "indexed"
+LARGE = "large"
+BINARY = "binary"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    tokens TEXT NOT NULL
+);
+"""
+
+
+def trigrams(text: str) -> Set[str]:
+    """Every three-character substring of text"""
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def tokenize(text: str) -> Set[str]:
+    """Distinct whitespace-separated tokens of text, lowercased"""
+    return set(text.lower().split())
+
+
+def default_index_path(root: Path) -> Path:
+    """
+    Where the index for a checkout is kept: one SQLite file per checkout
+    under GL_PUBLISHER_INDEX_DIR (default ~/.cache/gl-publisher-mcp).
+    """
+    cache_dir = os.environ.get("GL_PUBLISHER_INDEX_DIR") or str(
+        Path.home() / ".cache" / "gl-publisher-mcp"
+    )
+    digest = hashlib.sha1(str(Path(root).resolve()).encode("utf-8")).hexdigest()[:12]
+    return Path(cache_dir) / f"code-index-{digest}.sqlite3"
+
+
+class CodeIndex:
+    """
+    Persistent inverted index of a repository checkout.
+
+    Each text file is stored once in a SQLite file that survives restarts,
+    as its distinct lowercased whitespace-separated tokens. In memory, a
+    trigram index over the vocabulary of all files finds the tokens
+    containing a substring. A search pattern's whitespace-separated pieces
+    must each lie within one token of a matching file, so a query only
+    reads the files that have a token containing every piece.
+
+    `refresh` re-indexes files whose mtime or size changed and drops
+    deleted ones; it walks the checkout (see walk_files) at most every
+    `refresh_interval` seconds. Until the first refresh finishes the index
+    isn't `ready`. `refresh_in_background` builds or refreshes it without
+    blocking, and queries meanwhile use the last snapshot.
+    """
+
+    def __init__(self, root: Path, path: Optional[Path] = None, refresh_interval: float = 2.0):
+        self.root = Path(root)
+        self.path = Path(path) if path is not None else default_index_path(self.root)
+        self.refresh_interval = refresh_interval
+        self.last_refresh: Dict[str, float] = {}
+        self._refreshed_at: Optional[float] = None
+        # Held briefly by queries and while refresh swaps in changes
+        self._lock = threading.Lock()
+        # Held for a whole refresh, so only one runs at a time
+        self._refresh_lock = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+        # path -> (id, mtime_ns, size, status)
+        self._files: Dict[str, Tuple[int, int, int, str]] = {}
+        self._file_tokens: Dict[int, FrozenSet[str]] = {}
+        # Tokens of every file ever indexed since the index was loaded; ones
+        # no file has any more only cost a lookup, and go at the next load
+        self._vocabulary: Set[str] = set()
+        self._grams: Dict[str, Set[str]] = {}
+
+        started = time.perf_counter()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._check_version()
+        for file_id, path, mtime_ns, size, status, tokens in self._db.execute(
+            "SELECT id, path, mtime_ns, size, status, tokens FROM files"
+        ):
+            self._files[path] = (file_id, mtime_ns, size, status)
+            self._file_tokens[file_id] = frozenset(tokens.split())
+        self._vocabulary = set().union(*self._file_tokens.values())
+        for token in self._vocabulary:
+            self._add_grams(token)
+        self.load_seconds = time.perf_counter() - started
+
+    def _check_version(self):
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is not None and row[0] == str(INDEX_VERSION):
+            return
+        with self._db:
+            self._db.execute("DELETE FROM files")
+            self._db.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)",
+                (str(INDEX_VERSION),),
+            )
+
+    def close(self):
+        self._db.close()
+
+    def _add_grams(self, token: str):
+        for gram in trigrams(token):
+            self._grams.setdefault(gram, set()).add(token)
+
+    def _add_tokens(self, file_id: int, tokens: FrozenSet[str]):
+        self._file_tokens[file_id] = tokens
+        for token in tokens.difference(self._vocabulary):
+            self._add_grams(token)
+        self._vocabulary |= tokens
+
+    def _read_file(self, relative: str, stat: os.stat_result) -> Optional[Tuple[str, Set[str]]]:
+        """(status, tokens) of a file, or None if it can't be read"""
+        if stat.st_size > MAX_INDEXED_BYTES:
+            return LARGE, set()
+        try:
+            data = (self.root / relative).read_bytes()
+        except OSError:
+            return None
+        # Same rule as the scan, so a search finds the same files with or without the index
+        if is_binary(data):
+            return BINARY, set()
+        return INDEXED, tokenize(data.decode("utf-8", errors="replace"))
+
+    def _apply(self, changed: List[Tuple[str, os.stat_result, str, Set[str]]], removed: List[str]):
+        """
+        Store re-read and removed files, then swap them into memory. Only
+        the swap holds the query lock.
+        """
+        rows = []
+        with self._db:
+            for relative, stat, status, tokens in changed:
+                row = (stat.st_mtime_ns, stat.st_size, status, "\n".join(tokens))
+                old = self._files.get(relative)
+                if old is not None:
+                    file_id = old[0]
+                    self._db.execute(
+                        "UPDATE files SET mtime_ns = ?, size = ?, status = ?, tokens = ? WHERE id = ?",
+                        row + (file_id,),
+                    )
+                else:
+                    file_id = self._db.execute(
+                        "INSERT INTO files (path, mtime_ns, size, status, tokens) VALUES (?, ?, ?, ?, ?)",
+                        (relative,) + row,
+                    ).lastrowid
+                rows.append((relative, (file_id, stat.st_mtime_ns, stat.st_size, status), frozenset(tokens)))
+            for path in removed:
+                self._db.execute("DELETE FROM files WHERE id = ?", (self._files[path][0],))
+
+        with self._lock:
+            for relative, entry, tokens in rows:
+                self._files[relative] = entry
+                self._add_tokens(entry[0], tokens)
+            for path in removed:
+                file_id = self._files.pop(path)[0]
+                del self._file_tokens[file_id]
+
+    def refresh(self, force: bool = False) -> Dict[str, float]:
+        """
+        Bring the index up to date with the checkout.
+
+        The walk and file reads happen without the query lock, and changes
+        are applied in batches, so searches keep answering from the index
+        as it was. Returns how many files and distinct tokens are indexed,
+        how many files were re-indexed or removed and how long it took; a
+        refresh skipped within `refresh_interval` reports nothing updated.
+        """
+        # Only refresh changes _files, so it can read it without the query lock
+        with self._refresh_lock:
+            if (
+                not force
+                and self._refreshed_at is not None
+                and time.monotonic() - self._refreshed_at < self.refresh_interval
+            ):
+                return dict(self.last_refresh, updated=0, removed=0, seconds=0.0)
+
+            started = time.perf_counter()
+            seen = set()
+            changed = []
+            updated = 0
+            for relative, stat in walk_files(self.root):
+                seen.add(relative)
+                known = self._files.get(relative)
+                if known is not None and known[1:3] == (stat.st_mtime_ns, stat.st_size):
+                    continue
+                read = self._read_file(relative, stat)
+                if read is None:
+                    continue
+                changed.append((relative, stat) + read)
+                if len(changed) >= APPLY_BATCH:
+                    self._apply(changed, [])
+                    updated += len(changed)
+                    changed = []
+            removed = [path for path in self._files if path not in seen]
+            self._apply(changed, removed)
+            updated += len(changed)
+
+            with self._lock:
+                self._refreshed_at = time.monotonic()
+                self.last_refresh = {
+                    "files": len(self._files),
+                    "tokens": len(self._vocabulary),
+                    "updated": updated,
+                    "removed": len(removed),
+                    "seconds": time.perf_counter() - started,
+                }
+                return self.last_refresh
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.last_refresh)
+
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the last refresh finished, None before the first"""
+        refreshed_at = self._refreshed_at
+        return None if refreshed_at is None else time.monotonic() - refreshed_at
+
+    def refresh_in_background(self):
+        """
+        Refresh on a daemon thread if the index is unbuilt or older than
+        `refresh_interval`, unless a background refresh is already running.
+        """
+        with self._lock:
+            if self._refresher is not None and self._refresher.is_alive():
+                return
+            age = self.age
+            if age is not None and age < self.refresh_interval:
+                return
+            self._refresher = threading.Thread(
+                target=self._refresh_quietly, name="code-index-refresh", daemon=True
+            )
+            self._refresher.start()
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except (OSError, sqlite3.Error):
+            # Searches keep using the last snapshot (or scanning); the next one tries again
+            pass
+
+    def _tokens_containing(self, piece: str) -> FrozenSet[str]:
+        grams = sorted((self._grams.get(gram, set()) for gram in trigrams(piece)), key=len)
+        if not grams:
+            # Too short for a trigram: check the whole vocabulary
+            return frozenset(token for token in self._vocabulary if piece in token)
+        return frozenset(token for token in set.intersection(*grams) if piece in token)
+
+    def candidates(self, pattern: str, file_patterns: List[str]) -> List[str]:
+        """
+        Files that may contain `pattern` (case insensitive) and match one of
+        `file_patterns`, in walk order. Files too large to index are always
+        candidates; binary files never are.
+        """
+        matchers = [file_pattern_matcher(file_pattern) for file_pattern in file_patterns]
+        with self._lock:
+            pieces = [self._tokens_containing(piece) for piece in pattern.lower().split()]
+            found = []
+            for path, (file_id, _, _, status) in self._files.items():
+                if status == BINARY or not any(matches(path) for matches in matchers):
+                    continue
+                if status == INDEXED and not all(
+                    not self._file_tokens[file_id].isdisjoint(tokens) for tokens in pieces
+                ):
+                    continue
+                found.append(path)
+        return sorted(found, key=walk_order_key)
+
+
+_indexes: Dict[str, CodeIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(root: Path) -> CodeIndex:
+    """The shared index for a checkout, opened on first use"""
+    key = str(Path(root).resolve())
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = CodeIndex(Path(root))
+        return index
@@ -0,0 +1,394 @@
+import fnmatch
+import mmap
+import os
+import re
+import threading
+import time
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Pattern, Tuple
+
+# Directories never walked: VCS metadata, Maven output, dependencies and IDE state
+SKIP_DIRS = frozenset({".git", "target", "node_modules", ".gradle", ".idea"})
+# Gradle output directories, skipped next to a Gradle build file
+GRADLE_BUILD_FILES = frozenset({"build.gradle", "build.gradle.kts"})
+GRADLE_OUTPUT_DIRS = frozenset({"build", "out"})
+
+# A NUL byte in the first block means a binary file
+SNIFF_BYTES = 8192
+# Files this large are memory-mapped rather than read; mapping costs more
+# than reading a small file
+MMAP_MIN_BYTES = 1 << 20
+# Memory-mapped files are lowercased for searching this much at a time
+BLOCK_BYTES = 1 << 20
+# Files handed to a worker at a time, so a thread isn't scheduled per small file
+BATCH_FILES = 16
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+def is_binary(head: bytes) -> bool:
+    """Whether a file starting with `head` is binary; the index and the scan both use this"""
+    return b"\0" in head[:SNIFF_BYTES]
+
+
+def glob_to_regex(pattern: str) -> str:
+    """Regex for a .gitignore glob where `*`/`?` don't cross `/` and `**` does"""
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 1 :]:
+            end = pattern.index("]", i + 1)
+            parts.append("[" + pattern[i + 1 : end].replace("!", "^", 1) + "]")
+            i = end + 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(parts)
+
+
+class IgnoreRules:
+    """
+    The patterns of one .gitignore file.
+
+    Supports comments, `!` negation, directory-only patterns (trailing
+    `/`), patterns anchored to the file's directory (containing a `/`) and
+    `*`, `?`, `[...]` and `**` globs.
+    """
+
+    def __init__(self, base: str, lines: List[str]):
+        # Directory of the .gitignore relative to the root, "" for the root
+        self.base = base
+        self.rules: List[Tuple[Pattern, bool, bool, bool]] = []
+        for line in lines:
+            line = line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            if line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            anchored = "/" in line
+            regex = re.compile(glob_to_regex(line.lstrip("/")) + r"\Z")
+            self.rules.append((regex, negate, dir_only, anchored))
+
+    @classmethod
+    def read(cls, directory: str, base: str) -> Optional["IgnoreRules"]:
+        try:
+            with open(os.path.join(directory, ".gitignore"), "r", encoding="utf-8", errors="replace") as f:
+                rules = cls(base, f.readlines())
+        except OSError:
+            return None
+        return rules if rules.rules else None
+
+    def match(self, relative_path: str, is_dir: bool) -> Optional[bool]:
+        """True if ignored, False if re-included, None if no pattern applies"""
+        if self.base:
+            if not relative_path.startswith(self.base + "/"):
+                return None
+            relative_path = relative_path[len(self.base) + 1 :]
+        name = relative_path.rsplit("/", 1)[-1]
+        result = None
+        for regex, negate, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relative_path if anchored else name):
+                result = not negate
+        return result
+
+
+def is_ignored(chain: List[IgnoreRules], relative_path: str, is_dir: bool) -> bool:
+    """Whether the .gitignore files from the root down ignore a path; the deepest match wins"""
+    ignored = False
+    for rules in chain:
+        result = rules.match(relative_path, is_dir)
+        if result is not None:
+            ignored = result
+    return ignored
+
+
+def walk_order_key(relative_path: str) -> Tuple[Tuple[int, str], ...]:
+    """Sort key giving the order walk_files yields paths in: a directory's files, then its subdirectories"""
+    parts = relative_path.split("/")
+    return tuple((1, part) for part in parts[:-1]) + ((0, parts[-1]),)
+
+
+def walk_files(
+    root: Path, skip_dirs=SKIP_DIRS, gitignore: bool = True
+) -> Iterator[Tuple[str, os.stat_result]]:
+    """
+    (relative path, stat) of every file under root, in a fixed order.
+
+    Pruned as the walk goes rather than filtered afterwards: SKIP_DIRS,
+    Gradle output next to a Gradle build file, and anything the checkout's
+    .gitignore files ignore are never descended into.
+    """
+    chains: Dict[str, List[IgnoreRules]] = {}
+    for directory, dirnames, filenames in os.walk(root):
+        relative_dir = os.path.relpath(directory, root).replace(os.sep, "/")
+        relative_dir = "" if relative_dir == "." else relative_dir
+        chain = chains.pop(relative_dir, [])
+        if gitignore and ".gitignore" in filenames:
+            own = IgnoreRules.read(directory, relative_dir)
+            if own is not None:
+                chain = chain + [own]
+
+        def relative(name):
+            return f"{relative_dir}/{name}" if relative_dir else name
+
+        skip = skip_dirs | GRADLE_OUTPUT_DIRS if GRADLE_BUILD_FILES & set(filenames) else skip_dirs
+        # Pruning in place keeps os.walk out of build, dependency and ignored trees
+        dirnames[:] = sorted(
+            d for d in dirnames if d not in skip and not is_ignored(chain, relative(d), True)
+        )
+        for d in dirnames:
+            chains[relative(d)] = chain
+
+        for filename in sorted(filenames):
+            if is_ignored(chain, relative(filename), False):
+                continue
+            try:
+                stat = os.stat(os.path.join(directory, filename))
+            except OSError:
+                continue
+            yield relative(filename), stat
+
+
+def file_pattern_matcher(file_pattern: str) -> Callable[[str], bool]:
+    """A test for whether a relative path would be found by rglob(file_pattern)"""
+    if "/" not in file_pattern:
+        # The common case ('*.kt'): only the file name matters
+        name_re = re.compile(fnmatch.translate(file_pattern))
+        return lambda relative_path: name_re.match(relative_path.rsplit("/", 1)[-1]) is not None
+    return lambda relative_path: PurePosixPath(relative_path).match(file_pattern)
+
+
+def match_lines(text: str, relative_path: str, pattern_lower: str, limit: int) -> List[Dict[str, str]]:
+    """Lines of text containing the pattern (case insensitive), with 2 lines of context each side"""
+    results = []
+    lines = text.split("\n")
+    for line_num, line in enumerate(lines, 1):
+        if pattern_lower in line.lower():
+            start = max(0, line_num - 3)
+            end = min(len(lines), line_num + 2)
+            results.append(
+                {
+                    "file": relative_path,
+                    "line": line_num,
+                    "match": line.strip(),
+                    "context": "\n".join(lines[start:end]),
+                }
+            )
+            if len(results) >= limit:
+                break
+    return results
+
+
+def match_bytes(
+    data, relative_path: str, needle: bytes, limit: int, stop: threading.Event
+) -> List[Dict[str, str]]:
+    """
+    match_lines over undecoded (e.g. memory-mapped) bytes for a lowercased
+    ASCII needle. The data is lowercased a block of whole lines at a time
+    to search it; only matching lines and their context are decoded.
+    """
+    results = []
+    line_num = 1
+    block_start = 0
+    while block_start <= len(data) and len(results) < limit and not stop.is_set():
+        block_end = data.find(b"\n", block_start + BLOCK_BYTES)
+        block_end = len(data) if block_end < 0 else block_end
+        block = data[block_start:block_end].lower()
+        counted_to = 0
+        position = 0
+        while len(results) < limit:
+            found = block.find(needle, position)
+            if found < 0:
+                break
+            line_start = block.rfind(b"\n", 0, found) + 1
+            line_end = block.find(b"\n", found)
+            line_end = len(block) if line_end < 0 else line_end
+            line_num += block.count(b"\n", counted_to, line_start)
+            counted_to = line_start
+
+            # Context may reach into the neighbouring blocks, so it comes from data
+            start = block_start + line_start
+            end = block_start + line_end
+            context_start = start
+            for _ in range(2):
+                if context_start == 0:
+                    break
+                context_start = data.rfind(b"\n", 0, context_start - 1) + 1
+            context_end = end
+            for _ in range(2):
+                if context_end >= len(data):
+                    break
+                following = data.find(b"\n", context_end + 1)
+                context_end = len(data) if following < 0 else following
+
+            results.append(
+                {
+                    "file": relative_path,
+                    "line": line_num,
+                    "match": data[start:end].decode("utf-8", errors="replace").strip(),
+                    "context": data[context_start:context_end].decode("utf-8", errors="replace"),
+                }
+            )
+            # One result per line, as in match_lines
+            position = line_end + 1
+            if position > len(block):
+                break
+        block_start = block_end + 1
+        if block_start <= len(data):
+            # The rest of the block and the newline ending it
+            line_num += block.count(b"\n", counted_to) + 1
+    return results
+
+
+def scan_file(
+    path: str,
+    relative_path: str,
+    pattern_lower: str,
+    needle: Optional[bytes],
+    limit: int,
+    stop: threading.Event,
+) -> List[Dict[str, str]]:
+    """
+    Matches in one file; binaries (a NUL byte in the first block) have
+    none. Large files are memory-mapped and searched in place.
+    """
+    if stop.is_set():
+        return []
+    try:
+        with open(path, "rb") as f:
+            head = f.read(SNIFF_BYTES)
+            if is_binary(head):
+                return []
+            if len(head) < SNIFF_BYTES:
+                data = head
+            elif os.fstat(f.fileno()).st_size < MMAP_MIN_BYTES:
+                data = head + f.read()
+            else:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if needle is not None:
+                    return match_bytes(data, relative_path, needle, limit, stop)
+                return match_lines(bytes(data).decode("utf-8"), relative_path, pattern_lower, limit)
+            finally:
+                if isinstance(data, mmap.mmap):
+                    data.close()
+    except (OSError, ValueError, UnicodeDecodeError):
+        return []
+
+
+def scan_files(
+    root: Path,
+    relative_paths: Iterable[str],
+    pattern: str,
+    max_results: int = 20,
+    workers: int = DEFAULT_WORKERS,
+    stats: Optional[Dict[str, float]] = None,
+) -> List[Dict[str, str]]:
+    """
+    Search files in the order given, on a thread pool.
+
+    Paths are pulled from `relative_paths` (which may be a lazy walk) in
+    batches as workers free up, keeping two per worker in flight. Results are
+    collected in that order, so they are the same as a sequential scan;
+    once `max_results` are in, queued files are cancelled and running
+    ones stop at their next match.
+
+    Args:
+        root: Repository the paths are relative to
+        relative_paths: Files to search, in result order
+        pattern: Text to find (case insensitive)
+        max_results: Maximum number of results to return
+        workers: Threads reading files
+        stats: Optional dict filled with files scanned and time taken
+
+    Returns:
+        List of matches with file, line number, and context
+    """
+    started = time.perf_counter()
+    pattern_lower = pattern.lower()
+    # Bytes can only be lowercased like text for ASCII patterns
+    needle = pattern_lower.encode("ascii") if pattern.isascii() else None
+    paths = iter(relative_paths)
+
+    results: List[Dict[str, str]] = []
+    scanned = 0
+    stop = threading.Event()
+    workers = max(1, workers)
+
+    def scan_batch(batch: List[str]) -> List[List[Dict[str, str]]]:
+        return [
+            scan_file(os.path.join(root, relative), relative, pattern_lower, needle, max_results, stop)
+            for relative in batch
+        ]
+
+    # Matching is per line, so a pattern spanning lines never matches
+    if "\n" not in pattern and max_results > 0:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="code-scan") as pool:
+            pending = deque()
+
+            def fill():
+                while len(pending) < workers * 2:
+                    batch = list(islice(paths, BATCH_FILES))
+                    if not batch:
+                        return
+                    pending.append(pool.submit(scan_batch, batch))
+
+            fill()
+            while pending and len(results) < max_results:
+                for matches in pending.popleft().result():
+                    results.extend(matches)
+                    scanned += 1
+                    if len(results) >= max_results:
+                        break
+                fill()
+            stop.set()
+            for future in pending:
+                future.cancel()
+
+    if stats is not None:
+        stats.update(scanned=scanned, seconds=time.perf_counter() - started)
+    return results[:max_results]
+
+
+def scan_code(
+    root: Path,
+    pattern: str,
+    file_patterns: List[str],
+    max_results: int = 20,
+    workers: int = DEFAULT_WORKERS,
+    stats: Optional[Dict[str, float]] = None,
+) -> List[Dict[str, str]]:
+    """
+    Search every file matching one of `file_patterns` without an index,
+    streaming the walk into scan_files.
+    """
+    matchers = [file_pattern_matcher(file_pattern) for file_pattern in file_patterns]
+    files = (
+        relative
+        for relative, _ in walk_files(root)
+        if any(matches(relative) for matches in matchers)
+    )
+    return scan_files(root, files, pattern, max_results, workers, stats)
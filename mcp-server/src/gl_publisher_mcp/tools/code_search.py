@@ -1,6 +1,13 @@
+import sqlite3
+import time
 from pathlib import Path
 from typing import Optional, List, Dict
-import re
+
+from gl_publisher_mcp.tools.code_index import CodeIndex, get_index
+from gl_publisher_mcp.tools.code_scan import scan_code, scan_files
+
+# Searched when no file pattern is given
+DEFAULT_FILE_PATTERNS = ["*.kt", "*.java", "*.md"]
 
 
 def search_code(
@@ -8,62 +15,69 @@ def search_code(
     gl_publisher_path: Path,
     file_pattern: Optional[str] = None,
     max_results: int = 20,
+    index: Optional[CodeIndex] = None,
+    stats: Optional[Dict[str, float]] = None,
 ) -> List[Dict[str, str]]:
     """
     Search for code patterns in the repository.
 
+    Candidate files come from the persistent trigram index as last
+    refreshed (a stale index is refreshed in the background for later
+    searches); only they are read. Until the index has been
+    built (it is built in the background on first use) or when it can't be
+    used, every matching file is scanned instead. Either way files are
+    read in parallel and results come in the same order.
+
     Args:
         pattern: Search pattern or keyword
         gl_publisher_path: Path to oracle-gl-publisher repository
         file_pattern: Optional file glob pattern (e.g., '*.kt')
         max_results: Maximum number of results to return
+        index: Index to use (default: the shared index for the repository)
+        stats: Optional dict filled with how the search went (mode,
+            candidates, files read, index age and total time)
 
     Returns:
         List of matches with file, line number, and context
     """
-    results = []
-
-    # Determine which files to search
-    if file_pattern:
-        files = list(gl_publisher_path.rglob(file_pattern))
-    else:
-        # Default to common code files
-        files = list(gl_publisher_path.rglob("*.kt"))
-        files.extend(gl_publisher_path.rglob("*.java"))
-        files.extend(gl_publisher_path.rglob("*.md"))
-
-    # Filter out target directories and hidden files
-    files = [f for f in files if "/target/" not in str(f) and "/.git/" not in str(f)]
+    started = time.perf_counter()
+    file_patterns = [file_pattern] if file_pattern else DEFAULT_FILE_PATTERNS
+    info: Dict[str, float] = {}
+    scanned: Dict[str, float] = {}
 
-    pattern_lower = pattern.lower()
+    files = None
+    try:
+        index = index or get_index(gl_publisher_path)
+        if index.ready:
+            # Answer from the last snapshot; a stale index refreshes in the background
+            index.refresh_in_background()
+            files = index.candidates(pattern, file_patterns)
+            info.update(mode="index", indexed=index.last_refresh["files"], index_age=index.age)
+        else:
+            index.refresh_in_background()
+            info.update(mode="scan", building=True)
+    except (OSError, sqlite3.Error):
+        # e.g. an unwritable cache directory
+        info.update(mode="scan", building=False)
 
-    for file_path in files:
-        if len(results) >= max_results:
-            break
-
-        try:
-            content = file_path.read_text()
-            lines = content.split("\n")
-
-            for line_num, line in enumerate(lines, 1):
-                if pattern_lower in line.lower():
-                    # Get surrounding context (2 lines before and after)
-                    start = max(0, line_num - 3)
-                    end = min(len(lines), line_num + 2)
-                    context_lines = lines[start:end]
+    if files is not None:
+        results = scan_files(gl_publisher_path, files, pattern, max_results, stats=scanned)
+        info.update(candidates=len(files))
+    else:
+        results = scan_code(gl_publisher_path, pattern, file_patterns, max_results, stats=scanned)
 
-                    results.append(
-                        {
-                            "file": str(file_path.relative_to(gl_publisher_path)),
-                            "line": line_num,
-                            "match": line.strip(),
-                            "context": "\n".join(context_lines),
-                        }
-                    )
+    info.update(read=scanned["scanned"], seconds=time.perf_counter() - started)
+    if stats is not None:
+        stats.update(info)
+    return results
 
-                    if len(results) >= max_results:
-                        break
-        except (UnicodeDecodeError, PermissionError):
-            continue
 
-    return results
+def describe_search(stats: Dict[str, float]) -> str:
+    """One-line summary of a search's stats"""
+    if stats.get("mode") == "index":
+        return (
+            f"Searched {stats['candidates']} candidate file(s) of {stats['indexed']} indexed "
+            f"in {stats['seconds'] * 1000:.0f}ms (index from {stats['index_age']:.1f}s ago)"
+        )
+    state = "index building" if stats.get("building") else "no index"
+    return f"Scanned {stats['read']} file(s) in {stats['seconds'] * 1000:.0f}ms ({state})"
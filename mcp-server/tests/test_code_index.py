@@ -0,0 +1,168 @@
+import os
+import sqlite3
+import threading
+
+import pytest
+from gl_publisher_mcp.tools import code_index
+from gl_publisher_mcp.tools.code_index import CodeIndex, tokenize, trigrams
+from gl_publisher_mcp.tools.code_scan import scan_code, scan_files
+
+
+@pytest.fixture
+def repo(tmp_path):
+    """Create mock repository with code, docs, build output and a binary"""
+    root = tmp_path / "repo"
+    (root / "api" / "src").mkdir(parents=True)
+    (root / "api" / "target").mkdir()
+    (root / "docs").mkdir()
+
+    (root / "api" / "src" / "Reversal.kt").write_text("class ReversalBuilder {\n    fun reverse() {}\n}\n")
+    (root / "api" / "src" / "Batch.kt").write_text("class BatchBuilder {\n    val size = 10\n}\n")
+    (root / "api" / "target" / "Reversal.kt").write_text("class ReversalBuilder {}\n")
+    (root / "docs" / "reversals.md").write_text("# Reversals\n\nUse ReversalBuilder.\n")
+    (root / "docs" / "logo.md").write_bytes(b"\x89PNG\x00\xff\xfe ReversalBuilder")
+    return root
+
+
+@pytest.fixture
+def index(repo, tmp_path):
+    index = CodeIndex(repo, tmp_path / "index.sqlite3", refresh_interval=0)
+    index.refresh()
+    yield index
+    index.close()
+
+
+def test_trigrams_and_tokens():
+    """Test trigrams and whitespace-separated lowercase tokens are extracted"""
+    assert trigrams("abcd") == {"abc", "bcd"}
+    assert trigrams("ab") == set()
+    assert tokenize("fun reverse() {}\n\tFUN") == {"fun", "reverse()", "{}"}
+
+
+def test_multi_word_and_partial_patterns(index):
+    """Test every piece of a pattern must lie within one token of the file"""
+    assert index.candidates("fun reverse(", ["*.kt"]) == ["api/src/Reversal.kt"]
+    assert index.candidates("versalBuild", ["*.kt"]) == ["api/src/Reversal.kt"]
+    assert index.candidates("{", ["*.kt"]) == ["api/src/Batch.kt", "api/src/Reversal.kt"]
+    assert index.candidates("fun size", ["*.kt"]) == []
+
+
+def test_candidates_contain_every_trigram(index):
+    """Test only files containing the pattern's trigrams are candidates, in walk order"""
+    assert index.candidates("reversalbuilder", ["*.kt", "*.md"]) == [
+        "api/src/Reversal.kt",
+        "docs/reversals.md",
+    ]
+    assert index.candidates("BATCH", ["*.kt"]) == ["api/src/Batch.kt"]
+    assert index.candidates("nowhere to be found", ["*.kt"]) == []
+
+
+def test_build_dirs_and_binaries_skipped(index):
+    """Test target/ is never indexed and binary files are never candidates"""
+    assert "api/target/Reversal.kt" not in index.candidates("", ["*.kt"])
+    assert "docs/logo.md" not in index.candidates("", ["*.md"])
+    assert index.last_refresh["files"] == 4
+
+
+def test_index_persists_across_restarts(repo, index, tmp_path):
+    """Test reopening the index re-reads nothing that didn't change"""
+    reopened = CodeIndex(repo, tmp_path / "index.sqlite3")
+    stats = reopened.refresh()
+
+    assert stats["updated"] == 0
+    assert reopened.candidates("reversalbuilder", ["*.kt"]) == ["api/src/Reversal.kt"]
+    reopened.close()
+
+
+def test_changed_and_deleted_files_updated(repo, index):
+    """Test a refresh re-indexes changed files and forgets deleted ones"""
+    (repo / "api" / "src" / "Batch.kt").write_text("class BatchBuilder : ReversalBuilder()\n")
+    (repo / "docs" / "reversals.md").unlink()
+
+    stats = index.refresh()
+
+    assert stats["updated"] == 1
+    assert stats["removed"] == 1
+    assert index.candidates("reversalbuilder", ["*.kt", "*.md"]) == [
+        "api/src/Batch.kt",
+        "api/src/Reversal.kt",
+    ]
+    assert index.candidates("val size", ["*.kt"]) == []
+
+
+def test_refresh_interval(repo, tmp_path):
+    """Test the checkout isn't walked again within the refresh interval"""
+    index = CodeIndex(repo, tmp_path / "throttled.sqlite3", refresh_interval=60)
+    first = index.refresh()
+    (repo / "docs" / "new.md").write_text("ReversalBuilder again\n")
+
+    assert index.refresh()["updated"] == 0
+    assert index.refresh()["files"] == first["files"]
+    assert index.refresh(force=True)["updated"] == 1
+    index.close()
+
+
+def test_large_files_always_candidates(repo, tmp_path, monkeypatch):
+    """Test files too big to index are verified for every query"""
+    monkeypatch.setattr(code_index, "MAX_INDEXED_BYTES", 40)
+    index = CodeIndex(repo, tmp_path / "large.sqlite3")
+    index.refresh()
+
+    assert index.candidates("no such text", ["*.kt", "*.md"]) == ["api/src/Batch.kt", "api/src/Reversal.kt"]
+    index.close()
+
+
+def test_old_index_version_rebuilt(repo, index, tmp_path):
+    """Test an index written by another version is discarded"""
+    path = tmp_path / "index.sqlite3"
+    db = sqlite3.connect(str(path))
+    with db:
+        db.execute("UPDATE meta SET value = '0' WHERE key = 'version'")
+    db.close()
+
+    reopened = CodeIndex(repo, path)
+    assert reopened.refresh()["updated"] == 4
+    reopened.close()
+
+
+def test_index_finds_what_the_scan_finds(repo, index):
+    """Test non-UTF-8 text is indexed, so searches match with or without the index"""
+    (repo / "api" / "src" / "Legacy.kt").write_bytes("// Grüße\nfun lookupLedger() = 1\n".encode("latin-1"))
+    index.refresh(force=True)
+
+    for pattern in ["lookupLedger", "ReversalBuilder", "fun", "Grüße", "nowhere"]:
+        for file_patterns in (["*.kt"], ["*.kt", "*.md"]):
+            scanned = scan_code(repo, pattern, file_patterns, max_results=100)
+            indexed = scan_files(repo, index.candidates(pattern, file_patterns), pattern, max_results=100)
+            assert indexed == scanned, pattern
+    assert [r["file"] for r in scan_code(repo, "lookupLedger", ["*.kt"])] == ["api/src/Legacy.kt"]
+
+
+def test_queries_use_snapshot_during_refresh(repo, index, monkeypatch):
+    """Test a query doesn't wait for a running refresh, and sees its changes once it finishes"""
+    (repo / "api" / "src" / "Accrual.kt").write_text("class AccrualBuilder {}\n")
+    walking = threading.Event()
+    release = threading.Event()
+    walk_files = code_index.walk_files
+
+    def slow_walk(root):
+        walking.set()
+        release.wait(5)
+        return walk_files(root)
+
+    monkeypatch.setattr(code_index, "walk_files", slow_walk)
+    index.refresh_in_background()
+    assert walking.wait(5)
+
+    assert index.candidates("accrualbuilder", ["*.kt"]) == []
+    release.set()
+    index._refresher.join(timeout=10)
+    assert index.candidates("accrualbuilder", ["*.kt"]) == ["api/src/Accrual.kt"]
+
+
+def test_background_refresh_only_when_stale(index):
+    """Test a fresh index starts no background refresh"""
+    index.refresh_interval = 60
+    index.refresh(force=True)
+    index.refresh_in_background()
+    assert index._refresher is None
@@ -0,0 +1,142 @@
+import threading
+
+import pytest
+from gl_publisher_mcp.tools import code_scan
+from gl_publisher_mcp.tools.code_scan import (
+    SNIFF_BYTES,
+    match_bytes,
+    match_lines,
+    scan_code,
+    scan_files,
+    walk_files,
+)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    """A checkout with build output, ignored files and a binary"""
+    (tmp_path / ".gitignore").write_text("*.log\ngenerated/\n!keep.log\n")
+    (tmp_path / "build.gradle.kts").write_text("plugins {}\n")
+    for directory in ["api/src", "api/target", "build", "generated", "docs", ".git"]:
+        (tmp_path / directory).mkdir(parents=True)
+    (tmp_path / "api/src/Reversal.kt").write_text("class ReversalBuilder {\n    fun reverse() = 1\n}\n")
+    (tmp_path / "api/src/Batch.kt").write_text("class BatchBuilder {\n    fun reverse() = 2\n}\n")
+    (tmp_path / "api/.gitignore").write_text("/src/Skipped.kt\n")
+    (tmp_path / "api/src/Skipped.kt").write_text("fun reverse() = 3\n")
+    (tmp_path / "api/target/Reversal.kt").write_text("fun reverse() = 4\n")
+    (tmp_path / "build/Reversal.kt").write_text("fun reverse() = 5\n")
+    (tmp_path / "generated/Reversal.kt").write_text("fun reverse() = 6\n")
+    (tmp_path / "docs/run.log").write_text("reverse\n")
+    (tmp_path / "docs/keep.log").write_text("reverse\n")
+    (tmp_path / "docs/logo.kt").write_bytes(b"reverse\0\x89PNG")
+    (tmp_path / ".git/Reversal.kt").write_text("fun reverse() = 7\n")
+    return tmp_path
+
+
+def test_walk_prunes_build_ignored_and_vcs_dirs(repo):
+    """Test the walk skips target/, Gradle build/, .git/ and .gitignore'd paths, honouring negation"""
+    assert [path for path, _ in walk_files(repo)] == [
+        ".gitignore",
+        "build.gradle.kts",
+        "api/.gitignore",
+        "api/src/Batch.kt",
+        "api/src/Reversal.kt",
+        "docs/keep.log",
+        "docs/logo.kt",
+    ]
+
+
+def test_build_dir_kept_without_gradle(repo):
+    """Test build/ is only Gradle output next to a Gradle build file"""
+    (repo / "build.gradle.kts").unlink()
+    assert "build/Reversal.kt" in [path for path, _ in walk_files(repo)]
+
+
+def test_scan_skips_binaries(repo):
+    """Test files with a NUL byte in the first block are never searched"""
+    results = scan_code(repo, "reverse", ["*.kt"])
+    assert [r["file"] for r in results] == ["api/src/Batch.kt", "api/src/Reversal.kt"]
+
+
+def test_order_is_the_same_for_any_worker_count(tmp_path):
+    """Test results come in walk order however many threads read the files"""
+    for i in range(60):
+        (tmp_path / f"dir{i % 7}").mkdir(exist_ok=True)
+        (tmp_path / f"dir{i % 7}" / f"File{i}.kt").write_text(("x\n" * (i * 37)) + "val match = 1\n" * 3)
+
+    sequential = scan_code(tmp_path, "MATCH", ["*.kt"], max_results=1000, workers=1)
+    assert len(sequential) == 180
+    for workers in [2, 8, 32]:
+        assert scan_code(tmp_path, "MATCH", ["*.kt"], max_results=1000, workers=workers) == sequential
+
+
+def test_stops_at_max_results(tmp_path, monkeypatch):
+    """Test the scan stops reading files once max_results matches are in"""
+    for i in range(400):
+        (tmp_path / f"File{i:03}.kt").write_text("val match = 1\nval match = 2\n")
+    read = []
+    scan_file = code_scan.scan_file
+    monkeypatch.setattr(
+        code_scan, "scan_file", lambda path, *args: read.append(path) or scan_file(path, *args)
+    )
+    stats = {}
+    results = scan_code(tmp_path, "match", ["*.kt"], max_results=5, workers=4, stats=stats)
+
+    assert [(r["file"], r["line"]) for r in results] == [
+        ("File000.kt", 1), ("File000.kt", 2), ("File001.kt", 1), ("File001.kt", 2), ("File002.kt", 1)
+    ]
+    assert stats["scanned"] == 3
+    # Batches already handed to workers are all that was read
+    assert len(read) < 200
+
+
+def test_large_files_memory_mapped(tmp_path, monkeypatch):
+    """Test a memory-mapped file is searched in place with the right line numbers"""
+    monkeypatch.setattr(code_scan, "MMAP_MIN_BYTES", SNIFF_BYTES)
+    lines = [f"line {i}" for i in range(SNIFF_BYTES // 4)] + ["val needle = true", "after"]
+    (tmp_path / "Big.kt").write_text("\n".join(lines))
+    results = scan_files(tmp_path, ["Big.kt"], "NEEDLE")
+
+    assert results == [
+        {
+            "file": "Big.kt",
+            "line": len(lines) - 1,
+            "match": "val needle = true",
+            "context": "\n".join(lines[-4:]),
+        }
+    ]
+
+
+@pytest.mark.parametrize("pattern", ["fun", "FUN reverse", "", "}", "missing"])
+def test_bytes_match_like_text(tmp_path, pattern):
+    """Test searching undecoded bytes gives the same lines and context as searching text"""
+    text = "\nclass A {\n  fun reverse() = 1\n\n  fun again() = 2\n}\n"
+    expected = match_lines(text, "A.kt", pattern.lower(), 10)
+    needle = pattern.lower().encode("ascii")
+
+    assert match_bytes(text.encode(), "A.kt", needle, 10, threading.Event()) == expected
+    (tmp_path / "A.kt").write_text(text)
+    assert scan_files(tmp_path, ["A.kt"], pattern, max_results=10) == expected
+
+
+def test_matches_across_blocks(tmp_path, monkeypatch):
+    """Test a memory-mapped file searched in several blocks keeps line numbers and context"""
+    monkeypatch.setattr(code_scan, "BLOCK_BYTES", 64)
+    text = "".join(f"line {i} {'match' if i % 5 == 0 else 'other'}\n" for i in range(SNIFF_BYTES // 8))
+    expected = match_lines(text, "A.kt", "match", 1000)
+
+    assert match_bytes(text.encode(), "A.kt", b"match", 1000, threading.Event()) == expected
+    (tmp_path / "A.kt").write_text(text)
+    assert scan_files(tmp_path, ["A.kt"], "MATCH", max_results=1000) == expected
+
+
+def test_multi_line_pattern_never_matches(repo):
+    """Test a pattern spanning lines finds nothing, as matching is per line"""
+    assert scan_code(repo, "{\n", ["*.kt"]) == []
+
+
+def test_non_ascii_patterns_decode(tmp_path):
+    """Test a non-ASCII pattern is matched on decoded text"""
+    (tmp_path / "A.md").write_text("# Überblick\nÜBERBLICK again\n")
+    results = scan_files(tmp_path, ["A.md"], "überblick")
+    assert [r["line"] for r in results] == [1, 2]
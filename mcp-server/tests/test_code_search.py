@@ -1,6 +1,15 @@
 import pytest
 from pathlib import Path
-from gl_publisher_mcp.tools.code_search import search_code
+from gl_publisher_mcp.tools.code_index import CodeIndex
+from gl_publisher_mcp.tools.code_search import describe_search, search_code
+
+
+@pytest.fixture(autouse=True)
+def index_dir(tmp_path_factory, monkeypatch):
+    """Keep the shared code indexes out of the home directory and the mock repository"""
+    path = tmp_path_factory.mktemp("index") / "cache"
+    monkeypatch.setenv("GL_PUBLISHER_INDEX_DIR", str(path))
+    return path
 
 
 @pytest.fixture
@@ -47,3 +56,47 @@ def test_search_code_shows_context(mock_gl_publisher_path):
     """Test that results include surrounding context"""
     results = search_code("processActivity", mock_gl_publisher_path)
     assert any("activity: Activity" in r["context"] for r in results)
+
+
+def test_search_code_reads_only_candidates(mock_gl_publisher_path, index_dir):
+    """Test the index narrows a search to files containing the pattern"""
+    index = CodeIndex(mock_gl_publisher_path, index_dir / "code.sqlite3")
+    index.refresh()
+    stats = {}
+    results = search_code("processActivity", mock_gl_publisher_path, index=index, stats=stats)
+
+    assert [r["file"] for r in results] == ["src/example.kt"]
+    assert stats["mode"] == "index"
+    assert stats["candidates"] == 1
+    assert stats["indexed"] == 2
+    assert "1 candidate file(s) of 2 indexed" in describe_search(stats)
+
+
+def test_search_code_scans_while_index_builds(mock_gl_publisher_path, index_dir):
+    """Test the first search scans instead of waiting for the index, which is built in the background"""
+    index = CodeIndex(mock_gl_publisher_path, index_dir / "code.sqlite3")
+    stats = {}
+    results = search_code("processActivity", mock_gl_publisher_path, index=index, stats=stats)
+
+    assert [r["file"] for r in results] == ["src/example.kt"]
+    assert stats["mode"] == "scan"
+    assert "index building" in describe_search(stats)
+    index._refresher.join(timeout=10)
+    assert index.ready
+
+
+def test_search_code_short_pattern(mock_gl_publisher_path):
+    """Test patterns shorter than a trigram still search every file"""
+    results = search_code("va", mock_gl_publisher_path)
+    assert any(r["match"] == 'val data = "test data"' for r in results)
+
+
+def test_search_code_without_index_scans(mock_gl_publisher_path, index_dir):
+    """Test an unusable index directory falls back to scanning"""
+    index_dir.write_text("not a directory")
+    stats = {}
+    results = search_code("processActivity", mock_gl_publisher_path, stats=stats)
+
+    assert [r["file"] for r in results] == ["src/example.kt"]
+    assert stats["mode"] == "scan"
+    assert "no index" in describe_search(stats)
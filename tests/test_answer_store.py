@@ -0,0 +1,100 @@
+"""Unit tests for the persistent answer store"""
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from ledger_bot.answer_store import SQLiteAnswerStore
+from ledger_bot.cache import ResponseCache
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestSQLiteAnswerStore:
+    """Test the on-disk answer store"""
+
+    def test_answers_survive_reopen(self, tmp_path):
+        """Test answers are still there after a restart"""
+        path = str(tmp_path / "answers.sqlite3")
+        store = SQLiteAnswerStore(path)
+        store.put("k", "answer", kb_hash="kb1")
+        store.close()
+
+        reopened = SQLiteAnswerStore(path)
+        assert reopened.get("k") == "answer"
+        assert len(reopened) == 1
+
+    def test_expired_answers_not_returned(self, tmp_path):
+        """Test the TTL is enforced on read"""
+        clock = FakeClock()
+        store = SQLiteAnswerStore(str(tmp_path / "a.db"), ttl=60, clock=clock)
+        store.put("k", "answer")
+        clock.now += 61
+        assert store.get("k") is None
+        assert len(store) == 0
+
+    def test_invalidate_kb(self, tmp_path):
+        """Test answers from other KB versions are deleted"""
+        store = SQLiteAnswerStore(str(tmp_path / "a.db"))
+        store.put("old", "1", kb_hash="kb1")
+        store.put("new", "2", kb_hash="kb2")
+        assert store.invalidate_kb("kb2") == 1
+        assert store.get("old") is None
+        assert store.get("new") == "2"
+
+    def test_compaction_drops_least_recently_used(self, tmp_path):
+        """Test size-based compaction keeps the most recently used answers"""
+        clock = FakeClock()
+        store = SQLiteAnswerStore(str(tmp_path / "a.db"), max_bytes=250,
+                                  compact_every=1000, compact_ratio=0.8, clock=clock)
+        for i in range(5):
+            clock.now += 1
+            store.put(f"k{i}", "x" * 100)
+        clock.now += 1
+        store.get("k0")
+
+        removed = store.compact()
+
+        assert removed == 3
+        assert store.size_bytes() <= 200
+        assert store.get("k0") is not None
+        assert store.get("k4") is not None
+        assert store.get("k1") is None
+
+    def test_compaction_runs_automatically(self, tmp_path):
+        """Test compaction is triggered every compact_every writes"""
+        store = SQLiteAnswerStore(str(tmp_path / "a.db"), max_bytes=100, compact_every=3)
+        for i in range(3):
+            store.put(f"k{i}", "x" * 60)
+        assert store.size_bytes() <= 100
+
+
+class TestCacheWithStore:
+    """Test the store as a second tier behind the in-memory cache"""
+
+    def test_memory_miss_reads_through_to_store(self, tmp_path):
+        """Test a fresh cache is warmed from the store"""
+        store = SQLiteAnswerStore(str(tmp_path / "a.db"))
+        ResponseCache(store=store).put("k", "answer", kb_hash="kb1")
+
+        cache = ResponseCache(store=store)
+        assert cache.get("k") == "answer"
+        assert cache.stats()["store_hits"] == 1
+        # Promoted into memory, so the second read doesn't touch the store
+        assert cache.get("k") == "answer"
+        assert cache.stats()["store_hits"] == 1
+
+    def test_invalidation_reaches_store(self, tmp_path):
+        """Test KB invalidation clears both tiers"""
+        store = SQLiteAnswerStore(str(tmp_path / "a.db"))
+        cache = ResponseCache(store=store)
+        cache.put("k", "answer", kb_hash="kb1")
+        cache.invalidate_kb("kb2")
+        assert store.get("k") is None
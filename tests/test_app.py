@@ -1,6 +1,9 @@
 """Unit tests for Ledger Bot"""
 import os
+import subprocess
 import sys
+import threading
+import time
 import pytest
 from unittest.mock import patch, MagicMock
 
@@ -8,6 +11,31 @@ from unittest.mock import patch, MagicMock
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 import app
+from ledger_bot.dedup import EventDeduper
+from ledger_bot.drain import Drainer
+from ledger_bot.health import SocketModeHealth
+from ledger_bot.kb_tiers import compile_tiers
+from ledger_bot.knowledge import estimate_tokens
+from ledger_bot.quotas import Admission, QuotaManager
+
+
+@pytest.fixture(autouse=True)
+def empty_response_cache():
+    """Keep cached answers, thread history and quota usage from leaking between tests"""
+    app.response_cache.clear()
+    app.conversations.clear()
+    app.quotas.clear()
+    yield
+    app.response_cache.clear()
+    app.conversations.clear()
+    app.quotas.clear()
+
+
+@pytest.fixture(autouse=True)
+def llm_client():
+    """Stand-in LLM client, so tests need no LiteLLM key; tests patch its create()"""
+    with patch.object(app, "llm_client", MagicMock()) as client:
+        yield client
 
 
 class TestHealthEndpoints:
@@ -23,21 +51,55 @@ class TestHealthEndpoints:
 
     def test_ready_endpoint_when_ready(self):
         """Test /ready endpoint returns 200 when ready"""
-        app.health_status['ready'] = True
-        app.health_status['slack_connected'] = True
+        with patch.object(app.startup, 'ready_after', 1.0), \
+             patch.object(app, 'socket_health', SocketModeHealth()):
+            app.socket_health.on_message('{"type": "hello"}')
+            with app.health_app.test_client() as client:
+                response = client.get('/ready')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['ready'] is True
+        assert data['slack_connected'] is True
+        assert data['socket_mode']['connects'] == 1
+
+    def test_not_ready_until_socket_says_hello(self):
+        """Test a finished startup isn't ready without a live Socket Mode connection"""
+        with patch.object(app.startup, 'ready_after', 1.0), \
+             patch.object(app, 'socket_health', SocketModeHealth()):
+            with app.health_app.test_client() as client:
+                assert client.get('/ready').status_code == 503
+
+            app.socket_health.on_message('{"type": "hello"}')
+            app.socket_health.on_message('{"type": "disconnect", "reason": "refresh_requested"}')
+            with app.health_app.test_client() as client:
+                data = client.get('/ready').get_json()
+        assert data['slack_connected'] is False
+        assert data['socket_mode']['last_disconnect_reason'] == "refresh_requested"
+
+    def test_not_ready_while_llm_failing(self):
+        """Test readiness drops once LLM calls fail for the whole window"""
+        with patch.object(app.startup, 'ready_after', 1.0), \
+             patch.object(app, 'socket_health', SocketModeHealth()), \
+             patch.object(app.llm_caller, 'failing_since', time.monotonic() - app.READINESS_LLM_WINDOW - 1), \
+             patch.object(app.llm_caller, 'last_failure', time.monotonic()):
+            app.socket_health.on_message('{"type": "hello"}')
+            with app.health_app.test_client() as client:
+                response = client.get('/ready')
+        assert response.status_code == 503
+        assert response.get_json()['llm_connected'] is False
 
+    def test_metrics_endpoint(self):
+        """Test /metrics serves Prometheus exposition format"""
         with app.health_app.test_client() as client:
-            response = client.get('/ready')
+            response = client.get('/metrics')
             assert response.status_code == 200
-            data = response.get_json()
-            assert data['ready'] is True
-            assert data['slack_connected'] is True
+            assert response.content_type.startswith('text/plain')
+            body = response.get_data(as_text=True)
+            assert 'ledger_bot_llm_latency_seconds' in body
+            assert 'ledger_bot_queue_depth' in body
 
     def test_ready_endpoint_when_not_ready(self):
         """Test /ready endpoint returns 503 when not ready"""
-        app.health_status['ready'] = False
-        app.health_status['slack_connected'] = False
-
         with app.health_app.test_client() as client:
             response = client.get('/ready')
             assert response.status_code == 503
@@ -82,3 +144,601 @@ class TestConfiguration:
         """Test health port defaults to 8080"""
         port = int(os.environ.get('HEALTH_PORT', '8080'))
         assert port == 8080
+
+    def test_missing_env_vars_fail_fast(self):
+        """Test startup names every missing required variable"""
+        with patch.dict(os.environ, {'SLACK_APP_TOKEN': 'test-app-token'}, clear=True):
+            with pytest.raises(SystemExit, match="SLACK_BOT_TOKEN, LITELLM_DEVELOPER_KEY"):
+                app.check_environment()
+
+
+class TestStartup:
+    """Test the lazy startup pipeline"""
+
+    def test_import_needs_no_tokens(self):
+        """Test app imports without tokens and builds no clients until used"""
+        env = {k: v for k, v in os.environ.items()
+               if k not in ('SLACK_BOT_TOKEN', 'SLACK_APP_TOKEN', 'LITELLM_DEVELOPER_KEY')}
+        result = subprocess.run(
+            [sys.executable, "-c", "import app; print(app.slack_app, app.llm_client, app.dispatcher)"],
+            cwd=os.path.dirname(os.path.dirname(__file__)), env=env, capture_output=True, text=True, timeout=60
+        )
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.count("not built") == 3
+
+    def test_cassette_refused_with_async_runtime(self, tmp_path):
+        """Test CASSETTE_MODE with BOT_RUNTIME=async fails at startup instead of calling LiteLLM"""
+        env = dict(os.environ, BOT_RUNTIME="async", CASSETTE_MODE="replay",
+                   CASSETTE_PATH=str(tmp_path / "cassette.jsonl"))
+        result = subprocess.run(
+            [sys.executable, "-c", "import app"],
+            cwd=os.path.dirname(os.path.dirname(__file__)), env=env, capture_output=True, text=True, timeout=60
+        )
+        assert result.returncode != 0
+        assert "CASSETTE_MODE only works with BOT_RUNTIME=sync" in result.stderr
+
+    def test_slack_app_registers_handlers(self):
+        """Test building the Slack app wires up the mention and DM handlers"""
+        with patch.dict(os.environ, {'SLACK_BOT_TOKEN': 'xoxb-test'}), \
+             patch.object(app, 'App') as bolt_app:
+            slack_app = app.create_slack_app()
+
+        assert slack_app is bolt_app.return_value
+        registered = {call.args[0]: handler_call.args[0]
+                      for call, handler_call in zip(slack_app.event.call_args_list,
+                                                    slack_app.event.return_value.call_args_list)}
+        assert registered == {"app_mention": app.handle_mention, "message": app.handle_message}
+
+    def test_ready_reports_startup_phases(self):
+        """Test /ready includes per-phase startup timings"""
+        with app.health_app.test_client() as client:
+            data = client.get('/ready').get_json()
+
+        assert {"imports", "knowledge"} <= set(data["startup"]["phases_ms"])
+
+
+def make_chunk(content):
+    """Build a streamed completion chunk"""
+    chunk = MagicMock()
+    chunk.choices = [MagicMock()]
+    chunk.choices[0].delta.content = content
+    return chunk
+
+
+class TestAnswerQuestion:
+    """Test the shared mention/DM answer flow"""
+
+    def make_client(self):
+        client = MagicMock()
+        client.chat_postMessage.return_value = {"ts": "111.222"}
+        return client
+
+    def test_streams_answer_into_placeholder(self):
+        """Test streamed deltas end with the full answer in the placeholder"""
+        client = self.make_client()
+        chunks = [make_chunk("Use an "), make_chunk("ImpactBuilder."), make_chunk(None)]
+        with patch.object(app, 'STREAM_RESPONSES', True), \
+             patch.object(app.llm_client.chat.completions, 'create', return_value=iter(chunks)) as create:
+            app.answer_question(client, "C1", "how do I add an activity?", thread_ts="1.0")
+
+        assert create.call_args.kwargs["stream"] is True
+        client.chat_postMessage.assert_called_once_with(
+            channel="C1", thread_ts="1.0", text=app.THINKING_MESSAGE
+        )
+        assert client.chat_update.call_args.kwargs["text"] == "Use an ImpactBuilder."
+
+    def test_non_streaming_answer(self):
+        """Test the blocking path when streaming is disabled"""
+        client = self.make_client()
+        response = MagicMock()
+        response.choices[0].message.content = "Answer"
+        with patch.object(app, 'STREAM_RESPONSES', False), \
+             patch.object(app.llm_client.chat.completions, 'create', return_value=response):
+            app.answer_question(client, "D1", "hi")
+
+        client.chat_update.assert_called_once_with(channel="D1", ts="111.222", text="Answer")
+
+    def test_long_answer_truncated(self):
+        """Test answers over MAX_MESSAGE_LENGTH are truncated"""
+        text = app.truncate_response("x" * (app.MAX_MESSAGE_LENGTH + 10))
+        assert text.startswith("x" * app.MAX_MESSAGE_LENGTH)
+        assert "Response truncated" in text
+
+    def test_transient_llm_error_retried(self):
+        """Test a timed-out LLM call is retried before the user sees an error"""
+        client = MagicMock()
+        client.chat_postMessage.return_value = {"ts": "111.222"}
+        response = MagicMock()
+        response.choices[0].message.content = "Recovered answer"
+        with patch.object(app, 'STREAM_RESPONSES', False), \
+             patch.object(app.llm_caller, 'sleep'), \
+             patch.object(app.llm_client.chat.completions, 'create',
+                          side_effect=[TimeoutError("slow"), response]) as create:
+            app.answer_question(client, "C1", "hi")
+        assert create.call_count == 2
+        assert create.call_args.kwargs["timeout"] == app.LLM_ATTEMPT_TIMEOUT
+        assert client.chat_update.call_args.kwargs["text"] == "Recovered answer"
+
+    def test_llm_error_reported_in_placeholder(self):
+        """Test LLM errors replace the placeholder with an error message"""
+        client = self.make_client()
+        with patch.object(app.llm_client.chat.completions, 'create', side_effect=Exception("boom")):
+            app.answer_question(client, "C1", "hi")
+
+        text = client.chat_update.call_args.kwargs["text"]
+        assert text.startswith("❌ Sorry, I encountered an error: `boom`")
+
+
+class TestDispatchQuestion:
+    """Test handing events to the worker pool"""
+
+    def test_question_queued_for_worker(self):
+        """Test accepted events are answered by the worker pool"""
+        client = MagicMock()
+        event = {"channel": "C1", "text": "hi", "user": "U1", "ts": "1.0"}
+        with patch.object(app.dispatcher, 'submit', return_value=True) as submit, \
+             patch.object(app, 'answer_question') as answer:
+            app.dispatch_question(client, event, thread_ts="1.0", source="mention")
+            submit.call_args.args[0]()
+
+        kwargs = submit.call_args.kwargs
+        assert (kwargs["user"], kwargs["channel"], kwargs["weight"]) == ("U1", "C1", 1.0)
+        assert kwargs["cost"] > 0
+        args, kwargs = answer.call_args
+        assert args[1:] == ("C1", "hi")
+        assert kwargs["thread_ts"] == "1.0"
+        assert kwargs["source"] == "mention"
+        client.chat_postMessage.assert_not_called()
+
+    def test_busy_message_when_queue_full(self):
+        """Test users are told to retry when the queue is full"""
+        client = MagicMock()
+        event = {"channel": "C1", "text": "hi", "user": "U1", "ts": "1.0"}
+        with patch.object(app.dispatcher, 'submit', return_value=False):
+            app.dispatch_question(client, event, thread_ts="1.0", source="mention")
+
+        client.chat_postMessage.assert_called_once_with(
+            channel="C1", thread_ts="1.0", text=app.BUSY_MESSAGE
+        )
+
+    def test_ready_reports_llm_breakers(self):
+        """Test /ready includes circuit breaker state"""
+        app.llm_caller.breaker(app.MODEL_NAME)
+        with app.health_app.test_client() as client:
+            data = client.get('/ready').get_json()
+            assert data["llm"]["breakers"][app.MODEL_NAME]["state"] == "closed"
+
+    def test_ready_reports_queue_depth(self):
+        """Test /ready includes dispatcher stats"""
+        with app.health_app.test_client() as client:
+            data = client.get('/ready').get_json()
+            assert "queue_depth" in data["dispatch"]
+
+
+class TestGracefulDrain:
+    """Test SIGTERM drain and event dedup during rolling deploys"""
+
+    def test_redelivered_event_answered_once(self):
+        """Test a second delivery of the same event_id is skipped"""
+        event = {"channel": "C1", "text": "hi", "user": "U1", "ts": "1.0"}
+        body = {"event_id": "Ev1", "event": event}
+        with patch.object(app, 'event_deduper', EventDeduper()), \
+             patch.object(app, 'dispatch_question') as dispatch:
+            app.handle_mention(event, MagicMock(), MagicMock(), body=body)
+            app.handle_mention(event, MagicMock(), MagicMock(), body=body)
+            app.handle_message(dict(event, ts="2.0"), MagicMock(), MagicMock(), body={"event_id": "Ev2"})
+        assert dispatch.call_count == 2
+
+    def test_edits_and_deletions_ignored(self):
+        """Test message_changed (the bot's own streamed edits) and other non-user subtypes aren't questions"""
+        edited = {"type": "message", "subtype": "message_changed", "channel": "D1",
+                  "message": {"text": "partial :writing_hand:", "bot_id": "B1"}, "ts": "3.0"}
+        deleted = {"type": "message", "subtype": "message_deleted", "channel": "D1", "ts": "4.0"}
+        shared = {"type": "message", "subtype": "file_share", "channel": "D1", "user": "U1", "text": "see this",
+                  "ts": "5.0"}
+        with patch.object(app, 'event_deduper', EventDeduper()), \
+             patch.object(app, 'dispatch_question') as dispatch:
+            for i, event in enumerate((edited, deleted, shared)):
+                app.handle_message(event, MagicMock(), MagicMock(), body={"event_id": f"Ev{i}"})
+        dispatch.assert_called_once()
+        assert dispatch.call_args.args[1] is shared
+
+    def test_dedup_failure_still_answers(self):
+        """Test a broken dedup store doesn't drop events"""
+        deduper = MagicMock()
+        deduper.claim.side_effect = RuntimeError("database is locked")
+        with patch.object(app, 'event_deduper', deduper):
+            assert app.claim_event({"event_id": "Ev1"}, "mention")
+
+    def test_draining_tells_user_to_ask_again(self):
+        """Test events that arrive while draining get the restart message instead of queueing"""
+        client = MagicMock()
+        event = {"channel": "C1", "text": "hi", "user": "U1", "ts": "1.0"}
+        drainer = Drainer()
+        drainer.begin()
+        with patch.object(app, 'drainer', drainer), \
+             patch.object(app.dispatcher, 'submit') as submit:
+            app.dispatch_question(client, event, thread_ts="1.0", source="mention")
+        submit.assert_not_called()
+        client.chat_postMessage.assert_called_once_with(channel="C1", thread_ts="1.0", text=app.RESTART_MESSAGE)
+
+    def test_question_tracked_until_answered(self):
+        """Test a queued question stays pending until its worker finishes"""
+        event = {"channel": "C1", "text": "hi", "user": "U1", "ts": "1.0"}
+        drainer = Drainer()
+        with patch.object(app, 'drainer', drainer), \
+             patch.object(app.dispatcher, 'submit', return_value=True) as submit, \
+             patch.object(app, 'answer_question') as answer:
+            app.dispatch_question(MagicMock(), event, thread_ts="1.0", source="mention")
+            assert drainer.pending() == 1
+            submit.call_args.args[0]()
+        assert answer.call_args.kwargs["reply"].channel == "C1"
+        assert drainer.pending() == 0
+
+    def test_not_ready_while_draining(self):
+        """Test /ready fails once a drain starts so no new traffic is routed here"""
+        drainer = Drainer()
+        drainer.begin()
+        with patch.object(app.startup, 'ready_after', 1.0), \
+             patch.object(app, 'socket_health', SocketModeHealth()), \
+             patch.object(app, 'drainer', drainer), \
+             app.health_app.test_client() as client:
+            app.socket_health.on_message('{"type": "hello"}')
+            response = client.get('/ready')
+        assert response.status_code == 503
+        assert response.get_json()['drain']['draining'] is True
+
+    def test_drain_rewrites_unfinished_placeholders(self):
+        """Test drain closes Socket Mode, waits out the deadline and replaces stuck answers"""
+        handler = MagicMock()
+        slack = MagicMock()
+        drainer = Drainer(timeout=0.05)
+        drainer.track(slack, "C1", "1.0").ts = "2.0"
+        dispatcher = MagicMock()
+        with patch.object(app, 'drainer', drainer), \
+             patch.object(app, 'dispatcher', dispatcher), \
+             patch.object(app, 'slack_scheduler', MagicMock()):
+            app.drain(handler)
+
+        handler.close.assert_called_once()
+        dispatcher.shutdown.assert_called_once_with(wait=False)
+        dispatcher.cancel_pending.assert_called_once()
+        slack.chat_update.assert_called_once_with(channel="C1", ts="2.0", text=app.RESTART_MESSAGE)
+
+
+class TestQuotas:
+    """Test per-user and per-channel quotas in front of the worker pool"""
+
+    def test_throttled_user_told_to_wait(self):
+        """Test a user over their request quota gets the throttle message instead of an answer"""
+        client = MagicMock()
+        quotas = QuotaManager(user_requests_per_minute=1, user_tokens_per_hour=0,
+                              channel_requests_per_minute=0, channel_tokens_per_hour=0)
+        with patch.object(app, 'quotas', quotas), \
+             patch.object(app.dispatcher, 'submit', return_value=True) as submit:
+            app.dispatch_question(client, {"channel": "C1", "text": "first", "user": "U1"}, source="DM")
+            app.dispatch_question(client, {"channel": "C1", "text": "second", "user": "U1"}, source="DM")
+
+        assert submit.call_count == 1
+        text = client.chat_postMessage.call_args.kwargs["text"]
+        assert text.startswith(":hourglass: You've asked a lot of questions recently")
+        assert "60 seconds" in text
+        assert quotas.stats()["throttled"] == {"user": 1, "channel": 0}
+
+    def test_channel_quota_message(self):
+        """Test the throttle message names the channel when the channel quota refused it"""
+        admission = Admission("U1", "C1", 100, allowed=False, scope="channel", retry_after=600)
+        assert app.throttled_message(admission) == (
+            ":hourglass: This channel has asked a lot of questions recently. Please try again in 10 minutes."
+        )
+
+    def test_quotas_disabled(self):
+        """Test nothing is throttled with QUOTAS_ENABLED=false"""
+        client = MagicMock()
+        quotas = QuotaManager(user_requests_per_minute=1)
+        with patch.object(app, 'QUOTAS_ENABLED', False), patch.object(app, 'quotas', quotas), \
+             patch.object(app.dispatcher, 'submit', return_value=True) as submit:
+            for _ in range(3):
+                app.dispatch_question(client, {"channel": "C1", "text": "hi", "user": "U1"}, source="DM")
+
+        assert submit.call_count == 3
+
+    def test_priority_channel_weight(self):
+        """Test priority channels get their weight in the fair queue"""
+        quotas = QuotaManager(channel_weights={"CINCIDENT": 4})
+        with patch.object(app, 'quotas', quotas), \
+             patch.object(app.dispatcher, 'submit', return_value=True) as submit:
+            app.dispatch_question(MagicMock(), {"channel": "CINCIDENT", "text": "hi", "user": "U1"},
+                                  source="DM")
+
+        assert submit.call_args.kwargs["weight"] == 4
+
+    def test_answer_settles_estimate(self):
+        """Test the up-front estimate is corrected to the answer's size once answered"""
+        quotas = QuotaManager()
+        with patch.object(app, 'quotas', quotas), \
+             patch.object(app.dispatcher, 'submit', return_value=True) as submit, \
+             patch.object(app, 'answer_question', return_value="A short answer.") as answer:
+            app.dispatch_question(MagicMock(), {"channel": "C1", "text": "hi", "user": "U1"}, source="DM")
+            submit.call_args.args[0]()
+
+        answer.assert_called_once()
+        prompt_tokens, answer_tokens = app.estimate_question_tokens("hi", channel="C1")
+        user, = quotas.stats()["top_users"]
+        assert user["id"] == "U1"
+        assert user["tokens"] == prompt_tokens + app.estimate_tokens("A short answer.")
+        assert submit.call_args.kwargs["cost"] == prompt_tokens + answer_tokens
+
+    def test_coalesced_follower_charged_nothing(self):
+        """Test a question answered by an identical in-flight one gets its whole estimate back"""
+        quotas = QuotaManager()
+        with patch.object(app, 'quotas', quotas), \
+             patch.object(app.dispatcher, 'submit', return_value=True) as submit, \
+             patch.object(app.singleflight, 'begin', return_value=(MagicMock(), False)), \
+             patch.object(app.singleflight, 'wait', return_value="Shared answer."), \
+             patch.object(app, 'generate_answer') as generate:
+            app.dispatch_question(MagicMock(), {"channel": "C1", "text": "hi", "user": "U1"}, source="DM")
+            submit.call_args.args[0]()
+
+        generate.assert_not_called()
+        user, = quotas.stats()["top_users"]
+        assert user["tokens"] == 0
+        assert user["admitted"] == 1
+
+    def test_quota_usage_endpoint(self):
+        """Test /quotas lists every tracked user's totals"""
+        quotas = QuotaManager()
+        for user in ("U1", "U2"):
+            quotas.settle(quotas.admit(user, "D1", 10), 10)
+        with patch.object(app, 'quotas', quotas), app.health_app.test_client() as client:
+            data = client.get('/quotas').get_json()
+        assert [u["id"] for u in data["users"]] == ["U1", "U2"]
+        assert data["channels"] == [{"id": "D1", "tokens": 20, "admitted": 2, "throttled": 0}]
+
+    def test_ready_reports_quotas(self):
+        """Test /ready includes quota limits and usage"""
+        with app.health_app.test_client() as client:
+            data = client.get('/ready').get_json()
+            assert data["quotas"]["enabled"] == app.QUOTAS_ENABLED
+            assert "top_channels" in data["quotas"]
+
+
+class TestBuildMessages:
+    """Test prompt construction"""
+
+    def test_retrieval_sends_relevant_sections(self):
+        """Test retrieval trims the knowledge base for the question"""
+        with patch.object(app, 'RETRIEVAL_ENABLED', True):
+            messages = app.build_messages("how do reversals work?")
+        assert messages[0]["role"] == "system"
+        assert len(messages[0]["content"]) < len(app.KNOWLEDGE_BASE)
+        assert messages[1] == {"role": "user", "content": "how do reversals work?"}
+
+    def test_full_knowledge_base_without_retrieval(self):
+        """Test the whole compiled knowledge base is sent when retrieval is off"""
+        with patch.object(app, 'RETRIEVAL_ENABLED', False):
+            messages = app.build_messages("hi")
+        assert messages[0]["content"] == app.knowledge.prompt_text
+        assert len(messages[0]["content"]) <= len(app.KNOWLEDGE_BASE)
+
+    def test_archived_sections_not_sent(self):
+        """Test sections archived to meet the token ceiling are left out of the prompt"""
+        kb = compile_tiers(app.KNOWLEDGE_BASE, token_ceiling=2000).kb
+        with patch.object(app, 'RETRIEVAL_ENABLED', False):
+            messages = app.build_messages("hi", kb=kb)
+        assert estimate_tokens(messages[0]["content"]) <= 2000
+        assert "### Example: Impact Builder Structure" not in messages[0]["content"]
+
+    def test_prompt_cache_sends_stable_cached_prefix(self):
+        """Test prompt caching sends the whole KB as one cache_control block"""
+        with patch.object(app, 'PROMPT_CACHE_ENABLED', True), \
+                patch.object(app, 'RETRIEVAL_ENABLED', True):
+            first = app.build_messages("how do reversals work?")
+            second = app.build_messages("what is a journal entry?")
+        assert first[0]["content"] == [
+            {"type": "text", "text": app.knowledge.prompt_text, "cache_control": {"type": "ephemeral"}}
+        ]
+        # The prefix must not change between questions or it never hits
+        assert first[0] == second[0]
+        assert second[1] == {"role": "user", "content": "what is a journal entry?"}
+
+    def test_question_mention_stripped_like_history(self):
+        """Test the current question is sent without the bot mention, as stored turns are"""
+        messages = app.build_messages("<@U999> how do reversals work?")
+        assert messages[-1] == {"role": "user", "content": "how do reversals work?"}
+        assert app.build_messages("<@U999>")[-1] == {"role": "user", "content": "<@U999>"}
+
+
+class TestResponseCache:
+    """Test answering repeat questions from the cache"""
+
+    def test_answer_cached_and_reused(self):
+        """Test a second identical question skips the LLM and the queue"""
+        client = MagicMock()
+        client.chat_postMessage.return_value = {"ts": "111.222"}
+        response = MagicMock()
+        response.choices[0].message.content = "Use an ImpactBuilder."
+        with patch.object(app, 'STREAM_RESPONSES', False), \
+             patch.object(app.llm_client.chat.completions, 'create', return_value=response) as create:
+            app.answer_question(client, "C1", "<@U999> How do I add a new activity?")
+
+        event = {"channel": "C2", "text": "how do i add a new   activity", "user": "U2", "ts": "2.0"}
+        with patch.object(app.dispatcher, 'submit') as submit:
+            app.dispatch_question(client, event, thread_ts="2.0", source="mention")
+
+        submit.assert_not_called()
+        assert create.call_count == 1
+        client.chat_postMessage.assert_called_with(channel="C2", thread_ts="2.0", text="Use an ImpactBuilder.")
+        assert app.response_cache.stats()["hits"] == 1
+
+    def test_errors_not_cached(self):
+        """Test failed answers are not cached"""
+        client = MagicMock()
+        client.chat_postMessage.return_value = {"ts": "111.222"}
+        with patch.object(app.llm_client.chat.completions, 'create', side_effect=Exception("boom")):
+            app.answer_question(client, "C1", "hi")
+        assert len(app.response_cache) == 0
+
+    def test_ready_reports_cache_stats(self):
+        """Test /ready includes cache counters"""
+        with app.health_app.test_client() as client:
+            data = client.get('/ready').get_json()
+            assert "hits" in data["cache"]
+
+
+class TestConversationMemory:
+    """Test follow-up questions in a thread keep their context"""
+
+    def test_follow_up_sends_thread_history(self):
+        """Test a follow-up includes earlier turns and bypasses the cache"""
+        client = MagicMock()
+        client.chat_postMessage.return_value = {"ts": "111.222"}
+        first, second = MagicMock(), MagicMock()
+        first.choices[0].message.content = "Reversals swap debits and credits."
+        second.choices[0].message.content = "Accruals reverse on the first of the month."
+        with patch.object(app, 'STREAM_RESPONSES', False), \
+             patch.object(app.llm_client.chat.completions, 'create', side_effect=[first, second]) as create:
+            app.answer_question(client, "C1", "<@U999> how do reversals work?", thread_ts="1.0")
+            app.answer_question(client, "C1", "<@U999> what about accruals?", thread_ts="1.0")
+
+        messages = create.call_args.kwargs["messages"]
+        assert messages[1:] == [
+            {"role": "user", "content": "how do reversals work?"},
+            {"role": "assistant", "content": "Reversals swap debits and credits."},
+            {"role": "user", "content": "what about accruals?"},
+        ]
+        # Only the standalone first question is cacheable
+        assert len(app.response_cache) == 1
+
+    def test_follow_up_not_answered_from_cache(self):
+        """Test a cached standalone answer isn't reused for a thread follow-up"""
+        client = MagicMock()
+        app.response_cache.put(app.response_cache_key("what about accruals?"), "cached", kb_hash=app.knowledge.hash)
+        app.conversations.append("C1", "1.0", "how do reversals work?", "Reversals swap debits and credits.")
+        assert not app.reply_from_cache(client, "C1", "what about accruals?", thread_ts="1.0")
+        assert app.reply_from_cache(client, "C1", "what about accruals?", thread_ts="2.0")
+
+    def test_top_level_dms_do_not_share_history(self):
+        """Test separate top-level DMs aren't each other's history, so a repeated question hits the cache"""
+        client = MagicMock()
+        client.chat_postMessage.return_value = {"ts": "111.222"}
+        first, second = MagicMock(), MagicMock()
+        first.choices[0].message.content = "Reversals swap debits and credits."
+        second.choices[0].message.content = "Accruals reverse on the first of the month."
+        with patch.object(app, 'STREAM_RESPONSES', False), \
+             patch.object(app.llm_client.chat.completions, 'create', side_effect=[first, second]) as create:
+            app.answer_question(client, "D1", "how do reversals work?")
+            app.answer_question(client, "D1", "what about accruals?")
+
+        assert create.call_args.kwargs["messages"][1:] == [{"role": "user", "content": "what about accruals?"}]
+        assert app.conversation_history("D1", None) == []
+        assert app.reply_from_cache(client, "D1", "how do reversals work?")
+        assert client.chat_postMessage.call_args.kwargs["text"] == "Reversals swap debits and credits."
+
+    def test_mention_in_thread_answers_in_thread(self):
+        """Test a mention inside a thread replies to and remembers the root thread"""
+        event = {"channel": "C1", "text": "what about accruals?", "user": "U1", "ts": "5.0", "thread_ts": "1.0"}
+        with patch.object(app, 'dispatch_question') as dispatch:
+            app.handle_mention(event, MagicMock(), MagicMock())
+        assert dispatch.call_args.kwargs["thread_ts"] == "1.0"
+
+
+class TestRouting:
+    """Test questions are answered by the routed model tier"""
+
+    def test_routed_tier_sets_model_and_max_tokens(self):
+        """Test a lookup question uses the fast tier's model and max_tokens"""
+        client = MagicMock()
+        client.chat_postMessage.return_value = {"ts": "111.222"}
+        response = MagicMock()
+        response.choices[0].message.content = "Ask in #ledger-help."
+        with patch.object(app, 'ROUTING_ENABLED', True), \
+             patch.object(app, 'STREAM_RESPONSES', False), \
+             patch.object(app.llm_client.chat.completions, 'create', return_value=response) as create:
+            app.answer_question(client, "C1", "which slack channel do I ask in?")
+        assert create.call_args.kwargs["model"] == app.router.fast.model
+        assert create.call_args.kwargs["max_tokens"] == app.router.fast.max_tokens
+
+    def test_routing_off_uses_default_model(self):
+        """Test the single configured model is used when routing is disabled"""
+        assert app.route_question("which slack channel do I ask in?").tier.model == app.MODEL_NAME
+        default_key = app.question_key("which slack channel do I ask in?")
+        with patch.object(app, 'ROUTING_ENABLED', True):
+            # Answers from different models are cached separately
+            assert app.question_key("which slack channel do I ask in?") != default_key
+
+
+class TestCoalescing:
+    """Test identical in-flight questions share one LLM call"""
+
+    def test_follower_reuses_in_flight_answer(self):
+        """Test a question already in flight is answered from the leader's call"""
+        client = MagicMock()
+        client.chat_postMessage.return_value = {"ts": "333.444"}
+        key = app.question_key("what is attribute6")
+        call, _ = app.singleflight.begin(key)
+
+        with patch.object(app.llm_client.chat.completions, 'create') as create:
+            follower = threading.Thread(
+                target=app.answer_question, args=(client, "C1", "<@U1> What is ATTRIBUTE6?")
+            )
+            follower.start()
+            while call.followers == 0:
+                time.sleep(0.001)
+            app.singleflight.finish(key, call, result="ATTRIBUTE6 is the external source id.")
+            follower.join(2)
+
+        create.assert_not_called()
+        client.chat_update.assert_called_with(
+            channel="C1", ts="333.444", text="ATTRIBUTE6 is the external source id."
+        )
+
+    def test_leader_releases_key_on_error(self):
+        """Test a failed leader doesn't leave the question stuck in flight"""
+        client = MagicMock()
+        client.chat_postMessage.return_value = {"ts": "111.222"}
+        with patch.object(app.llm_client.chat.completions, 'create', side_effect=Exception("boom")):
+            app.answer_question(client, "C1", "hi there")
+        assert app.singleflight.in_flight() == 0
+
+
+class TestKnowledgeReload:
+    """Test hot reloading the knowledge base"""
+
+    def test_admin_reload_swaps_knowledge(self, tmp_path):
+        """Test POST /admin/reload-knowledge swaps in the edited file"""
+        original = app.knowledge
+        path = tmp_path / "knowledge_base.txt"
+        path.write_text(original.text + "\n## ACCRUALS\nAccruals are booked monthly.\n")
+        reloader = app.KnowledgeReloader(
+            str(path), original, build=app.build_knowledge, on_swap=app.install_knowledge
+        )
+        try:
+            with patch.object(app, 'knowledge_reloader', reloader), \
+                 patch.object(app, 'KB_RELOAD_TOKEN', 'secret'), \
+                 app.health_app.test_client() as client:
+                response = client.post('/admin/reload-knowledge', headers={"X-Admin-Token": "secret"})
+            data = response.get_json()
+            assert response.status_code == 200
+            assert data["reloaded"] is True
+            assert app.knowledge is reloader.current
+            assert app.knowledge.hash != original.hash
+            assert "ACCRUALS" in app.KNOWLEDGE_BASE
+        finally:
+            app.install_knowledge(original)
+
+    def test_admin_reload_requires_token(self):
+        """Test the reload endpoint checks KB_RELOAD_TOKEN when set"""
+        with patch.object(app, 'KB_RELOAD_TOKEN', 'secret'), \
+             app.health_app.test_client() as client:
+            assert client.post('/admin/reload-knowledge').status_code == 403
+            assert client.post('/admin/reload-knowledge', headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+    def test_admin_reload_disabled_without_token(self):
+        """Test the reload endpoint fails closed when KB_RELOAD_TOKEN is unset"""
+        with patch.object(app, 'KB_RELOAD_TOKEN', ''), \
+             patch.object(app, 'knowledge_reloader') as reloader, \
+             app.health_app.test_client() as client:
+            assert client.post('/admin/reload-knowledge').status_code == 404
+            assert client.post('/admin/reload-knowledge', headers={"X-Admin-Token": ""}).status_code == 404
+        reloader.reload.assert_not_called()
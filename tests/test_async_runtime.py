@@ -0,0 +1,287 @@
+"""Unit tests for the asyncio runtime"""
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from ledger_bot.async_runtime import AsyncAnswerer
+from ledger_bot.cache import ResponseCache
+from ledger_bot.conversation import ConversationStore
+from ledger_bot.drain import Drainer
+from ledger_bot.quotas import Admission
+
+
+def make_chunk(content):
+    """Build a streamed completion chunk"""
+    chunk = MagicMock()
+    chunk.choices = [MagicMock()]
+    chunk.choices[0].delta.content = content
+    return chunk
+
+
+async def async_iter(items):
+    for item in items:
+        yield item
+
+
+def make_answerer(llm_client, **kwargs):
+    return AsyncAnswerer(
+        llm_client,
+        "test-model",
+        lambda question, kb=None: [{"role": "user", "content": question}],
+        lambda text: text,
+        lambda error: f"error: {error}",
+        **kwargs
+    )
+
+
+def make_slack_client():
+    client = MagicMock()
+    client.chat_postMessage = AsyncMock(return_value={"ts": "111.222"})
+    client.chat_update = AsyncMock()
+    return client
+
+
+class TestAsyncAnswerer:
+    """Test the async answer flow"""
+
+    def test_streams_answer(self):
+        """Test streamed deltas end with the full answer in the placeholder"""
+        llm_client = MagicMock()
+        llm_client.chat.completions.create = AsyncMock(
+            return_value=async_iter([make_chunk("Hello "), make_chunk("world")])
+        )
+        client = make_slack_client()
+
+        asyncio.run(make_answerer(llm_client).answer(client, "C1", "hi", thread_ts="1.0"))
+
+        assert llm_client.chat.completions.create.call_args.kwargs["stream"] is True
+        assert client.chat_update.call_args.kwargs["text"] == "Hello world"
+
+    def test_error_reported(self):
+        """Test LLM errors replace the placeholder"""
+        llm_client = MagicMock()
+        llm_client.chat.completions.create = AsyncMock(side_effect=Exception("boom"))
+        client = make_slack_client()
+
+        asyncio.run(make_answerer(llm_client).answer(client, "C1", "hi"))
+
+        assert client.chat_update.call_args.kwargs["text"] == "error: boom"
+
+    def test_follow_up_sends_thread_history(self):
+        """Test earlier turns of the thread are sent and the new turn remembered"""
+        response = MagicMock()
+        response.choices[0].message.content = "Accruals reverse monthly."
+        llm_client = MagicMock()
+        llm_client.chat.completions.create = AsyncMock(return_value=response)
+        store = ConversationStore()
+        store.append("C1", "1.0", "how do reversals work?", "They swap debits and credits.")
+        build_messages = MagicMock(return_value=[])
+        answerer = AsyncAnswerer(
+            llm_client, "test-model", build_messages, lambda text: text, str, stream=False,
+            history=store.history, remember=store.append
+        )
+
+        asyncio.run(answerer.answer(make_slack_client(), "C1", "what about accruals?", thread_ts="1.0"))
+
+        assert build_messages.call_args.kwargs["history"][0]["content"] == "how do reversals work?"
+        assert store.history("C1", "1.0")[-1]["content"] == "Accruals reverse monthly."
+
+    def test_concurrency_bounded(self):
+        """Test no more than max_concurrency LLM calls run at once"""
+        in_flight = 0
+        peak = 0
+
+        async def slow_create(**kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            response = MagicMock()
+            response.choices[0].message.content = "ok"
+            return response
+
+        llm_client = MagicMock()
+        llm_client.chat.completions.create = slow_create
+        answerer = make_answerer(llm_client, stream=False, max_concurrency=3)
+        client = make_slack_client()
+
+        async def run():
+            await asyncio.gather(*(answerer.answer(client, "C1", "hi") for _ in range(10)))
+
+        asyncio.run(run())
+        assert peak == 3
+        assert client.chat_update.call_count == 10
+
+    def test_sheds_load_when_too_many_pending(self):
+        """Test the busy message once max_pending is reached"""
+        llm_client = MagicMock()
+        answerer = make_answerer(llm_client, max_pending=0, busy_message="busy")
+        client = make_slack_client()
+
+        asyncio.run(answerer.answer(client, "C1", "hi", thread_ts="1.0"))
+
+        client.chat_postMessage.assert_called_once_with(channel="C1", thread_ts="1.0", text="busy")
+        llm_client.chat.completions.create.assert_not_called()
+
+    def test_draining_tells_user_to_ask_again(self):
+        """Test questions arriving during a drain get the restart message"""
+        llm_client = MagicMock()
+        drainer = Drainer()
+        drainer.begin()
+        answerer = make_answerer(llm_client, drainer=drainer, restart_message="restarting")
+        client = make_slack_client()
+
+        asyncio.run(answerer.answer(client, "C1", "hi", thread_ts="1.0"))
+
+        client.chat_postMessage.assert_called_once_with(channel="C1", thread_ts="1.0", text="restarting")
+        llm_client.chat.completions.create.assert_not_called()
+
+    def test_answer_tracked_until_done(self):
+        """Test the drainer sees the question's placeholder while it's being answered"""
+        drainer = Drainer()
+        seen = []
+
+        async def create(**kwargs):
+            seen.extend(reply.ts for reply in drainer._pending)
+            response = MagicMock()
+            response.choices[0].message.content = "ok"
+            return response
+
+        llm_client = MagicMock()
+        llm_client.chat.completions.create = create
+        answerer = make_answerer(llm_client, stream=False, drainer=drainer)
+
+        asyncio.run(answerer.answer(make_slack_client(), "C1", "hi"))
+
+        assert seen == ["111.222"]
+        assert drainer.pending() == 0
+
+    def test_throttled_question_skips_llm(self):
+        """Test a question refused by a quota gets the throttle reply and isn't settled"""
+        llm_client = MagicMock()
+        settle = MagicMock()
+        answerer = make_answerer(
+            llm_client, admit=lambda user, channel, question, history: Admission(user, channel, 10, allowed=False),
+            settle=settle, throttled_message=lambda admission: f"slow down {admission.user}"
+        )
+        client = make_slack_client()
+
+        asyncio.run(answerer.answer(client, "C1", "hi", thread_ts="1.0", user="U1"))
+
+        client.chat_postMessage.assert_called_once_with(channel="C1", thread_ts="1.0", text="slow down U1")
+        llm_client.chat.completions.create.assert_not_called()
+        settle.assert_not_called()
+
+    def test_admitted_question_settled_with_answer(self):
+        """Test an admitted question is settled with the answer text"""
+        response = MagicMock()
+        response.choices[0].message.content = "ok"
+        llm_client = MagicMock()
+        llm_client.chat.completions.create = AsyncMock(return_value=response)
+        settle = MagicMock()
+        answerer = make_answerer(
+            llm_client, stream=False, admit=lambda user, channel, question, history: Admission(user, channel, 10),
+            settle=settle
+        )
+
+        asyncio.run(answerer.answer(make_slack_client(), "C1", "hi", user="U1"))
+
+        admission, question, answer, _ = settle.call_args.args
+        assert (admission.user, question, answer) == ("U1", "hi", "ok")
+
+    def test_cached_answer_skips_llm(self):
+        """Test a cached answer is posted without calling the LLM"""
+        cache = ResponseCache()
+        cache.put("key", "cached answer")
+        llm_client = MagicMock()
+        answerer = make_answerer(llm_client, cache=cache, cache_key=lambda question, kb=None, channel=None: "key")
+        client = make_slack_client()
+
+        asyncio.run(answerer.answer(client, "C1", "hi", thread_ts="1.0"))
+
+        client.chat_postMessage.assert_called_once_with(channel="C1", thread_ts="1.0", text="cached answer")
+        llm_client.chat.completions.create.assert_not_called()
+
+    def test_knowledge_pinned_per_question(self):
+        """Test a reload mid-answer doesn't change the prompt's or the cached answer's knowledge version"""
+        old, new = SimpleNamespace(hash="v1"), SimpleNamespace(hash="v2")
+        current = [old]
+
+        async def create(**kwargs):
+            current[0] = new  # hot reload while the LLM is answering
+            response = MagicMock()
+            response.choices[0].message.content = "answer"
+            return response
+
+        llm_client = MagicMock()
+        llm_client.chat.completions.create = create
+        build_messages = MagicMock(return_value=[])
+        cache = MagicMock()
+        cache.get.return_value = None
+        answerer = AsyncAnswerer(
+            llm_client, "test-model", build_messages, lambda text: text, str, stream=False,
+            cache=cache, cache_key=lambda question, kb=None, channel=None: f"{question}@{kb.hash}",
+            knowledge=lambda: current[0]
+        )
+
+        asyncio.run(answerer.answer(make_slack_client(), "C1", "hi"))
+
+        assert build_messages.call_args.kwargs["kb"] is old
+        assert cache.put.call_args.args[0] == "hi@v1"
+        assert cache.put.call_args.kwargs["kb_hash"] == "v1"
+
+    def test_identical_questions_coalesced(self):
+        """Test concurrent identical questions share one LLM call"""
+        calls = 0
+
+        async def slow_create(**kwargs):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            response = MagicMock()
+            response.choices[0].message.content = "shared"
+            return response
+
+        llm_client = MagicMock()
+        llm_client.chat.completions.create = slow_create
+        answerer = make_answerer(
+            llm_client, stream=False, coalesce_key=lambda question, kb=None, channel=None: question
+        )
+        client = make_slack_client()
+
+        async def run():
+            await asyncio.gather(*(answerer.answer(client, "C1", "same") for _ in range(4)))
+
+        asyncio.run(run())
+        assert calls == 1
+        assert answerer.saved_calls == 3
+        assert [c.kwargs["text"] for c in client.chat_update.call_args_list] == ["shared"] * 4
+
+    def test_coalesced_followers_marked_shared(self):
+        """Test followers' admissions are marked shared so settle can refund them"""
+        async def slow_create(**kwargs):
+            await asyncio.sleep(0.01)
+            response = MagicMock()
+            response.choices[0].message.content = "shared"
+            return response
+
+        llm_client = MagicMock()
+        llm_client.chat.completions.create = slow_create
+        settle = MagicMock()
+        answerer = make_answerer(
+            llm_client, stream=False, coalesce_key=lambda question, kb=None, channel=None: question,
+            admit=lambda user, channel, question, history: Admission(user, channel, 10), settle=settle
+        )
+        client = make_slack_client()
+
+        async def run():
+            await asyncio.gather(*(answerer.answer(client, "C1", "same", user=f"U{i}") for i in range(3)))
+
+        asyncio.run(run())
+        assert sorted(call.args[0].shared for call in settle.call_args_list) == [False, True, True]
@@ -0,0 +1,78 @@
+"""Unit tests for the response cache"""
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from ledger_bot.cache import ResponseCache, cache_key, normalize_question
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestNormalizeQuestion:
+    """Test question normalization"""
+
+    def test_strips_mentions_case_and_whitespace(self):
+        """Test equivalent phrasings normalize to the same text"""
+        assert normalize_question("<@U123ABC>  How do I add a   new activity?") == "how do i add a new activity"
+        assert normalize_question("how do i add a new activity") == "how do i add a new activity"
+
+    def test_key_depends_on_kb_and_model(self):
+        """Test the key changes with the KB hash and model"""
+        base = cache_key("What is ATTRIBUTE6?", "kb1", "sonnet")
+        assert base == cache_key("<@U1> what is attribute6", "kb1", "sonnet")
+        assert base != cache_key("What is ATTRIBUTE6?", "kb2", "sonnet")
+        assert base != cache_key("What is ATTRIBUTE6?", "kb1", "haiku")
+
+
+class TestResponseCache:
+    """Test LRU, TTL and invalidation"""
+
+    def test_hit_and_miss_counters(self):
+        """Test hits and misses are counted"""
+        cache = ResponseCache()
+        assert cache.get("k") is None
+        cache.put("k", "answer")
+        assert cache.get("k") == "answer"
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted"""
+        cache = ResponseCache(max_entries=2)
+        cache.put("a", "1")
+        cache.put("b", "2")
+        cache.get("a")
+        cache.put("c", "3")
+        assert cache.get("b") is None
+        assert cache.get("a") == "1"
+        assert cache.stats()["evictions"] == 1
+
+    def test_ttl_expiry(self):
+        """Test entries expire after their TTL"""
+        clock = FakeClock()
+        cache = ResponseCache(ttl=10, clock=clock)
+        cache.put("k", "answer")
+        clock.now = 9.9
+        assert cache.get("k") == "answer"
+        clock.now = 10.0
+        assert cache.get("k") is None
+        assert cache.stats()["expirations"] == 1
+
+    def test_invalidate_kb(self):
+        """Test entries from older KB versions are dropped"""
+        cache = ResponseCache()
+        cache.put("old", "1", kb_hash="kb1")
+        cache.put("new", "2", kb_hash="kb2")
+        assert cache.invalidate_kb("kb2") == 1
+        assert cache.get("old") is None
+        assert cache.get("new") == "2"
@@ -0,0 +1,260 @@
+"""Unit tests for LLM/Slack cassette recording and replay"""
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from ledger_bot.cassette import (
+    Cassette,
+    RecordingLLMClient,
+    RecordingSlackClient,
+    ReplayedLLMError,
+    ReplayLLMClient,
+    last_question,
+    request_key,
+)
+from ledger_bot.resilience import PeekedStream
+
+MESSAGES = [{"role": "system", "content": "kb"}, {"role": "user", "content": "How do reversals work?"}]
+
+
+class FakeClock:
+    """Manually advanced clock; sleeping advances it"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def chunk(content=None, usage=None):
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=content))] if content is not None else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+def recording_client(clock, response):
+    """RecordingLLMClient over a fake client; response is returned or, if a list, streamed with ticks"""
+    cassette = Cassette(clock=clock)
+
+    def create(**kwargs):
+        clock.now += 0.5
+        if isinstance(response, Exception):
+            raise response
+        if isinstance(response, list):
+            def stream():
+                for item in response:
+                    clock.now += 0.1
+                    yield item
+            return stream()
+        return response
+
+    inner = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return RecordingLLMClient(inner, cassette, clock=clock), cassette
+
+
+def replay(entries, clock=None, **kwargs):
+    cassette = Cassette([{"kind": "llm", "at": 0.0, **entry} for entry in entries])
+    return ReplayLLMClient(cassette, sleep=(clock or FakeClock()).sleep, **kwargs)
+
+
+class TestRequestMatching:
+    """Test request hashing and question extraction"""
+
+    def test_key_is_stable_and_model_specific(self):
+        assert request_key("m", MESSAGES) == request_key("m", [dict(m) for m in MESSAGES])
+        assert request_key("m", MESSAGES) != request_key("other", MESSAGES)
+
+    def test_last_question(self):
+        assert last_question(MESSAGES) == "How do reversals work?"
+        assert last_question([{"role": "user", "content": [{"type": "text", "text": "hi"}]}]) == "hi"
+        assert last_question([]) == ""
+
+
+class TestRecording:
+    """Test recording LLM calls, Slack timings and events"""
+
+    def test_records_blocking_completion(self):
+        clock = FakeClock()
+        response = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Answer"))],
+                                   usage={"prompt_tokens": 10, "completion_tokens": 2})
+        client, cassette = recording_client(clock, response)
+
+        assert client.chat.completions.create(model="m", messages=MESSAGES, max_tokens=100) is response
+
+        entry, = cassette.llm_calls()
+        assert entry["content"] == "Answer"
+        assert entry["duration"] == 0.5
+        assert entry["key"] == request_key("m", MESSAGES)
+        assert entry["question"] == "How do reversals work?"
+        assert entry["usage"] == {"prompt_tokens": 10, "completion_tokens": 2}
+
+    def test_records_stream_chunk_timing(self):
+        clock = FakeClock()
+        client, cassette = recording_client(clock, [chunk("Hel"), chunk("lo"), chunk(usage={"completion_tokens": 2})])
+
+        stream = client.chat.completions.create(model="m", messages=MESSAGES, stream=True)
+        assert [c.choices[0].delta.content for c in stream if c.choices] == ["Hel", "lo"]
+
+        entry, = cassette.llm_calls()
+        assert entry["chunks"] == [[0.6, "Hel"], [0.7, "lo"]]
+        assert entry["first_token"] == 0.6
+        assert entry["usage"] == {"completion_tokens": 2}
+
+    def test_closed_stream_is_not_recorded(self):
+        clock = FakeClock()
+        client, cassette = recording_client(clock, [chunk("a"), chunk("b")])
+
+        stream = PeekedStream(client.chat.completions.create(model="m", messages=MESSAGES, stream=True))
+        stream.close()
+
+        assert cassette.llm_calls() == []
+
+    def test_records_errors(self):
+        clock = FakeClock()
+        client, cassette = recording_client(clock, TimeoutError("slow"))
+
+        with pytest.raises(TimeoutError):
+            client.chat.completions.create(model="m", messages=MESSAGES)
+
+        entry, = cassette.llm_calls()
+        assert entry["error"] == {"type": "TimeoutError", "message": "slow", "retryable": True}
+
+    def test_records_slack_call_durations(self):
+        clock = FakeClock()
+        cassette = Cassette(clock=clock)
+        inner = MagicMock()
+        inner.chat_update.side_effect = lambda **kwargs: clock.sleep(0.2) or {"ok": True}
+        client = RecordingSlackClient(inner, cassette, clock=clock)
+
+        client.chat_update(channel="C1", ts="1.0", text="hi")
+        client.auth_test()
+
+        entry, = cassette.of_kind("slack")
+        assert entry["method"] == "chat_update"
+        assert entry["duration"] == 0.2
+        assert entry["ok"] is True
+
+    def test_events_keep_only_replay_fields(self):
+        cassette = Cassette()
+        cassette.add_event({"type": "app_mention", "channel": "C1", "text": "hi", "ts": "1.0",
+                            "blocks": [{"big": "payload"}], "thread_ts": None})
+
+        entry, = cassette.events()
+        assert entry["event"] == {"type": "app_mention", "channel": "C1", "text": "hi", "ts": "1.0"}
+
+    def test_file_round_trip(self, tmp_path):
+        path = str(tmp_path / "cassette.jsonl")
+        cassette = Cassette.record(path)
+        cassette.add_event({"type": "message", "channel": "D1", "text": "hi", "ts": "1.0"})
+        cassette.add("llm", key="k", question="hi", content="Answer", duration=0.1)
+        cassette.close()
+
+        loaded = Cassette.load(path)
+
+        assert [entry["kind"] for entry in loaded.entries] == ["event", "llm"]
+        assert loaded.llm_calls()[0]["content"] == "Answer"
+
+    def test_rejects_unknown_version(self, tmp_path):
+        path = tmp_path / "cassette.jsonl"
+        path.write_text('{"kind": "header", "version": 99}\n')
+
+        with pytest.raises(ValueError):
+            Cassette.load(str(path))
+
+    def test_slack_latency_scaled(self):
+        cassette = Cassette([{"kind": "slack", "at": 0, "method": "chat_update", "duration": 0.2},
+                             {"kind": "slack", "at": 0, "method": "chat_update", "duration": 0.4}])
+
+        latency = cassette.slack_latency(time_scale=0.5)
+
+        assert [latency.sample() for _ in range(3)] == [0.1, 0.2, 0.1]
+        assert Cassette().slack_latency() is None
+
+
+class TestReplay:
+    """Test serving recorded calls back through the OpenAI client interface"""
+
+    def test_matches_by_request_then_question_then_order(self):
+        client = replay([
+            {"key": "other", "question": "something else", "content": "first", "duration": 0},
+            {"key": request_key("m", MESSAGES), "question": "?", "content": "exact", "duration": 0},
+            {"key": "x", "question": "How do reversals work?", "content": "same question", "duration": 0},
+        ])
+
+        def ask():
+            return client.chat.completions.create(model="m", messages=MESSAGES).choices[0].message.content
+
+        assert [ask(), ask(), ask(), ask()] == ["exact", "same question", "first", "first"]
+        assert client.stats()["matches"] == {"key": 1, "question": 1, "order": 1, "reused": 1}
+
+    def test_blocking_replay_waits_scaled_duration(self):
+        clock = FakeClock()
+        client = replay([{"content": "Answer", "duration": 2.0, "usage": {"completion_tokens": 1}}],
+                        clock, time_scale=0.5)
+
+        response = client.chat.completions.create(model="m", messages=MESSAGES)
+
+        assert response.choices[0].message.content == "Answer"
+        assert response.usage.completion_tokens == 1
+        assert clock.sleeps == [1.0]
+
+    def test_stream_replays_chunk_timing(self):
+        clock = FakeClock()
+        client = replay([{"chunks": [[0.8, "Hel"], [1.0, "lo"]], "duration": 1.5,
+                          "usage": {"prompt_tokens": 5, "completion_tokens": 2}}], clock)
+
+        chunks = list(client.chat.completions.create(model="m", messages=MESSAGES, stream=True))
+
+        assert [c.choices[0].delta.content for c in chunks if c.choices and c.choices[0].delta.content] == \
+            ["Hel", "lo"]
+        assert chunks[-1].usage.completion_tokens == 2
+        assert clock.sleeps == pytest.approx([0.8, 0.2, 0.5])
+
+    def test_blocking_recording_can_be_streamed(self):
+        client = replay([{"content": "Answer", "duration": 0}])
+
+        chunks = list(client.chat.completions.create(model="m", messages=MESSAGES, stream=True))
+
+        assert chunks[0].choices[0].delta.content == "Answer"
+
+    def test_zero_time_scale_never_sleeps(self):
+        clock = FakeClock()
+        client = replay([{"chunks": [[3.0, "a"]], "duration": 4.0}], clock, time_scale=0)
+
+        list(client.chat.completions.create(model="m", messages=MESSAGES, stream=True))
+
+        assert clock.sleeps == []
+
+    def test_wait_past_timeout_raises(self):
+        clock = FakeClock()
+        client = replay([{"chunks": [[10.0, "late"]], "duration": 10.0}], clock)
+
+        with pytest.raises(TimeoutError):
+            PeekedStream(client.chat.completions.create(model="m", messages=MESSAGES, stream=True, timeout=2))
+        assert clock.sleeps == [2]
+
+    def test_recorded_errors_are_raised(self):
+        client = replay([
+            {"duration": 0, "error": {"type": "InternalServerError", "message": "boom", "retryable": True}},
+            {"duration": 0, "error": {"type": "BadRequestError", "message": "bad", "retryable": False}},
+        ])
+
+        with pytest.raises(TimeoutError):
+            client.chat.completions.create(model="m", messages=MESSAGES)
+        with pytest.raises(ReplayedLLMError):
+            client.chat.completions.create(model="m", messages=MESSAGES)
+
+    def test_requires_llm_calls(self):
+        with pytest.raises(ValueError):
+            ReplayLLMClient(Cassette())
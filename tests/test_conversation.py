@@ -0,0 +1,81 @@
+"""Unit tests for per-thread conversation memory"""
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from ledger_bot.conversation import ConversationStore, summarize, Turn
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestConversationStore:
+    """Test history, compaction and eviction"""
+
+    def test_history_is_per_thread(self):
+        """Test turns are returned as chat messages for their own thread only"""
+        store = ConversationStore()
+        store.append("C1", "1.0", "<@U123> how do reversals work?", "Reversals swap debits and credits.")
+        assert store.history("C1", "1.0") == [
+            {"role": "user", "content": "how do reversals work?"},
+            {"role": "assistant", "content": "Reversals swap debits and credits."},
+        ]
+        assert store.history("C1", "2.0") == []
+        assert store.history("C2", "1.0") == []
+
+    def test_older_turns_compacted_into_summary(self):
+        """Test history over the token budget keeps recent turns and summarizes the rest"""
+        store = ConversationStore(token_budget=100, keep_turns=2)
+        for i in range(5):
+            store.append("C1", "1.0", f"question {i}?", f"Answer {i}. " + "detail " * 40)
+        history = store.history("C1", "1.0")
+        assert history[0]["role"] == "system"
+        assert "question 0?" in history[0]["content"]
+        assert "Answer 0." in history[0]["content"]
+        assert "detail" not in history[0]["content"]
+        assert [m["content"] for m in history[1:2]] == ["question 4?"]
+        assert len(history) == 3
+        assert store.stats()["compactions"] > 0
+
+    def test_summary_stays_within_its_budget(self):
+        """Test the rolling summary drops its oldest lines once too long"""
+        turns = [Turn("user", f"question number {i} about accruals?") for i in range(50)]
+        summary = summarize("", turns, max_tokens=60)
+        assert len(summary) // 4 <= 60
+        assert "question number 49" in summary
+        assert "question number 0 " not in summary
+
+    def test_lru_eviction_by_thread_count_and_bytes(self):
+        """Test least recently used threads are evicted under the caps"""
+        clock = FakeClock()
+        store = ConversationStore(max_threads=2, clock=clock)
+        store.append("C1", "1", "first?", "a")
+        store.append("C1", "2", "second?", "b")
+        store.append("C1", "1", "first again?", "c")
+        store.append("C1", "3", "third?", "d")
+        assert store.history("C1", "2") == []
+        assert store.history("C1", "1") != []
+        assert store.stats()["evictions"] == 1
+
+        small = ConversationStore(max_bytes=100)
+        small.append("C1", "1", "x" * 60, "y")
+        small.append("C1", "2", "z" * 60, "y")
+        assert small.history("C1", "1") == []
+        assert small.stats()["bytes"] <= 100
+
+    def test_idle_threads_expire(self):
+        """Test threads idle past the TTL are forgotten"""
+        clock = FakeClock()
+        store = ConversationStore(idle_ttl=60, clock=clock)
+        store.append("C1", "1", "question?", "answer")
+        clock.now = 61
+        assert store.history("C1", "1") == []
+        assert store.stats()["expirations"] == 1
+        assert store.stats()["bytes"] == 0
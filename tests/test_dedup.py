@@ -0,0 +1,82 @@
+"""Unit tests for Slack event dedup"""
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from ledger_bot.dedup import EventDeduper, SQLiteEventDeduper
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestEventDeduper:
+    """Test in-memory event claims"""
+
+    def test_redelivered_event_claimed_once(self):
+        """Test the second delivery of an event_id is refused"""
+        deduper = EventDeduper()
+        assert deduper.claim("Ev1")
+        assert not deduper.claim("Ev1")
+        assert deduper.claim("Ev2")
+        assert deduper.stats() == {"tracked": 2, "claims": 2, "duplicates": 1}
+
+    def test_events_without_id_always_claimed(self):
+        """Test events with no event_id are never treated as duplicates"""
+        deduper = EventDeduper()
+        assert deduper.claim(None)
+        assert deduper.claim(None)
+
+    def test_claims_expire(self):
+        """Test an event_id can be claimed again after the TTL"""
+        clock = FakeClock()
+        deduper = EventDeduper(ttl=60, clock=clock)
+        deduper.claim("Ev1")
+        clock.now += 61
+        assert deduper.claim("Ev1")
+
+    def test_bounded(self):
+        """Test the oldest claims are dropped past max_entries"""
+        deduper = EventDeduper(max_entries=2)
+        for event_id in ("Ev1", "Ev2", "Ev3"):
+            deduper.claim(event_id)
+        assert deduper.stats()["tracked"] == 2
+        assert deduper.claim("Ev1")
+
+
+class TestSQLiteEventDeduper:
+    """Test event claims shared through a file"""
+
+    def test_claim_seen_by_other_pod(self, tmp_path):
+        """Test a second process on the same file can't claim the same event"""
+        path = str(tmp_path / "events.sqlite3")
+        old_pod = SQLiteEventDeduper(path, owner="old")
+        new_pod = SQLiteEventDeduper(path, owner="new")
+
+        assert old_pod.claim("Ev1")
+        assert not new_pod.claim("Ev1")
+        assert new_pod.claim("Ev2")
+        assert not old_pod.claim("Ev2")
+        assert new_pod.stats()["duplicates"] == 1
+        old_pod.close()
+        new_pod.close()
+
+    def test_expired_claim_reclaimed_and_purged(self, tmp_path):
+        """Test claims older than the TTL neither block nor pile up"""
+        clock = FakeClock()
+        deduper = SQLiteEventDeduper(str(tmp_path / "events.sqlite3"), ttl=60, purge_every=2, clock=clock)
+        deduper.claim("Ev1")
+        clock.now += 61
+        assert deduper.claim("Ev1")
+
+        deduper.claim("Ev2")
+        clock.now += 61
+        deduper.claim("Ev3")
+        deduper.claim("Ev4")
+        assert deduper.stats()["tracked"] == 2
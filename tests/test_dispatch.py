@@ -0,0 +1,176 @@
+"""Unit tests for the bounded worker pool"""
+import os
+import sys
+import threading
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from ledger_bot.dispatch import Dispatcher
+
+
+def blocking_job(started, release, log=None, name=None):
+    """Job that signals it started and waits to be released"""
+    def run():
+        if log is not None:
+            log.append(name)
+        started.release()
+        release.wait(5)
+    return run
+
+
+class TestDispatcher:
+    """Test admission control and concurrency caps"""
+
+    def test_runs_submitted_jobs(self):
+        """Test jobs run on worker threads"""
+        dispatcher = Dispatcher(workers=2, queue_size=10)
+        done = threading.Event()
+        assert dispatcher.submit(done.set)
+        assert done.wait(2)
+        dispatcher.shutdown()
+        assert dispatcher.stats()["completed"] == 1
+
+    def test_rejects_when_queue_full(self):
+        """Test submit returns False once the queue is at capacity"""
+        started = threading.Semaphore(0)
+        release = threading.Event()
+        dispatcher = Dispatcher(workers=1, queue_size=1)
+
+        assert dispatcher.submit(blocking_job(started, release))
+        assert started.acquire(timeout=2)
+        assert dispatcher.submit(lambda: None)
+        assert not dispatcher.submit(lambda: None)
+
+        stats = dispatcher.stats()
+        assert stats["queue_depth"] == 1
+        assert stats["rejected"] == 1
+        release.set()
+        dispatcher.shutdown()
+
+    def test_per_user_cap(self):
+        """Test a user at their cap doesn't block other users"""
+        started = threading.Semaphore(0)
+        release = threading.Event()
+        log = []
+        dispatcher = Dispatcher(workers=3, queue_size=10, per_user_limit=1)
+
+        dispatcher.submit(blocking_job(started, release, log, "u1-a"), user="U1")
+        assert started.acquire(timeout=2)
+        dispatcher.submit(blocking_job(started, release, log, "u1-b"), user="U1")
+        dispatcher.submit(blocking_job(started, release, log, "u2-a"), user="U2")
+        assert started.acquire(timeout=2)
+
+        # U1's second job waits behind the cap while U2's runs
+        assert log == ["u1-a", "u2-a"]
+        assert dispatcher.stats()["queue_depth"] == 1
+
+        release.set()
+        dispatcher.shutdown()
+        assert sorted(log) == ["u1-a", "u1-b", "u2-a"]
+
+    def test_concurrency_counters_forgotten_when_idle(self):
+        """Test users whose jobs were only looked at, never run, leave no counters behind"""
+        started = threading.Semaphore(0)
+        release = threading.Event()
+        dispatcher = Dispatcher(workers=2, queue_size=100, per_channel_limit=1)
+        dispatcher.submit(blocking_job(started, release), user="U0", channel="C0")
+        assert started.acquire(timeout=2)
+        # Capped by their channel, so the idle worker checks them and leaves them queued
+        for i in range(1, 50):
+            dispatcher.submit(lambda: None, user=f"U{i}", channel="C0")
+        dispatcher.submit(blocking_job(started, release), user="U50", channel="C1")
+        assert started.acquire(timeout=2)
+
+        assert dispatcher.cancel_pending() == 49
+        release.set()
+        dispatcher.shutdown()
+        assert dict(dispatcher._active_by_user) == {}
+        assert dict(dispatcher._active_by_channel) == {}
+
+    def test_failed_job_counted(self):
+        """Test exceptions in jobs are contained and counted"""
+        dispatcher = Dispatcher(workers=1, queue_size=10)
+
+        def fail():
+            raise RuntimeError("boom")
+
+        dispatcher.submit(fail)
+        dispatcher.shutdown()
+        assert dispatcher.stats()["failed"] == 1
+
+    def test_shutdown_rejects_new_work(self):
+        """Test submit after shutdown is rejected"""
+        dispatcher = Dispatcher(workers=1, queue_size=10)
+        dispatcher.shutdown()
+        assert not dispatcher.submit(lambda: None)
+
+    def test_cancel_pending_drops_queued_jobs(self):
+        """Test queued jobs are dropped without touching the running one"""
+        started = threading.Semaphore(0)
+        release = threading.Event()
+        ran = []
+        dispatcher = Dispatcher(workers=1, queue_size=10)
+
+        dispatcher.submit(blocking_job(started, release))
+        assert started.acquire(timeout=2)
+        dispatcher.submit(lambda: ran.append(1))
+        dispatcher.submit(lambda: ran.append(2))
+
+        assert dispatcher.cancel_pending() == 2
+        release.set()
+        dispatcher.shutdown(timeout=2)
+        assert ran == []
+        assert dispatcher.stats()["completed"] == 1
+
+    def test_fair_queuing_across_channels(self):
+        """Test a channel with a backlog doesn't starve one that asks later"""
+        started = threading.Semaphore(0)
+        release = threading.Event()
+        log = []
+        dispatcher = Dispatcher(workers=1, queue_size=20, per_channel_limit=10)
+
+        dispatcher.submit(blocking_job(started, release, log, "busy-0"), channel="CBUSY")
+        assert started.acquire(timeout=2)
+        for i in range(1, 4):
+            dispatcher.submit(lambda i=i: log.append(f"busy-{i}"), channel="CBUSY")
+        dispatcher.submit(lambda: log.append("quiet-1"), channel="CQUIET")
+        release.set()
+        dispatcher.shutdown()
+
+        assert log == ["busy-0", "quiet-1", "busy-1", "busy-2", "busy-3"]
+
+    def test_weights_share_the_pool(self):
+        """Test a channel with weight 2 is served twice as often as one with weight 1"""
+        started = threading.Semaphore(0)
+        release = threading.Event()
+        log = []
+        dispatcher = Dispatcher(workers=1, queue_size=20, per_channel_limit=10)
+
+        dispatcher.submit(blocking_job(started, release, log, "start"))
+        assert started.acquire(timeout=2)
+        for i in range(4):
+            dispatcher.submit(lambda i=i: log.append(f"low-{i}"), channel="CLOW")
+            dispatcher.submit(lambda i=i: log.append(f"high-{i}"), channel="CHIGH", weight=2)
+        release.set()
+        dispatcher.shutdown()
+
+        assert log[1:7] == ["high-0", "low-0", "high-1", "high-2", "low-1", "high-3"]
+
+    def test_cost_counts_against_share(self):
+        """Test expensive jobs use up a channel's share faster"""
+        started = threading.Semaphore(0)
+        release = threading.Event()
+        log = []
+        dispatcher = Dispatcher(workers=1, queue_size=20, per_channel_limit=10)
+
+        dispatcher.submit(blocking_job(started, release, log, "start"))
+        assert started.acquire(timeout=2)
+        dispatcher.submit(lambda: log.append("big"), channel="C1", cost=3)
+        dispatcher.submit(lambda: log.append("big-2"), channel="C1", cost=3)
+        for i in range(3):
+            dispatcher.submit(lambda i=i: log.append(f"small-{i}"), channel="C2")
+        release.set()
+        dispatcher.shutdown()
+
+        assert log[1:] == ["small-0", "small-1", "big", "small-2", "big-2"]
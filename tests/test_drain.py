@@ -0,0 +1,114 @@
+"""Unit tests for graceful drain"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from ledger_bot.drain import Drainer
+from ledger_bot.slack_outbound import ScheduledSlackClient
+
+
+class TestDrainer:
+    """Test tracking and draining unanswered questions"""
+
+    def test_idle_once_pending_answers_finish(self):
+        """Test wait_idle returns True as soon as the last answer is done"""
+        drainer = Drainer(timeout=5)
+        reply = drainer.track(MagicMock(), "C1", "1.0")
+        drainer.begin()
+        threading.Timer(0.05, drainer.done, [reply]).start()
+
+        started = time.monotonic()
+        assert drainer.wait_idle()
+        assert time.monotonic() - started < 2
+        assert drainer.stats()["finished_while_draining"] == 1
+
+    def test_deadline_passes(self):
+        """Test wait_idle gives up at the deadline"""
+        drainer = Drainer(timeout=0.05)
+        drainer.track(MagicMock(), "C1")
+        drainer.begin()
+        assert not drainer.wait_idle()
+        assert drainer.remaining() == 0
+
+    def test_abandon_rewrites_placeholders_and_posts_for_queued(self):
+        """Test placeholders are replaced and never-started questions get a reply in their thread"""
+        client = MagicMock()
+        drainer = Drainer(timeout=0)
+        started = drainer.track(client, "C1", "1.0", "mention")
+        started.ts = "2.0"
+        drainer.track(client, "C2", None, "DM")
+        finished = drainer.track(client, "C3")
+        drainer.done(finished)
+        drainer.begin()
+
+        assert drainer.abandon("restarting") == 2
+
+        client.chat_update.assert_called_once_with(channel="C1", ts="2.0", text="restarting")
+        client.chat_postMessage.assert_called_once_with(channel="C2", thread_ts=None, text="restarting")
+        assert drainer.stats()["pending"] == 0
+        assert drainer.stats()["abandoned"] == 2
+
+    def test_abandon_continues_after_slack_error(self):
+        """Test one failed notice doesn't stop the others"""
+        client = MagicMock()
+        client.chat_update.side_effect = RuntimeError("message_not_found")
+        drainer = Drainer()
+        drainer.track(client, "C1").ts = "2.0"
+        drainer.track(client, "C2")
+
+        assert drainer.abandon("restarting") == 2
+        client.chat_postMessage.assert_called_once()
+
+    def test_abandon_async(self):
+        """Test notices are awaited for async Slack clients"""
+        client = MagicMock()
+        client.chat_update = AsyncMock()
+        drainer = Drainer()
+        drainer.track(client, "C1").ts = "2.0"
+
+        assert asyncio.run(drainer.abandon_async("restarting")) == 1
+        client.chat_update.assert_awaited_once_with(channel="C1", ts="2.0", text="restarting")
+
+    def test_notices_sent_concurrently_past_the_outbound_queue(self):
+        """Test 50 notices go straight to Slack at once instead of waiting for queue pacing"""
+        raw = MagicMock()
+        raw.chat_update.side_effect = lambda **kwargs: time.sleep(0.1)
+        scheduler = MagicMock()
+        client = ScheduledSlackClient(raw, scheduler)
+        drainer = Drainer()
+        for i in range(50):
+            drainer.track(client, f"C{i % 3}").ts = f"{i}.0"
+
+        started = time.monotonic()
+        assert drainer.abandon("restarting") == 50
+        assert time.monotonic() - started < 2
+        assert raw.chat_update.call_count == 50
+        scheduler.submit.assert_not_called()
+
+    def test_async_notices_sent_concurrently(self):
+        """Test async notices are awaited together"""
+        async def slow_update(**kwargs):
+            await asyncio.sleep(0.1)
+        client = MagicMock()
+        client.chat_update = AsyncMock(side_effect=slow_update)
+        drainer = Drainer()
+        for i in range(50):
+            drainer.track(client, "C1").ts = f"{i}.0"
+
+        started = time.monotonic()
+        assert asyncio.run(drainer.abandon_async("restarting")) == 50
+        assert time.monotonic() - started < 2
+        assert client.chat_update.await_count == 50
+
+    def test_not_draining_until_begin(self):
+        """Test stats before a drain starts"""
+        drainer = Drainer()
+        assert not drainer.draining
+        assert drainer.remaining() is None
+        assert drainer.stats()["seconds_left"] is None
@@ -0,0 +1,146 @@
+"""Unit tests for the fake LiteLLM and Slack servers used by load tests"""
+import os
+import random
+import sys
+
+import pytest
+from openai import InternalServerError, OpenAI, RateLimitError
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from ledger_bot.fakes import Distribution, FakeLiteLLM, FakeSlack, distribution
+
+
+def llm_client(fake):
+    return OpenAI(api_key="sk-test", base_url=fake.base_url, max_retries=0)
+
+
+class TestDistribution:
+    """Test latency distribution specs"""
+
+    def test_fixed(self):
+        assert Distribution("fixed:0.5").sample() == 0.5
+
+    def test_uniform_within_bounds(self):
+        dist = Distribution("uniform:1,2", random.Random(1))
+        samples = [dist.sample() for _ in range(100)]
+        assert all(1 <= s <= 2 for s in samples)
+
+    def test_lognormal_median(self):
+        dist = Distribution("lognormal:0.8,0.5", random.Random(1))
+        samples = sorted(dist.sample() for _ in range(2001))
+        assert 0.7 < samples[1000] < 0.9
+
+    def test_never_negative(self):
+        dist = Distribution("normal:0,5", random.Random(1))
+        assert min(dist.sample() for _ in range(100)) == 0.0
+
+    @pytest.mark.parametrize("spec", ["", "fixed", "gamma:1,2", "uniform:1", "fixed:abc"])
+    def test_invalid_specs_rejected(self, spec):
+        with pytest.raises(ValueError):
+            Distribution(spec)
+
+    def test_numbers_are_fixed(self):
+        assert distribution(0.25).sample() == 0.25
+
+
+class TestFakeLiteLLM:
+    """Test the OpenAI-compatible fake against the real OpenAI client"""
+
+    def test_blocking_completion(self):
+        with FakeLiteLLM(first_token="fixed:0", tokens_per_second=0, answer_tokens="fixed:5") as fake:
+            response = llm_client(fake).chat.completions.create(
+                model="fake-model", max_tokens=100, messages=[{"role": "user", "content": "hi"}]
+            )
+
+        assert len(response.choices[0].message.content.split()) == 5
+        assert response.usage.completion_tokens == 5
+        assert fake.stats()["models"] == {"fake-model": 1}
+
+    def test_streams_tokens_with_usage(self):
+        with FakeLiteLLM(first_token="fixed:0", tokens_per_second=0, answer_tokens="fixed:7") as fake:
+            stream = llm_client(fake).chat.completions.create(
+                model="fake-model", max_tokens=100, messages=[{"role": "user", "content": "hi"}],
+                stream=True, stream_options={"include_usage": True}
+            )
+            chunks = list(stream)
+
+        deltas = [c.choices[0].delta.content for c in chunks if c.choices and c.choices[0].delta.content]
+        assert len(deltas) == 7
+        assert chunks[-1].usage.completion_tokens == 7
+
+    def test_max_tokens_caps_answer(self):
+        with FakeLiteLLM(first_token="fixed:0", tokens_per_second=0, answer_tokens="fixed:50") as fake:
+            response = llm_client(fake).chat.completions.create(
+                model="fake-model", max_tokens=3, messages=[{"role": "user", "content": "hi"}]
+            )
+
+        assert response.usage.completion_tokens == 3
+
+    def test_injected_errors(self):
+        with FakeLiteLLM(first_token="fixed:0", error_rate=1.0) as fake:
+            with pytest.raises(InternalServerError):
+                llm_client(fake).chat.completions.create(
+                    model="fake-model", messages=[{"role": "user", "content": "hi"}]
+                )
+
+        assert fake.stats()["failures"] == 1
+
+    def test_injected_rate_limits(self):
+        with FakeLiteLLM(first_token="fixed:0", rate_limit_rate=1.0) as fake:
+            with pytest.raises(RateLimitError):
+                llm_client(fake).chat.completions.create(
+                    model="fake-model", messages=[{"role": "user", "content": "hi"}]
+                )
+
+
+class TestFakeSlack:
+    """Test the recording Slack Web API fake against the real WebClient"""
+
+    def test_records_posts_and_updates(self):
+        with FakeSlack() as fake:
+            client = WebClient(token="xoxb-test", base_url=fake.base_url)
+            posted = client.chat_postMessage(channel="C1", thread_ts="1.0", text="Thinking...")
+            client.chat_update(channel="C1", ts=posted["ts"], text="Answer")
+
+        post, = fake.calls_to("chat.postMessage")
+        update, = fake.calls_to("chat.update")
+        assert post.payload["thread_ts"] == "1.0"
+        assert update.ts == posted["ts"]
+        assert update.text == "Answer"
+
+    def test_message_ts_is_unique(self):
+        with FakeSlack() as fake:
+            client = WebClient(token="xoxb-test", base_url=fake.base_url)
+            first = client.chat_postMessage(channel="C1", text="a")["ts"]
+            second = client.chat_postMessage(channel="C1", text="b")["ts"]
+
+        assert first != second
+
+    def test_listeners_see_calls(self):
+        seen = []
+        with FakeSlack() as fake:
+            fake.listeners.append(seen.append)
+            WebClient(token="xoxb-test", base_url=fake.base_url).chat_postMessage(channel="C1", text="a")
+
+        assert [call.method for call in seen] == ["chat.postMessage"]
+
+    def test_auth_test_succeeds(self):
+        with FakeSlack() as fake:
+            response = WebClient(token="xoxb-test", base_url=fake.base_url).auth_test()
+
+        assert response["user_id"] == "U0FAKEBOT"
+
+    def test_injected_rate_limits_carry_retry_after(self):
+        with FakeSlack(rate_limit_rate=1.0, retry_after=3) as fake:
+            client = WebClient(token="xoxb-test", base_url=fake.base_url)
+            with pytest.raises(SlackApiError) as error:
+                client.chat_postMessage(channel="C1", text="a")
+
+        assert error.value.response.status_code == 429
+        assert error.value.response.headers["Retry-After"] == "3"
+        assert fake.calls == []
+        assert fake.stats()["rate_limited"] == 1
@@ -0,0 +1,139 @@
+"""Unit tests for Socket Mode health and the health server"""
+import json
+import os
+import sys
+import threading
+import urllib.request
+from types import SimpleNamespace
+
+from flask import Flask
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from ledger_bot.health import SocketModeHealth, make_health_server
+
+
+class FakeSocketClient:
+    """Just the listener lists and is_connected() of slack_sdk's builtin SocketModeClient"""
+
+    def __init__(self):
+        self.on_message_listeners = []
+        self.on_close_listeners = []
+        self.on_error_listeners = []
+        self.session_active = True
+
+    def is_connected(self):
+        return self.session_active
+
+    def receive(self, message):
+        for listener in self.on_message_listeners:
+            listener(json.dumps(message))
+
+    def close(self, code=1006, reason=None):
+        self.session_active = False
+        for listener in self.on_close_listeners:
+            listener(code, reason)
+
+
+class TestSocketModeHealth:
+    """Test connection state from Socket Mode events"""
+
+    def test_connected_after_hello(self):
+        health = SocketModeHealth()
+        client = FakeSocketClient()
+        health.attach(client)
+        assert not health.connected()
+
+        client.receive({"type": "hello", "num_connections": 1})
+
+        assert health.connected()
+        assert health.wait_connected(0)
+        assert health.stats()["connects"] == 1
+
+    def test_disconnect_until_next_hello(self):
+        health = SocketModeHealth()
+        client = FakeSocketClient()
+        health.attach(client)
+        client.receive({"type": "hello"})
+
+        client.receive({"type": "disconnect", "reason": "refresh_requested"})
+        assert not health.connected()
+
+        client.receive({"type": "hello"})
+        assert health.connected()
+        stats = health.stats()
+        assert (stats["connects"], stats["disconnects"]) == (2, 1)
+        assert stats["last_disconnect_reason"] == "refresh_requested"
+
+    def test_close_without_reconnect(self):
+        health = SocketModeHealth()
+        client = FakeSocketClient()
+        health.attach(client)
+        client.receive({"type": "hello"})
+
+        client.close()
+
+        assert not health.connected()
+        assert health.stats()["closes"] == 1
+
+    def test_close_after_reconnect_keeps_connection(self):
+        """Test the builtin client's reconnect-then-notify order doesn't mark a live socket down"""
+        health = SocketModeHealth()
+        client = FakeSocketClient()
+        health.attach(client)
+        client.receive({"type": "hello"})
+        client.receive({"type": "hello"})
+
+        for listener in client.on_close_listeners:
+            listener(1000, None)
+
+        assert health.connected()
+
+    def test_dead_session_not_connected(self):
+        """Test a socket that died without a close frame isn't reported connected"""
+        health = SocketModeHealth()
+        client = FakeSocketClient()
+        health.attach(client)
+        client.receive({"type": "hello"})
+
+        client.session_active = False
+
+        assert not health.connected()
+
+    def test_async_client_listeners(self):
+        import asyncio
+
+        health = SocketModeHealth()
+        client = SimpleNamespace(on_message_listeners=[], on_close_listeners=[], on_error_listeners=[])
+        health.attach_async(client)
+
+        asyncio.run(client.on_message_listeners[0](SimpleNamespace(data='{"type": "hello"}')))
+        assert health.connected()
+        asyncio.run(client.on_close_listeners[0](SimpleNamespace(data=1006, extra="gone")))
+        assert not health.connected()
+
+    def test_ignores_other_messages(self):
+        health = SocketModeHealth()
+        health.on_message("not json")
+        health.on_message('{"type": "events_api", "envelope_id": "1"}')
+        assert health.stats()["connects"] == 0
+
+
+class TestHealthServer:
+    """Test serving a WSGI app on the waitress server"""
+
+    def test_serves_requests(self):
+        wsgi_app = Flask(__name__)
+        wsgi_app.add_url_rule("/health", "health", lambda: {"status": "healthy"})
+        server = make_health_server(wsgi_app, host="127.0.0.1", port=0)
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        try:
+            url = f"http://127.0.0.1:{server.port}/health"
+            with urllib.request.urlopen(url, timeout=5) as response:
+                assert json.load(response) == {"status": "healthy"}
+        finally:
+            server.stop()
+        thread.join(timeout=5)
+        assert not thread.is_alive()
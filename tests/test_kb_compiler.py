@@ -0,0 +1,160 @@
+"""Unit tests for the knowledge base compiler"""
+import json
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from ledger_bot.kb_compiler import (
+    Source, compile_knowledge_base, manifest_path, read_manifest, shift_headings, split_blocks,
+    update_knowledge_base
+)
+from ledger_bot.knowledge import KnowledgeBase
+
+CURATED = """# LEDGER BOT KNOWLEDGE BASE
+
+You are Ledger Bot.
+
+## YOUR ROLE
+- Help teams onboard
+
+## REVERSALS
+Reversals swap debits and credits.
+"""
+
+
+def reader(docs):
+    """read() over an in-memory {path: text} dict; missing paths read as None"""
+    return lambda path: docs.get(path)
+
+
+class TestCompileKnowledgeBase:
+    """Test rebuilding the knowledge base from curated text and sources"""
+
+    def test_sources_added_after_curated_sections(self):
+        """Test imported docs become `##` sections with their headings moved under them"""
+        sources = [Source("/repo/api/README.md", "API Module Details", key="api/README.md")]
+        docs = {"/repo/api/README.md": "# API\n\nGraphQL endpoint.\n\n## Usage\n\nCall it.\n"}
+
+        result = compile_knowledge_base(CURATED, sources, {}, read=reader(docs))
+
+        assert result.text.startswith(CURATED.strip())
+        assert "## API Module Details\n\n### API\n\nGraphQL endpoint.\n\n#### Usage" in result.text
+        assert [s.status for s in result.sections] == ["curated", "curated", "added"]
+        assert result.manifest["sources"]["api/README.md"]["title"] == "API Module Details"
+        titles = [s.title for s in KnowledgeBase(result.text).sections if s.level == 2]
+        assert titles == ["YOUR ROLE", "REVERSALS", "API Module Details"]
+
+    def test_repeated_runs_are_identical(self):
+        """Test compiling the output again with its manifest changes nothing"""
+        sources = [Source("a.md", "A"), Source("b.md", "B")]
+        docs = {"a.md": "Alpha.\n", "b.md": "# Beta\nBravo.\n"}
+
+        first = compile_knowledge_base(CURATED, sources, {}, read=reader(docs))
+        second = compile_knowledge_base(first.text, sources, first.manifest, read=reader(docs))
+
+        assert first.changed
+        assert not second.changed
+        assert second.manifest == first.manifest
+        assert [s.status for s in second.sections][-2:] == ["unchanged", "unchanged"]
+
+    def test_only_changed_source_rebuilt(self):
+        """Test an edited source replaces its own section in place"""
+        sources = [Source("a.md", "A"), Source("b.md", "B")]
+        docs = {"a.md": "Alpha.\n", "b.md": "Bravo.\n"}
+        first = compile_knowledge_base(CURATED, sources, {}, read=reader(docs))
+
+        docs["a.md"] = "Alpha, revised.\n"
+        second = compile_knowledge_base(first.text, sources, first.manifest, read=reader(docs))
+
+        assert [s.status for s in second.sections][-2:] == ["updated", "unchanged"]
+        assert "Alpha, revised." in second.text
+        assert "Alpha.\n" not in second.text
+        assert second.text.index("## A") < second.text.index("## B")
+
+    def test_append_only_duplicates_dropped(self):
+        """Test copies left by the old append-mode script collapse to one section"""
+        appended = CURATED + "\n\n## A\n\nAlpha.\n\n## A\n\nAlpha.\n"
+        result = compile_knowledge_base(appended, [Source("a.md", "A")], {}, read=reader({"a.md": "Alpha."}))
+
+        assert result.text.count("## A\n") == 1
+        assert "duplicate" in [s.status for s in result.sections]
+        assert result.tokens < result.previous_tokens
+
+    def test_identical_sections_deduped(self):
+        """Test a source with the same content as an earlier section isn't added again"""
+        sources = [Source("reversals.md", "ADR: Reversals")]
+        result = compile_knowledge_base(CURATED, sources, {},
+                                        read=reader({"reversals.md": "Reversals swap debits\nand credits."}))
+
+        assert "ADR: Reversals" not in result.text
+        assert result.sections[-1].status == "duplicate"
+
+    def test_unreadable_source_keeps_section(self):
+        """Test a source that can't be read keeps its previous section"""
+        sources = [Source("a.md", "A")]
+        first = compile_knowledge_base(CURATED, sources, {}, read=reader({"a.md": "Alpha."}))
+        second = compile_knowledge_base(first.text, sources, first.manifest, read=reader({}))
+
+        assert not second.changed
+        assert second.sections[-1].status == "kept"
+
+    def test_dropped_source_removed(self):
+        """Test a source no longer listed loses its section"""
+        first = compile_knowledge_base(CURATED, [Source("a.md", "A")], {}, read=reader({"a.md": "Alpha."}))
+        second = compile_knowledge_base(first.text, [], first.manifest, read=reader({}))
+
+        assert second.text == CURATED
+        assert second.sections[-1].status == "removed"
+
+
+class TestHeadings:
+    """Test section splitting and heading shifts"""
+
+    def test_code_fences_ignored(self):
+        """Test `#` lines inside code blocks are neither shifted nor split on"""
+        text = "# Title\n\n```bash\n# comment\n## also a comment\n```\n"
+        assert shift_headings(text) == "### Title\n\n```bash\n# comment\n## also a comment\n```"
+        preamble, blocks = split_blocks("## A\n```\n## not a section\n```\n")
+        assert [block.title for block in blocks] == ["A"]
+
+    def test_deep_headings_left_alone(self):
+        """Test a document already below `##` is unchanged"""
+        assert shift_headings("### Detail\ntext") == "### Detail\ntext"
+
+
+class TestUpdateKnowledgeBase:
+    """Test writing the knowledge base and manifest"""
+
+    def test_writes_only_when_changed(self, tmp_path):
+        """Test the file isn't rewritten (and the bot not reloaded) when nothing changed"""
+        kb_path = tmp_path / "knowledge_base.txt"
+        kb_path.write_text(CURATED)
+        doc = tmp_path / "a.md"
+        doc.write_text("Alpha.\n")
+        sources = [Source(doc, "A", key="a.md")]
+
+        update_knowledge_base(str(kb_path), sources)
+        first_mtime = os.stat(kb_path).st_mtime_ns
+        manifest = json.loads(open(manifest_path(kb_path)).read())
+        result = update_knowledge_base(str(kb_path), sources)
+
+        assert not result.changed
+        assert os.stat(kb_path).st_mtime_ns == first_mtime
+        assert read_manifest(manifest_path(kb_path)) == manifest
+        assert not os.path.exists(f"{kb_path}.tmp")
+
+    def test_dry_run_writes_nothing(self, tmp_path):
+        """Test --dry-run only reports"""
+        kb_path = tmp_path / "knowledge_base.txt"
+        kb_path.write_text(CURATED)
+        doc = tmp_path / "a.md"
+        doc.write_text("Alpha.\n")
+
+        result = update_knowledge_base(str(kb_path), [Source(doc, "A")], dry_run=True)
+
+        assert result.changed
+        assert kb_path.read_text() == CURATED
+        assert not os.path.exists(manifest_path(kb_path))
+        assert "added" in result.report()
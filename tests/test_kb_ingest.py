@@ -0,0 +1,147 @@
+"""Unit tests for knowledge base document ingest"""
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from ledger_bot.kb_compiler import compile_knowledge_base
+from ledger_bot.kb_ingest import PathRules, cap_tokens, classify, glob_to_regex, ingest, normalize
+
+
+def write(root, relative_path, text):
+    path = root / relative_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def make_checkout(root):
+    """A small oracle-gl-publisher-shaped tree"""
+    write(root, "README.md", "# Repo\n")
+    write(root, "api/README.md", "# API\n\nGraphQL endpoint.\n")
+    write(root, "api/docs/reprocessing.md", "# Reprocessing\n\nCall reprocess.\n")
+    write(root, "api/build/README.md", "# Generated\n")
+    write(root, "api/CHANGELOG.md", "# Changes\n")
+    write(root, "db/README.md", "# DB\n\nFlyway.\n")
+    write(root, "docs/adr/0010-reversals.md", "# Reversals\n\nSwap debits and credits.\n")
+    write(root, "docs/adr/0007-idempotency-key-meaning.md", "# Idempotency\n\nKeys.\n")
+    write(root, "docs/adr/adr-template.md", "# Title\n")
+    write(root, "node_modules/pkg/README.md", "# Dependency\n")
+
+
+class TestIngest:
+    """Test discovering and reading documents"""
+
+    def test_discovers_modules_and_adrs(self, tmp_path):
+        """Test every module README, module doc and ADR is found, in knowledge base order"""
+        make_checkout(tmp_path)
+        result = ingest(tmp_path, workers=4)
+
+        assert [d.key for d in result.documents] == [
+            "api/README.md",
+            "db/README.md",
+            "api/docs/reprocessing.md",
+            "docs/adr/0007-idempotency-key-meaning.md",
+            "docs/adr/0010-reversals.md",
+        ]
+        assert [d.title for d in result.documents][:3] == [
+            "API Module Details", "DB Module Details", "API Module: reprocessing"
+        ]
+        assert result.failed == []
+        assert "5 document(s)" in result.describe()
+
+    def test_include_and_exclude_rules(self, tmp_path):
+        """Test custom rules narrow and extend what is ingested"""
+        make_checkout(tmp_path)
+        rules = PathRules(include=["docs/adr/*.md", "README.md"], exclude=["docs/adr/0007-*", "**/*template*"])
+        assert [d.key for d in ingest(tmp_path, rules).documents] == [
+            "docs/adr/0010-reversals.md", "README.md"
+        ]
+
+    def test_same_result_in_any_thread_count(self, tmp_path):
+        """Test parallel reads produce the same knowledge base as a single thread"""
+        make_checkout(tmp_path)
+        texts = []
+        for workers in (1, 8):
+            result = ingest(tmp_path, workers=workers)
+            texts.append(compile_knowledge_base("", result.sources(), {}, read=result.reader()).text)
+        assert texts[0] == texts[1]
+
+    def test_unreadable_document_kept_as_source(self, tmp_path):
+        """Test a file that can't be read still keeps its previous section"""
+        make_checkout(tmp_path)
+        (tmp_path / "db" / "README.md").unlink()
+        (tmp_path / "db" / "README.md").symlink_to(tmp_path / "missing.md")
+        result = ingest(tmp_path)
+
+        assert result.failed == ["db/README.md"]
+        assert "db/README.md" in [s.key for s in result.sources()]
+        assert result.reader()(str(tmp_path / "db" / "README.md")) is None
+
+
+    def test_unreadable_documents_named_by_path(self, tmp_path):
+        """Test unreadable documents sharing a title keep distinct sections and are reported by path"""
+        write(tmp_path, "api/docs/v1/setup.md", "# Setup v1\n")
+        write(tmp_path, "api/docs/v2/setup.md", "# Setup v2\n")
+        first = ingest(tmp_path)
+        compiled = compile_knowledge_base("", first.sources(), {}, read=first.reader())
+        for version in ("v1", "v2"):
+            path = tmp_path / "api" / "docs" / version / "setup.md"
+            path.unlink()
+            path.symlink_to(tmp_path / "missing.md")
+
+        second = ingest(tmp_path)
+        result = compile_knowledge_base(compiled.text, second.sources(), compiled.manifest, read=second.reader())
+
+        assert "(api/docs/v1/setup.md, api/docs/v2/setup.md)" in second.describe()
+        assert sorted(s.title for s in second.sources()) == sorted(d.title for d in first.documents)
+        assert not result.changed
+        assert [s.status for s in result.sections] == ["kept", "kept"]
+        assert "(unreadable: api/docs/v1/setup.md)" in result.report()
+        assert "(unreadable: api/docs/v2/setup.md)" in result.report()
+
+
+class TestNormalize:
+    """Test document clean-up and token caps"""
+
+    def test_strips_front_matter_comments_and_badges(self):
+        """Test text that costs tokens without informing answers is removed"""
+        raw = ("---\ntitle: API\n---\n[![CI](https://ci/badge.svg)](https://ci) ![cov](c.svg)\r\n"
+               "# API\n<!-- TODO: rewrite -->\n\n\n\nGraphQL.   \n")
+        assert normalize(raw) == "# API\n\nGraphQL.\n"
+
+    def test_cap_cuts_at_paragraph(self):
+        """Test long documents are cut at a paragraph break and marked"""
+        text = "".join(f"Paragraph {i} " + "word " * 20 + "\n\n" for i in range(50))
+        capped, truncated = cap_tokens(text, 100)
+        assert truncated
+        assert capped.endswith("_(truncated)_\n")
+        assert len(capped) <= 400
+        assert "\n\n_(truncated)_" in capped
+        assert cap_tokens("short", 100) == ("short", False)
+        assert cap_tokens(text, 0) == (text, False)
+
+    def test_cap_closes_open_code_block(self):
+        """Test truncating inside a code block doesn't leave it open"""
+        text = "Intro\n\n```bash\n" + "echo hi\n\n" * 100 + "```\n"
+        capped, _ = cap_tokens(text, 50)
+        assert capped.count("```") % 2 == 0
+
+
+class TestRules:
+    """Test path globs and titles"""
+
+    def test_globs(self):
+        """Test `*` stays within a directory and `**/` spans any depth"""
+        assert glob_to_regex("*/README.md").match("api/README.md")
+        assert not glob_to_regex("*/README.md").match("api/src/README.md")
+        assert glob_to_regex("*/docs/**/*.md").match("api/docs/a.md")
+        assert glob_to_regex("*/docs/**/*.md").match("api/docs/v1/a.md")
+        assert glob_to_regex("**/CHANGELOG.md").match("CHANGELOG.md")
+
+    def test_titles_match_earlier_compiles(self):
+        """Test module READMEs and ADRs keep the titles the old hardcoded list used"""
+        assert classify("queue-processor/README.md") == ("module", "QUEUE-PROCESSOR Module Details")
+        assert classify("docs/adr/0010-Reversals-in-GL-Publisher.md") == (
+            "adr", "ADR: 0010-Reversals-in-GL-Publisher"
+        )
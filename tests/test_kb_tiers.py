@@ -0,0 +1,174 @@
+"""Unit tests for knowledge base compression and tiers"""
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from ledger_bot.kb_compiler import shift_headings, split_blocks
+from ledger_bot.kb_tiers import code_tokens, compile_tiers, compress_markdown, dedupe_snippets, settings, split_snippets
+from ledger_bot.knowledge import CORE, KnowledgeBase, Section, estimate_tokens, parse_sections
+
+CODE = "\n".join(f"    fun step{i}(activity: Activity) = builder.add(activity, {i})" for i in range(6))
+
+SAMPLE_KB = f"""# LEDGER BOT KNOWLEDGE BASE
+
+You are Ledger Bot.
+
+## YOUR ROLE
+- Help teams onboard
+
+## REVERSALS
+Reversals   swap debits and credits.
+
+
+
+Both headers are linked.
+
+## REAL-WORLD EXAMPLES
+
+### Example: Impact Builder Structure
+```kotlin
+class ReversalBuilder {{
+{CODE}
+}}
+```
+
+```bash
+mvn install -Dmaven.test.skip=true
+```
+
+### Example: Another Builder
+```kotlin
+class ReversalBuilder {{
+{CODE}
+}}
+```
+
+## HOW TO ANSWER QUESTIONS
+Be concise.
+"""
+
+
+def titles(kb, tier):
+    return [s.title for s in kb.sections if s.tier == tier]
+
+
+class TestCompression:
+    """Test lossless whitespace and snippet compression"""
+
+    def test_whitespace_collapsed(self):
+        """Test trailing spaces, space runs and blank-line runs go; list nesting stays"""
+        text = "Intro  text   here.   \n\n\n\n- item\n  - nested  item\n"
+        assert compress_markdown(text) == "Intro text here.\n\n- item\n  - nested item\n"
+
+    def test_code_blocks_shortened(self):
+        """Test code is dedented, indentation halved and blank lines dropped"""
+        text = "```kotlin\n    class A {\n\n        val x = 1\n    }\n```\n"
+        assert compress_markdown(text) == "```kotlin\nclass A {\n  val x = 1\n}\n```\n"
+
+    def test_two_space_nesting_kept(self):
+        """Test 2-space indented code (YAML) is only dedented, keeping every nesting level"""
+        text = "```yaml\n  a:\n    b:\n      c: 1\n    d: 2\n```\n"
+        compressed = compress_markdown(text)
+        assert compressed == "```yaml\na:\n  b:\n    c: 1\n  d: 2\n```\n"
+        assert compress_markdown(compressed) == compressed
+
+    def test_repeated_snippets_point_at_core(self):
+        """Test a code block repeated from a core section becomes a pointer to it"""
+        _, sections = parse_sections(SAMPLE_KB)
+        sections[3].tier = CORE
+        texts, counts = dedupe_snippets(sections)
+
+        assert "_(same code as in Example: Impact Builder Structure)_" in texts[4]
+        assert "fun step0" not in texts[4]
+        assert counts == [0, 0, 0, 0, 1, 0]
+
+    def test_detail_snippets_not_pointed_at(self):
+        """Test a snippet repeated between detail sections is kept, as retrieval may send only one of them"""
+        _, sections = parse_sections(SAMPLE_KB)
+        texts, counts = dedupe_snippets(sections)
+
+        assert texts == [s.text for s in sections]
+        assert counts == [0] * len(sections)
+
+    def test_indented_fence_in_list_is_code_everywhere(self):
+        """Test every parser treats a fence indented inside a list item as code"""
+        text = ("## SETUP\n- Add the config:\n\n  ```yaml\n  ledger:\n\n  ## not a heading\n"
+                "    enabled: true\n  ```\n- Restart\n")
+        code = "```yaml\n  ledger:\n\n  ## not a heading\n    enabled: true\n  ```"
+
+        assert [s.title for s in parse_sections(text)[1]] == ["SETUP"]
+        assert [b.title for b in split_blocks(text)[1]] == ["SETUP"]
+        assert shift_headings(text, top_level=2) == text
+        assert split_snippets(text) == ["## SETUP\n- Add the config:", "  " + code, "- Restart"]
+        assert code_tokens(text) > 0
+        assert compress_markdown(text) == (
+            "## SETUP\n- Add the config:\n\n```yaml\nledger:\n## not a heading\n  enabled: true\n```\n- Restart\n"
+        )
+
+    def test_short_snippets_left_alone(self):
+        """Test snippets too short to be worth a pointer are repeated"""
+        sections = [Section("A", 2, "## A\nBe concise.\n", 0), Section("B", 2, "## B\nBe concise.\n", 1)]
+        assert dedupe_snippets(sections) == (["## A\nBe concise.\n", "## B\nBe concise.\n"], [0, 0])
+
+
+class TestTiers:
+    """Test sorting sections into core, detail and archive"""
+
+    def test_no_ceiling_keeps_everything(self):
+        """Test without a ceiling every section is sent, compressed"""
+        result = compile_tiers(SAMPLE_KB)
+
+        assert titles(result.kb, "core") == ["YOUR ROLE", "HOW TO ANSWER QUESTIONS"]
+        assert titles(result.kb, "archive") == []
+        assert "Reversals swap debits and credits.\n\nBoth headers" in result.kb.prompt_text
+        assert result.kb.prompt_tokens < result.kb.total_tokens
+
+    def test_ceiling_archives_code_heavy_sections_first(self):
+        """Test examples are archived before prose to get under the ceiling"""
+        full = compile_tiers(SAMPLE_KB).kb.prompt_tokens
+        result = compile_tiers(SAMPLE_KB, token_ceiling=full - 20)
+
+        assert titles(result.kb, "archive") == ["Example: Impact Builder Structure"]
+        assert result.kb.prompt_tokens <= full - 20
+        assert "archived: ceiling" in result.report()
+        # Neither example is core, so the copy is sent in full
+        assert "fun step0" in result.kb.prompt_text
+        assert "same code as in" not in result.kb.prompt_text
+
+    def test_core_never_archived(self):
+        """Test an impossible ceiling archives all detail but keeps core and reports it"""
+        result = compile_tiers(SAMPLE_KB, token_ceiling=10)
+
+        assert titles(result.kb, "core") == ["YOUR ROLE", "HOW TO ANSWER QUESTIONS"]
+        assert titles(result.kb, "detail") == []
+        assert result.over_ceiling
+        assert "exceed the 10 token ceiling" in result.report()
+
+    def test_configured_archive_covers_subsections(self):
+        """Test archiving a `##` section archives its `###` sections too"""
+        kb = compile_tiers(SAMPLE_KB, archive_titles=["real-world examples"]).kb
+
+        assert titles(kb, "archive") == [
+            "REAL-WORLD EXAMPLES", "Example: Impact Builder Structure", "Example: Another Builder"
+        ]
+        assert "ReversalBuilder" not in kb.prompt_text
+        assert kb.retrieve("ReversalBuilder step0").sections == []
+
+    def test_artifact_round_trip(self):
+        """Test a tiered build loads from its artifact with the same tiers and prompt"""
+        built = compile_tiers(SAMPLE_KB, token_ceiling=60).kb
+        loaded = KnowledgeBase(SAMPLE_KB, artifact=built.to_artifact())
+
+        assert loaded.compiled
+        assert loaded.tiering == settings(token_ceiling=60)
+        assert [s.tier for s in loaded.sections] == [s.tier for s in built.sections]
+        assert loaded.prompt_text == built.prompt_text
+        assert estimate_tokens(loaded.prompt_text) == loaded.prompt_tokens
+
+    def test_untiered_knowledge_base_sends_raw_text(self):
+        """Test a plain KnowledgeBase still sends its text unchanged"""
+        kb = KnowledgeBase(SAMPLE_KB)
+        assert kb.prompt_text == SAMPLE_KB
+        assert kb.tiering is None
@@ -0,0 +1,204 @@
+"""Unit tests for knowledge base sections and retrieval"""
+import os
+import sys
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from ledger_bot.knowledge import (
+    KnowledgeBase,
+    KnowledgeReloader,
+    artifact_path,
+    estimate_tokens,
+    parse_sections,
+    read_artifact,
+    save_artifact,
+)
+
+SAMPLE_KB = """# LEDGER BOT KNOWLEDGE BASE
+
+You are Ledger Bot.
+
+## YOUR ROLE
+- Help teams onboard
+
+## GL PUBLISHER OVERVIEW
+
+Publisher intro.
+
+### Key Modules
+queue-processor consumes Kafka messages.
+
+### Reversals
+Reversals are processed through the GraphQL API.
+
+```bash
+## not a heading inside a code fence
+```
+
+## HOW TO ANSWER QUESTIONS
+Be concise.
+
+## ATTRIBUTE6 USAGE
+ATTRIBUTE6 stores the external source id.
+
+#### Pattern 1
+JSON metadata in ATTRIBUTE6.
+"""
+
+
+class TestParseSections:
+    """Test splitting the knowledge base on headings"""
+
+    def test_preamble_and_sections(self):
+        """Test preamble and ##/### sections are split in order"""
+        preamble, sections = parse_sections(SAMPLE_KB)
+        assert "You are Ledger Bot." in preamble
+        assert [s.title for s in sections] == [
+            "YOUR ROLE", "GL PUBLISHER OVERVIEW", "Key Modules", "Reversals",
+            "HOW TO ANSWER QUESTIONS", "ATTRIBUTE6 USAGE",
+        ]
+
+    def test_subsections_know_their_parent(self):
+        """Test ### sections record their ## parent"""
+        _, sections = parse_sections(SAMPLE_KB)
+        reversals = next(s for s in sections if s.title == "Reversals")
+        assert reversals.level == 3
+        assert reversals.parent == "GL PUBLISHER OVERVIEW"
+
+    def test_code_fences_and_deep_headings_stay_in_section(self):
+        """Test fenced and #### headings don't start new sections"""
+        _, sections = parse_sections(SAMPLE_KB)
+        reversals = next(s for s in sections if s.title == "Reversals")
+        attribute6 = next(s for s in sections if s.title == "ATTRIBUTE6 USAGE")
+        assert "not a heading inside a code fence" in reversals.text
+        assert "#### Pattern 1" in attribute6.text
+
+
+class TestRetrieval:
+    """Test selecting sections for a question"""
+
+    def test_core_sections_always_included(self):
+        """Test core sections are sent even when nothing matches"""
+        kb = KnowledgeBase(SAMPLE_KB)
+        retrieval = kb.retrieve("zzz unrelated")
+        assert "## YOUR ROLE" in retrieval.prompt
+        assert "## HOW TO ANSWER QUESTIONS" in retrieval.prompt
+        assert retrieval.sections == []
+
+    def test_relevant_section_retrieved_with_parent_heading(self):
+        """Test the best match is included under its parent heading"""
+        kb = KnowledgeBase(SAMPLE_KB)
+        retrieval = kb.retrieve("how do reversals work?", top_k=1)
+        assert [s.title for s in retrieval.sections] == ["Reversals"]
+        assert "## GL PUBLISHER OVERVIEW" in retrieval.prompt
+        assert retrieval.prompt.index("## YOUR ROLE") < retrieval.prompt.index("### Reversals")
+        assert "Key Modules" not in retrieval.prompt
+
+    def test_token_budget_respected(self):
+        """Test sections that don't fit the budget are skipped"""
+        kb = KnowledgeBase(SAMPLE_KB)
+        core_tokens = kb.retrieve("zzz").prompt_tokens
+        retrieval = kb.retrieve("ATTRIBUTE6 reversals", token_budget=core_tokens)
+        assert retrieval.sections == []
+
+    def test_token_savings_reported(self):
+        """Test savings are measured against the full knowledge base"""
+        kb = KnowledgeBase(SAMPLE_KB)
+        retrieval = kb.retrieve("ATTRIBUTE6")
+        assert retrieval.full_tokens == estimate_tokens(SAMPLE_KB)
+        assert retrieval.tokens_saved > 0
+        assert "ATTRIBUTE6 USAGE" in retrieval.describe()
+
+    def test_real_knowledge_base_retrieval(self):
+        """Test retrieval over the shipped knowledge base"""
+        path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "knowledge_base.txt")
+        with open(path) as f:
+            kb = KnowledgeBase(f.read())
+        retrieval = kb.retrieve("how do I add a new activity?")
+        assert "Adding New Activities" in [s.title for s in retrieval.sections]
+        assert retrieval.prompt_tokens < kb.total_tokens
+
+
+class TestCompiledArtifact:
+    """Test loading the knowledge base from a precompiled artifact"""
+
+    def test_round_trip_matches_parsed(self, tmp_path):
+        """Test a compiled knowledge base retrieves exactly like a freshly parsed one"""
+        parsed = KnowledgeBase(SAMPLE_KB)
+        path = artifact_path(str(tmp_path / "knowledge_base.txt"))
+        save_artifact(parsed, path)
+
+        compiled = KnowledgeBase(SAMPLE_KB, artifact=read_artifact(path))
+
+        assert path.endswith("knowledge_base.compiled.json")
+        assert compiled.compiled and not parsed.compiled
+        assert [(s.title, s.parent, s.tokens) for s in compiled.sections] == \
+            [(s.title, s.parent, s.tokens) for s in parsed.sections]
+        assert [s.title for s in compiled.core_sections] == [s.title for s in parsed.core_sections]
+        assert compiled.retrieve("ATTRIBUTE6").prompt == parsed.retrieve("ATTRIBUTE6").prompt
+
+    def test_stale_artifact_ignored(self):
+        """Test an artifact for other text or another version is not used"""
+        artifact = KnowledgeBase(SAMPLE_KB).to_artifact()
+        changed = SAMPLE_KB + "\n## NEW SECTION\nFresh content.\n"
+
+        assert not KnowledgeBase(changed, artifact=artifact).compiled
+        assert "NEW SECTION" in [s.title for s in KnowledgeBase(changed, artifact=artifact).sections]
+        assert not KnowledgeBase(SAMPLE_KB, artifact=dict(artifact, version=0)).compiled
+
+    def test_missing_or_corrupt_artifact(self, tmp_path):
+        """Test unreadable artifacts are treated as absent"""
+        path = tmp_path / "knowledge_base.compiled.json"
+        assert read_artifact(str(path)) is None
+        path.write_text("{not json")
+        assert read_artifact(str(path)) is None
+
+
+class TestKnowledgeReloader:
+    """Test reloading the knowledge base without a restart"""
+
+    def make_reloader(self, tmp_path, text=SAMPLE_KB):
+        path = tmp_path / "knowledge_base.txt"
+        path.write_text(text)
+        swaps = []
+        reloader = KnowledgeReloader(
+            str(path), KnowledgeBase(text), on_swap=lambda new, old: swaps.append((new, old))
+        )
+        return reloader, path, swaps
+
+    def test_unchanged_file_not_rebuilt(self, tmp_path):
+        """Test reload is a no-op when the file hasn't changed"""
+        reloader, _, swaps = self.make_reloader(tmp_path)
+        assert reloader.reload() is None
+        assert reloader.reload(force=True) is None
+        assert swaps == []
+
+    def test_changed_file_swapped_in(self, tmp_path):
+        """Test a changed file is rebuilt and swapped atomically"""
+        reloader, path, swaps = self.make_reloader(tmp_path)
+        old = reloader.current
+        path.write_text(SAMPLE_KB + "\n## NEW SECTION\nFresh content about accruals.\n")
+
+        new = reloader.reload(force=True)
+
+        assert new is reloader.current
+        assert new.hash != old.hash
+        assert "NEW SECTION" in [s.title for s in new.sections]
+        assert swaps == [(new, old)]
+        # The old version is untouched for requests still using it
+        assert "NEW SECTION" not in [s.title for s in old.sections]
+        assert reloader.stats()["reloads"] == 1
+
+    def test_failed_reload_keeps_current(self, tmp_path):
+        """Test a broken reload leaves the current version in place"""
+        reloader, path, _ = self.make_reloader(tmp_path)
+        old = reloader.current
+        path.unlink()
+
+        with pytest.raises(OSError):
+            reloader.reload(force=True)
+
+        assert reloader.current is old
+        assert reloader.stats()["failures"] == 1
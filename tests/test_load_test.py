@@ -0,0 +1,174 @@
+"""Tests for the offline load test driver"""
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+from openai import OpenAI
+from slack_sdk import WebClient
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import load_test
+from ledger_bot.cassette import Cassette
+from ledger_bot.fakes import FakeLiteLLM, FakeSlack, SlackCall
+
+
+def call(method, at=0.0, ts=None, **payload):
+    return SlackCall(method, payload, at, ts)
+
+
+class TestPercentile:
+    """Test nearest-rank percentiles"""
+
+    def test_percentiles(self):
+        values = list(range(1, 101))
+        assert load_test.percentile(values, 50) == 50
+        assert load_test.percentile(values, 99) == 99
+        assert load_test.percentile(values, 100) == 100
+
+    def test_single_value(self):
+        assert load_test.percentile([3.0], 95) == 3.0
+
+    def test_empty(self):
+        assert load_test.percentile([], 50) is None
+
+
+class TestEvents:
+    """Test event generation and arrival schedules"""
+
+    def test_mentions_and_dms_have_distinct_threads(self):
+        events = load_test.make_events(200, ["q"], dm_fraction=0.5, seed=1)
+
+        kinds = {e.kind for e in events}
+        assert kinds == {"app_mention", "message"}
+        assert len({e.key for e in events}) == 200
+        for injected in events:
+            if injected.kind == "app_mention":
+                assert injected.event["text"].startswith(f"<@{load_test.BOT_USER_ID}>")
+                assert injected.key == (injected.event["channel"], injected.event["ts"])
+
+    def test_repeat_fraction(self):
+        repeated = load_test.make_events(50, ["q"], dm_fraction=1.0, repeat_fraction=1.0, seed=1)
+        unique = load_test.make_events(50, ["q"], dm_fraction=1.0, repeat_fraction=0.0, seed=1)
+
+        assert {e.event["text"] for e in repeated} == {"q"}
+        assert len({e.event["text"] for e in unique}) == 50
+
+    def test_cassette_events(self):
+        cassette = Cassette([
+            {"kind": "event", "at": 5.0, "event": {"type": "app_mention", "channel": "C1", "ts": "1.0", "text": "a"}},
+            {"kind": "llm", "at": 6.0},
+            {"kind": "event", "at": 9.0, "event": {"type": "message", "channel": "D1", "ts": "2.0", "text": "b"}},
+        ])
+
+        events, offsets = load_test.cassette_events(cassette, arrival_scale=0.5)
+
+        assert [(e.kind, e.key) for e in events] == [("app_mention", ("C1", "1.0")), ("message", ("D1", None))]
+        assert offsets == [0.0, 2.0]
+
+    def test_uniform_arrivals(self):
+        assert load_test.arrival_offsets(3, 2.0, poisson=False) == [0.0, 0.5, 1.0]
+
+    def test_poisson_arrivals_average_rate(self):
+        offsets = load_test.arrival_offsets(2000, 10.0, seed=1)
+        assert offsets[-1] / len(offsets) == pytest.approx(0.1, rel=0.1)
+
+
+class TestReplyTracker:
+    """Test matching Slack calls back to injected events"""
+
+    def make(self):
+        tracker = load_test.ReplyTracker("Thinking...", "Busy")
+        injected = load_test.InjectedEvent("app_mention", {}, ("C1", "1.0"))
+        injected.sent_at = 1.0
+        tracker.expect(injected)
+        return tracker, injected
+
+    def test_final_update_completes(self):
+        tracker, injected = self.make()
+        tracker.on_call(call("chat.postMessage", ts="2.0", channel="C1", thread_ts="1.0", text="Thinking..."))
+        tracker.on_call(call("chat.update", ts="2.0", channel="C1", text="Part" + load_test.TYPING_INDICATOR))
+        assert injected.outcome is None
+
+        tracker.on_call(call("chat.update", at=4.0, ts="2.0", channel="C1", text="Answer"))
+
+        assert injected.outcome == "answered"
+        assert injected.latency == 3.0
+        assert injected.slack_calls == 3
+        assert tracker.wait(0)
+
+    def test_cached_and_busy_replies(self):
+        tracker, injected = self.make()
+        tracker.on_call(call("chat.postMessage", ts="2.0", channel="C1", thread_ts="1.0", text="Busy"))
+        assert injected.outcome == "shed"
+
+        tracker, injected = self.make()
+        tracker.on_call(call("chat.postMessage", ts="2.0", channel="C1", thread_ts="1.0", text="Answer"))
+        assert injected.outcome == "cached"
+
+    def test_throttled_replies_not_cached(self):
+        tracker = load_test.ReplyTracker("Thinking...", "Busy", ":hourglass: {who} asked a lot. Try again in {wait}.")
+        injected = load_test.InjectedEvent("app_mention", {}, ("C1", "1.0"))
+        injected.sent_at = 1.0
+        tracker.expect(injected)
+        tracker.on_call(call("chat.postMessage", ts="2.0", channel="C1", thread_ts="1.0",
+                             text=":hourglass: You've asked a lot. Try again in 30 seconds."))
+        assert injected.outcome == "throttled"
+
+        report = load_test.build_report(MagicMock(), [injected], MagicMock(rate_limited=0), None,
+                                        10.0, 10.0, True, 0, 1)
+        assert report["outcomes"] == {"throttled": 1}
+        assert report["throughput_per_second"] == 0
+        assert report["latency_seconds"]["p50"] is None
+
+    def test_error_messages(self):
+        tracker, injected = self.make()
+        tracker.on_call(call("chat.postMessage", ts="2.0", channel="C1", thread_ts="1.0", text="Thinking..."))
+        tracker.on_call(call("chat.update", ts="2.0", channel="C1", text="❌ Sorry, I encountered an error"))
+
+        assert injected.outcome == "error"
+
+    def test_events_in_one_thread_match_in_order(self):
+        tracker, first = self.make()
+        second = load_test.InjectedEvent("message", {}, ("C1", "1.0"))
+        tracker.expect(second)
+
+        tracker.on_call(call("chat.postMessage", ts="2.0", channel="C1", thread_ts="1.0", text="Thinking..."))
+        tracker.on_call(call("chat.postMessage", ts="3.0", channel="C1", thread_ts="1.0", text="Thinking..."))
+        tracker.on_call(call("chat.update", ts="3.0", channel="C1", text="Second answer"))
+
+        assert first.outcome is None
+        assert second.outcome == "answered"
+
+    def test_wait_times_out_with_outstanding_events(self):
+        tracker, _ = self.make()
+        assert not tracker.wait(0.01)
+
+
+@pytest.mark.integration
+class TestRunLoad:
+    """Drive the real handlers against the fake servers"""
+
+    def test_reports_answers(self):
+        import app
+
+        llm = FakeLiteLLM(first_token="fixed:0.05", tokens_per_second=0, answer_tokens="fixed:20", seed=1)
+        slack = FakeSlack(seed=1)
+        with llm, slack, patch.object(app, "llm_client", OpenAI(api_key="sk-test", base_url=llm.base_url,
+                                                                  max_retries=0)):
+            events = load_test.make_events(6, load_test.QUESTIONS, repeat_fraction=0.0, seed=1)
+            offsets = load_test.arrival_offsets(6, 50.0, poisson=False)
+            report = load_test.run_load(app, WebClient(token="xoxb-test", base_url=slack.base_url), slack,
+                                        events, offsets, drain=30, llm=llm)
+        app.response_cache.clear()
+        app.conversations.clear()
+
+        assert report["drained"]
+        assert report["outcomes"] == {"answered": 6}
+        assert report["latency_seconds"]["p99"] >= report["latency_seconds"]["p50"] > 0
+        assert report["slack_calls_per_answer"] >= 2
+        assert report["fake_llm"]["requests"] == 6
+        assert report["memory_mb"]["peak"] > 0
+        assert "p95" in load_test.format_report(report)
@@ -0,0 +1,78 @@
+"""Unit tests for Prometheus metrics helpers"""
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from prometheus_client import REGISTRY
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from ledger_bot import metrics
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestMetricsHelpers:
+    """Test recording helpers"""
+
+    def test_record_usage_counts_tokens(self):
+        """Test prompt/completion tokens are counted from usage payloads"""
+        before = sample("ledger_bot_llm_tokens_total", model="m-usage", type="prompt")
+        metrics.record_usage("m-usage", SimpleNamespace(prompt_tokens=120, completion_tokens=30))
+        assert sample("ledger_bot_llm_tokens_total", model="m-usage", type="prompt") == before + 120
+        assert sample("ledger_bot_llm_tokens_total", model="m-usage", type="completion") == 30
+
+    def test_record_usage_ignores_missing_usage(self):
+        """Test missing or non-numeric usage is ignored"""
+        metrics.record_usage("m-none", None)
+        metrics.record_usage("m-none", MagicMock())
+        assert sample("ledger_bot_llm_tokens_total", model="m-none", type="prompt") == 0
+
+    def test_record_usage_counts_prompt_cache_tokens(self):
+        """Test Anthropic-style cache read/write token fields are counted"""
+        metrics.record_usage("m-cache", SimpleNamespace(
+            prompt_tokens=50, completion_tokens=10,
+            cache_read_input_tokens=4000, cache_creation_input_tokens=0
+        ))
+        metrics.record_usage("m-cache", SimpleNamespace(
+            prompt_tokens=50, completion_tokens=10, cache_creation_input_tokens=4000
+        ))
+        assert sample("ledger_bot_llm_tokens_total", model="m-cache", type="cache_read") == 4000
+        assert sample("ledger_bot_llm_tokens_total", model="m-cache", type="cache_write") == 4000
+
+    def test_prompt_cache_status_from_openai_style_usage(self):
+        """Test cached_tokens in prompt_tokens_details counts as a cache read"""
+        usage = SimpleNamespace(prompt_tokens=4100, prompt_tokens_details=SimpleNamespace(cached_tokens=4000))
+        assert metrics.prompt_cache_tokens(usage) == (4000, 0)
+        assert metrics.prompt_cache_status(usage) == "read"
+        assert metrics.prompt_cache_status(SimpleNamespace(prompt_tokens=10)) == "none"
+        assert metrics.prompt_cache_status(None) == "unknown"
+
+    def test_record_error_by_stage_and_type(self):
+        """Test errors are labelled by stage and exception class"""
+        before = sample("ledger_bot_errors_total", stage="test", type="ValueError")
+        metrics.record_error("test", ValueError("bad"))
+        assert sample("ledger_bot_errors_total", stage="test", type="ValueError") == before + 1
+
+    def test_timed_slack_client_records_latency(self):
+        """Test chat_postMessage/chat_update calls are timed and passed through"""
+        client = MagicMock()
+        client.chat_update.return_value = {"ok": True}
+        before = sample("ledger_bot_slack_api_latency_seconds_count", method="chat_update")
+
+        timed = metrics.TimedSlackClient(client)
+        assert timed.chat_update(channel="C1", ts="1", text="hi") == {"ok": True}
+        assert timed.users_info is client.users_info
+
+        client.chat_update.assert_called_once_with(channel="C1", ts="1", text="hi")
+        assert sample("ledger_bot_slack_api_latency_seconds_count", method="chat_update") == before + 1
+
+    def test_exposition_format(self):
+        """Test the scrape body is Prometheus text format"""
+        body, content_type = metrics.exposition()
+        assert content_type.startswith("text/plain")
+        assert b"ledger_bot_answer_latency_seconds" in body
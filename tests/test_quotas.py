@@ -0,0 +1,173 @@
+"""Unit tests for per-user and per-channel quotas"""
+import os
+import sys
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from ledger_bot.quotas import QuotaManager, channel_type, parse_channel_weights
+
+
+class FakeClock:
+    """Manually advanced clock"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def manager(clock, **limits):
+    options = dict(user_requests_per_minute=0, user_tokens_per_hour=0,
+                   channel_requests_per_minute=0, channel_tokens_per_hour=0, clock=clock)
+    options.update(limits)
+    return QuotaManager(**options)
+
+
+class TestParseChannelWeights:
+    """Test CHANNEL_PRIORITIES parsing"""
+
+    def test_parses_weights(self):
+        assert parse_channel_weights("C1:4, C2:0.5") == {"C1": 4.0, "C2": 0.5}
+        assert parse_channel_weights("") == {}
+
+    @pytest.mark.parametrize("spec", ["C1:high", "C1:0", "C1:-2"])
+    def test_rejects_invalid_weights(self, spec):
+        with pytest.raises(ValueError):
+            parse_channel_weights(spec)
+
+
+class TestQuotaManager:
+    """Test request and token buckets per user and channel"""
+
+    def test_user_request_quota(self):
+        clock = FakeClock()
+        quotas = manager(clock, user_requests_per_minute=2)
+
+        assert quotas.admit("U1", "C1", 10).allowed
+        assert quotas.admit("U1", "C1", 10).allowed
+        refused = quotas.admit("U1", "C1", 10)
+
+        assert not refused.allowed
+        assert refused.scope == "user"
+        assert refused.retry_after == pytest.approx(30)
+        # Other users are unaffected
+        assert quotas.admit("U2", "C1", 10).allowed
+
+    def test_requests_refill_over_time(self):
+        clock = FakeClock()
+        quotas = manager(clock, user_requests_per_minute=1)
+        quotas.admit("U1", "C1", 10)
+        assert not quotas.admit("U1", "C1", 10).allowed
+
+        clock.now = 60
+        assert quotas.admit("U1", "C1", 10).allowed
+
+    def test_channel_token_quota(self):
+        clock = FakeClock()
+        quotas = manager(clock, channel_tokens_per_hour=1000)
+
+        assert quotas.admit("U1", "C1", 600).allowed
+        refused = quotas.admit("U2", "C1", 600)
+
+        assert not refused.allowed
+        assert refused.scope == "channel"
+        assert refused.retry_after == pytest.approx(200 * 3.6)
+        assert quotas.admit("U2", "C2", 600).allowed
+
+    def test_refused_question_charges_nothing(self):
+        clock = FakeClock()
+        quotas = manager(clock, user_requests_per_minute=10, channel_tokens_per_hour=1000)
+        quotas.admit("U1", "C1", 900)
+
+        assert not quotas.admit("U1", "C1", 900).allowed
+        # The user's request bucket wasn't charged for the refused question
+        assert quotas.stats()["top_users"][0]["admitted"] == 1
+        assert quotas.admit("U1", "C1", 100).allowed
+
+    def test_oversized_question_waits_for_full_bucket(self):
+        clock = FakeClock()
+        quotas = manager(clock, user_tokens_per_hour=1000)
+
+        assert quotas.admit("U1", "C1", 5000).allowed
+        assert not quotas.admit("U1", "C1", 5000).allowed
+
+    def test_settle_returns_unused_estimate(self):
+        clock = FakeClock()
+        quotas = manager(clock, user_tokens_per_hour=1000)
+        admission = quotas.admit("U1", "C1", 800)
+        assert not quotas.admit("U1", "C1", 800).allowed
+
+        quotas.settle(admission, 200)
+
+        assert quotas.admit("U1", "C1", 800).allowed
+        assert quotas.stats()["top_users"][0]["tokens"] == 200
+
+    def test_settle_charges_overruns(self):
+        clock = FakeClock()
+        quotas = manager(clock, user_tokens_per_hour=1000)
+        admission = quotas.admit("U1", "C1", 100)
+
+        quotas.settle(admission, 1000)
+
+        assert not quotas.admit("U1", "C1", 100).allowed
+
+    def test_channel_weight_scales_quota(self):
+        clock = FakeClock()
+        quotas = manager(clock, channel_requests_per_minute=1, channel_weights={"CINC": 3})
+
+        assert quotas.weight("CINC") == 3
+        assert quotas.weight("C1") == 1
+        assert [quotas.admit(f"U{i}", "CINC", 1).allowed for i in range(4)] == [True, True, True, False]
+
+    def test_zero_limits_disable_quotas(self):
+        quotas = manager(FakeClock())
+        assert all(quotas.admit("U1", "C1", 10 ** 9).allowed for _ in range(100))
+
+    def test_missing_user_only_checks_channel(self):
+        quotas = manager(FakeClock(), user_requests_per_minute=1, channel_requests_per_minute=5)
+        assert quotas.admit(None, "C1", 1).allowed
+        assert quotas.admit(None, "C1", 1).allowed
+
+    def test_least_recent_tenants_forgotten(self):
+        quotas = manager(FakeClock(), user_requests_per_minute=1, max_tenants=2)
+        quotas.admit("U1", None, 1)
+        quotas.admit("U2", None, 1)
+        quotas.admit("U3", None, 1)
+
+        assert quotas.stats()["tenants"] == 2
+        # U1 was evicted and starts with a full bucket again
+        assert quotas.admit("U1", None, 1).allowed
+
+    def test_stats_rank_heaviest_tenants(self):
+        quotas = manager(FakeClock())
+        for user, tokens in (("U1", 100), ("U2", 500), ("U3", 300)):
+            quotas.settle(quotas.admit(user, "C1", tokens), tokens)
+
+        stats = quotas.stats(top=2)
+
+        assert [u["id"] for u in stats["top_users"]] == ["U2", "U3"]
+        assert stats["top_channels"] == [{"id": "C1", "tokens": 900, "admitted": 3, "throttled": 0}]
+
+    def test_usage_lists_every_tenant(self):
+        quotas = manager(FakeClock())
+        for user in ("U1", "U2", "U3"):
+            quotas.settle(quotas.admit(user, "C1", 10), 10)
+
+        usage = quotas.usage()
+
+        assert [u["id"] for u in usage["users"]] == ["U1", "U2", "U3"]
+        assert usage["channels"] == [{"id": "C1", "tokens": 30, "admitted": 3, "throttled": 0}]
+
+
+class TestChannelType:
+    """Test the bounded channel label used in metrics"""
+
+    @pytest.mark.parametrize("channel, expected", [
+        ("C0123", "public"), ("G0123", "private"), ("D0123", "dm"), ("X1", "other"), (None, "none"), ("", "none"),
+    ])
+    def test_channel_type(self, channel, expected):
+        assert channel_type(channel) == expected
@@ -0,0 +1,241 @@
+"""Unit tests for LLM retries, hedging and circuit breaking"""
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from ledger_bot.resilience import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, PeekedStream, ResilientLLM, RetryBudget
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def flaky(failures, result="ok", error=TimeoutError):
+    """attempt() that raises `failures` times, then succeeds"""
+    calls = []
+
+    def attempt(model, timeout):
+        calls.append(model)
+        if len(calls) <= failures:
+            raise error("slow gateway")
+        return result
+    attempt.calls = calls
+    return attempt
+
+
+class TestRetryBudget:
+    """Test the retry budget"""
+
+    def test_retries_capped_by_ratio_of_requests(self):
+        """Test retries are limited to min_retries plus ratio of recent requests"""
+        clock = FakeClock()
+        budget = RetryBudget(ratio=0.5, min_retries=1, window=10, clock=clock)
+        for _ in range(4):
+            budget.record_request()
+        assert [budget.try_spend() for _ in range(4)] == [True, True, True, False]
+        assert budget.stats()["exhausted"] == 1
+        clock.now = 11
+        assert budget.try_spend()
+
+
+class TestCircuitBreaker:
+    """Test breaker state transitions"""
+
+    def test_opens_on_error_rate_and_recovers_after_cooldown(self):
+        """Test closed -> open -> half-open probe -> closed"""
+        clock = FakeClock()
+        breaker = CircuitBreaker("m", error_rate=0.5, min_calls=4, cooldown=30, clock=clock)
+        for ok in (True, False, True, False):
+            breaker.record(ok)
+        assert breaker.state == OPEN
+        assert not breaker.allow()
+
+        clock.now = 31
+        assert breaker.allow()
+        assert breaker.state == HALF_OPEN
+        # Only one probe at a time
+        assert not breaker.allow()
+        breaker.record(True, latency=1.0)
+        assert breaker.state == CLOSED
+
+    def test_opens_on_latency_slo(self):
+        """Test slow successes trip the breaker and a slow probe re-opens it"""
+        clock = FakeClock()
+        breaker = CircuitBreaker("m", latency_slo=10, slow_rate=0.5, min_calls=2, cooldown=5, clock=clock)
+        breaker.record(True, latency=20)
+        breaker.record(True, latency=25)
+        assert breaker.state == OPEN
+        clock.now = 6
+        assert breaker.allow()
+        breaker.record(True, latency=40)
+        assert breaker.state == OPEN
+        assert breaker.trips == 2
+
+
+class TestResilientLLM:
+    """Test retries, fallback and hedging around attempts"""
+
+    def test_retries_retryable_errors_with_backoff(self):
+        """Test timeouts are retried after a jittered backoff"""
+        sleeps = []
+        caller = ResilientLLM(max_attempts=3, sleep=sleeps.append, rng=lambda: 1.0, backoff_base=0.5)
+        attempt = flaky(2)
+        assert caller.call(attempt, "primary") == ("ok", "primary")
+        assert len(attempt.calls) == 3
+        assert sleeps == [0.5, 1.0]
+
+    def test_gives_up_after_max_attempts(self):
+        """Test the last error is raised once attempts run out"""
+        caller = ResilientLLM(max_attempts=2, sleep=lambda s: None)
+        with pytest.raises(TimeoutError):
+            caller.call(flaky(5), "primary")
+
+    def test_non_retryable_errors_raised_immediately(self):
+        """Test request errors are not retried and don't count against the model"""
+        caller = ResilientLLM(sleep=lambda s: None)
+        attempt = flaky(1, error=ValueError)
+        with pytest.raises(ValueError):
+            caller.call(attempt, "primary")
+        assert len(attempt.calls) == 1
+        assert caller.stats()["breakers"]["primary"]["error_rate"] == 0.0
+
+    def test_health_tracks_failing_streak(self):
+        """Test healthy() turns false only after failing for the whole window, and recovers on success"""
+        clock = FakeClock()
+        caller = ResilientLLM(max_attempts=1, sleep=lambda s: None, clock=clock)
+        assert caller.healthy(60)
+
+        with pytest.raises(TimeoutError):
+            caller.call(flaky(1), "primary")
+        clock.now = 61
+        with pytest.raises(TimeoutError):
+            caller.call(flaky(1), "primary")
+
+        assert caller.healthy(60, now=59)
+        assert not caller.healthy(60, now=62)
+        assert caller.healthy(0, now=62)
+
+        caller.call(flaky(0), "primary")
+        assert caller.failing_since is None
+        assert caller.healthy(60, now=62)
+
+    def test_healthy_again_once_idle_past_the_window(self):
+        """Test one failure followed by no traffic doesn't keep the pod out of rotation"""
+        clock = FakeClock()
+        caller = ResilientLLM(max_attempts=1, sleep=lambda s: None, clock=clock)
+        with pytest.raises(TimeoutError):
+            caller.call(flaky(1), "primary")
+
+        assert caller.healthy(60, now=59)
+        assert caller.healthy(60, now=61)
+        assert caller.healthy(60, now=3600)
+
+    def test_retry_budget_limits_retries(self):
+        """Test an exhausted budget stops retrying"""
+        caller = ResilientLLM(max_attempts=5, budget=RetryBudget(ratio=0, min_retries=1), sleep=lambda s: None)
+        attempt = flaky(5)
+        with pytest.raises(TimeoutError):
+            caller.call(attempt, "primary")
+        assert len(attempt.calls) == 2
+
+    def test_falls_back_when_circuit_open(self):
+        """Test an open circuit sends calls to the fallback model, or fails fast without one"""
+        def breaker(model, on_change=None):
+            return CircuitBreaker(model, min_calls=2, on_change=on_change)
+
+        caller = ResilientLLM(max_attempts=1, fallback_model="backup", breaker_factory=breaker)
+        for _ in range(2):
+            with pytest.raises(TimeoutError):
+                caller.call(flaky(1), "primary")
+        assert caller.stats()["breakers"]["primary"]["state"] == OPEN
+        assert caller.call(lambda model, timeout: model, "primary") == ("backup", "backup")
+
+        no_fallback = ResilientLLM(max_attempts=1, breaker_factory=breaker)
+        for _ in range(2):
+            with pytest.raises(TimeoutError):
+                no_fallback.call(flaky(1), "primary")
+        with pytest.raises(CircuitOpenError):
+            no_fallback.call(flaky(0), "primary")
+
+    def test_hedged_request_wins_when_first_is_slow(self):
+        """Test a second request fires after the hedge delay and the first success wins"""
+        release = threading.Event()
+        discarded = []
+        calls = []
+
+        def attempt(model, timeout):
+            calls.append(model)
+            if len(calls) == 1:
+                release.wait(5)
+                return "slow"
+            return "fast"
+
+        caller = ResilientLLM(hedge=True, hedge_min_delay=0.01, hedge_min_samples=1)
+        caller._latency_window("primary").add(0.01)
+        try:
+            assert caller.call(attempt, "primary", discard=discarded.append) == ("fast", "primary")
+        finally:
+            release.set()
+        caller._executor.shutdown(wait=True)
+        assert discarded == ["slow"]
+
+    def test_async_retry_and_hedge(self):
+        """Test the async path retries timeouts and cancels the losing hedge"""
+        calls = []
+
+        async def attempt(model, timeout):
+            calls.append(model)
+            if len(calls) == 1:
+                raise TimeoutError("slow gateway")
+            if len(calls) == 2:
+                await asyncio.sleep(5)
+            return "answer"
+
+        caller = ResilientLLM(hedge=True, hedge_min_delay=0.01, hedge_min_samples=1, rng=lambda: 0.0)
+        caller._latency_window("primary").add(0.01)
+        assert asyncio.run(caller.acall(attempt, "primary")) == ("answer", "primary")
+        assert len(calls) == 3
+
+    def test_async_wait_for_timeout_retried(self):
+        """Test asyncio.TimeoutError from the async path is retried and counts against the breaker"""
+        calls = []
+
+        async def attempt(model, timeout):
+            calls.append(model)
+            if len(calls) == 1:
+                raise asyncio.TimeoutError()
+            return "answer"
+
+        caller = ResilientLLM(rng=lambda: 0.0)
+        assert asyncio.run(caller.acall(attempt, "primary")) == ("answer", "primary")
+        assert len(calls) == 2
+        assert caller.stats()["breakers"]["primary"]["error_rate"] == 0.5
+
+
+class TestPeekedStream:
+    """Test streams are read ahead by one chunk"""
+
+    def test_first_chunk_read_eagerly(self):
+        """Test the first chunk is consumed on construction and replayed"""
+        consumed = []
+
+        def chunks():
+            for chunk in ("a", "b", "c"):
+                consumed.append(chunk)
+                yield chunk
+
+        stream = PeekedStream(chunks())
+        assert consumed == ["a"]
+        assert list(stream) == ["a", "b", "c"]
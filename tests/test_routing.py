@@ -0,0 +1,82 @@
+"""Unit tests for model tier routing"""
+import os
+import sys
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from ledger_bot.routing import QuestionRouter, parse_channel_tiers, parse_tiers
+
+TIERS = "fast=bedrock-claude-4.5-haiku:800,strong=bedrock-claude-4.5-sonnet:2000"
+HEADINGS = ["Reversals", "Accruals", "Journal Entries", "Slack Channels", "Activities", "Publisher Flow"]
+
+
+def make_router(**kwargs):
+    return QuestionRouter(parse_tiers(TIERS), headings=HEADINGS, **kwargs)
+
+
+class TestTierTable:
+    """Test parsing of tier and override config"""
+
+    def test_parse_tiers(self):
+        """Test tiers keep their order, models and max_tokens"""
+        fast, strong = parse_tiers(TIERS)
+        assert (fast.name, fast.model, fast.max_tokens) == ("fast", "bedrock-claude-4.5-haiku", 800)
+        assert (strong.name, strong.model, strong.max_tokens) == ("strong", "bedrock-claude-4.5-sonnet", 2000)
+
+    def test_invalid_tiers_rejected(self):
+        """Test malformed tier entries and unknown override tiers raise"""
+        with pytest.raises(ValueError):
+            parse_tiers("fast=haiku")
+        with pytest.raises(ValueError):
+            parse_tiers("")
+        with pytest.raises(ValueError):
+            make_router(channel_tiers={"C1": "medium"})
+
+    def test_parse_channel_tiers(self):
+        """Test channel overrides parse into a dict"""
+        assert parse_channel_tiers("C1:strong, C2:fast,") == {"C1": "strong", "C2": "fast"}
+
+
+class TestQuestionRouter:
+    """Test classification and routing"""
+
+    def test_lookup_questions_go_to_fast_tier(self):
+        """Test short where/who questions use the fast model"""
+        route = make_router().route("what Slack channel do I ask in?")
+        assert route.tier.name == "fast"
+        assert route.source == "classifier"
+        assert route.score < 0
+
+    def test_debugging_questions_go_to_strong_tier(self):
+        """Test debugging and multi-section questions use the strong model"""
+        router = make_router()
+        assert router.route("Why is my reversal journal entry not balancing after the accrual ran?").tier.name == "strong"
+        trace = "This fails:\n```\nTraceback (most recent call last):\n  boom\n```"
+        route = router.route(trace)
+        assert route.tier.name == "strong"
+        assert "code or stack trace" in route.reasons
+
+    def test_heading_matches_are_features(self):
+        """Test questions spanning many KB sections score higher than focused ones"""
+        router = make_router()
+        focused, _ = router.classify("tell me about accruals")
+        broad, reasons = router.classify("how do reversals, accruals, journal entries and activities interact")
+        assert broad > focused
+        assert any("spans" in reason for reason in reasons)
+
+    def test_channel_override_wins(self):
+        """Test a channel override skips the classifier"""
+        router = make_router(channel_tiers={"C-ACCOUNTING": "strong"})
+        route = router.route("which channel?", channel="C-ACCOUNTING")
+        assert route.tier.name == "strong"
+        assert route.source == "channel"
+        assert router.route("which channel?", channel="C-OTHER").tier.name == "fast"
+
+    def test_threshold_is_configurable(self):
+        """Test raising the threshold keeps borderline questions on the fast tier"""
+        question = "Why is my reversal journal entry not balancing after the accrual ran?"
+        assert make_router().route(question).tier.name == "strong"
+        assert make_router(threshold=5).route(question).tier.name == "fast"
@@ -0,0 +1,71 @@
+"""Unit tests for in-flight question coalescing"""
+import os
+import sys
+import threading
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from ledger_bot.singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    """Test leader/follower coalescing"""
+
+    def test_first_caller_leads(self):
+        """Test the first caller for a key is the leader, later ones follow"""
+        flight = SingleFlight()
+        call, leader = flight.begin("k")
+        follower_call, follower_leader = flight.begin("k")
+        assert leader is True
+        assert follower_leader is False
+        assert follower_call is call
+        assert call.followers == 1
+
+    def test_followers_get_leader_result(self):
+        """Test followers receive the leader's answer and count as saved calls"""
+        flight = SingleFlight(wait_timeout=2)
+        call, _ = flight.begin("k")
+        results = []
+
+        def follow():
+            follower_call, _ = flight.begin("k")
+            results.append(flight.wait(follower_call))
+
+        threads = [threading.Thread(target=follow) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        while call.followers < 3:
+            pass
+        flight.finish("k", call, result="answer")
+        for thread in threads:
+            thread.join()
+
+        assert results == ["answer"] * 3
+        assert flight.stats()["saved_calls"] == 3
+        assert flight.in_flight() == 0
+
+    def test_leader_failure_releases_followers(self):
+        """Test followers get None when the leader errors"""
+        flight = SingleFlight()
+        call, _ = flight.begin("k")
+        follower_call, _ = flight.begin("k")
+        flight.finish("k", call, error=RuntimeError("boom"))
+        assert flight.wait(follower_call) is None
+        assert flight.stats()["leader_failures"] == 1
+
+    def test_follower_timeout(self):
+        """Test followers stop waiting after the wait window"""
+        flight = SingleFlight(wait_timeout=0.01)
+        call, _ = flight.begin("k")
+        follower_call, _ = flight.begin("k")
+        assert flight.wait(follower_call) is None
+        assert flight.stats()["timeouts"] == 1
+
+    def test_new_call_after_finish(self):
+        """Test a key can lead again once its call finished"""
+        flight = SingleFlight()
+        call, _ = flight.begin("k")
+        flight.finish("k", call, result="answer")
+        _, leader = flight.begin("k")
+        assert leader is True
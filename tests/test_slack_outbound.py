@@ -0,0 +1,154 @@
+"""Unit tests for the rate-limited Slack outbound queue"""
+import os
+import sys
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from ledger_bot.slack_outbound import ScheduledSlackClient, SlackScheduler, TokenBucket, retry_after
+
+
+class RateLimited(Exception):
+    """Stand-in for a SlackApiError carrying a 429 response"""
+
+    def __init__(self, seconds):
+        super().__init__("ratelimited")
+        self.response = SimpleNamespace(status_code=429, headers={"Retry-After": str(seconds)})
+
+
+@pytest.fixture
+def scheduler():
+    schedulers = []
+
+    def make(**kwargs):
+        scheduler = SlackScheduler(**kwargs)
+        schedulers.append(scheduler)
+        return scheduler
+    yield make
+    for scheduler in schedulers:
+        scheduler.stop()
+
+
+class TestTokenBucket:
+    """Test token bucket refill"""
+
+    def test_delay_until_refill(self):
+        """Test an empty bucket reports when the next token arrives"""
+        bucket = TokenBucket(rate=2.0, burst=1, now=0.0)
+        assert bucket.delay(0.0) == 0
+        bucket.take(0.0)
+        assert bucket.delay(0.0) == pytest.approx(0.5)
+        assert bucket.delay(0.5) == 0
+
+    def test_amounts_and_give_back(self):
+        """Test multi-token takes and returning unused tokens up to the burst"""
+        bucket = TokenBucket(rate=1.0, burst=10, now=0.0)
+        bucket.take(0.0, 8)
+        assert bucket.delay(0.0, 5) == pytest.approx(3)
+        bucket.give_back(0.0, 20)
+        assert bucket.tokens == 10
+
+
+class TestSlackScheduler:
+    """Test rate limiting, merging and Retry-After handling"""
+
+    def test_channel_rate_limit_does_not_block_other_channels(self, scheduler):
+        """Test a busy channel is paced while another channel goes straight through"""
+        slack = ScheduledSlackClient(MagicMock(), scheduler(channel_rate=10.0, channel_burst=1))
+        started = time.monotonic()
+        for _ in range(3):
+            slack.chat_postMessage(channel="C1", text="hi")
+        busy = time.monotonic() - started
+        started = time.monotonic()
+        slack.chat_postMessage(channel="C2", text="hi")
+        assert busy >= 0.18
+        assert time.monotonic() - started < 0.1
+
+    def test_superseded_updates_merged(self, scheduler):
+        """Test queued edits to the same message collapse into the latest one"""
+        client = MagicMock()
+        client.chat_update.return_value = {"ok": True}
+        outbound = scheduler(channel_rate=5.0, channel_burst=1)
+        slack = ScheduledSlackClient(client, outbound)
+        slack.chat_postMessage(channel="C1", text="placeholder")
+        first = slack.submit("chat_update", channel="C1", ts="1.0", text="partial")
+        second = slack.submit("chat_update", channel="C1", ts="1.0", text="partial plus more")
+        final = slack.chat_update(channel="C1", ts="1.0", text="final answer")
+
+        assert final == {"ok": True}
+        assert first is second
+        assert first.result() == {"ok": True}
+        client.chat_update.assert_called_once_with(channel="C1", ts="1.0", text="final answer")
+        assert outbound.stats()["merged_updates"] == 2
+
+    def test_concurrent_streams_share_the_update_bucket(self, scheduler):
+        """Test partial edits keep a reserve for final edits and are dropped, not queued, when short"""
+        client = MagicMock()
+        client.chat_update.return_value = {"ok": True}
+        # 18/min with a frozen clock: 3 tokens that never refill
+        outbound = scheduler(method_limits={"chat_update": 18}, channel_burst=10, partial_reserve=1,
+                             clock=lambda: 0.0)
+        slack = ScheduledSlackClient(client, outbound)
+        assert slack.submit("chat_update", partial=True, channel="C1", ts="0.0", text="a").result(timeout=2)
+        assert slack.submit("chat_update", partial=True, channel="C1", ts="1.0", text="b").result(timeout=2)
+        dropped = [slack.submit("chat_update", partial=True, channel="C1", ts=f"{i}.0", text="c") for i in range(2, 5)]
+
+        assert dropped == [None, None, None]
+        assert slack.partial_interval() == pytest.approx(5 / 0.3)
+        # The reserved token still lets a final answer through
+        assert slack.chat_update(channel="C1", ts="2.0", text="final") == {"ok": True}
+        assert slack.partial_interval() == pytest.approx(4 / 0.3)
+        assert outbound.stats()["dropped_updates"] == 3
+
+    def test_final_edits_sent_before_partial_edits(self, scheduler, monkeypatch):
+        """Test a post or final edit queued after another message's partial edit goes first"""
+        outbound = scheduler(clock=lambda: 0.0)
+        monkeypatch.setattr(outbound, "_start", lambda: None)
+        outbound.submit(MagicMock(), "chat_update", {"channel": "C1", "ts": "1.0", "text": "partial"}, partial=True)
+        outbound.submit(MagicMock(), "chat_update", {"channel": "C2", "ts": "2.0", "text": "final"})
+        outbound.submit(MagicMock(), "chat_postMessage", {"channel": "C3", "text": "Thinking..."})
+
+        request, _ = outbound._next_ready(0.0)
+        assert request.kwargs["ts"] == "2.0"
+        outbound._queue.remove(request)
+        assert outbound._next_ready(0.0)[0].method == "chat_postMessage"
+
+    def test_final_edit_promotes_queued_partial(self, scheduler, monkeypatch):
+        """Test a final edit merged into a queued partial one isn't left at partial priority"""
+        outbound = scheduler(clock=lambda: 0.0)
+        monkeypatch.setattr(outbound, "_start", lambda: None)
+        partial = outbound.submit(MagicMock(), "chat_update", {"channel": "C1", "ts": "1.0", "text": "a"},
+                                  partial=True)
+        final = outbound.submit(MagicMock(), "chat_update", {"channel": "C1", "ts": "1.0", "text": "ab"})
+
+        assert final is partial
+        assert not outbound._queue[0].partial
+
+    def test_retry_after_honoured(self, scheduler):
+        """Test a 429 pauses the method and the call is retried"""
+        client = MagicMock()
+        client.chat_postMessage.side_effect = [RateLimited(0.2), {"ok": True, "ts": "2.0"}]
+        outbound = scheduler()
+        started = time.monotonic()
+        result = ScheduledSlackClient(client, outbound).chat_postMessage(channel="C1", text="hi")
+        assert result["ts"] == "2.0"
+        assert time.monotonic() - started >= 0.2
+        assert outbound.stats()["rate_limited"] == 1
+
+    def test_other_errors_raised(self, scheduler):
+        """Test non-rate-limit errors reach the caller without retries"""
+        client = MagicMock()
+        client.chat_postMessage.side_effect = ValueError("channel_not_found")
+        with pytest.raises(ValueError):
+            ScheduledSlackClient(client, scheduler()).chat_postMessage(channel="C1", text="hi")
+        assert client.chat_postMessage.call_count == 1
+
+    def test_retry_after_parsing(self):
+        """Test only 429 responses carry a retry delay"""
+        assert retry_after(RateLimited(3)) == 3.0
+        assert retry_after(ValueError("nope")) is None
@@ -0,0 +1,110 @@
+"""Unit tests for startup phases and lazily built clients"""
+import os
+import sys
+import threading
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from ledger_bot.startup import Lazy, Startup, is_built, resolve
+
+
+class FakeClock:
+    """Manually advanced clock"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestStartup:
+    """Test phase timing"""
+
+    def test_phases_timed(self):
+        clock = FakeClock()
+        startup = Startup(clock=clock)
+
+        with startup.phase("knowledge"):
+            clock.now += 0.25
+        startup.record("imports", 1.0)
+        clock.now += 0.5
+
+        assert startup.ready() == 0.75
+        assert startup.stats() == {"phases_ms": {"knowledge": 250.0, "imports": 1000.0}, "ready_ms": 750.0}
+
+    def test_failed_phase_still_recorded(self):
+        clock = FakeClock()
+        startup = Startup(clock=clock)
+
+        try:
+            with startup.phase("slack_app"):
+                clock.now += 2
+                raise ConnectionError("auth.test failed")
+        except ConnectionError:
+            pass
+
+        assert startup.phases == [("slack_app", 2)]
+        assert startup.stats()["ready_ms"] is None
+
+
+class TestLazy:
+    """Test building objects on first use"""
+
+    def test_built_on_first_attribute_access(self):
+        calls = []
+        startup = Startup()
+        lazy = Lazy(lambda: calls.append(1) or {"key": "value"}, "client", startup)
+
+        assert not is_built(lazy)
+        assert calls == []
+        assert lazy.get("key") == "value"
+        assert lazy.get("key") == "value"
+
+        assert calls == [1]
+        assert is_built(lazy)
+        assert [name for name, _ in startup.phases] == ["client"]
+
+    def test_built_once_across_threads(self):
+        calls = []
+
+        def factory():
+            calls.append(1)
+            time.sleep(0.05)
+            return object()
+
+        lazy = Lazy(factory, "slow")
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(resolve(lazy))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert calls == [1]
+        assert len({id(result) for result in results}) == 1
+
+    def test_failed_build_retried(self):
+        attempts = []
+
+        def factory():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise KeyError("SLACK_BOT_TOKEN")
+            return "client"
+
+        lazy = Lazy(factory, "client")
+        try:
+            resolve(lazy)
+        except KeyError:
+            pass
+
+        assert resolve(lazy) == "client"
+        assert len(attempts) == 2
+
+    def test_plain_objects_pass_through(self):
+        value = object()
+        assert resolve(value) is value
+        assert is_built(value)
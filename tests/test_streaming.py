@@ -0,0 +1,163 @@
+"""Unit tests for streamed Slack message updates"""
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from ledger_bot.slack_outbound import ScheduledSlackClient
+from ledger_bot.streaming import ThrottledMessageUpdater, TYPING_INDICATOR
+
+
+class RateLimited(Exception):
+    """Stand-in for a SlackApiError carrying a 429 response"""
+
+    def __init__(self, seconds):
+        super().__init__("ratelimited")
+        self.response = SimpleNamespace(status_code=429, headers={"Retry-After": str(seconds)})
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestThrottledMessageUpdater:
+    """Test coalescing of streamed chat_update calls"""
+
+    def make_updater(self, **kwargs):
+        client = MagicMock()
+        clock = FakeClock()
+        updater = ThrottledMessageUpdater(client, "C1", "123.456", clock=clock, **kwargs)
+        return updater, client, clock
+
+    def test_first_text_pushed_quickly(self):
+        """Test first update is sent once first_chars arrive"""
+        updater, client, _ = self.make_updater(first_chars=5)
+        updater.append("Hel")
+        assert client.chat_update.call_count == 0
+        updater.append("lo there")
+        assert client.chat_update.call_count == 1
+        assert client.chat_update.call_args.kwargs["text"] == "Hello there" + TYPING_INDICATOR
+
+    def test_updates_coalesced_by_time_and_chars(self):
+        """Test edits wait for both the interval and the char budget"""
+        updater, client, clock = self.make_updater(first_chars=1, min_chars=10, min_interval=1.0)
+        updater.append("a")
+        assert client.chat_update.call_count == 1
+
+        # Enough chars, not enough time
+        updater.append("b" * 20)
+        assert client.chat_update.call_count == 1
+
+        # Enough time, then the next delta triggers an edit
+        clock.now = 1.5
+        updater.append("c")
+        assert client.chat_update.call_count == 2
+
+        # Enough time, not enough chars
+        clock.now = 5.0
+        updater.append("d")
+        assert client.chat_update.call_count == 2
+
+    def test_partial_text_capped_at_max_length(self):
+        """Test partial edits never exceed max_length"""
+        updater, client, _ = self.make_updater(first_chars=1, max_length=10)
+        updater.append("x" * 50)
+        assert client.chat_update.call_args.kwargs["text"] == "x" * 10 + TYPING_INDICATOR
+
+    def test_finish_sends_final_text(self):
+        """Test finish always sends the final answer"""
+        updater, client, _ = self.make_updater(first_chars=100)
+        updater.append("short")
+        updater.finish("short answer")
+        assert client.chat_update.call_count == 1
+        assert client.chat_update.call_args.kwargs["text"] == "short answer"
+        assert updater.first_update_at is not None
+
+    def test_intermediate_update_errors_swallowed(self):
+        """Test a failed partial edit doesn't raise"""
+        updater, client, _ = self.make_updater(first_chars=1)
+        client.chat_update.side_effect = Exception("ratelimited")
+        updater.append("hello")
+        assert updater.updates_sent == 0
+
+    def test_failed_edit_waits_for_retry_after(self):
+        """Test a 429 on a partial edit holds off further edits instead of retrying on every delta"""
+        updater, client, clock = self.make_updater(first_chars=1, min_chars=1, min_interval=1.0)
+        client.chat_update.side_effect = RateLimited(5)
+        updater.append("a")
+        for _ in range(10):
+            updater.append("b")
+        assert client.chat_update.call_count == 1
+
+        clock.now = 2.0
+        updater.append("c")
+        assert client.chat_update.call_count == 1
+        client.chat_update.side_effect = None
+        clock.now = 5.0
+        updater.append("d")
+        assert client.chat_update.call_count == 2
+        assert updater.updates_sent == 1
+
+    def test_failed_edit_waits_for_interval(self):
+        """Test other edit errors wait for the next interval"""
+        updater, client, clock = self.make_updater(first_chars=1, min_chars=1, min_interval=1.0)
+        client.chat_update.side_effect = Exception("message_not_found")
+        updater.append("a")
+        updater.append("b")
+        assert client.chat_update.call_count == 1
+        clock.now = 1.0
+        updater.append("c")
+        assert client.chat_update.call_count == 2
+
+    def test_scheduled_client_edits_queued_without_waiting(self):
+        """Test partial edits are submitted to the outbound queue, the final one awaited"""
+        scheduler = MagicMock()
+        client = ScheduledSlackClient(MagicMock(), scheduler)
+        updater = ThrottledMessageUpdater(client, "C1", "123.456", first_chars=1, clock=FakeClock())
+        updater.append("Hello")
+        scheduler.submit.assert_called_once()
+        assert scheduler.submit.call_args.args[1:] == (
+            "chat_update", {"channel": "C1", "ts": "123.456", "text": "Hello" + TYPING_INDICATOR}
+        )
+        scheduler.submit.return_value.result.assert_not_called()
+
+        updater.finish("Hello world")
+        scheduler.submit.return_value.result.assert_called_once()
+
+    def test_scheduled_interval_stretches_with_concurrent_streams(self):
+        """Test edits slow to the queue's per-stream share when several messages stream at once"""
+        scheduler = MagicMock()
+        scheduler.partial_interval.return_value = 6.0
+        clock = FakeClock()
+        updater = ThrottledMessageUpdater(ScheduledSlackClient(MagicMock(), scheduler), "C1", "123.456",
+                                          min_interval=1.0, min_chars=1, first_chars=1, clock=clock)
+        updater.append("a")
+        clock.now = 2.0
+        updater.append("b")
+        assert scheduler.submit.call_count == 1
+        clock.now = 6.0
+        updater.append("c")
+        assert scheduler.submit.call_count == 2
+
+    def test_dropped_partial_edit_waits_for_next_interval(self):
+        """Test an edit the queue drops isn't counted or retried on the very next delta"""
+        scheduler = MagicMock()
+        scheduler.submit.return_value = None
+        scheduler.partial_interval.return_value = 0.0
+        clock = FakeClock()
+        updater = ThrottledMessageUpdater(ScheduledSlackClient(MagicMock(), scheduler), "C1", "123.456",
+                                          min_interval=1.0, min_chars=1, first_chars=1, clock=clock)
+        updater.append("a")
+        updater.append("b")
+        assert scheduler.submit.call_count == 1
+        assert updater.updates_sent == 0
+        clock.now = 1.0
+        updater.append("c")
+        assert scheduler.submit.call_count == 2
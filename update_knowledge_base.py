@@ -2,59 +2,98 @@
 """
 Script to update the Ledger Bot knowledge base with content from oracle-gl-publisher repo
 """
+import argparse
 import os
+import time
 from pathlib import Path
 
-GL_PUBLISHER_PATH = Path.home() / "IdeaProjects" / "oracle-gl-publisher"
+from ledger_bot.kb_compiler import update_knowledge_base
+from ledger_bot.kb_ingest import DEFAULT_EXCLUDE, DEFAULT_INCLUDE, DEFAULT_MAX_DOC_TOKENS, PathRules, ingest
+from ledger_bot.kb_tiers import compile_tiers, settings
+from ledger_bot.knowledge import artifact_path, read_artifact, save_artifact, text_hash
+
+GL_PUBLISHER_PATH = Path(os.environ.get("GL_PUBLISHER_PATH", Path.home() / "IdeaProjects" / "oracle-gl-publisher"))
 KNOWLEDGE_BASE_PATH = Path.home() / "ledger-bot-app" / "knowledge_base.txt"
 
-def read_file(path):
-    """Read file content safely"""
-    try:
-        with open(path, 'r') as f:
-            return f.read()
-    except Exception as e:
-        print(f"Error reading {path}: {e}")
-        return None
-
-def append_to_knowledge_base(content, section_title):
-    """Append content to knowledge base"""
-    with open(KNOWLEDGE_BASE_PATH, 'a') as f:
-        f.write(f"\n\n## {section_title}\n\n")
-        f.write(content)
-    print(f"✅ Added: {section_title}")
+# Same settings as the bot, so it can load the artifact instead of compiling at startup
+CORE_SECTIONS = [
+    title.strip()
+    for title in os.environ.get("RETRIEVAL_CORE_SECTIONS", "YOUR ROLE,HOW TO ANSWER QUESTIONS").split(",")
+    if title.strip()
+]
+ARCHIVE_SECTIONS = [title.strip() for title in os.environ.get("KB_ARCHIVE_SECTIONS", "").split(",") if title.strip()]
+KB_TOKEN_CEILING = int(os.environ.get("KB_TOKEN_CEILING", "0"))
+KB_COMPRESS = os.environ.get("KB_COMPRESS", "true").lower() == "true"
+
+def compile_artifact(path, force=False, token_ceiling=KB_TOKEN_CEILING):
+    """Write the compiled artifact (compressed, tiered sections and retrieval index) the bot loads at startup"""
+    with open(path, 'r') as f:
+        text = f.read()
+    output = artifact_path(str(path))
+    artifact = read_artifact(output)
+    options = settings(CORE_SECTIONS, ARCHIVE_SECTIONS, token_ceiling, KB_COMPRESS)
+    if (not force and artifact is not None and artifact.get("hash") == text_hash(text)
+            and artifact.get("tiering") == options):
+        print(f"✅ Compiled artifact {output} is up to date")
+        return
+    result = compile_tiers(text, CORE_SECTIONS, ARCHIVE_SECTIONS, token_ceiling, KB_COMPRESS)
+    print(result.report())
+    save_artifact(result.kb, output)
+    print(f"✅ Compiled {len(result.kb.sections)} sections to {output}: {result.describe()}")
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--knowledge-base", type=Path, default=KNOWLEDGE_BASE_PATH,
+                        help="Knowledge base file to update (default: %(default)s)")
+    parser.add_argument("--gl-publisher", type=Path, default=GL_PUBLISHER_PATH,
+                        help="oracle-gl-publisher checkout to read docs from (default: %(default)s)")
+    parser.add_argument("--compile-only", action="store_true",
+                        help="Only rebuild the compiled artifact, e.g. in the Docker build")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Print the section report without writing anything")
+    parser.add_argument("--include", action="append", metavar="GLOB",
+                        help=f"Path glob to ingest, repeatable (default: {' '.join(DEFAULT_INCLUDE)})")
+    parser.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                        help=f"Path glob to skip, added to: {' '.join(DEFAULT_EXCLUDE)}")
+    parser.add_argument("--max-doc-tokens", type=int, default=DEFAULT_MAX_DOC_TOKENS,
+                        help="Truncate each document to about this many tokens, 0 for no cap (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="Threads reading documents (default: %(default)s)")
+    parser.add_argument("--token-ceiling", type=int, default=KB_TOKEN_CEILING,
+                        help="Archive detail sections until the prompt fits this many tokens, 0 for no ceiling "
+                             "(default: KB_TOKEN_CEILING or %(default)s)")
+    args = parser.parse_args()
+    if args.compile_only:
+        compile_artifact(args.knowledge_base, force=True, token_ceiling=args.token_ceiling)
+        return
+    if not args.gl_publisher.is_dir():
+        raise SystemExit(f"❌ oracle-gl-publisher checkout not found at {args.gl_publisher}")
+
     print("Updating Ledger Bot knowledge base...")
-    print(f"Reading from: {GL_PUBLISHER_PATH}")
-    print(f"Writing to: {KNOWLEDGE_BASE_PATH}\n")
-    
-    # Add module READMEs
-    modules = ["api", "queue-processor", "audit-status-processor", "db"]
-    for module in modules:
-        readme_path = GL_PUBLISHER_PATH / module / "README.md"
-        if readme_path.exists():
-            content = read_file(readme_path)
-            if content:
-                append_to_knowledge_base(content, f"{module.upper()} Module Details")
-    
-    # Add important ADRs
-    adr_files = [
-        "0007-idempotency-key-meaning.md",
-        "0010-Reversals-in-GL-Publisher.md",
-        "0003-add-oracle-import-check-logic.md"
-    ]
-    
-    for adr_file in adr_files:
-        adr_path = GL_PUBLISHER_PATH / "docs" / "adr" / adr_file
-        if adr_path.exists():
-            content = read_file(adr_path)
-            if content:
-                append_to_knowledge_base(content, f"ADR: {adr_file.replace('.md', '')}")
-    
-    # Add a simple Impact Builder example
-    print("\n✨ Knowledge base updated!")
-    print("Restart the bot to load the new knowledge.")
+    print(f"Reading from: {args.gl_publisher}")
+    print(f"Writing to: {args.knowledge_base}\n")
+
+    started = time.perf_counter()
+    rules = PathRules(args.include or DEFAULT_INCLUDE, DEFAULT_EXCLUDE + tuple(args.exclude))
+    ingested = ingest(args.gl_publisher, rules, max_doc_tokens=args.max_doc_tokens, workers=args.workers)
+    print(f"📥 Ingested {ingested.describe()}")
+    for document in ingested.documents:
+        if document.truncated:
+            print(f"✂️  {document.key}: {document.raw_tokens} -> {document.tokens} tokens")
+
+    result = update_knowledge_base(args.knowledge_base, ingested.sources(), read=ingested.reader(),
+                                   dry_run=args.dry_run)
+    if not args.dry_run:
+        compile_artifact(args.knowledge_base, token_ceiling=args.token_ceiling)
+    print(f"⏱️  Refreshed in {time.perf_counter() - started:.2f}s")
+    if args.dry_run:
+        return
+
+    if result.changed:
+        print("\n✨ Knowledge base updated!")
+        print("The bot picks up the new knowledge automatically (or POST /admin/reload-knowledge on the health port).")
+    else:
+        print("\n✨ Knowledge base already up to date")
 
 if __name__ == "__main__":
     main()